@@ -4,20 +4,50 @@
 """
 
 import os
+import re
 import json
-import requests
 from pathlib import Path
 import datetime
-import time
+from typing import Dict, List, Tuple
+
+from artifact_store import ArtifactStore, read_text
+from deepseek_client import CircuitOpenError, DeepSeekClient, RetryQueue
+from profiler import add_profile_arguments, run_profiled, stage
+from transcript_normalize import estimate_tokens, format_stats, normalize_transcript
 
 # DeepSeek API配置
 DEEPSEEK_API_KEY = "your_api_key"
 DEEPSEEK_API_URL = "https://api.deepseek.com/v1/chat/completions"
 
 # 设置转录文件目录和结果目录
+# 转录和分析结果保存在产物存储（artifact_store.py）中，这两个旧版目录可用 python artifact_store.py import 迁移；
+# 存储外的转录文件的分析结果仍保存到 RESULT_DIR
 TXT_DIR = r"D:\test\TikTok_Video_API\txt"
 RESULT_DIR = r"D:\test\TikTok_Video_API\result"  # 新增结果目录
 
+# 熔断期间被推迟分析的转录文件
+RETRY_QUEUE_PATH = r"D:\test\TikTok_Video_API\db\analysis_retry.jsonl"
+
+# 发送前是否折叠重复循环、去掉语气填充词
+NORMALIZE_TRANSCRIPT = True
+
+# 保存分析结果后写入全文检索索引
+SEARCH_INDEX = True
+
+# 单条转录内容的最大长度（字符）
+MAX_CONTENT_CHARS = 1000
+
+# 批量分析：单次请求中转录内容的token预算、最多合并的条数和每条的回复token数
+BATCH_TOKEN_BUDGET = 3000
+BATCH_MAX_ITEMS = 8
+BATCH_TOKENS_PER_ITEM = 600
+
+DEFAULT_SYSTEM_PROMPT = "你是一个专业的文本分析助手，请对提供的文本内容进行分析，包括但不限于：主要内容总结、关键信息提取、情感倾向分析等。请用中文回答。"
+
+BATCH_INSTRUCTION = """接下来会一次提供多段互不相关的文本，每段都有编号（id）。
+请按照上面的要求分别分析每一段，只输出一个JSON数组，不要输出其他内容。
+数组中每个元素的格式为 {"id": 编号, "analysis": "该段文本的完整分析结果"}，每个编号都必须出现且只出现一次。"""
+
 def read_prompt_file():
     """读取提示词文件内容"""
     prompt_file = r"D:\test\TikTok_Video_API\提示词.txt"
@@ -33,24 +63,17 @@ def read_prompt_file():
 
 def get_latest_transcript_file():
     """获取最新的转录文件"""
-    if not os.path.exists(TXT_DIR):
-        raise FileNotFoundError(f"转录目录 {TXT_DIR} 不存在")
-    
-    # 获取所有txt文件
-    txt_files = list(Path(TXT_DIR).glob("*.txt"))
+    with ArtifactStore() as store:
+        latest = store.latest("transcript")
     
-    if not txt_files:
-        raise FileNotFoundError(f"在目录 {TXT_DIR} 中未找到转录文件")
+    if latest is None:
+        raise FileNotFoundError("产物存储中没有转录文件")
     
-    # 按修改时间排序，最新的文件排在前面
-    txt_files.sort(key=lambda x: x.stat().st_mtime, reverse=True)
-    
-    return txt_files[0]
+    return Path(latest)
 
 def read_transcript_file(file_path):
-    """读取转录文件内容"""
-    with open(file_path, 'r', encoding='utf-8') as f:
-        content = f.read()
+    """读取转录文件内容（压缩保存的转录自动解压）"""
+    content = read_text(str(file_path))
     
     # 提取实际的转录内容（跳过前几行的元数据）
     lines = content.split('\n')
@@ -63,88 +86,280 @@ def read_transcript_file(file_path):
     transcript_content = '\n'.join(lines[transcript_start:])
     return transcript_content.strip()
 
+def prepare_transcript(content, name=""):
+    """
+    规范化转录内容并输出token压缩统计
+    
+    Args:
+        content: 转录内容
+        name: 文件名（用于输出）
+        
+    Returns:
+        (规范化后的内容, 统计信息)
+    """
+    if not NORMALIZE_TRANSCRIPT:
+        tokens = estimate_tokens(content)
+        return content, {"chars_before": len(content), "chars_after": len(content),
+                         "tokens_before": tokens, "tokens_after": tokens}
+    
+    with stage("normalize"):
+        content, stats = normalize_transcript(content)
+    print(f"预压缩{' ' + name if name else ''}: {format_stats(stats)}")
+    return content, stats
+
+def get_system_prompt():
+    """获取系统提示词，没有提示词文件时使用默认提示词"""
+    prompt_text = read_prompt_file()
+    return prompt_text if prompt_text else DEFAULT_SYSTEM_PROMPT
+
+def truncate_content(content):
+    """限制内容长度以避免API超时"""
+    if len(content) > MAX_CONTENT_CHARS:
+        content = content[:MAX_CONTENT_CHARS] + "\n\n[内容已截断以适应API限制]"
+    return content
+
+_client = None
+
+def get_client():
+    """获取进程内共享的DeepSeek客户端（API地址或密钥变化时重新创建）"""
+    global _client
+    if _client is None or (_client.api_url, _client.api_key) != (DEEPSEEK_API_URL, DEEPSEEK_API_KEY):
+        _client = DeepSeekClient(DEEPSEEK_API_URL, DEEPSEEK_API_KEY)
+    return _client
+
+def request_deepseek(payload, max_retries=3):
+    """
+    发送请求到DeepSeek API并返回回复内容
+    
+    慢请求的对冲、单次尝试和整体的截止时间以及熔断由 DeepSeekClient 处理，
+    熔断器打开时抛出 CircuitOpenError
+    """
+    print("正在发送请求到DeepSeek API...")
+    with stage("llm"):
+        return get_client().complete(payload, max_retries)
+
+def defer_transcript(file_path, reason):
+    """熔断期间将转录文件放入重试队列"""
+    RetryQueue(RETRY_QUEUE_PATH).push(str(file_path), reason)
+    print(f"DeepSeek服务暂时不可用，已将 {Path(file_path).name} 加入重试队列")
+
 def analyze_with_deepseek(content, max_retries=3):
     """使用DeepSeek API分析内容，包含重试机制"""
-    headers = {
-        "Authorization": f"Bearer {DEEPSEEK_API_KEY}",
-        "Content-Type": "application/json"
+    payload = {
+        "model": "deepseek-chat",
+        "messages": [
+            {
+                "role": "system",
+                "content": get_system_prompt()
+            },
+            {
+                "role": "user",
+                "content": f"请分析以下文本内容：\n\n{truncate_content(content)}"
+            }
+        ],
+        "stream": False,
+        "temperature": 0.7,
+        "max_tokens": 1000
     }
+    return request_deepseek(payload, max_retries)
+
+def pack_batches(items: List[Tuple[str, str]], token_budget: int = BATCH_TOKEN_BUDGET,
+                 max_items: int = BATCH_MAX_ITEMS) -> List[List[Tuple[str, str]]]:
+    """
+    按token预算将多条转录内容打包为若干批
     
-    # 读取提示词
-    prompt_text = read_prompt_file()
+    Args:
+        items: (编号, 内容) 列表
+        token_budget: 每批内容的token预算
+        max_items: 每批最多的条数
+        
+    Returns:
+        批次列表，超出预算的单条内容单独成批
+    """
+    batches = []
+    current = []
+    current_tokens = 0
+    for item_id, content in items:
+        tokens = estimate_tokens(content[:MAX_CONTENT_CHARS])
+        if current and (current_tokens + tokens > token_budget or len(current) >= max_items):
+            batches.append(current)
+            current = []
+            current_tokens = 0
+        current.append((item_id, content))
+        current_tokens += tokens
+    if current:
+        batches.append(current)
+    return batches
+
+def parse_batch_response(text, expected_ids) -> Dict[str, str]:
+    """
+    解析批量分析返回的JSON数组
     
-    # 如果没有提示词文件，则使用默认提示词
-    if not prompt_text:
-        system_prompt = "你是一个专业的文本分析助手，请对提供的文本内容进行分析，包括但不限于：主要内容总结、关键信息提取、情感倾向分析等。请用中文回答。"
-    else:
-        system_prompt = prompt_text
+    Args:
+        text: API返回的内容
+        expected_ids: 本批所有编号
+        
+    Returns:
+        编号到分析结果的映射
+        
+    Raises:
+        ValueError: 不是合法的JSON数组或缺少某些编号
+    """
+    # 去掉可能包裹在外面的 ```json 代码块
+    text = text.strip()
+    match = re.search(r"```(?:json)?\s*(.*?)\s*```", text, re.S)
+    if match:
+        text = match.group(1)
+    start, end = text.find("["), text.rfind("]")
+    if start == -1 or end < start:
+        raise ValueError("返回内容中没有JSON数组")
+    
+    try:
+        data = json.loads(text[start:end + 1])
+    except json.JSONDecodeError as e:
+        raise ValueError(f"JSON解析失败: {e}")
     
-    # 限制内容长度以避免API超时
-    if len(content) > 1000:
-        content = content[:1000] + "\n\n[内容已截断以适应API限制]"
+    results = {}
+    for entry in data:
+        if not isinstance(entry, dict) or "id" not in entry or not isinstance(entry.get("analysis"), str):
+            raise ValueError(f"数组元素格式不正确: {entry}")
+        results[str(entry["id"])] = entry["analysis"].strip()
     
+    missing = [item_id for item_id in expected_ids if not results.get(item_id)]
+    if missing:
+        raise ValueError(f"缺少编号 {', '.join(missing)} 的分析结果")
+    return {item_id: results[item_id] for item_id in expected_ids}
+
+def analyze_batch_with_deepseek(batch: List[Tuple[str, str]], max_retries=3) -> Dict[str, str]:
+    """
+    在一次请求中分析多条内容，系统提示词只发送一次
+    
+    Args:
+        batch: (编号, 内容) 列表
+        max_retries: 最大重试次数
+        
+    Returns:
+        编号到分析结果的映射
+    """
+    items = [{"id": item_id, "content": truncate_content(content)} for item_id, content in batch]
     payload = {
         "model": "deepseek-chat",
         "messages": [
             {
                 "role": "system",
-                "content": system_prompt
+                "content": f"{get_system_prompt()}\n\n{BATCH_INSTRUCTION}"
             },
             {
                 "role": "user",
-                "content": f"请分析以下文本内容：\n\n{content}"
+                "content": f"请分别分析以下 {len(items)} 段文本内容：\n\n{json.dumps(items, ensure_ascii=False, indent=2)}"
             }
         ],
         "stream": False,
         "temperature": 0.7,
-        "max_tokens": 1000
+        "max_tokens": min(8192, BATCH_TOKENS_PER_ITEM * len(items))
     }
+    return parse_batch_response(request_deepseek(payload, max_retries), [item_id for item_id, _ in batch])
+
+def get_pending_transcript_files():
+    """获取还没有分析结果的转录文件，按转录时间从旧到新排序"""
+    with ArtifactStore() as store:
+        return [Path(f) for f in store.pending("transcript", "analysis")]
+
+def has_analysis_result(file_path):
+    """转录文件是否已有分析结果（产物存储中的转录按同一分组的索引判断）"""
+    with ArtifactStore() as store:
+        key = store.key_for_path(file_path)
+        if key:
+            return store.get(key, "analysis") is not None
+    return os.path.exists(os.path.join(RESULT_DIR, f"{Path(file_path).stem}_analysis.txt"))
+
+def analyze_transcripts_batched(files, token_budget=BATCH_TOKEN_BUDGET, max_items=BATCH_MAX_ITEMS):
+    """
+    批量分析多个转录文件
     
-    # 实现重试机制
-    for attempt in range(max_retries):
-        try:
-            print(f"正在发送请求到DeepSeek API... (尝试 {attempt + 1}/{max_retries})")
-            response = requests.post(
-                DEEPSEEK_API_URL, 
-                headers=headers, 
-                json=payload,
-                timeout=60  # 增加超时时间到60秒
-            )
-            print(f"API响应状态码: {response.status_code}")
-            response.raise_for_status()
-            result = response.json()
-            return result["choices"][0]["message"]["content"]
-        except requests.exceptions.Timeout:
-            print(f"DeepSeek API调用超时 (尝试 {attempt + 1}/{max_retries})")
-            if attempt < max_retries - 1:  # 如果不是最后一次尝试，等待一段时间再重试
-                wait_time = 2 ** attempt  # 指数退避
-                print(f"等待 {wait_time} 秒后重试...")
-                time.sleep(wait_time)
-            else:
-                raise Exception("DeepSeek API调用超时，已达到最大重试次数")
-        except requests.exceptions.RequestException as e:
-            raise Exception(f"DeepSeek API网络请求失败: {str(e)}")
-        except Exception as e:
-            raise Exception(f"DeepSeek API调用失败: {str(e)}")
+    较短的转录内容按token预算合并到同一个请求中，返回的JSON数组拆分后分别保存；
+    某一批的返回无法解析时，该批改为逐条请求
+    
+    Args:
+        files: 转录文件路径列表
+        token_budget: 每批内容的token预算
+        max_items: 每批最多的条数
+        
+    Returns:
+        分析结果文件路径列表
+    """
+    items = []
+    paths = {}
+    tokens_before = tokens_after = 0
+    for index, file_path in enumerate(files):
+        content, stats = prepare_transcript(read_transcript_file(file_path), Path(file_path).name)
+        if not content:
+            print(f"跳过空的转录文件: {Path(file_path).name}")
+            continue
+        tokens_before += stats["tokens_before"]
+        tokens_after += stats["tokens_after"]
+        item_id = str(index)
+        paths[item_id] = file_path
+        items.append((item_id, content))
+    
+    if NORMALIZE_TRANSCRIPT and items:
+        print(f"预压缩合计: {format_stats({'tokens_before': tokens_before, 'tokens_after': tokens_after})}")
+    
+    batches = pack_batches(items, token_budget, max_items)
+    print(f"共 {len(items)} 个转录文件，合并为 {len(batches)} 个请求")
     
-    raise Exception("DeepSeek API调用失败，已达到最大重试次数")
+    saved = []
+    for batch in batches:
+        if len(batch) > 1:
+            try:
+                results = analyze_batch_with_deepseek(batch)
+                for item_id, analysis in results.items():
+                    saved.append(save_analysis_result(paths[item_id], analysis))
+                continue
+            except CircuitOpenError as e:
+                for item_id, _ in batch:
+                    defer_transcript(paths[item_id], str(e))
+                continue
+            except Exception as e:
+                print(f"批量分析失败: {e}，改为逐条分析")
+        
+        for item_id, content in batch:
+            try:
+                print(f"正在分析: {Path(paths[item_id]).name}")
+                saved.append(save_analysis_result(paths[item_id], analyze_with_deepseek(content)))
+            except CircuitOpenError as e:
+                defer_transcript(paths[item_id], str(e))
+            except Exception as e:
+                print(f"分析 {Path(paths[item_id]).name} 时出错: {str(e)}")
+    
+    return saved
 
 def save_analysis_result(file_path, analysis_result):
     """保存分析结果到文件"""
-    # 生成分析结果文件名
-    stem = Path(file_path).stem
-    analysis_filename = f"{stem}_analysis.txt"
-    
-    # 确保结果目录存在
-    os.makedirs(RESULT_DIR, exist_ok=True)
-    
-    # 将纯分析结果保存到result目录
-    result_path = os.path.join(RESULT_DIR, analysis_filename)
-    with open(result_path, 'w', encoding='utf-8') as f:
-        f.write(analysis_result)
+    with ArtifactStore() as store:
+        key = store.key_for_path(file_path)
+        if key:
+            # 原子写入转录所在的分组并登记，不会出现写了一半的分析结果
+            result_path = store.write_text(key, "analysis", analysis_result)
+        else:
+            # 确保结果目录存在
+            os.makedirs(RESULT_DIR, exist_ok=True)
+            
+            # 将纯分析结果保存到result目录
+            result_path = os.path.join(RESULT_DIR, f"{Path(file_path).stem}_analysis.txt")
+            with open(result_path, 'w', encoding='utf-8') as f:
+                f.write(analysis_result)
     
     print(f"分析结果已保存至: {result_path}")
     
+    # 写入全文检索索引
+    if SEARCH_INDEX:
+        try:
+            from search_index import index_analysis
+            index_analysis(result_path, analysis_result)
+        except Exception as e:
+            print(f"写入检索索引时出错: {e}")
+    
     return result_path
 
 def analyze_latest_transcript():
@@ -158,18 +373,20 @@ def analyze_latest_transcript():
         latest_file = get_latest_transcript_file()
         print(f"找到最新转录文件: {latest_file.name}")
         
-        # 读取转录内容
-        transcript_content = read_transcript_file(latest_file)
-        print(f"转录内容长度: {len(transcript_content)} 字符")
-        
-        # 使用DeepSeek API进行分析
-        print("正在调用DeepSeek API进行分析...")
-        analysis_result = analyze_with_deepseek(transcript_content)
-        print("AI分析完成!")
-        
-        # 保存分析结果
-        analysis_file_path = save_analysis_result(latest_file, analysis_result)
-        print(f"分析结果已保存至: {analysis_file_path}")
+        with stage("analyze", latest_file.name):
+            # 读取转录内容
+            transcript_content = read_transcript_file(latest_file)
+            print(f"转录内容长度: {len(transcript_content)} 字符")
+            transcript_content, _ = prepare_transcript(transcript_content)
+            
+            # 使用DeepSeek API进行分析
+            print("正在调用DeepSeek API进行分析...")
+            analysis_result = analyze_with_deepseek(transcript_content)
+            print("AI分析完成!")
+            
+            # 保存分析结果
+            analysis_file_path = save_analysis_result(latest_file, analysis_result)
+            print(f"分析结果已保存至: {analysis_file_path}")
         
         # 打印分析结果
         print("\n" + "=" * 50)
@@ -178,6 +395,10 @@ def analyze_latest_transcript():
         print(analysis_result)
         
         return analysis_file_path
+    except CircuitOpenError as e:
+        defer_transcript(latest_file, str(e))
+        print("可稍后运行 python analyze_transcript.py --retry-deferred 重新分析")
+        return None
     except Exception as e:
         print(f"处理过程中出现错误: {str(e)}")
         # 提供一些解决建议
@@ -188,9 +409,66 @@ def analyze_latest_transcript():
         print("4. 检查API密钥是否正确配置")
         return None
 
+def analyze_pending_transcripts(token_budget=BATCH_TOKEN_BUDGET, max_items=BATCH_MAX_ITEMS):
+    """批量分析所有还没有分析结果的转录文件"""
+    print("=" * 50)
+    print("转录内容AI批量分析工具")
+    print("=" * 50)
+    
+    try:
+        files = get_pending_transcript_files()
+    except Exception as e:
+        print(f"处理过程中出现错误: {str(e)}")
+        return []
+    
+    if not files:
+        print("没有待分析的转录文件")
+        return []
+    
+    saved = analyze_transcripts_batched(files, token_budget, max_items)
+    print(f"\n批量分析完成: {len(saved)}/{len(files)} 个文件")
+    return saved
+
+def retry_deferred_transcripts(token_budget=BATCH_TOKEN_BUDGET, max_items=BATCH_MAX_ITEMS):
+    """重新分析熔断期间被推迟的转录文件"""
+    print("=" * 50)
+    print("重新分析被推迟的转录文件")
+    print("=" * 50)
+    
+    files = [
+        Path(f) for f in RetryQueue(RETRY_QUEUE_PATH).drain()
+        if os.path.exists(f) and not has_analysis_result(f)
+    ]
+    if not files:
+        print("重试队列为空")
+        return []
+    
+    saved = analyze_transcripts_batched(files, token_budget, max_items)
+    print(f"\n重新分析完成: {len(saved)}/{len(files)} 个文件")
+    return saved
+
 def main():
     """主函数"""
     return analyze_latest_transcript()
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="使用DeepSeek API分析转录文件")
+    parser.add_argument("--batch", action="store_true", help="分析所有未分析的转录文件，较短的内容合并到同一个请求中")
+    parser.add_argument("--budget", type=int, default=BATCH_TOKEN_BUDGET,
+                        help=f"--batch 模式下每个请求的内容token预算（默认: {BATCH_TOKEN_BUDGET}）")
+    parser.add_argument("--max-items", type=int, default=BATCH_MAX_ITEMS,
+                        help=f"--batch 模式下每个请求最多合并的文件数（默认: {BATCH_MAX_ITEMS}）")
+    parser.add_argument("--retry-deferred", action="store_true", help="重新分析熔断期间被推迟的转录文件")
+    parser.add_argument("--watch", action="store_true", help="常驻运行，新转录写完后立即分析（见 watch_folder.py）")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    if args.watch:
+        from watch_folder import watch
+        run_profiled(args, "analyze", watch, ["analyze"])
+    elif args.retry_deferred:
+        run_profiled(args, "analyze", retry_deferred_transcripts, args.budget, args.max_items)
+    elif args.batch:
+        run_profiled(args, "analyze", analyze_pending_transcripts, args.budget, args.max_items)
+    else:
+        run_profiled(args, "analyze", main)
\ No newline at end of file
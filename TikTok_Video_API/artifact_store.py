@@ -0,0 +1,718 @@
+#!/usr/bin/env python3
+"""
+产物存储
+视频、图集图片、转录（含字幕）和分析结果按视频ID分组保存（没有视频ID的文件按内容哈希），每组一个目录，
+并按键的哈希分两级子目录：<根目录>/ab/cd/<键>/。文件名由键决定，同一分钟、同一标题首字的视频不会再互相覆盖，
+单个目录的文件数也不会无限增长。
+写入时先写同目录下的临时文件再原子重命名，读者不会看到写了一半的文件。
+SQLite索引记录每个产物的文件名和创建时间，查找某个视频的产物、最新的视频或转录、待分析的转录都不需要扫描目录。
+转录和分析结果可以压缩保存（COMPRESSION），同类文本共用一个字典，读取时通过 read_text 自动解压
+"""
+
+import argparse
+import contextlib
+import hashlib
+import os
+import re
+import shutil
+import sqlite3
+import struct
+import threading
+import time
+import uuid
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+# 产物根目录和索引数据库
+ARTIFACT_DIR = r"D:\test\TikTok_Video_API\artifacts"
+ARTIFACT_DB = r"D:\test\TikTok_Video_API\db\artifacts.db"
+
+# 键只能包含字母、数字、下划线和短横线（视频ID或 sha256-<哈希>）
+KEY_PATTERN = re.compile(r"^[A-Za-z0-9_-]{1,128}$")
+
+# 各类产物的默认文件名；转录的字幕文件（.srt、.vtt、.segments.jsonl）与转录文本同名、扩展名不同
+ARTIFACT_NAMES = {
+    "video": "{key}{ext}",
+    "transcript": "{key}_transcript.txt",
+    "analysis": "{key}_transcript_analysis.txt",
+}
+
+# 与转录文本一起删除的字幕文件扩展名
+TRANSCRIPT_SIDECARS = (".srt", ".vtt", ".segments.jsonl")
+
+# 图集的图片按序号命名（<key>_01.jpg、<key>_02.webp ...），重建索引时按此识别
+IMAGE_NAME_PATTERN = re.compile(r"^(?P<key>[A-Za-z0-9_-]+)_\d{2,}\.(?:jpe?g|png|webp|heic|gif)$")
+
+# 计算内容哈希时每次读取的字节数
+HASH_CHUNK_SIZE = 1 << 20
+
+# 文本产物的压缩方式：None 不压缩；"zlib" 使用标准库和预置字典；"zstd" 使用训练的字典（需要 pip install zstandard）
+# 读取接口 read_text 对压缩和未压缩的文件都适用，切换压缩方式不影响已有文件
+COMPRESSION = None
+
+# 压缩保存的产物类型和压缩文件的扩展名
+COMPRESSED_KINDS = ("transcript", "analysis")
+COMPRESSED_SUFFIX = ".z"
+
+# 压缩文件头：魔数、压缩方式（1字节）、字典ID（4字节，0表示不使用字典）
+COMPRESSED_MAGIC = b"TVZ1"
+CODEC_IDS = {"zlib": b"z", "zstd": b"s"}
+
+# 字典从最新的 DICT_SAMPLES 个同类文本中生成，不足 DICT_MIN_SAMPLES 个时不使用字典；
+# zlib的预置字典最多使用32KB，zstd的字典大小相同
+DICT_SAMPLES = 500
+DICT_MIN_SAMPLES = 20
+DICT_SIZE = 32 * 1024
+
+# zlib字典中常用词组的长度（字符数）
+DICT_NGRAM_SIZES = (2, 3, 4, 6, 8)
+
+# 压缩级别
+ZLIB_LEVEL = 9
+ZSTD_LEVEL = 19
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS artifacts (
+    key TEXT NOT NULL,
+    name TEXT NOT NULL,
+    kind TEXT NOT NULL,
+    size INTEGER NOT NULL DEFAULT 0,
+    created_at REAL NOT NULL,
+    PRIMARY KEY (key, name)
+);
+CREATE INDEX IF NOT EXISTS idx_artifacts_kind_created ON artifacts (kind, created_at);
+CREATE TABLE IF NOT EXISTS dictionaries (
+    kind TEXT NOT NULL,
+    codec TEXT NOT NULL,
+    dict_id INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+"""
+
+def validate_key(key: str) -> str:
+    """检查键是否合法（会作为目录名和文件名的一部分）"""
+    key = str(key)
+    if not KEY_PATTERN.match(key):
+        raise ValueError(f"无效的产物键: {key}")
+    return key
+
+def content_key(path: str) -> str:
+    """按文件内容计算的键"""
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b""):
+            digest.update(chunk)
+    return f"sha256-{digest.hexdigest()[:32]}"
+
+def plain_name(path: str) -> str:
+    """去掉压缩文件扩展名后的路径"""
+    return path[:-len(COMPRESSED_SUFFIX)] if path.endswith(COMPRESSED_SUFFIX) else path
+
+def image_name(key: str, index: int, ext: str = ".jpg") -> str:
+    """图集中第 index 张图片（从1开始）的文件名"""
+    return f"{validate_key(key)}_{index:02d}{ext}"
+
+def build_zlib_dictionary(samples: List[str], size: int = DICT_SIZE) -> bytes:
+    """
+    从样本中生成zlib预置字典
+
+    候选内容为在多个样本中出现的句子（如分析结果中的固定标题）和常用词组（字符n-gram），
+    按 (出现的样本数 - 1) × 字节数 估计可以节省的字节，取收益最高的内容填满字典；
+    收益越高的放得越靠后（zlib优先使用距离近的匹配）
+    """
+    counts = Counter()
+    for text in samples:
+        candidates = set(re.findall(r"[^\n。！？!?；;]{2,200}[\n。！？!?；;]?", text))
+        for n in DICT_NGRAM_SIZES:
+            candidates.update(text[i:i + n] for i in range(len(text) - n + 1))
+        counts.update(candidates)
+    scored = sorted(((n - 1) * len(item.encode("utf-8")), item) for item, n in counts.items() if n > 1)
+    chosen, total = [], 0
+    for _, item in reversed(scored):
+        data = item.encode("utf-8")
+        if total + len(data) > size:
+            continue
+        # 已包含在收益更高的内容中的不再重复放入
+        if any(data in other for other in chosen[-200:]):
+            continue
+        chosen.append(data)
+        total += len(data)
+    return b"".join(reversed(chosen))
+
+def train_dictionary(samples: List[str], codec: str, size: int = DICT_SIZE) -> bytes:
+    """按压缩方式从样本文本生成字典，样本不适合训练时返回空字典"""
+    if codec == "zstd":
+        import zstandard
+        try:
+            return zstandard.train_dictionary(size, [text.encode("utf-8") for text in samples]).as_bytes()
+        except zstandard.ZstdError:
+            return b""
+    return build_zlib_dictionary(samples, size)
+
+def dictionary_id(dictionary: bytes) -> int:
+    """字典ID由内容决定，索引数据库重建后也不会与已有字典冲突"""
+    return zlib.crc32(dictionary) or 1
+
+def compress_bytes(data: bytes, codec: str, dictionary: bytes = b"") -> bytes:
+    """压缩数据并加上文件头"""
+    if codec == "zstd":
+        import zstandard
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        payload = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dict_data).compress(data)
+    elif codec == "zlib":
+        compressor = zlib.compressobj(ZLIB_LEVEL, zdict=dictionary) if dictionary else zlib.compressobj(ZLIB_LEVEL)
+        payload = compressor.compress(data) + compressor.flush()
+    else:
+        raise ValueError(f"不支持的压缩方式: {codec}")
+    dict_id = dictionary_id(dictionary) if dictionary else 0
+    return COMPRESSED_MAGIC + CODEC_IDS[codec] + struct.pack(">I", dict_id) + payload
+
+def parse_header(blob: bytes) -> Optional[Tuple[str, int, bytes]]:
+    """解析压缩文件头，返回 (压缩方式, 字典ID, 压缩数据)，不是压缩文件时返回None"""
+    if not blob.startswith(COMPRESSED_MAGIC):
+        return None
+    header_size = len(COMPRESSED_MAGIC) + 5
+    codec = {v: k for k, v in CODEC_IDS.items()}.get(blob[len(COMPRESSED_MAGIC):len(COMPRESSED_MAGIC) + 1])
+    if codec is None:
+        raise ValueError("未知的压缩方式")
+    dict_id = struct.unpack(">I", blob[len(COMPRESSED_MAGIC) + 1:header_size])[0]
+    return codec, dict_id, blob[header_size:]
+
+def decompress_bytes(codec: str, payload: bytes, dictionary: bytes = b"") -> bytes:
+    """解压 parse_header 返回的压缩数据"""
+    if codec == "zstd":
+        import zstandard
+        dict_data = zstandard.ZstdCompressionDict(dictionary) if dictionary else None
+        return zstandard.ZstdDecompressor(dict_data=dict_data).decompress(payload)
+    decompressor = zlib.decompressobj(zdict=dictionary) if dictionary else zlib.decompressobj()
+    return decompressor.decompress(payload) + decompressor.flush()
+
+def shard_dirs(key: str) -> List[str]:
+    """键所在的两级分片目录名（按键的哈希，视频ID前缀相近时也能均匀分布）"""
+    digest = hashlib.sha1(key.encode("utf-8")).hexdigest()
+    return [digest[:2], digest[2:4]]
+
+class ArtifactStore:
+    """
+    按键分组、分片保存的产物存储
+
+    路径由键直接计算，不访问磁盘；索引数据库在第一次查询或登记时才打开
+    """
+
+    def __init__(self, root: Optional[str] = None, db_path: Optional[str] = None):
+        # 默认路径在创建时读取，测试时可以修改模块的 ARTIFACT_DIR、ARTIFACT_DB
+        self.root = os.path.abspath(root or ARTIFACT_DIR)
+        self.db_path = db_path or ARTIFACT_DB
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._dictionaries: Dict[int, bytes] = {}
+
+    @property
+    def conn(self) -> sqlite3.Connection:
+        if self._conn is None:
+            if self.db_path != ":memory:":
+                os.makedirs(os.path.dirname(os.path.abspath(self.db_path)), exist_ok=True)
+            self._conn = sqlite3.connect(self.db_path, check_same_thread=False, timeout=30)
+            self._conn.execute("PRAGMA journal_mode=WAL")
+            self._conn.execute("PRAGMA synchronous=NORMAL")
+            self._conn.executescript(SCHEMA)
+        return self._conn
+
+    def group_dir(self, key: str) -> str:
+        """键对应的分组目录"""
+        key = validate_key(key)
+        return os.path.join(self.root, *shard_dirs(key), key)
+
+    def artifact_path(self, key: str, kind: str, ext: str = "", name: Optional[str] = None) -> str:
+        """
+        产物文件路径（只计算路径，不检查是否存在）
+
+        Args:
+            key: 视频ID或内容哈希键
+            kind: 产物类型（video、transcript、analysis 等）
+            ext: 视频文件的扩展名（如 .mp4）
+            name: 指定文件名，用于同一类型有多个文件的产物（如图集中的图片）
+        """
+        if name is None:
+            if kind not in ARTIFACT_NAMES:
+                raise ValueError(f"产物类型 {kind} 需要指定文件名")
+            name = ARTIFACT_NAMES[kind].format(key=key, ext=ext)
+        return os.path.join(self.group_dir(key), os.path.basename(name))
+
+    def key_for_path(self, path: str) -> Optional[str]:
+        """路径位于产物存储中时返回所属分组的键，否则返回None"""
+        parent = os.path.dirname(os.path.abspath(path))
+        key = os.path.basename(parent)
+        if not KEY_PATTERN.match(key):
+            return None
+        return key if os.path.normcase(parent) == os.path.normcase(self.group_dir(key)) else None
+
+    @property
+    def dictionary_dir(self) -> str:
+        """字典文件目录（字典与压缩文件放在一起，索引数据库丢失时压缩文件仍然可以读取）"""
+        return os.path.join(self.root, "dictionaries")
+
+    def register(self, key: str, kind: str, path: str, created_at: Optional[float] = None):
+        """登记已经写入分组目录的文件（如流式写入的转录文本）"""
+        key = validate_key(key)
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        with self._lock, self.conn:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO artifacts (key, name, kind, size, created_at) VALUES (?, ?, ?, ?, ?)",
+                (key, os.path.basename(path), kind, size, created_at if created_at is not None else time.time()),
+            )
+
+    @contextlib.contextmanager
+    def open_write(self, key: str, kind: str, ext: str = "", name: Optional[str] = None,
+                   mode: str = "wb", encoding: Optional[str] = None, created_at: Optional[float] = None):
+        """
+        原子写入一个产物：写入临时文件，正常结束后重命名为正式文件名并登记，出错时删除临时文件
+
+        用法:
+            with store.open_write(video_id, "video", ".mp4") as f:
+                f.write(data)
+        """
+        path = self.artifact_path(key, kind, ext, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{uuid.uuid4().hex[:8]}.tmp")
+        f = open(tmp_path, mode, encoding=encoding)
+        try:
+            yield f
+            f.close()
+            os.replace(tmp_path, path)
+        except BaseException:
+            f.close()
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
+        self.register(key, kind, path, created_at)
+
+    def write_text(self, key: str, kind: str, text: str, name: Optional[str] = None,
+                   created_at: Optional[float] = None) -> str:
+        """
+        原子写入文本产物，返回文件路径
+
+        开启压缩（COMPRESSION）且产物类型在 COMPRESSED_KINDS 中时压缩保存，文件名加上 COMPRESSED_SUFFIX；
+        同一产物的另一种形式（压缩或未压缩）会被删除
+        """
+        path = self.artifact_path(key, kind, name=name)
+        if COMPRESSION and kind in COMPRESSED_KINDS:
+            path += COMPRESSED_SUFFIX
+            data = compress_bytes(text.encode("utf-8"), COMPRESSION, self.current_dictionary(kind, COMPRESSION))
+            with self.open_write(key, kind, name=os.path.basename(path), created_at=created_at) as f:
+                f.write(data)
+        else:
+            with self.open_write(key, kind, name=os.path.basename(path), mode="w", encoding="utf-8",
+                                 created_at=created_at) as f:
+                f.write(text)
+        other = plain_name(path) if path.endswith(COMPRESSED_SUFFIX) else path + COMPRESSED_SUFFIX
+        self._discard(key, other)
+        return path
+
+    def _discard(self, key: str, path: str):
+        """删除分组中的一个文件及其索引行"""
+        with contextlib.suppress(FileNotFoundError):
+            os.remove(path)
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM artifacts WHERE key = ? AND name = ?", (key, os.path.basename(path)))
+
+    def read_text(self, path: str) -> str:
+        """
+        读取文本产物，压缩和未压缩的文件都适用
+
+        文件在记录路径之后被压缩（或解压）时，按另一种文件名读取
+        """
+        if not os.path.exists(path):
+            other = plain_name(path) if path.endswith(COMPRESSED_SUFFIX) else path + COMPRESSED_SUFFIX
+            if os.path.exists(other):
+                path = other
+        with open(path, "rb") as f:
+            data = f.read()
+        header = parse_header(data)
+        if header:
+            codec, dict_id, payload = header
+            data = decompress_bytes(codec, payload, self.load_dictionary(dict_id) if dict_id else b"")
+        return data.decode("utf-8")
+
+    def load_dictionary(self, dict_id: int) -> bytes:
+        """按ID读取字典文件"""
+        if dict_id not in self._dictionaries:
+            try:
+                with open(os.path.join(self.dictionary_dir, f"{dict_id:08x}.dict"), "rb") as f:
+                    self._dictionaries[dict_id] = f.read()
+            except FileNotFoundError:
+                raise ValueError(f"压缩字典 {dict_id:08x} 不存在") from None
+        return self._dictionaries[dict_id]
+
+    def current_dictionary(self, kind: str, codec: str) -> bytes:
+        """
+        指定类型和压缩方式当前使用的字典
+
+        还没有字典且已有足够的同类文本时生成一个；样本不足时返回空字典（不使用字典压缩）
+        """
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT dict_id FROM dictionaries WHERE kind = ? AND codec = ? ORDER BY created_at DESC LIMIT 1",
+                (kind, codec),
+            ).fetchone()
+        if row:
+            return self.load_dictionary(row[0])
+        samples = [self.read_text(path) for path in self.list(kind, limit=DICT_SAMPLES)]
+        if len(samples) < DICT_MIN_SAMPLES:
+            return b""
+        return self.train(kind, codec, samples)
+
+    def train(self, kind: str, codec: str, samples: Optional[List[str]] = None) -> bytes:
+        """
+        用最新的同类文本生成新字典，之后写入的文件使用新字典（已有文件仍使用原来的字典）
+
+        Returns:
+            字典内容，样本不适合训练时为空
+        """
+        if samples is None:
+            samples = [self.read_text(path) for path in self.list(kind, limit=DICT_SAMPLES)]
+        dictionary = train_dictionary(samples, codec)
+        if not dictionary:
+            return b""
+        dict_id = dictionary_id(dictionary)
+        os.makedirs(self.dictionary_dir, exist_ok=True)
+        path = os.path.join(self.dictionary_dir, f"{dict_id:08x}.dict")
+        tmp_path = f"{path}.{uuid.uuid4().hex[:8]}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(dictionary)
+        os.replace(tmp_path, path)
+        self._dictionaries[dict_id] = dictionary
+        with self._lock, self.conn:
+            self.conn.execute("INSERT INTO dictionaries (kind, codec, dict_id, created_at) VALUES (?, ?, ?, ?)",
+                              (kind, codec, dict_id, time.time()))
+        return dictionary
+
+    def compress(self, key: str, kind: str) -> Optional[str]:
+        """
+        把分组中未压缩的文本产物改为压缩保存（如流式写入完成的转录），未开启压缩时不做任何事
+
+        Returns:
+            产物的当前路径，不存在时返回None
+        """
+        path = self.get(key, kind)
+        if path is None or not COMPRESSION or kind not in COMPRESSED_KINDS or path.endswith(COMPRESSED_SUFFIX):
+            return path
+        with self._lock:
+            created_at = self.conn.execute("SELECT created_at FROM artifacts WHERE key = ? AND name = ?",
+                                           (key, os.path.basename(path))).fetchone()[0]
+        with open(path, "r", encoding="utf-8") as f:
+            text = f.read()
+        # 保留原来的创建时间，最新文件和待分析文件的顺序不变
+        return self.write_text(key, kind, text, name=os.path.basename(path), created_at=created_at)
+
+    def compress_all(self, kinds: Iterable[str] = COMPRESSED_KINDS) -> Dict[str, int]:
+        """把存储中已有的未压缩文本产物全部改为压缩保存，返回各类型压缩的文件数"""
+        counts = {}
+        for kind in kinds:
+            counts[kind] = 0
+            for path in self.list(kind, newest_first=False):
+                if not path.endswith(COMPRESSED_SUFFIX):
+                    self.compress(self.key_for_path(path), kind)
+                    counts[kind] += 1
+        return counts
+
+    def add_file(self, src: str, key: Optional[str] = None, kind: str = "video", move: bool = True) -> str:
+        """
+        把已有文件放入存储
+
+        Args:
+            src: 源文件路径
+            key: 键，默认按文件内容计算
+            kind: 产物类型
+            move: 为True时移动源文件，否则复制
+
+        Returns:
+            存储中的文件路径
+        """
+        key = key or content_key(src)
+        path = self.artifact_path(key, kind, Path(src).suffix.lower())
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = os.path.join(os.path.dirname(path), f".{os.path.basename(path)}.{uuid.uuid4().hex[:8]}.tmp")
+        try:
+            if move:
+                # 同一分区内是重命名，跨分区时复制后删除源文件
+                shutil.move(src, tmp_path)
+            else:
+                shutil.copy2(src, tmp_path)
+            os.replace(tmp_path, path)
+        except BaseException:
+            with contextlib.suppress(OSError):
+                os.remove(tmp_path)
+            raise
+        self.register(key, kind, path)
+        return path
+
+    def _existing(self, rows: Iterable[sqlite3.Row]) -> List[str]:
+        """把索引行转换为路径，文件已被外部删除的行从索引中移除"""
+        paths, stale = [], []
+        for key, name in rows:
+            path = os.path.join(self.group_dir(key), name)
+            if os.path.exists(path):
+                paths.append(path)
+            else:
+                stale.append((key, name))
+        if stale:
+            with self._lock, self.conn:
+                self.conn.executemany("DELETE FROM artifacts WHERE key = ? AND name = ?", stale)
+        return paths
+
+    def get(self, key: str, kind: str) -> Optional[str]:
+        """某个分组中指定类型的产物路径，不存在时返回None"""
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT key, name FROM artifacts WHERE key = ? AND kind = ? ORDER BY created_at DESC",
+                (validate_key(key), kind),
+            ).fetchall()
+        paths = self._existing(rows)
+        return paths[0] if paths else None
+
+    def latest(self, kind: str) -> Optional[str]:
+        """最新的指定类型产物路径，没有时返回None"""
+        while True:
+            with self._lock:
+                row = self.conn.execute(
+                    "SELECT key, name FROM artifacts WHERE kind = ? ORDER BY created_at DESC LIMIT 1", (kind,)
+                ).fetchone()
+            if row is None:
+                return None
+            paths = self._existing([row])
+            if paths:
+                return paths[0]
+
+    def list(self, kind: str, newest_first: bool = True, limit: Optional[int] = None) -> List[str]:
+        """指定类型的所有产物路径，按创建时间排序"""
+        order = "DESC" if newest_first else "ASC"
+        with self._lock:
+            rows = self.conn.execute(
+                f"SELECT key, name FROM artifacts WHERE kind = ? ORDER BY created_at {order} LIMIT ?",
+                (kind, -1 if limit is None else limit),
+            ).fetchall()
+        return self._existing(rows)
+
+    def pending(self, kind: str, missing_kind: str) -> List[str]:
+        """
+        有 kind 类型产物、但同组还没有 missing_kind 类型产物的文件路径，按创建时间从旧到新排序
+        （如还没有分析结果的转录）
+        """
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT a.key, a.name FROM artifacts a WHERE a.kind = ? AND NOT EXISTS "
+                "(SELECT 1 FROM artifacts b WHERE b.key = a.key AND b.kind = ?) ORDER BY a.created_at",
+                (kind, missing_kind),
+            ).fetchall()
+        return self._existing(rows)
+
+    def remove(self, key: str, kind: str) -> int:
+        """
+        删除分组中指定类型的产物（转录同时删除字幕文件），分组目录为空时一并删除
+
+        Returns:
+            删除的文件数
+        """
+        key = validate_key(key)
+        with self._lock:
+            names = [row[0] for row in self.conn.execute(
+                "SELECT name FROM artifacts WHERE key = ? AND kind = ?", (key, kind)
+            ).fetchall()]
+        group = self.group_dir(key)
+        deleted = 0
+        for name in names:
+            path = os.path.join(group, name)
+            related = [path]
+            if kind == "transcript":
+                related += [os.path.splitext(plain_name(path))[0] + ext for ext in TRANSCRIPT_SIDECARS]
+            for file_path in related:
+                with contextlib.suppress(FileNotFoundError):
+                    os.remove(file_path)
+                    deleted += 1
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM artifacts WHERE key = ? AND kind = ?", (key, kind))
+        with contextlib.suppress(OSError):
+            os.rmdir(group)
+        return deleted
+
+    def prune(self, kind: str, keep: int) -> List[str]:
+        """
+        只保留最新的 keep 个指定类型的产物，删除更早的（同一个键有多个文件时，如图集，按其中最新的文件排序）
+
+        Returns:
+            被删除的产物所属的键
+        """
+        with self._lock:
+            keys = [row[0] for row in self.conn.execute(
+                "SELECT key FROM artifacts WHERE kind = ? GROUP BY key ORDER BY MAX(created_at) DESC LIMIT -1 OFFSET ?",
+                (kind, keep),
+            ).fetchall()]
+        for key in keys:
+            self.remove(key, kind)
+        return keys
+
+    def rebuild_index(self) -> int:
+        """
+        遍历存储目录重建索引（索引数据库丢失或文件被手动移动后使用）
+
+        Returns:
+            登记的文件数
+        """
+        patterns = [(kind, re.compile("^" + re.escape(template).replace(re.escape("{key}"), "(?P<key>[A-Za-z0-9_-]+)")
+                                      .replace(re.escape("{ext}"), r"\.\w+") + f"(?:{re.escape(COMPRESSED_SUFFIX)})?$"))
+                    for kind, template in ARTIFACT_NAMES.items()]
+        patterns.append(("image", IMAGE_NAME_PATTERN))
+        count = 0
+        with self._lock, self.conn:
+            self.conn.execute("DELETE FROM artifacts")
+        for group in Path(self.root).glob("*/*/*"):
+            if not group.is_dir() or group.name != self.key_for_path(str(group / "x")):
+                continue
+            for file in group.iterdir():
+                if file.name.startswith("."):
+                    continue
+                for kind, pattern in patterns:
+                    match = pattern.match(file.name)
+                    if match and match.group("key") == group.name:
+                        self.register(group.name, kind, str(file), file.stat().st_mtime)
+                        count += 1
+                        break
+        return count
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """各类型产物的数量和总大小"""
+        with self._lock:
+            rows = self.conn.execute("SELECT kind, COUNT(*), SUM(size) FROM artifacts GROUP BY kind").fetchall()
+        return {kind: {"count": count, "bytes": size or 0} for kind, count, size in rows}
+
+    def close(self):
+        if self._conn is not None:
+            self._conn.close()
+            self._conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def read_text(path: str) -> str:
+    """读取文本产物（转录、分析结果），压缩和未压缩的文件都适用，压缩字典从文件所在的存储中读取"""
+    parents = Path(os.path.abspath(path)).parents
+    with ArtifactStore(str(parents[3]) if len(parents) > 3 else None) as store:
+        return store.read_text(path)
+
+def ingest_videos(directory: str, extensions: Iterable[str], store: ArtifactStore,
+                  files: Optional[List[str]] = None) -> List[str]:
+    """
+    把目录（如手动放入文件的 video 目录）中的音视频文件移入存储
+
+    下载时记录过的文件按视频ID分组，并更新视频信息中的文件路径；其他文件按内容哈希分组
+
+    Args:
+        directory: 目录
+        extensions: 支持的扩展名
+        store: 产物存储
+        files: 只移入这些文件（如已确认写入完成的文件），默认移入目录中的所有文件
+
+    Returns:
+        移入后的文件路径列表
+    """
+    if not os.path.isdir(directory):
+        return []
+    extensions = {ext.lower() for ext in extensions}
+    names = [os.path.basename(file) for file in files] if files is not None else os.listdir(directory)
+    files = [os.path.join(directory, name) for name in names
+             if Path(name).suffix.lower() in extensions and os.path.isfile(os.path.join(directory, name))]
+    if not files:
+        return []
+
+    from metadata_store import MetadataStore
+    moved = []
+    with MetadataStore() as metadata:
+        for file in files:
+            record = metadata.find_by_file(file)
+            key = str(record["video_id"]) if record and record.get("video_id") else None
+            path = store.add_file(file, key if key and KEY_PATTERN.match(key) else None)
+            if record:
+                metadata.add(dict(record, file=path))
+            print(f"已移入产物存储: {Path(file).name} -> {path}")
+            moved.append(path)
+    return moved
+
+def import_legacy(store: ArtifactStore, video_dir: str, txt_dir: str, result_dir: str,
+                  video_extensions: Iterable[str]) -> Dict[str, int]:
+    """
+    把旧版平铺目录中的视频、转录和分析结果移入存储
+
+    转录按内容哈希分组，同名的 <转录文件名>_analysis.txt 分析结果放入同一组
+
+    Returns:
+        各类型移入的文件数
+    """
+    counts = {"video": len(ingest_videos(video_dir, video_extensions, store)), "transcript": 0, "analysis": 0}
+    if not os.path.isdir(txt_dir):
+        return counts
+    for transcript in sorted(Path(txt_dir).glob("*.txt")):
+        key = content_key(str(transcript))
+        path = store.add_file(str(transcript), key, "transcript")
+        for ext in TRANSCRIPT_SIDECARS:
+            sidecar = str(transcript)[:-len(".txt")] + ext
+            if os.path.exists(sidecar):
+                shutil.move(sidecar, os.path.splitext(path)[0] + ext)
+        counts["transcript"] += 1
+
+        analysis = os.path.join(result_dir, f"{transcript.stem}_analysis.txt")
+        if os.path.exists(analysis):
+            with open(analysis, "r", encoding="utf-8") as f:
+                store.write_text(key, "analysis", f.read())
+            os.remove(analysis)
+            counts["analysis"] += 1
+    return counts
+
+def main():
+    """主函数"""
+    global COMPRESSION
+    parser = argparse.ArgumentParser(description="产物存储：导入旧版目录、重建索引、查看统计")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    subparsers.add_parser("import", help="把旧版 video、txt、result 目录中的文件移入产物存储")
+    subparsers.add_parser("reindex", help="遍历存储目录重建索引")
+    subparsers.add_parser("stats", help="查看各类型产物的数量和大小")
+    for command, help_text in (("compress", "把已有的转录和分析结果改为压缩保存"),
+                               ("train", "用最新的转录和分析结果重新生成压缩字典")):
+        command_parser = subparsers.add_parser(command, help=help_text)
+        command_parser.add_argument("--codec", choices=sorted(CODEC_IDS), default=COMPRESSION or "zlib",
+                                    help=f"压缩方式（默认: {COMPRESSION or 'zlib'}，zstd 需要 pip install zstandard）")
+    args = parser.parse_args()
+
+    with ArtifactStore() as store:
+        if args.command == "import":
+            import analyze_transcript
+            import video_to_text
+            counts = import_legacy(store, video_to_text.VIDEO_DIR, analyze_transcript.TXT_DIR,
+                                   analyze_transcript.RESULT_DIR, video_to_text.SUPPORTED_EXTENSIONS)
+            print(f"已导入 视频 {counts['video']} 个，转录 {counts['transcript']} 个，分析结果 {counts['analysis']} 个")
+            print("可运行 python search_index.py import 更新检索索引中的文件路径")
+        elif args.command == "reindex":
+            print(f"已登记 {store.rebuild_index()} 个文件")
+        elif args.command == "compress":
+            COMPRESSION = args.codec
+            counts = store.compress_all()
+            print(f"已压缩 转录 {counts['transcript']} 个，分析结果 {counts['analysis']} 个")
+            print(f"之后写入的文件也压缩保存，需要把 artifact_store.py 中的 COMPRESSION 设置为 \"{args.codec}\"")
+        elif args.command == "train":
+            for kind in COMPRESSED_KINDS:
+                dictionary = store.train(kind, args.codec)
+                print(f"{kind}: " + (f"新字典 {len(dictionary)} 字节" if dictionary else "样本不足，未生成字典"))
+        elif args.command == "stats":
+            print("=" * 50)
+            print(f"产物存储: {store.root}")
+            print("=" * 50)
+            for kind, info in sorted(store.stats().items()):
+                print(f"{kind:12s} {info['count']:8d} 个  {info['bytes'] / 1024 / 1024:10.1f} MB")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,322 @@
+#!/usr/bin/env python3
+"""
+音频指纹模块
+对音频提取频谱峰值对哈希（与Shazam类似的星座图指纹），保存在本地SQLite索引中。
+转载、重新上传的同一段视频虽然 video_id 不同，但音频指纹相同，
+转录前先查询索引，匹配度超过阈值时直接复用已有的转录结果（按对齐的时间差平移和截取片段），跳过Whisper
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+import numpy as np
+
+# 指纹索引数据库路径
+FINGERPRINT_DB = r"D:\test\TikTok_Video_API\db\fingerprints.db"
+
+# 判定为同一段音频所需的对齐哈希占比（查询音频和已索引音频两边都要达到，
+# 只截取了一小段、或在原音频前后拼接了大量其他内容的音频不会被当成同一段）
+MATCH_THRESHOLD = 0.5
+
+# 匹配所需的最少对齐哈希数（避免极短音频误判）
+MIN_ALIGNED_HASHES = 20
+
+# 频谱参数（16kHz音频）
+SAMPLE_RATE = 16000
+FFT_SIZE = 1024
+HOP_SIZE = 512
+
+# 每帧在这些频段内各取一个最强峰值
+BAND_EDGES = [10, 20, 40, 80, 160, 320, 512]
+
+# 每帧最多保留的峰值数
+PEAKS_PER_FRAME = 2
+
+# 峰值密度上限：每个峰值在前后 DENSITY_RADIUS 帧（约±0.5秒）内必须是最强的 PEAKS_PER_WINDOW 个之一，
+# 每秒约保留12个峰值、60个哈希（不加限制时约300个），与窗口的起点无关，裁剪过的音频选出的峰值相同
+DENSITY_RADIUS = 16
+PEAKS_PER_WINDOW = 12
+
+# 每个锚点与其后 FAN_OUT 个峰值配对，时间差不超过 MAX_DELTA 帧
+FAN_OUT = 5
+MAX_DELTA = 63
+
+# 单次SQL查询中的哈希数上限
+QUERY_BATCH = 500
+
+# 出现在超过该数量的已索引哈希中的常见哈希（停用哈希）不参与匹配，
+# 单次查询读取的行数因此不超过 查询哈希数 × STOP_HASH_LIMIT
+STOP_HASH_LIMIT = 1000
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS clips (
+    id INTEGER PRIMARY KEY,
+    source TEXT,
+    transcript_path TEXT,
+    text TEXT,
+    segments TEXT,
+    hash_count INTEGER,
+    created_at REAL
+);
+CREATE TABLE IF NOT EXISTS fingerprints (
+    hash INTEGER NOT NULL,
+    clip_id INTEGER NOT NULL,
+    offset INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_fingerprints_hash ON fingerprints(hash);
+CREATE TABLE IF NOT EXISTS hash_counts (
+    hash INTEGER PRIMARY KEY,
+    count INTEGER NOT NULL
+);
+"""
+
+def find_peaks(audio: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    提取频谱峰值（星座图）
+
+    Args:
+        audio: 16kHz单声道音频
+
+    Returns:
+        (帧序号, 频点) 列表，按时间排序
+    """
+    if len(audio) < FFT_SIZE:
+        return []
+
+    audio = np.ascontiguousarray(audio, dtype=np.float32)
+    frame_count = 1 + (len(audio) - FFT_SIZE) // HOP_SIZE
+    strides = (audio.strides[0] * HOP_SIZE, audio.strides[0])
+    frames = np.lib.stride_tricks.as_strided(audio, shape=(frame_count, FFT_SIZE), strides=strides)
+    spectrum = np.abs(np.fft.rfft(frames * np.hanning(FFT_SIZE), axis=1))
+    log_spectrum = np.log1p(spectrum)
+
+    # 每个频段取最强的频点，再只保留每帧中最强的 PEAKS_PER_FRAME 个，
+    # 且必须明显高于整段音频的平均能量（过滤静音和底噪）
+    band_bins = []
+    band_values = []
+    for low, high in zip(BAND_EDGES[:-1], BAND_EDGES[1:]):
+        best = log_spectrum[:, low:high].argmax(axis=1)
+        band_bins.append(low + best)
+        band_values.append(log_spectrum[np.arange(frame_count), low + best])
+    band_bins = np.stack(band_bins, axis=1)
+    band_values = np.stack(band_values, axis=1)
+
+    threshold = band_values.mean() + band_values.std() * 0.5
+    strongest = np.argsort(band_values, axis=1)[:, -PEAKS_PER_FRAME:]
+    candidates = []
+    for t in range(frame_count):
+        for band in strongest[t]:
+            if band_values[t, band] > threshold:
+                candidates.append((t, int(band_bins[t, band]), float(band_values[t, band])))
+    candidates.sort()
+
+    # 按峰值密度筛选：只保留在前后 DENSITY_RADIUS 帧内足够强的峰值，限制每段音频的哈希数
+    times = np.array([t for t, _, _ in candidates])
+    values = np.array([v for _, _, v in candidates])
+    peaks = []
+    for i, (t, f, v) in enumerate(candidates):
+        low = np.searchsorted(times, t - DENSITY_RADIUS, side="left")
+        high = np.searchsorted(times, t + DENSITY_RADIUS, side="right")
+        if np.count_nonzero(values[low:high] > v) < PEAKS_PER_WINDOW:
+            peaks.append((t, f))
+    return peaks
+
+def fingerprint(audio: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    计算音频指纹
+
+    Args:
+        audio: 16kHz单声道音频
+
+    Returns:
+        (哈希, 锚点帧序号) 列表
+    """
+    peaks = find_peaks(audio)
+    hashes = []
+    for i, (t1, f1) in enumerate(peaks):
+        paired = 0
+        for t2, f2 in peaks[i + 1:]:
+            delta = t2 - t1
+            if delta == 0:
+                continue
+            if delta > MAX_DELTA or paired >= FAN_OUT:
+                break
+            # 频点各占10位、时间差占6位
+            hashes.append(((f1 & 0x3FF) << 16 | (f2 & 0x3FF) << 6 | delta, t1))
+            paired += 1
+    return hashes
+
+def align_segments(segments: List[Dict[str, Any]], offset: float, duration: float) -> List[Dict[str, Any]]:
+    """
+    把已索引音频的转录片段对齐到查询音频的时间轴
+
+    查询音频的第 t 秒对应已索引音频的第 t + offset 秒；只保留至少一半落在查询音频范围内的片段，
+    并把时间截取到 [0, duration]
+
+    Args:
+        segments: 已索引音频的转录片段
+        offset: lookup 返回的 offset（秒）
+        duration: 查询音频时长（秒）
+
+    Returns:
+        对齐后的片段
+    """
+    aligned = []
+    for seg in segments:
+        start = max(0.0, seg["start"] - offset)
+        end = min(duration, seg["end"] - offset)
+        length = seg["end"] - seg["start"]
+        if end <= start or (length > 0 and end - start < length / 2):
+            continue
+        aligned.append({"start": round(start, 3), "end": round(end, 3), "text": seg["text"]})
+    return aligned
+
+class FingerprintIndex:
+    """
+    本地音频指纹索引
+
+    查询按哈希走B树索引，代价与读取的行数成正比。峰值密度上限控制每段音频的哈希数，
+    出现次数超过 stop_hash_limit 的停用哈希不读取，因此单次查询最多读取
+    查询哈希数 × stop_hash_limit 行；索引中的音频越多，被跳过的常见哈希也越多，
+    匹配依靠剩下的区分度较高的哈希
+    """
+
+    def __init__(self, db_path: str = FINGERPRINT_DB, stop_hash_limit: int = STOP_HASH_LIMIT):
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.stop_hash_limit = stop_hash_limit
+        self._lock = threading.Lock()
+
+        # 旧版本的索引没有 hash_counts 表，首次打开时从 fingerprints 统计一次
+        with self.conn:
+            if (self.conn.execute("SELECT 1 FROM hash_counts LIMIT 1").fetchone() is None
+                    and self.conn.execute("SELECT 1 FROM fingerprints LIMIT 1").fetchone() is not None):
+                self.conn.execute(
+                    "INSERT INTO hash_counts (hash, count) SELECT hash, COUNT(*) FROM fingerprints GROUP BY hash"
+                )
+
+    def add(self, hashes: List[Tuple[int, int]], source: str, transcript_path: str, text: str,
+            segments: Optional[List[Dict[str, Any]]] = None) -> int:
+        """
+        将一段音频的指纹和转录结果加入索引
+
+        Args:
+            hashes: 音频指纹
+            source: 源文件路径
+            transcript_path: 转录文本路径
+            text: 转录文本
+            segments: 转录片段
+
+        Returns:
+            新音频的ID
+        """
+        counts: Dict[int, int] = {}
+        for h, _ in hashes:
+            counts[h] = counts.get(h, 0) + 1
+
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO clips (source, transcript_path, text, segments, hash_count, created_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (source, transcript_path, text, json.dumps(segments or [], ensure_ascii=False),
+                 len(hashes), time.time()),
+            )
+            clip_id = cursor.lastrowid
+            self.conn.executemany(
+                "INSERT INTO fingerprints (hash, clip_id, offset) VALUES (?, ?, ?)",
+                ((h, clip_id, offset) for h, offset in hashes),
+            )
+            self.conn.executemany(
+                "INSERT INTO hash_counts (hash, count) VALUES (?, ?) "
+                "ON CONFLICT(hash) DO UPDATE SET count = count + excluded.count",
+                counts.items(),
+            )
+        return clip_id
+
+    def lookup(self, hashes: List[Tuple[int, int]], threshold: float = MATCH_THRESHOLD) -> Optional[Dict[str, Any]]:
+        """
+        查找与指纹匹配的已索引音频
+
+        对每个候选音频统计 (索引中的偏移 - 查询中的偏移) 的分布，
+        同一段音频的大量哈希会落在同一个时间差上；停用哈希不参与投票，也不计入匹配度的分母
+
+        Args:
+            hashes: 查询音频的指纹
+            threshold: 对齐哈希分别占查询音频和已索引音频哈希数的最低比例
+
+        Returns:
+            匹配的音频信息（含转录文本、片段、匹配度，以及查询音频起点在已索引音频中的位置 offset 秒），
+            没有匹配时返回None
+        """
+        if not hashes:
+            return None
+
+        query_offsets: Dict[int, List[int]] = {}
+        for h, offset in hashes:
+            query_offsets.setdefault(h, []).append(offset)
+
+        votes: Dict[Tuple[int, int], int] = {}
+        unique_hashes = list(query_offsets)
+        stopped = 0
+        with self._lock:
+            for i in range(0, len(unique_hashes), QUERY_BATCH):
+                batch = unique_hashes[i:i + QUERY_BATCH]
+                placeholders = ",".join("?" * len(batch))
+                for (h,) in self.conn.execute(
+                    f"SELECT hash FROM hash_counts WHERE hash IN ({placeholders}) AND count > ?",
+                    (*batch, self.stop_hash_limit),
+                ):
+                    stopped += len(query_offsets[h])
+                rows = self.conn.execute(
+                    f"SELECT f.hash, f.clip_id, f.offset FROM fingerprints f "
+                    f"JOIN hash_counts c ON c.hash = f.hash "
+                    f"WHERE f.hash IN ({placeholders}) AND c.count <= ?",
+                    (*batch, self.stop_hash_limit),
+                ).fetchall()
+                for h, clip_id, offset in rows:
+                    for query_offset in query_offsets[h]:
+                        key = (clip_id, offset - query_offset)
+                        votes[key] = votes.get(key, 0) + 1
+
+        if not votes:
+            return None
+
+        (clip_id, delta), aligned = max(votes.items(), key=lambda item: item[1])
+        if aligned < MIN_ALIGNED_HASHES:
+            return None
+
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT source, transcript_path, text, segments, hash_count FROM clips WHERE id = ?", (clip_id,)
+            ).fetchone()
+        # 已索引音频中有多少哈希是停用哈希没有单独记录，按查询音频中的比例估算
+        usable = len(hashes) - stopped
+        score = min(aligned / usable, aligned / max(1.0, row[4] * usable / len(hashes)))
+        if score < threshold:
+            return None
+        return {
+            "clip_id": clip_id,
+            "source": row[0],
+            "transcript_path": row[1],
+            "text": row[2],
+            "segments": json.loads(row[3]) if row[3] else [],
+            "score": score,
+            "offset": delta * HOP_SIZE / SAMPLE_RATE,
+        }
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
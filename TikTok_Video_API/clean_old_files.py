@@ -1,6 +1,7 @@
 #!/usr/bin/env python3
 """
 清理脚本，用于清除 result、txt、json 目录中的旧文件，默认保留最新的十条数据
+（转录文本与同名的字幕文件算作一条）
 """
 
 import os
@@ -8,12 +9,24 @@ import glob
 from pathlib import Path
 import argparse
 
+from artifact_store import TRANSCRIPT_SIDECARS, ArtifactStore
+from profiler import add_profile_arguments, run_profiled
+
 # 定义需要清理的目录
 DIRECTORIES = {
     "video": r"D:\test\TikTok_Video_API\video",
     "txt": r"D:\test\TikTok_Video_API\txt",
     "json": r"D:\test\TikTok_Video_API\json",
-    "result": r"D:\test\TikTok_Video_API\result"
+    "result": r"D:\test\TikTok_Video_API\result",
+    "artifacts": r"D:\test\TikTok_Video_API\artifacts"
+}
+
+# 产物存储中各类型产物的保留数量（None 表示使用 keep_count），分析结果与 result 目录一样保留50个
+ARTIFACT_KEEP = {
+    "video": None,
+    "image": None,
+    "transcript": None,
+    "analysis": 50,
 }
 
 def get_sorted_files(directory):
@@ -27,24 +40,39 @@ def get_sorted_files(directory):
         print(f"获取目录 {directory} 文件列表时出错: {e}")
         return []
 
+def file_group(path):
+    """文件所属的条目名：转录文本和它的字幕文件（.srt、.vtt、.segments.jsonl）属于同一条目"""
+    for suffix in TRANSCRIPT_SIDECARS:
+        if path.name.endswith(suffix):
+            return path.name[:-len(suffix)]
+    return path.stem
+
+def get_sorted_groups(directory):
+    """获取目录中按条目分组、按最新修改时间排序的文件列表（最新的条目在前）"""
+    groups = {}
+    for file_path in get_sorted_files(directory):
+        groups.setdefault(file_group(file_path), []).append(file_path)
+    # get_sorted_files 已按修改时间排序，字典保持插入顺序，每组第一次出现的位置即其最新修改时间
+    return list(groups.values())
+
 def clean_directory(directory, keep_count):
-    """清理指定目录，保留最新的keep_count个文件"""
+    """清理指定目录，保留最新的keep_count条数据（转录文本与字幕文件算作一条）"""
     print(f"正在清理目录: {directory}")
     
     if not os.path.exists(directory):
         print(f"目录 {directory} 不存在，跳过清理")
         return
     
-    files = get_sorted_files(directory)
-    print(f"目录 {directory} 中共有 {len(files)} 个文件")
+    groups = get_sorted_groups(directory)
+    print(f"目录 {directory} 中共有 {len(groups)} 条数据")
     
-    if len(files) <= keep_count:
-        print(f"文件数量 ({len(files)}) 不超过保留数量 ({keep_count})，无需清理")
+    if len(groups) <= keep_count:
+        print(f"数据数量 ({len(groups)}) 不超过保留数量 ({keep_count})，无需清理")
         return
     
-    # 需要删除的文件数量（从最旧的文件开始删除）
-    # 注意：files列表是按最新到最旧排序的，所以要删除的是后面的文件
-    to_delete = files[keep_count:]
+    # 需要删除的文件（从最旧的条目开始删除）
+    # 注意：groups列表是按最新到最旧排序的，所以要删除的是后面的条目
+    to_delete = [file_path for group in groups[keep_count:] for file_path in group]
     print(f"需要删除 {len(to_delete)} 个旧文件")
     
     # 删除旧文件（从最旧的文件开始删除）
@@ -59,6 +87,22 @@ def clean_directory(directory, keep_count):
     
     print(f"目录 {directory} 清理完成，共删除 {deleted_count} 个文件")
 
+def clean_artifacts(directory, keep_count):
+    """清理产物存储，每种产物按索引中的创建时间保留最新的若干个（不需要扫描和排序目录）"""
+    print(f"正在清理产物存储: {directory}")
+    
+    if not os.path.exists(directory):
+        print(f"目录 {directory} 不存在，跳过清理")
+        return
+    
+    with ArtifactStore(root=directory) as store:
+        for kind, keep in ARTIFACT_KEEP.items():
+            keep = keep_count if keep is None else keep
+            removed = store.prune(kind, keep)
+            print(f"{kind}: 保留最新的 {keep} 个，删除 {len(removed)} 个")
+    
+    print(f"产物存储 {directory} 清理完成")
+
 def clean_old_files(keep_count=10, target_dirs=None):
     """清理旧文件的主函数"""
     if target_dirs is None:
@@ -77,6 +121,8 @@ def clean_old_files(keep_count=10, target_dirs=None):
             # 对于result目录，使用不同的保留数量（50个）
             if dir_name == "result":
                 clean_directory(DIRECTORIES[dir_name], 50)
+            elif dir_name == "artifacts":
+                clean_artifacts(DIRECTORIES[dir_name], keep_count)
             else:
                 clean_directory(DIRECTORIES[dir_name], keep_count)
         else:
@@ -89,9 +135,10 @@ def main():
     """主函数"""
     parser = argparse.ArgumentParser(description="清理 result、txt、json 目录中的旧文件，默认保留最新的10个文件")
     parser.add_argument("-k", "--keep", type=int, default=10, help="保留的文件数量（默认: 10）")
-    parser.add_argument("-d", "--dirs", nargs="+", help="指定要清理的目录（result, txt, json），默认清理所有目录")
+    parser.add_argument("-d", "--dirs", nargs="+", help="指定要清理的目录（result, txt, json, video, artifacts），默认清理所有目录")
     parser.add_argument("--test-dir", help="测试目录路径，用于测试清理逻辑")
     parser.add_argument("--test-count", type=int, default=5, help="测试目录保留的文件数量（默认: 5）")
+    add_profile_arguments(parser)
     
     args = parser.parse_args()
     keep_count = args.keep
@@ -100,9 +147,9 @@ def main():
     # 如果提供了测试目录，则只清理测试目录
     if args.test_dir:
         print(f"测试模式：清理目录 {args.test_dir}，保留 {args.test_count} 个文件")
-        clean_directory(args.test_dir, args.test_count)
+        run_profiled(args, "clean", clean_directory, args.test_dir, args.test_count)
     else:
-        clean_old_files(keep_count, target_dirs)
+        run_profiled(args, "clean", clean_old_files, keep_count, target_dirs)
 
 if __name__ == "__main__":
     main()
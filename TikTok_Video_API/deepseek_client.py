@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+"""
+DeepSeek API客户端
+控制尾延迟：等待时间超过近期P95延迟仍未返回时发出一个对冲（重复）请求，取先返回的结果；
+每次尝试和整个请求都有截止时间；错误率升高时熔断器打开，后续请求直接失败，
+由调用方放入重试队列稍后处理，不会让一个慢的上游拖住整个流程
+"""
+
+import collections
+import json
+import os
+import random
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import Any, Dict, List, Optional, Tuple
+
+import requests
+
+# 单次尝试的超时时间和整个请求（含重试）的截止时间（秒），不含生成回复的时间
+ATTEMPT_TIMEOUT = 20.0
+REQUEST_DEADLINE = 90.0
+
+# 按该生成速度（tokens/秒，偏保守）估计生成 max_tokens 个token所需的时间，加到上面两个时间上
+MIN_TOKENS_PER_SECOND = 20.0
+
+# 剩余时间不足该值时不再发起新的尝试（秒）
+MIN_ATTEMPT_TIMEOUT = 0.5
+
+# 按近期成功请求延迟的该分位数决定何时发出对冲请求
+HEDGE_QUANTILE = 0.95
+
+# 样本不足时的对冲等待时间，以及对冲等待时间的上下限（秒）
+DEFAULT_HEDGE_DELAY = 8.0
+MIN_HEDGE_DELAY = 0.5
+MAX_HEDGE_DELAY = 15.0
+
+# 对冲请求数不超过总请求数的该比例，避免上游整体变慢时请求量翻倍
+MAX_HEDGE_RATIO = 0.1
+
+# 熔断器：统计窗口内请求数达到 min_requests 且失败率达到 failure_rate 时打开，cooldown 秒后放行一个试探请求
+BREAKER_FAILURE_RATE = 0.5
+BREAKER_MIN_REQUESTS = 5
+BREAKER_WINDOW = 60.0
+BREAKER_COOLDOWN = 30.0
+
+# 可重试的HTTP状态码
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+class CircuitOpenError(Exception):
+    """熔断器处于打开状态，请求未发出"""
+
+class DeadlineExceededError(Exception):
+    """在截止时间内没有得到成功响应"""
+
+class LatencyTracker:
+    """记录最近若干次成功请求的延迟，用于计算分位数"""
+
+    def __init__(self, size: int = 200, min_samples: int = 10):
+        self.min_samples = min_samples
+        self._samples = collections.deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    def add(self, latency: float):
+        with self._lock:
+            self._samples.append(latency)
+
+    def quantile(self, q: float) -> Optional[float]:
+        """返回延迟分位数，样本不足时返回None"""
+        with self._lock:
+            if len(self._samples) < self.min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+class CircuitBreaker:
+    """
+    熔断器
+
+    - closed: 正常放行，统计窗口内的失败率
+    - open: 失败率超标，直接拒绝请求，cooldown 秒后转为 half_open
+    - half_open: 只放行一个试探请求，成功则关闭，失败则重新打开
+    """
+
+    def __init__(self,
+                 failure_rate: float = BREAKER_FAILURE_RATE,
+                 min_requests: int = BREAKER_MIN_REQUESTS,
+                 window: float = BREAKER_WINDOW,
+                 cooldown: float = BREAKER_COOLDOWN):
+        self.failure_rate = failure_rate
+        self.min_requests = min_requests
+        self.window = window
+        self.cooldown = cooldown
+
+        self._state = "closed"
+        self._opened_at = 0.0
+        self._probe_in_flight = False
+        # 每次放行试探请求时递增，用来确认释放名额的是当前这次试探
+        self._probe_id = 0
+        self._results = collections.deque()
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        """当前状态（closed / open / half_open）"""
+        with self._lock:
+            self._update_state()
+            return self._state
+
+    def _update_state(self):
+        if self._state == "open" and time.monotonic() - self._opened_at >= self.cooldown:
+            self._state = "half_open"
+            self._probe_in_flight = False
+
+    def _open(self):
+        self._state = "open"
+        self._opened_at = time.monotonic()
+        self._results.clear()
+
+    def allow(self) -> Tuple[bool, Optional[int]]:
+        """
+        是否允许发出请求
+
+        Returns:
+            (是否允许, 试探编号)，只有半开状态下放行的试探请求才有试探编号，其余为None
+        """
+        with self._lock:
+            self._update_state()
+            if self._state == "closed":
+                return True, None
+            if self._state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                self._probe_id += 1
+                return True, self._probe_id
+            return False, None
+
+    def release(self, probe: int):
+        """
+        放弃试探请求的名额（试探请求既不能说明上游正常也不能说明故障时），下一个请求重新试探
+
+        Args:
+            probe: allow 返回的试探编号；熔断器状态已变化或名额已属于之后的试探时不做任何事
+        """
+        with self._lock:
+            if self._state == "half_open" and self._probe_in_flight and self._probe_id == probe:
+                self._probe_in_flight = False
+
+    def record(self, success: bool):
+        """记录一次请求结果"""
+        with self._lock:
+            if self._state == "half_open":
+                if success:
+                    self._state = "closed"
+                    self._results.clear()
+                else:
+                    self._open()
+                return
+            if self._state == "open":
+                return
+
+            now = time.monotonic()
+            self._results.append((now, success))
+            while self._results and now - self._results[0][0] > self.window:
+                self._results.popleft()
+            failures = sum(1 for _, ok in self._results if not ok)
+            if len(self._results) >= self.min_requests and failures / len(self._results) >= self.failure_rate:
+                self._open()
+
+class DeepSeekClient:
+    """
+    带对冲请求、熔断器和截止时间的DeepSeek客户端
+
+    对冲请求发出后，先返回的结果生效；落后的请求无法中途取消，会在自身超时后结束，结果被丢弃
+    """
+
+    def __init__(self,
+                 api_url: str,
+                 api_key: str,
+                 attempt_timeout: float = ATTEMPT_TIMEOUT,
+                 deadline: float = REQUEST_DEADLINE,
+                 hedge_quantile: float = HEDGE_QUANTILE,
+                 max_hedge_ratio: float = MAX_HEDGE_RATIO,
+                 breaker: Optional[CircuitBreaker] = None,
+                 max_workers: int = 16):
+        self.api_url = api_url
+        self.api_key = api_key
+        self.attempt_timeout = attempt_timeout
+        self.deadline = deadline
+        self.hedge_quantile = hedge_quantile
+        self.max_hedge_ratio = max_hedge_ratio
+        self.breaker = breaker or CircuitBreaker()
+        self.latencies = LatencyTracker()
+        self.session = requests.Session()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers)
+
+        # 统计信息
+        self.stats = {"requests": 0, "success": 0, "failures": 0, "hedged": 0, "hedge_wins": 0, "rejected": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str):
+        """线程安全地累加统计项"""
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    def timeouts(self, payload: Dict[str, Any]) -> Tuple[float, float]:
+        """
+        单次尝试的超时时间和整个请求的截止时间（秒），按请求的 max_tokens 放宽
+
+        Args:
+            payload: 请求内容
+
+        Returns:
+            (单次尝试超时时间, 整个请求截止时间)
+        """
+        generation = payload.get("max_tokens", 0) / MIN_TOKENS_PER_SECOND
+        return self.attempt_timeout + generation, self.deadline + generation
+
+    def hedge_delay(self) -> float:
+        """发出对冲请求前的等待时间（秒）"""
+        delay = self.latencies.quantile(self.hedge_quantile)
+        if delay is None:
+            delay = DEFAULT_HEDGE_DELAY
+        return min(MAX_HEDGE_DELAY, max(MIN_HEDGE_DELAY, delay))
+
+    def _may_hedge(self) -> bool:
+        with self._stats_lock:
+            return self.stats["hedged"] + 1 <= self.max_hedge_ratio * self.stats["requests"]
+
+    def _post(self, payload: Dict[str, Any], timeout: float) -> str:
+        """发出一次HTTP请求并返回回复内容"""
+        self._count("requests")
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+        response = self.session.post(self.api_url, headers=headers, json=payload, timeout=timeout)
+        response.raise_for_status()
+        return response.json()["choices"][0]["message"]["content"]
+
+    def _attempt(self, payload: Dict[str, Any], timeout: float) -> str:
+        """
+        一次带对冲的尝试
+
+        Args:
+            payload: 请求内容
+            timeout: 本次尝试的截止时间（秒）
+
+        Returns:
+            回复内容
+        """
+        start = time.monotonic()
+        futures = [self._executor.submit(self._post, payload, timeout)]
+        hedge_at = min(self.hedge_delay(), timeout)
+        done, _ = wait(futures, timeout=hedge_at)
+        if not done and self.breaker.state == "closed" and self._may_hedge():
+            self._count("hedged")
+            remaining = max(0.1, timeout - (time.monotonic() - start))
+            futures.append(self._executor.submit(self._post, payload, remaining))
+
+        pending = set(futures)
+        last_error: Optional[Exception] = None
+        while pending:
+            remaining = timeout - (time.monotonic() - start)
+            done, pending = wait(pending, timeout=max(0.0, remaining), return_when=FIRST_COMPLETED)
+            if not done:
+                raise requests.exceptions.Timeout(f"单次请求超过 {timeout:.1f} 秒未返回")
+            for future in done:
+                try:
+                    content = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+                self.latencies.add(time.monotonic() - start)
+                if len(futures) > 1 and future is futures[1]:
+                    self._count("hedge_wins")
+                return content
+        raise last_error
+
+    def complete(self, payload: Dict[str, Any], max_retries: int = 3) -> str:
+        """
+        发送对话请求，返回回复内容
+
+        Args:
+            payload: 请求内容
+            max_retries: 最大尝试次数
+
+        Returns:
+            回复内容
+
+        Raises:
+            CircuitOpenError: 熔断器已打开，请求未发出
+            DeadlineExceededError: 截止时间内没有成功响应
+        """
+        allowed, probe = self.breaker.allow()
+        if not allowed:
+            self._count("rejected")
+            raise CircuitOpenError("DeepSeek API错误率过高，熔断器已打开，请稍后重试")
+
+        try:
+            return self._complete(payload, max_retries)
+        finally:
+            # 本次是半开状态下的试探请求但没有记录结果时（如请求本身有误），释放试探名额，
+            # 否则熔断器会一直停留在半开状态、拒绝所有请求；不是试探请求的调用不能释放名额
+            if probe is not None:
+                self.breaker.release(probe)
+
+    def _complete(self, payload: Dict[str, Any], max_retries: int) -> str:
+        """complete 的重试循环（已通过熔断器检查）"""
+        attempt_timeout, request_deadline = self.timeouts(payload)
+        deadline = time.monotonic() + request_deadline
+        last_error: Optional[Exception] = None
+        for attempt in range(max_retries):
+            remaining = deadline - time.monotonic()
+            if remaining < MIN_ATTEMPT_TIMEOUT:
+                break
+            try:
+                content = self._attempt(payload, min(attempt_timeout, remaining))
+            except requests.exceptions.HTTPError as e:
+                status = e.response.status_code if e.response is not None else None
+                if status not in RETRYABLE_STATUS_CODES:
+                    # 请求本身有误（如密钥错误），重试没有意义，也不代表上游故障
+                    raise Exception(f"DeepSeek API调用失败: {str(e)}")
+                last_error = e
+            except (requests.exceptions.RequestException, ValueError, KeyError) as e:
+                last_error = e
+            else:
+                self._count("success")
+                self.breaker.record(True)
+                return content
+
+            self._count("failures")
+            self.breaker.record(False)
+            print(f"DeepSeek API调用失败 (尝试 {attempt + 1}/{max_retries}): {last_error}")
+            if self.breaker.state != "closed":
+                raise CircuitOpenError(f"DeepSeek API错误率过高，熔断器已打开: {last_error}")
+            if attempt < max_retries - 1:
+                # 指数退避（带抖动），不超过剩余时间
+                wait_time = min(random.uniform(0, 2 ** attempt), max(0.0, deadline - time.monotonic()))
+                print(f"等待 {wait_time:.1f} 秒后重试...")
+                time.sleep(wait_time)
+
+        raise DeadlineExceededError(f"DeepSeek API调用失败，已达到最大重试次数或截止时间: {last_error}")
+
+class RetryQueue:
+    """
+    熔断期间被推迟的任务队列，保存为JSONL文件，进程重启后仍可继续处理
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def push(self, item: str, reason: str = ""):
+        """加入一个被推迟的任务"""
+        with self._lock:
+            os.makedirs(os.path.dirname(os.path.abspath(self.path)), exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps({"item": item, "reason": reason, "deferred_at": time.time()},
+                                   ensure_ascii=False) + "\n")
+
+    def drain(self) -> List[str]:
+        """取出所有被推迟的任务（去重，保持加入顺序）并清空队列"""
+        with self._lock:
+            if not os.path.exists(self.path):
+                return []
+            items = []
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)["item"]
+                    except (json.JSONDecodeError, KeyError):
+                        continue
+                    if item not in items:
+                        items.append(item)
+            os.remove(self.path)
+            return items
+
+    def __len__(self) -> int:
+        with self._lock:
+            if not os.path.exists(self.path):
+                return 0
+            with open(self.path, "r", encoding="utf-8") as f:
+                return sum(1 for line in f if line.strip())
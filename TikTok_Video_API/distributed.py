@@ -0,0 +1,172 @@
+#!/usr/bin/env python3
+"""
+分布式处理
+把下载、转录和分析拆成三个阶段，各阶段的工作进程可以运行在不同的机器上，
+从共享队列（work_queue）领取任务，每个阶段完成后把下一个阶段的任务放入队列。
+任务中传递的是产物文件的绝对路径，下一个阶段的机器需要能读到这些文件（相邻阶段运行在同一台机器上，
+或把 artifacts、video 目录放在共享存储上并挂载为相同的路径）。
+db 目录中的SQLite数据库（产物索引、视频信息、检索索引、音频指纹、统计）使用WAL模式，依赖本机的共享内存和文件锁，
+不能放在NFS/SMB等网络文件系统上：每台机器使用本地的 db 目录，各数据库只由本机处理对应阶段的工作进程写入。
+任务的优先级和提交时间随任务传递到后续阶段，急用的单个链接（interactive）在每个阶段都优先于批量链接（bulk）处理
+"""
+
+import argparse
+import os
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+
+from artifact_store import ArtifactStore
+from work_queue import (DEFAULT_PRIORITY, PRIORITY_CLASSES, Job, PermanentJobError, WorkQueue, default_worker_id,
+                        open_queue, percentile, run_worker)
+
+STAGES = ["download", "transcribe", "analyze"]
+
+def make_handlers(queue: WorkQueue) -> Dict[str, Callable[[Dict[str, Any]], Any]]:
+    """
+    创建各阶段的任务处理函数
+
+    Args:
+        queue: 任务队列，用于放入下一个阶段的任务
+
+    Returns:
+        阶段名到处理函数的映射
+    """
+    def forward(stage: str, payload: Dict[str, Any], **values):
+        # 下一个阶段的任务沿用原任务的优先级和提交时间，端到端延迟从提交时算起
+        priority = payload.get("priority", DEFAULT_PRIORITY)
+        queue.put(stage, dict(values, url=payload.get("url"), priority=priority,
+                              submitted_at=payload.get("submitted_at")), priority)
+
+    def download(payload: Dict[str, Any]) -> List[str]:
+        import download_douyin_video
+        files = download_douyin_video.download_links([payload["url"]], payload.get("priority", DEFAULT_PRIORITY))
+        if not files:
+            raise Exception(f"下载失败: {payload['url']}")
+        # 图集的图片不需要转录
+        for path in files:
+            if Path(path).suffix.lower() not in download_douyin_video.IMAGE_EXTENSIONS.values():
+                forward("transcribe", payload, video=path)
+        return files
+
+    def transcribe(payload: Dict[str, Any]) -> str:
+        import video_to_text
+        if not os.path.exists(payload["video"]):
+            # 转录完成后会删除视频：工作进程在转录完成和提交完成之间崩溃时，任务重新投递后视频已经不在了，
+            # 改为查找已有的转录结果并继续放入分析队列
+            with ArtifactStore() as store:
+                key = store.key_for_path(payload["video"])
+                transcript_path = store.get(key, "transcript") if key else None
+            if transcript_path is None:
+                raise PermanentJobError(f"视频文件不存在: {payload['video']}")
+            print(f"视频已转录过，沿用已有的转录结果: {transcript_path}")
+            forward("analyze", payload, transcript=transcript_path)
+            return transcript_path
+        transcript_path = video_to_text.convert_video_to_text(payload["video"])
+        forward("analyze", payload, transcript=transcript_path)
+        return transcript_path
+
+    def analyze(payload: Dict[str, Any]) -> str:
+        import analyze_transcript
+        if not os.path.exists(payload["transcript"]):
+            raise PermanentJobError(f"转录文件不存在: {payload['transcript']}")
+        content, _ = analyze_transcript.prepare_transcript(
+            analyze_transcript.read_transcript_file(payload["transcript"]), Path(payload["transcript"]).name)
+        analysis = analyze_transcript.analyze_with_deepseek(content)
+        return analyze_transcript.save_analysis_result(payload["transcript"], analysis)
+
+    return {"download": download, "transcribe": transcribe, "analyze": analyze}
+
+def submit_links(queue: WorkQueue, text: str, priority: str = DEFAULT_PRIORITY) -> List[str]:
+    """
+    从文本中提取抖音链接并放入下载队列
+
+    Args:
+        queue: 任务队列
+        text: 包含抖音链接的文本
+        priority: 优先级，单个急用链接使用 interactive
+
+    Returns:
+        加入的任务ID列表
+    """
+    from download_douyin_video import extract_douyin_urls
+    return [queue.put("download", {"url": url, "priority": priority, "submitted_at": time.time()}, priority)
+            for url in extract_douyin_urls(text)]
+
+def work_once(queue: WorkQueue, handlers: Dict[str, Callable[[Dict[str, Any]], Any]], stages: List[str],
+              worker: str, lease_seconds: float, lanes: List[str]) -> List[Job]:
+    """
+    按优先级从高到低领取任务：某个优先级有任务时，每个阶段最多处理一个后返回，
+    下一轮重新从最高优先级开始，急用任务最多等待当前正在处理的任务完成（在任务边界抢占）
+
+    Returns:
+        已处理的任务
+    """
+    for lane in lanes:
+        # 同一优先级内每个阶段最多领取一个任务后轮到下一个阶段，避免某个阶段饿死
+        processed = [job for stage in stages
+                     for job in run_worker(queue, stage, handlers[stage], worker, lease_seconds,
+                                           max_jobs=1, exit_when_idle=True, classes=[lane])]
+        if processed:
+            return processed
+    return []
+
+def print_stats(queue: WorkQueue):
+    """打印各阶段的任务数和各优先级的延迟"""
+    stats = queue.stats()
+    print("=" * 50)
+    print("队列状态")
+    print("=" * 50)
+    for stage in STAGES + sorted(set(stats) - set(STAGES)):
+        counts = stats.get(stage, {})
+        print(f"{stage:10s} 待处理 {counts.get('pending', 0):5d}（急用 {counts.get('pending:interactive', 0)}）  "
+              f"处理中 {counts.get('leased', 0):5d}  租约过期 {counts.get('expired', 0):5d}  "
+              f"完成 {counts.get('done', 0):5d}  失败 {counts.get('dead', 0):5d}")
+        for priority, values in queue.latencies(stage).items():
+            if values:
+                print(f"{'':10s} {priority:12s} 从提交到完成 P50 {percentile(values, 0.5):7.1f} 秒  "
+                      f"P95 {percentile(values, 0.95):7.1f} 秒（最近 {len(values)} 个）")
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="分布式处理：提交链接、运行各阶段工作进程、查看队列状态")
+    parser.add_argument("--queue", help="队列地址：redis://host:6379/0 或SQLite数据库路径（默认本地SQLite）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    submit_parser = subparsers.add_parser("submit", help="提交抖音链接")
+    submit_parser.add_argument("text", nargs="?", help="包含抖音链接的文本（不提供时从标准输入读取）")
+    submit_parser.add_argument("--priority", choices=PRIORITY_CLASSES, default=DEFAULT_PRIORITY,
+                               help=f"优先级，急用的单个链接使用 interactive（默认: {DEFAULT_PRIORITY}）")
+
+    worker_parser = subparsers.add_parser("worker", help="运行工作进程")
+    worker_parser.add_argument("stages", nargs="+", choices=STAGES, help="处理的阶段（可指定多个，按顺序轮流领取）")
+    worker_parser.add_argument("--lease", type=float, default=60.0, help="租约时长，单位秒（默认: 60）")
+    worker_parser.add_argument("--exit-when-idle", action="store_true", help="所有阶段的队列都为空时退出")
+    worker_parser.add_argument("--lanes", nargs="+", choices=PRIORITY_CLASSES, default=list(PRIORITY_CLASSES),
+                               help="处理的优先级（默认全部）；只指定 interactive 的工作进程为急用链接预留")
+
+    subparsers.add_parser("status", help="查看队列状态")
+
+    args = parser.parse_args()
+
+    with open_queue(args.queue) as queue:
+        if args.command == "submit":
+            job_ids = submit_links(queue, args.text if args.text is not None else sys.stdin.read(), args.priority)
+            print(f"已提交 {len(job_ids)} 个下载任务（{args.priority}）")
+        elif args.command == "worker":
+            handlers = make_handlers(queue)
+            worker = default_worker_id()
+            lanes = sorted(set(args.lanes), key=PRIORITY_CLASSES.index)
+            print(f"工作进程 {worker} 已启动，处理阶段: {', '.join(args.stages)}，优先级: {', '.join(lanes)}")
+            while True:
+                processed = work_once(queue, handlers, args.stages, worker, args.lease, lanes)
+                if not processed:
+                    if args.exit_when_idle:
+                        break
+                    time.sleep(1.0)
+        elif args.command == "status":
+            print_stats(queue)
+
+if __name__ == "__main__":
+    main()
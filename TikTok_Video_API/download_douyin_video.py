@@ -1,21 +1,98 @@
 #!/usr/bin/env python3
 """
 抖音视频下载脚本
-用户输入抖音分享链接，程序爬取视频信息并提供下载选项
+用户输入抖音分享链接，程序爬取视频信息并提供下载选项；图集（note）作品并行下载其中的图片
 """
 
 import re
 import json
 import requests
 import os
-from typing import Dict, Any, Optional, List
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Any, Iterable, Optional, List
 from datetime import datetime
 
+from artifact_store import KEY_PATTERN, ArtifactStore, image_name
+from fetch_scheduler import FetchScheduler, get_default_scheduler
+from link_ingest import ExactDeduper, iter_douyin_urls
+from metadata_store import MetadataStore
+from profiler import add_profile_arguments, run_profiled, stage
+from work_queue import DEFAULT_PRIORITY, PRIORITY_CLASSES
+
 # 请求头，模拟移动端访问
 HEADERS = {
     'User-Agent': 'Mozilla/5.0 (iPhone; CPU iPhone OS 17_2 like Mac OS X) AppleWebKit/605.1.15 (KHTML, like Gecko) EdgiOS/121.0.2277.107 Version/17.0 Mobile/15E148 Safari/604.1'
 }
 
+# 没有视频ID时的视频保存目录（video_to_text 会把其中的文件移入产物存储）
+VIDEO_DIR = "D:\\test\\TikTok_Video_API\\video"
+
+# 短链接域名和视频、图集分享页地址模板（本地模拟服务测试时可以替换）
+SHORT_LINK_HOST = "v.douyin.com"
+SHARE_VIDEO_URL = "https://www.iesdouyin.com/share/video/{video_id}"
+SHARE_NOTE_URL = "https://www.iesdouyin.com/share/note/{video_id}"
+
+# 每个图集同时下载的图片数
+IMAGE_CONCURRENCY = 6
+
+# 图片的Content-Type对应的扩展名（未知类型按 .jpg 保存）
+IMAGE_EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp", "image/heic": ".heic", "image/gif": ".gif"}
+
+# 下载文件时每次读取的字节数
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
+
+# 分享页中视频信息JSON的提取正则
+ROUTER_DATA_PATTERN = re.compile(r"window\._ROUTER_DATA\s*=\s*(.*?)</script>", flags=re.DOTALL)
+
+# 下载视频和图片共用的连接池，连接数不少于单个图集的并行数
+_media_session: Optional[requests.Session] = None
+_media_lock = threading.Lock()
+
+def get_media_session() -> requests.Session:
+    """获取进程内共享的下载会话（复用到同一CDN的连接）"""
+    global _media_session
+    with _media_lock:
+        if _media_session is None:
+            session = requests.Session()
+            adapter = requests.adapters.HTTPAdapter(pool_connections=4, pool_maxsize=IMAGE_CONCURRENCY)
+            session.mount("http://", adapter)
+            session.mount("https://", adapter)
+            _media_session = session
+        return _media_session
+
+class TransferStats:
+    """按类型（视频、图片）统计下载的文件数、字节数和耗时"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.totals: Dict[str, List[float]] = {}
+
+    def add(self, kind: str, paths: List[str], seconds: float):
+        """
+        记录一次下载
+
+        Args:
+            kind: 类型（video 或 image）
+            paths: 下载的文件
+            seconds: 下载耗时（并行下载的图片为整个图集的耗时）
+        """
+        size = sum(os.path.getsize(path) for path in paths)
+        with self._lock:
+            total = self.totals.setdefault(kind, [0, 0, 0.0])
+            total[0] += len(paths)
+            total[1] += size
+            total[2] += seconds
+
+    def report(self):
+        """打印各类型的下载吞吐量"""
+        names = {"video": "视频", "image": "图片"}
+        for kind, (count, size, seconds) in self.totals.items():
+            seconds = max(seconds, 1e-9)
+            print(f"{names.get(kind, kind)}: {count} 个，{size / 1024 / 1024:.1f} MB，用时 {seconds:.1f} 秒，"
+                  f"{size / 1024 / 1024 / seconds:.2f} MB/秒，{count / seconds:.1f} 个/秒")
+
 def extract_douyin_urls(text: str) -> List[str]:
     """
     从文本中提取所有抖音链接
@@ -26,83 +103,63 @@ def extract_douyin_urls(text: str) -> List[str]:
     Returns:
         抖音链接列表
     """
-    # 提取分享链接，增强正则表达式以匹配更多格式
-    # 匹配 v.douyin.com 或 www.iesdouyin.com 格式的链接
-    urls = re.findall(r'https?://(?:v\.douyin\.com|www\.iesdouyin\.com/share/video)/[\w\d\-._?=&/]+', text)
-    
-    # 如果上面的模式没有匹配到，尝试更通用的匹配
-    if not urls:
-        urls = re.findall(r'https?://[\w\d\-._?=&/]*douyin[\w\d\-._?=&/]+', text)
-    
-    # 最后尝试匹配任何URL
-    if not urls:
-        urls = re.findall(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', text)
-    
-    # 去重并保持顺序
-    seen = set()
-    unique_urls = []
-    for url in urls:
-        if url not in seen:
-            seen.add(url)
-            unique_urls.append(url)
-    
-    return unique_urls
+    # 单遍匹配预编译的正则表达式：优先分享链接，没有时依次退回其他抖音链接、任意URL，去重并保持顺序
+    return list(iter_douyin_urls([text], ExactDeduper()))
 
-def parse_douyin_share_url(share_text: str) -> Dict[str, Any]:
+def parse_douyin_share_url(share_text: str, scheduler: Optional[FetchScheduler] = None,
+                           verbose: bool = True) -> Dict[str, Any]:
     """
     从抖音分享链接中解析视频信息
     
     Args:
         share_text: 包含抖音分享链接的文本
+        scheduler: 页面抓取调度器，为None时使用进程内共享的默认调度器
+        verbose: 是否打印解析进度
         
     Returns:
         包含视频信息的字典
     """
-    # 提取分享链接，增强正则表达式以匹配更多格式
-    # 匹配 v.douyin.com 或 www.iesdouyin.com 格式的链接
-    urls = re.findall(r'https?://(?:v\.douyin\.com|www\.iesdouyin\.com/share/video)/[\w\d\-._?=&/]+', share_text)
-    
-    # 如果上面的模式没有匹配到，尝试更通用的匹配
-    if not urls:
-        urls = re.findall(r'https?://[\w\d\-._?=&/]*douyin[\w\d\-._?=&/]+', share_text)
-    
-    # 最后尝试匹配任何URL
-    if not urls:
-        urls = re.findall(r'http[s]?://(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F]))+', share_text)
+    # 提取分享链接（与 extract_douyin_urls 共用同一个预编译正则）
+    urls = extract_douyin_urls(share_text)
     
     if not urls:
         raise ValueError("未找到有效的分享链接")
     
     share_url = urls[0]
-    print(f"正在解析分享链接: {share_url}")
+    if verbose:
+        print(f"正在解析分享链接: {share_url}")
+    
+    if scheduler is None:
+        scheduler = get_default_scheduler()
     
     # 如果是短链接，需要获取重定向后的URL以提取视频ID
-    if 'v.douyin.com' in share_url:
-        share_response = requests.get(share_url, headers=HEADERS)
-        # 从重定向后的URL中提取视频ID
-        video_id = share_response.url.split("?")[0].strip("/").split("/")[-1]
-        share_url = f'https://www.iesdouyin.com/share/video/{video_id}'
+    if SHORT_LINK_HOST in share_url:
+        with stage("fetch"):
+            share_response = scheduler.fetch(share_url, headers=HEADERS)
+        # 从重定向后的URL中提取视频ID，图集作品跳转到 /note/ 地址
+        resolved = share_response.url.split("?")[0]
+        video_id = resolved.strip("/").split("/")[-1]
+        share_url = (SHARE_NOTE_URL if "/note/" in resolved else SHARE_VIDEO_URL).format(video_id=video_id)
     else:
         # 直接从URL中提取视频ID
         video_id = share_url.split("?")[0].strip("/").split("/")[-1]
     
-    # 获取视频页面内容
-    print("正在获取视频页面信息...")
-    response = requests.get(share_url, headers=HEADERS)
+    # 获取视频页面内容（限流和网络错误由调度器重试，这里的失败即为真正的解析失败）
+    if verbose:
+        print("正在获取视频页面信息...")
+    with stage("fetch"):
+        response = scheduler.fetch(share_url, headers=HEADERS)
     response.raise_for_status()
     
-    # 使用正则表达式提取JSON数据
-    pattern = re.compile(
-        pattern=r"window\._ROUTER_DATA\s*=\s*(.*?)</script>",
-        flags=re.DOTALL,
-    )
-    find_res = pattern.search(response.text)
-
-    if not find_res or not find_res.group(1):
-        raise ValueError("从HTML中解析视频信息失败")
-
-    # 解析JSON数据
-    json_data = json.loads(find_res.group(1).strip())
+    with stage("parse_html"):
+        # 使用正则表达式提取JSON数据
+        find_res = ROUTER_DATA_PATTERN.search(response.text)
+
+        if not find_res or not find_res.group(1):
+            raise ValueError("从HTML中解析视频信息失败")
+
+        # 解析JSON数据
+        json_data = json.loads(find_res.group(1).strip())
     VIDEO_ID_PAGE_KEY = "video_(id)/page"
     NOTE_ID_PAGE_KEY = "note_(id)/page"
     
@@ -115,8 +172,16 @@ def parse_douyin_share_url(share_text: str) -> Dict[str, Any]:
 
     data = original_video_info["item_list"][0]
 
-    # 获取视频信息
-    video_url = data["video"]["play_addr"]["url_list"][0].replace("playwm", "play")
+    # 图集作品没有视频地址（或只有背景音乐），取每张图片的第一个地址
+    images = [image["url_list"][0] for image in data.get("images") or [] if image.get("url_list")]
+    video = data.get("video") or {}
+    play_urls = (video.get("play_addr") or {}).get("url_list") or []
+    if images:
+        video_url = ""
+    elif play_urls:
+        video_url = play_urls[0].replace("playwm", "play")
+    else:
+        raise ValueError("分享页中既没有视频地址也没有图集图片")
     desc = data.get("desc", "").strip() or f"douyin_{video_id}"
     
     # 替换文件名中的非法字符
@@ -127,15 +192,20 @@ def parse_douyin_share_url(share_text: str) -> Dict[str, Any]:
     like_count = data.get("statistics", {}).get("digg_count", 0)
     comment_count = data.get("statistics", {}).get("comment_count", 0)
     play_count = data.get("statistics", {}).get("play_count", 0)
+    # 视频时长（接口单位为毫秒），用于转录任务调度
+    duration = 0 if images else video.get("duration", 0) / 1000
     
     return {
+        "type": "note" if images else "video",
         "url": video_url,
         "title": desc,
         "video_id": video_id,
         "author": author_name,
         "likes": like_count,
         "comments": comment_count,
-        "plays": play_count
+        "plays": play_count,
+        "duration": duration,
+        "images": images
     }
 
 def download_video(video_info: Dict[str, Any], save_path: str | None = None) -> str:
@@ -144,51 +214,114 @@ def download_video(video_info: Dict[str, Any], save_path: str | None = None) ->
     
     Args:
         video_info: 视频信息字典
-        save_path: 保存路径，如果为None则使用默认路径
+        save_path: 保存路径，如果为None则按视频ID保存到产物存储
         
     Returns:
         保存的文件路径
     """
-    if save_path is None:
+    store = None
+    video_id = str(video_info.get('video_id') or '')
+    if save_path is None and KEY_PATTERN.match(video_id):
+        # 按视频ID分组保存，先写临时文件，下载完成后才重命名为正式文件名
+        store = ArtifactStore()
+        save_path = store.artifact_path(video_id, "video", ".mp4")
+    elif save_path is None:
         # 使用当前日期时间（精确到分钟）和标题的第一个字符作为文件名
         timestamp = datetime.now().strftime("%Y%m%d_%H%M")
         first_char = video_info['title'][0] if video_info['title'] else 'video'
         filename = f"{timestamp}_{first_char}.mp4"
-        # 修改保存路径为 D:\test\TikTok_Video_API\video
-        save_path = os.path.join(r"D:\\test\\TikTok_Video_API\\video", filename)
-    
-    # 确保保存目录存在
-    os.makedirs(os.path.dirname(save_path), exist_ok=True)
+        save_path = os.path.join(VIDEO_DIR, filename)
     
     print(f"正在下载视频: {video_info['title']}")
     print(f"保存位置: {save_path}")
     
-    # 下载视频
-    response = requests.get(video_info['url'], headers=HEADERS, stream=True)
-    response.raise_for_status()
-    
-    # 获取文件大小
-    total_size = int(response.headers.get('content-length', 0))
-    downloaded = 0
-    
-    with open(save_path, 'wb') as f:
-        for chunk in response.iter_content(chunk_size=8192):
-            if chunk:
-                f.write(chunk)
-                downloaded += len(chunk)
-                if total_size > 0:
-                    progress = downloaded / total_size * 100
-                    print(f"\r下载进度: {progress:.1f}%", end='', flush=True)
+    try:
+        # 下载视频（与图片共用连接池）；请求成功后才创建目标文件，请求失败时不会留下空文件
+        with get_media_session().get(video_info['url'], headers=HEADERS, stream=True) as response:
+            response.raise_for_status()
+            
+            # 获取文件大小
+            total_size = int(response.headers.get('content-length', 0))
+            downloaded = 0
+            
+            # 确保保存目录存在
+            os.makedirs(os.path.dirname(save_path), exist_ok=True)
+            target = store.open_write(video_id, "video", ".mp4") if store else open(save_path, 'wb')
+            with stage("write_media"), target as f:
+                for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                    if chunk:
+                        f.write(chunk)
+                        downloaded += len(chunk)
+                        if total_size > 0:
+                            progress = downloaded / total_size * 100
+                            print(f"\r下载进度: {progress:.1f}%", end='', flush=True)
+    finally:
+        if store:
+            store.close()
     
     print("\n视频下载完成!")
     return save_path
 
-def process_multiple_links(share_text: str) -> List[str]:
+def dedupe_image_urls(urls: Iterable[str]) -> List[str]:
+    """
+    去掉重复的图片地址并保持顺序
+
+    同一张图片的地址可能只有签名、过期时间等查询参数不同，按去掉查询参数后的地址判断是否重复
+    """
+    seen = set()
+    unique = []
+    for url in urls:
+        key = url.split("?")[0]
+        if key not in seen:
+            seen.add(key)
+            unique.append(url)
+    return unique
+
+def download_images(video_info: Dict[str, Any], max_workers: int = IMAGE_CONCURRENCY) -> List[str]:
+    """
+    并行下载图集中的图片，保存到作品的产物分组中（<视频ID>_01.jpg、<视频ID>_02.jpg ...）
+
+    Args:
+        video_info: parse_douyin_share_url 返回的图集信息
+        max_workers: 同时下载的图片数
+
+    Returns:
+        按图集顺序排列的图片路径
+    """
+    video_id = str(video_info.get('video_id') or '')
+    if not KEY_PATTERN.match(video_id):
+        raise ValueError(f"图集ID无效: {video_id}")
+    urls = dedupe_image_urls(video_info['images'])
+    if len(urls) < len(video_info['images']):
+        print(f"图集中有 {len(video_info['images']) - len(urls)} 张重复图片，已跳过")
+    print(f"正在下载图集: {video_info['title']}（{len(urls)} 张图片）")
+
+    session = get_media_session()
+
+    with ArtifactStore() as store:
+        def fetch(index: int, url: str) -> str:
+            # 请求成功后才创建目标文件（扩展名也由响应的 Content-Type 决定）
+            with session.get(url, headers=HEADERS, stream=True, timeout=30) as response:
+                response.raise_for_status()
+                content_type = response.headers.get("Content-Type", "").split(";")[0].strip().lower()
+                name = image_name(video_id, index, IMAGE_EXTENSIONS.get(content_type, ".jpg"))
+                with store.open_write(video_id, "image", name=name) as f:
+                    for chunk in response.iter_content(chunk_size=DOWNLOAD_CHUNK_SIZE):
+                        f.write(chunk)
+            return store.artifact_path(video_id, "image", name=name)
+
+        with stage("fetch_images"), ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(urls)))) as executor:
+            paths = list(executor.map(fetch, range(1, len(urls) + 1), urls))
+    print("图集下载完成!")
+    return paths
+
+def process_multiple_links(share_text: str, priority: str = DEFAULT_PRIORITY) -> List[str]:
     """
     处理包含多个链接的文本，逐个下载视频
     
     Args:
         share_text: 包含多个抖音链接的文本
+        priority: 优先级，急用链接（interactive）在批量转录时优先处理
         
     Returns:
         下载成功的文件路径列表
@@ -201,56 +334,88 @@ def process_multiple_links(share_text: str) -> List[str]:
         return []
     
     print(f"找到 {len(urls)} 个抖音链接")
+    return download_links(urls, priority)
+
+def download_links(urls: Iterable[str], priority: str = DEFAULT_PRIORITY) -> List[str]:
+    """
+    逐个下载链接对应的视频，链接可以是流式产生的（如 link_ingest 从大文件中提取的）
+    
+    Args:
+        urls: 抖音链接
+        priority: 优先级，非默认优先级时记录到元数据中，供 video_to_text --all 调度使用
+        
+    Returns:
+        下载成功的文件路径列表
+    """
     downloaded_files = []
+    transfers = TransferStats()
+    store = MetadataStore()
     
-    # 逐个处理每个链接
-    for i, url in enumerate(urls, 1):
-        print(f"\n处理第 {i} 个链接: {url}")
-        try:
-            # 解析视频信息
-            video_info = parse_douyin_share_url(url)
-            
-            # 显示视频信息
-            print("\n" + "=" * 50)
-            print("视频信息:")
-            print("=" * 50)
-            print(f"标题: {video_info['title']}")
-            print(f"作者: {video_info['author']}")
-            print(f"点赞数: {video_info['likes']}")
-            print(f"评论数: {video_info['comments']}")
-            print(f"播放数: {video_info['plays']}")
-            print(f"视频ID: {video_info['video_id']}")
-            print(f"无水印下载地址: {video_info['url']}")
-            
-            # 下载视频
-            print("\n开始下载视频...")
-            save_path = download_video(video_info)
-            downloaded_files.append(save_path)
-            print(f"视频已保存至: {save_path}")
-            
-            # 保存JSON信息到 D:\test\TikTok_Video_API\json 目录
-            # 使用当前日期时间（精确到分钟）和标题的第一个字符作为文件名
-            timestamp = datetime.now().strftime("%Y%m%d_%H%M")
-            first_char = video_info['title'][0] if video_info['title'] else 'video'
-            json_filename = f"{timestamp}_{first_char}.json"
-            json_save_path = os.path.join(r"D:\\test\\TikTok_Video_API\\json", json_filename)
-            
-            # 确保JSON保存目录存在
-            os.makedirs(os.path.dirname(json_save_path), exist_ok=True)
-            
-            # 写入JSON文件
-            with open(json_save_path, 'w', encoding='utf-8') as f:
-                json.dump(video_info, f, ensure_ascii=False, indent=2)
-            print(f"视频信息已保存至: {json_save_path}")
-            
-        except Exception as e:
-            print(f"处理链接 {url} 时出现错误: {str(e)}")
-            print("继续处理下一个链接...")
-            continue
+    try:
+        # 逐个处理每个链接
+        for i, url in enumerate(urls, 1):
+            print(f"\n处理第 {i} 个链接: {url}")
+            try:
+                with stage("download", url):
+                    # 解析视频信息
+                    video_info = parse_douyin_share_url(url)
+                
+                    # 显示视频信息
+                    print("\n" + "=" * 50)
+                    print("视频信息:")
+                    print("=" * 50)
+                    print(f"标题: {video_info['title']}")
+                    print(f"作者: {video_info['author']}")
+                    print(f"点赞数: {video_info['likes']}")
+                    print(f"评论数: {video_info['comments']}")
+                    print(f"播放数: {video_info['plays']}")
+                    print(f"视频ID: {video_info['video_id']}")
+                    if video_info['images']:
+                        print(f"图集图片数: {len(video_info['images'])}")
+                    else:
+                        print(f"无水印下载地址: {video_info['url']}")
+                
+                    start = time.perf_counter()
+                    record = {k: v for k, v in video_info.items() if k != 'images'}
+                    if video_info['images']:
+                        # 下载图集，图片不需要转录，元数据中只记录图片文件
+                        print("\n开始下载图集...")
+                        image_paths = download_images(video_info)
+                        transfers.add("image", image_paths, time.perf_counter() - start)
+                        downloaded_files.extend(image_paths)
+                        record["image_files"] = image_paths
+                        print(f"图集已保存至: {os.path.dirname(image_paths[0])}")
+                    else:
+                        # 下载视频
+                        print("\n开始下载视频...")
+                        save_path = download_video(video_info)
+                        transfers.add("video", [save_path], time.perf_counter() - start)
+                        downloaded_files.append(save_path)
+                        record["file"] = save_path
+                        print(f"视频已保存至: {save_path}")
+                
+                    # 追加视频信息快照到元数据存储（批量提交），记录本地文件路径供转录调度使用
+                    if priority != DEFAULT_PRIORITY:
+                        record["priority"] = priority
+                    store.add(record)
+                    print(f"视频信息已保存至: {store.db_path}")
+                
+            except Exception as e:
+                print(f"处理链接 {url} 时出现错误: {str(e)}")
+                print("继续处理下一个链接...")
+                continue
+    finally:
+        # 提交缓冲区中剩余的视频信息
+        store.close()
     
+    if transfers.totals:
+        print("\n" + "=" * 50)
+        print("下载吞吐量")
+        print("=" * 50)
+        transfers.report()
     return downloaded_files
 
-def main(share_link: Optional[str] = None):
+def main(share_link: Optional[str] = None, priority: str = DEFAULT_PRIORITY):
     """主函数"""
     print("=" * 50)
     print("抖音视频下载工具")
@@ -266,7 +431,7 @@ def main(share_link: Optional[str] = None):
             return None
         
         # 处理多个链接
-        downloaded_files = process_multiple_links(share_link)
+        downloaded_files = process_multiple_links(share_link, priority)
         
         if downloaded_files:
             print(f"\n成功下载 {len(downloaded_files)} 个视频:")
@@ -285,4 +450,11 @@ def main(share_link: Optional[str] = None):
         return None
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="下载抖音分享链接中的视频")
+    parser.add_argument("link", nargs="?", help="抖音分享文本（可包含多个链接），不提供时交互输入")
+    parser.add_argument("--priority", choices=PRIORITY_CLASSES, default=DEFAULT_PRIORITY,
+                        help=f"优先级，急用链接使用 interactive，批量转录时优先处理（默认: {DEFAULT_PRIORITY}）")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    run_profiled(args, "download", main, args.link, args.priority)
\ No newline at end of file
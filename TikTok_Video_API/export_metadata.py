@@ -0,0 +1,174 @@
+#!/usr/bin/env python3
+"""
+抖音视频信息批量导出脚本（仅元数据）
+只解析分享页中的标题、作者、点赞、评论、播放等信息，不下载视频，
+每个链接输出一行JSON（JSONL），支持并发处理和从未完成的输出文件续传
+"""
+
+import argparse
+import json
+import os
+import sys
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, TextIO
+
+from download_douyin_video import extract_douyin_urls, parse_douyin_share_url
+from metadata_store import MetadataStore
+
+def load_completed_urls(output_path: str) -> Set[str]:
+    """
+    读取已有的JSONL输出文件，返回已成功导出的分享链接
+
+    解析失败的记录和中断时写了一半的最后一行会被忽略，续传时重新处理
+
+    Args:
+        output_path: JSONL输出文件路径
+
+    Returns:
+        已成功导出的分享链接集合
+    """
+    completed = set()
+    if not os.path.exists(output_path):
+        return completed
+
+    with open(output_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if "error" not in record and record.get("share_url"):
+                completed.add(record["share_url"])
+
+    return completed
+
+def fetch_metadata(share_url: str) -> Dict[str, Any]:
+    """
+    获取单个链接的视频信息，失败时返回带 error 字段的记录
+
+    Args:
+        share_url: 抖音分享链接
+
+    Returns:
+        一条JSONL记录
+    """
+    record: Dict[str, Any] = {"share_url": share_url, "fetched_at": datetime.now().isoformat(timespec="seconds")}
+    try:
+        # 不打印解析进度，避免混入输出到标准输出的JSONL
+        record.update(parse_douyin_share_url(share_url, verbose=False))
+    except Exception as e:
+        record["error"] = f"{type(e).__name__}: {e}"
+    return record
+
+def iter_metadata(urls: Iterable[str], workers: int = 4) -> Iterator[Dict[str, Any]]:
+    """
+    并发获取视频信息，按完成顺序逐条产出记录
+
+    Args:
+        urls: 抖音分享链接
+        workers: 并发线程数（实际并发请求数还受抓取调度器的AIMD上限控制）
+
+    Yields:
+        每个链接对应的一条记录
+    """
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = [executor.submit(fetch_metadata, url) for url in urls]
+        for future in as_completed(futures):
+            yield future.result()
+
+def _prepare_append(output_path: str):
+    """如果输出文件最后一行不完整（中断时写了一半），先补上换行"""
+    if not os.path.exists(output_path) or os.path.getsize(output_path) == 0:
+        return
+    with open(output_path, "rb+") as f:
+        f.seek(-1, os.SEEK_END)
+        if f.read(1) != b"\n":
+            f.write(b"\n")
+
+def export_metadata(urls: List[str], output_path: Optional[str] = None, workers: int = 4,
+                    resume: bool = True, store: Optional[MetadataStore] = None) -> Dict[str, int]:
+    """
+    批量导出视频信息到JSONL文件或标准输出
+
+    Args:
+        urls: 抖音分享链接列表
+        output_path: 输出文件路径，为None或"-"时输出到标准输出
+        workers: 并发线程数
+        resume: 是否跳过输出文件中已成功导出的链接
+        store: 同时追加到的视频信息存储，为None时只输出JSONL
+
+    Returns:
+        统计信息（总数、跳过、成功、失败）
+    """
+    to_stdout = output_path in (None, "-")
+    stats = {"total": len(urls), "skipped": 0, "success": 0, "failed": 0}
+
+    if not to_stdout and resume:
+        completed = load_completed_urls(output_path)
+        pending = [url for url in urls if url not in completed]
+        stats["skipped"] = len(urls) - len(pending)
+        urls = pending
+
+    out: TextIO
+    if to_stdout:
+        out = sys.stdout
+    else:
+        os.makedirs(os.path.dirname(os.path.abspath(output_path)), exist_ok=True)
+        _prepare_append(output_path)
+        out = open(output_path, "a" if resume else "w", encoding="utf-8")
+
+    try:
+        for record in iter_metadata(urls, workers):
+            out.write(json.dumps(record, ensure_ascii=False) + "\n")
+            out.flush()
+            if "error" in record:
+                stats["failed"] += 1
+            else:
+                stats["success"] += 1
+                if store is not None:
+                    store.add(record)
+    finally:
+        if not to_stdout:
+            out.close()
+
+    return stats
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="批量导出抖音视频信息（不下载视频），每个链接输出一行JSON")
+    parser.add_argument("text", nargs="?", help="包含抖音链接的文本，未指定时从 --input 或标准输入读取")
+    parser.add_argument("-i", "--input", help="包含抖音链接的文本文件")
+    parser.add_argument("-o", "--output", default="-", help="JSONL输出文件路径（默认: 标准输出）")
+    parser.add_argument("-w", "--workers", type=int, default=4, help="并发线程数（默认: 4）")
+    parser.add_argument("--no-resume", action="store_true", help="不跳过输出文件中已导出的链接，覆盖输出文件")
+    parser.add_argument("--store", action="store_true", help="同时将视频信息追加到视频信息数据库")
+
+    args = parser.parse_args()
+
+    if args.text:
+        text = args.text
+    elif args.input:
+        with open(args.input, "r", encoding="utf-8") as f:
+            text = f.read()
+    else:
+        text = sys.stdin.read()
+
+    urls = extract_douyin_urls(text)
+    if not urls:
+        print("未找到有效的抖音链接", file=sys.stderr)
+        return None
+
+    print(f"找到 {len(urls)} 个抖音链接", file=sys.stderr)
+    store = MetadataStore() if args.store else None
+    try:
+        stats = export_metadata(urls, args.output, args.workers, resume=not args.no_resume, store=store)
+    finally:
+        if store is not None:
+            store.close()
+    print(f"导出完成: 成功 {stats['success']} 个，失败 {stats['failed']} 个，跳过 {stats['skipped']} 个",
+          file=sys.stderr)
+    return stats
+
+if __name__ == "__main__":
+    main()
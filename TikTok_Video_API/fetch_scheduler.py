@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+"""
+抖音页面抓取调度器
+根据错误和延迟信号，使用AIMD（加性增、乘性减）自适应调整并发数，
+对限流响应进行带随机抖动的指数退避重试，并区分限流与真正的解析失败
+"""
+
+import random
+import threading
+import time
+from typing import Dict, Optional
+
+import requests
+
+# 视为限流的HTTP状态码
+THROTTLE_STATUS_CODES = {403, 429, 503}
+
+# 抖音验证/限流页面中常见的特征字符串
+CHALLENGE_MARKERS = (
+    "_wafchallengeid",
+    "byted_acrawler",
+    "captcha",
+    "verifycenter",
+    "验证码",
+    "请稍后再试",
+)
+
+class ThrottledError(Exception):
+    """抖音返回了限流或验证页面，稍后重试可能成功"""
+
+class FetchFailedError(Exception):
+    """重试次数用尽后仍然无法获取页面"""
+
+def is_throttle_response(response: requests.Response) -> bool:
+    """
+    判断响应是否为限流/验证页面
+
+    Args:
+        response: HTTP响应
+
+    Returns:
+        是否为限流响应
+    """
+    if response.status_code in THROTTLE_STATUS_CODES:
+        return True
+
+    # 正常页面包含 _ROUTER_DATA，验证页面通常是很短的脚本页
+    if response.status_code == 200 and "_ROUTER_DATA" not in response.text:
+        text = response.text[:20000].lower()
+        return any(marker in text for marker in CHALLENGE_MARKERS)
+
+    return False
+
+class FetchScheduler:
+    """
+    基于AIMD的自适应并发抓取调度器
+
+    - 请求成功且延迟低于目标值时，并发上限加性增长（每个窗口约+1）
+    - 遇到限流、超时或延迟超标时，并发上限乘性下降
+    - 失败的请求使用带全抖动（full jitter）的指数退避重试
+    """
+
+    def __init__(self,
+                 min_concurrency: int = 1,
+                 max_concurrency: int = 8,
+                 initial_concurrency: int = 2,
+                 latency_target: float = 3.0,
+                 decrease_factor: float = 0.5,
+                 timeout: float = 10,
+                 max_retries: int = 4,
+                 base_delay: float = 1.0,
+                 max_delay: float = 30.0,
+                 session: Optional[requests.Session] = None):
+        self.min_concurrency = min_concurrency
+        self.max_concurrency = max_concurrency
+        self.latency_target = latency_target
+        self.decrease_factor = decrease_factor
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.session = session or requests.Session()
+
+        self._limit = float(initial_concurrency)
+        self._in_flight = 0
+        self._last_decrease = 0.0
+        self._cond = threading.Condition()
+
+        # 统计信息
+        self.stats = {"requests": 0, "success": 0, "throttled": 0, "errors": 0, "retries": 0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, key: str):
+        """线程安全地累加统计项"""
+        with self._stats_lock:
+            self.stats[key] += 1
+
+    @property
+    def concurrency_limit(self) -> int:
+        """当前允许的并发请求数"""
+        return max(self.min_concurrency, int(self._limit))
+
+    def _acquire(self):
+        """等待空闲的并发槽位"""
+        with self._cond:
+            while self._in_flight >= self.concurrency_limit:
+                self._cond.wait()
+            self._in_flight += 1
+
+    def _release(self):
+        """释放并发槽位"""
+        with self._cond:
+            self._in_flight -= 1
+            self._cond.notify_all()
+
+    def _on_success(self, latency: float):
+        """成功信号：延迟正常时加性增长，延迟超标时按拥塞处理"""
+        if latency > self.latency_target:
+            self._on_congestion()
+            return
+        with self._cond:
+            # 每个窗口（约等于当前上限个成功请求）增加1
+            self._limit = min(float(self.max_concurrency), self._limit + 1.0 / max(self._limit, 1.0))
+            self._cond.notify_all()
+
+    def _on_congestion(self):
+        """拥塞信号：乘性下降，同一批并发失败只下降一次"""
+        with self._cond:
+            now = time.monotonic()
+            # 在一个延迟目标周期内的多次失败视为同一次拥塞事件
+            if now - self._last_decrease < self.latency_target:
+                return
+            self._last_decrease = now
+            self._limit = max(float(self.min_concurrency), self._limit * self.decrease_factor)
+
+    def backoff_delay(self, attempt: int) -> float:
+        """
+        计算第attempt次重试前的等待时间（指数退避 + 全抖动）
+
+        Args:
+            attempt: 已失败的次数（从0开始）
+
+        Returns:
+            等待秒数
+        """
+        cap = min(self.max_delay, self.base_delay * (2 ** attempt))
+        return random.uniform(0, cap)
+
+    def fetch(self, url: str, headers: Optional[Dict[str, str]] = None, **kwargs) -> requests.Response:
+        """
+        受调度器控制地获取URL，遇到限流或网络错误时自动重试
+
+        Args:
+            url: 请求地址
+            headers: 请求头
+            **kwargs: 传递给 requests 的其他参数
+
+        Returns:
+            HTTP响应（非限流响应）
+
+        Raises:
+            ThrottledError: 重试次数用尽后仍被限流
+            FetchFailedError: 重试次数用尽后仍然网络错误
+        """
+        kwargs.setdefault("timeout", self.timeout)
+        last_error: Optional[Exception] = None
+
+        for attempt in range(self.max_retries + 1):
+            if attempt > 0:
+                self._count("retries")
+                wait_time = self.backoff_delay(attempt - 1)
+                print(f"第 {attempt} 次重试，等待 {wait_time:.1f} 秒（当前并发上限: {self.concurrency_limit}）")
+                time.sleep(wait_time)
+
+            self._acquire()
+            start = time.monotonic()
+            try:
+                self._count("requests")
+                response = self.session.get(url, headers=headers, **kwargs)
+            except (requests.exceptions.Timeout, requests.exceptions.ConnectionError) as e:
+                self._count("errors")
+                self._on_congestion()
+                last_error = e
+                continue
+            finally:
+                self._release()
+
+            if is_throttle_response(response):
+                self._count("throttled")
+                self._on_congestion()
+                last_error = ThrottledError(f"请求被限流 (状态码 {response.status_code}): {url}")
+                continue
+
+            self._count("success")
+            self._on_success(time.monotonic() - start)
+            return response
+
+        if isinstance(last_error, ThrottledError):
+            raise last_error
+        raise FetchFailedError(f"获取页面失败，已达到最大重试次数: {last_error}")
+
+# 进程内共享的默认调度器
+_default_scheduler: Optional[FetchScheduler] = None
+_default_lock = threading.Lock()
+
+def get_default_scheduler() -> FetchScheduler:
+    """获取进程内共享的默认调度器"""
+    global _default_scheduler
+    with _default_lock:
+        if _default_scheduler is None:
+            _default_scheduler = FetchScheduler()
+        return _default_scheduler
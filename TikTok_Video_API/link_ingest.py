@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+抖音链接流式提取模块
+从文件或标准输入中增量读取文本（适用于数百MB的聊天记录导出文件），
+用一个预编译的正则表达式单遍提取链接，并用布隆过滤器 + LRU 缓存在有限内存内去重
+"""
+
+import argparse
+import hashlib
+import math
+import re
+import sys
+from collections import OrderedDict
+from typing import IO, Dict, Iterable, Iterator, List, Optional, Union
+
+# 单个预编译正则，按优先级依次匹配：
+#   share  - v.douyin.com 短链接或 www.iesdouyin.com 分享页链接
+#   douyin - 其他包含 douyin 的链接（仅在整段文本中没有分享链接时使用）
+#   other  - 任意URL（仅在整段文本中没有任何抖音链接时作为兜底）
+# other 遇到内嵌的 "http(s)://" 即停止，内嵌的抖音链接（如跳转参数中的分享链接）会被单独匹配
+URL_PATTERN = re.compile(
+    r'(?P<share>https?://(?:v\.douyin\.com|www\.iesdouyin\.com/share/video)/[\w\-.?=&/]+)'
+    r'|(?P<douyin>https?://[\w\-.?=&/]*douyin[\w\-.?=&/]+)'
+    r'|(?P<other>https?://(?:(?!https?://)(?:[a-zA-Z]|[0-9]|[$-_@.&+]|[!*\(\),]|(?:%[0-9a-fA-F][0-9a-fA-F])))+)'
+)
+
+# 每次读取的字符数
+CHUNK_SIZE = 1 << 20
+
+# 块末尾保留的字符数，保证被切断的 "https://" 前缀能在下一块中重新匹配
+PREFIX_OVERLAP = len("https://")
+
+# 超过该长度仍未结束的匹配视为异常数据，直接丢弃
+MAX_URL_LENGTH = 4096
+
+# 每个兜底层级（其他抖音链接、任意URL）最多缓存的条数
+MAX_FALLBACK_URLS = 1000
+
+class BloomFilter:
+    """定长位数组的布隆过滤器"""
+
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.001):
+        # m = -n*ln(p)/(ln2)^2, k = m/n*ln2
+        self.size = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+
+    def _positions(self, item: str) -> Iterator[int]:
+        # 双重哈希：用一次 blake2b 摘要派生出 k 个位置
+        digest = hashlib.blake2b(item.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        for i in range(self.hash_count):
+            yield (h1 + i * h2) % self.size
+
+    def add(self, item: str):
+        for pos in self._positions(item):
+            self.bits[pos >> 3] |= 1 << (pos & 7)
+
+    def __contains__(self, item: str) -> bool:
+        return all(self.bits[pos >> 3] & (1 << (pos & 7)) for pos in self._positions(item))
+
+class LinkDeduper:
+    """
+    有限内存的链接去重器
+
+    最近出现的链接保存在LRU缓存中做精确判断，更早的链接只记录在布隆过滤器中。
+    布隆过滤器存在极小的误判率（把新链接当成重复），但不会漏判重复链接
+    """
+
+    def __init__(self, capacity: int = 1_000_000, error_rate: float = 0.001, lru_size: int = 10000):
+        self.bloom = BloomFilter(capacity, error_rate)
+        self.lru_size = lru_size
+        self._recent: "OrderedDict[str, None]" = OrderedDict()
+
+    def seen(self, url: str) -> bool:
+        """
+        判断链接是否已出现过，并记录该链接
+
+        Args:
+            url: 链接
+
+        Returns:
+            之前是否出现过
+        """
+        if url in self._recent:
+            self._recent.move_to_end(url)
+            return True
+
+        duplicate = url in self.bloom
+        self.bloom.add(url)
+        self._recent[url] = None
+        if len(self._recent) > self.lru_size:
+            self._recent.popitem(last=False)
+        return duplicate
+
+class ExactDeduper:
+    """基于集合的精确去重器，适用于已完整读入内存的短文本"""
+
+    def __init__(self):
+        self._seen = set()
+
+    def seen(self, url: str) -> bool:
+        if url in self._seen:
+            return True
+        self._seen.add(url)
+        return False
+
+def iter_matches(chunks: Iterable[str]) -> Iterator[re.Match]:
+    """
+    在连续的文本块上单遍匹配链接，正确处理跨块边界的链接
+
+    Args:
+        chunks: 文本块
+
+    Yields:
+        正则匹配结果
+    """
+    carry = ""
+    for chunk in chunks:
+        buf = carry + chunk
+        keep_from = max(0, len(buf) - PREFIX_OVERLAP)
+        for match in URL_PATTERN.finditer(buf):
+            if match.end() == len(buf):
+                # 链接可能延续到下一块，留到下一轮匹配
+                keep_from = match.start() if len(buf) - match.start() <= MAX_URL_LENGTH else len(buf)
+                break
+            yield match
+            keep_from = max(match.end(), len(buf) - PREFIX_OVERLAP)
+        carry = buf[keep_from:]
+
+    # 输入结束，剩余部分中的链接都是完整的
+    yield from URL_PATTERN.finditer(carry)
+
+def iter_chunks(stream: IO[str], chunk_size: int = CHUNK_SIZE) -> Iterator[str]:
+    """按固定大小增量读取文本流"""
+    while True:
+        chunk = stream.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+def iter_douyin_urls(chunks: Iterable[str], deduper: Optional[Union[LinkDeduper, ExactDeduper]] = None) -> Iterator[str]:
+    """
+    从文本块中流式提取去重后的抖音链接
+
+    与原 extract_douyin_urls 的分级规则一致：分享链接在匹配到后立即产出；
+    其他抖音链接只在整个输入中没有分享链接时产出，普通URL只在没有任何抖音链接时产出。
+    这两级兜底要读完输入才能确定，最多各缓存 MAX_FALLBACK_URLS 条
+
+    Args:
+        chunks: 文本块
+        deduper: 去重器，为None时新建一个
+
+    Yields:
+        抖音链接
+    """
+    if deduper is None:
+        deduper = LinkDeduper()
+
+    found_share = False
+    fallback: Dict[str, List[str]] = {"douyin": [], "other": []}
+
+    for match in iter_matches(chunks):
+        url = match.group(0)
+        if match.lastgroup != "share":
+            if not found_share and len(fallback[match.lastgroup]) < MAX_FALLBACK_URLS:
+                fallback[match.lastgroup].append(url)
+            continue
+        found_share = True
+        if not deduper.seen(url):
+            yield url
+
+    if not found_share:
+        for url in fallback["douyin"] or fallback["other"]:
+            if not deduper.seen(url):
+                yield url
+
+def iter_links_from_source(source: Union[str, IO[str]], deduper: Optional[LinkDeduper] = None) -> Iterator[str]:
+    """
+    从文件路径、"-"（标准输入）或已打开的文本流中流式提取抖音链接
+
+    Args:
+        source: 文件路径、"-" 或文本流
+        deduper: 去重器
+
+    Yields:
+        抖音链接
+    """
+    if source == "-":
+        yield from iter_douyin_urls(iter_chunks(sys.stdin), deduper)
+    elif isinstance(source, str):
+        with open(source, "r", encoding="utf-8", errors="replace") as f:
+            yield from iter_douyin_urls(iter_chunks(f), deduper)
+    else:
+        yield from iter_douyin_urls(iter_chunks(source), deduper)
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="从大文本文件中流式提取抖音链接并逐个下载")
+    parser.add_argument("sources", nargs="*", default=["-"], help="输入文件路径，\"-\" 表示标准输入（默认）")
+    parser.add_argument("--list-only", action="store_true", help="只输出提取到的链接，不下载")
+    parser.add_argument("--capacity", type=int, default=1_000_000, help="去重器预计容纳的链接数（默认: 1000000）")
+
+    args = parser.parse_args()
+
+    # 多个输入文件共用一个去重器
+    deduper = LinkDeduper(capacity=args.capacity)
+    links = (url for source in args.sources for url in iter_links_from_source(source, deduper))
+
+    if args.list_only:
+        for url in links:
+            print(url)
+        return None
+
+    import download_douyin_video
+    return download_douyin_video.download_links(links)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,427 @@
+#!/usr/bin/env python3
+"""
+流水线负载测试
+启动本地模拟的抖音服务（短链接跳转、分享页、视频文件）和DeepSeek接口，按目标到达率（泊松过程）提交链接，
+每个链接依次经过下载、转录、分析三个阶段，各阶段有独立的等待队列和工作线程。
+报告端到端延迟的P50/P95/P99、各阶段的队列长度和利用率，逐步提高到达率找出饱和点和瓶颈阶段。
+可以同时以固定到达率提交急用链接（interactive），各阶段优先处理并可为其预留工作线程，分别报告两类链接的延迟
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import random
+import tempfile
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Dict, List, Optional
+
+from local_standin import DeepSeekStandin, DouyinStandin
+from work_queue import DEFAULT_PRIORITY, PRIORITY_CLASSES, percentile
+
+STAGES = ["download", "transcribe", "analyze"]
+
+# 队列长度采样间隔（秒）
+SAMPLE_INTERVAL = 0.1
+
+# 吞吐量低于到达率的该比例，或某阶段利用率达到 SATURATION_UTILIZATION 时视为饱和
+SATURATION_THROUGHPUT = 0.9
+SATURATION_UTILIZATION = 0.95
+
+# 模拟转录文本：按视频时长每秒生成的字数
+TRANSCRIPT_CHARS_PER_SECOND = 4
+
+class Stage:
+    """
+    流水线的一个阶段：每个优先级一个等待队列，以及若干工作线程
+
+    工作线程每处理完一个条目都从最高优先级的队列重新取（在条目边界抢占）；
+    前 reserved 个线程只处理 interactive 条目，批量条目再多也不会占满所有线程。
+    处理函数接收上一阶段的结果，返回值传给下一阶段；抛出异常时该条目记为失败
+    """
+
+    def __init__(self, name: str, process: Callable[[Any], Any], workers: int, reserved: int = 0):
+        if reserved >= workers:
+            raise ValueError(f"{name} 阶段预留的线程数必须小于线程总数")
+        self.name = name
+        self.process = process
+        self.workers = workers
+        self.reserved = reserved
+        self.lanes: Dict[str, deque] = {priority: deque() for priority in PRIORITY_CLASSES}
+        self.next_stage: Optional["Stage"] = None
+        self.on_done: Optional[Callable[[Dict[str, Any]], None]] = None
+
+        self._lock = threading.Lock()
+        self._available = threading.Condition(self._lock)
+        self._stopping = False
+        self._threads: List[threading.Thread] = []
+        self.busy = 0
+        self.busy_time = 0.0
+        self.waits: List[float] = []
+        self.services: List[float] = []
+        self.depth_samples: List[int] = []
+
+    def start(self):
+        self._stopping = False
+        for i in range(self.workers):
+            lanes = PRIORITY_CLASSES[:1] if i < self.reserved else PRIORITY_CLASSES
+            thread = threading.Thread(target=self._run, args=(lanes,), daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self):
+        with self._available:
+            self._stopping = True
+            self._available.notify_all()
+        for thread in self._threads:
+            thread.join()
+        self._threads = []
+
+    def submit(self, item: Dict[str, Any]):
+        item["queued_at"] = time.perf_counter()
+        with self._available:
+            self.lanes[item.get("priority", DEFAULT_PRIORITY)].append(item)
+            self._available.notify_all()
+
+    def depth(self) -> int:
+        """排队中和处理中的条目数"""
+        with self._lock:
+            return sum(len(lane) for lane in self.lanes.values()) + self.busy
+
+    def _take(self, lanes: tuple) -> Optional[Dict[str, Any]]:
+        """按优先级从高到低取一个条目，停止时返回None"""
+        with self._available:
+            while True:
+                for priority in lanes:
+                    if self.lanes[priority]:
+                        item = self.lanes[priority].popleft()
+                        self.busy += 1
+                        self.waits.append(time.perf_counter() - item["queued_at"])
+                        return item
+                if self._stopping:
+                    return None
+                self._available.wait()
+
+    def _run(self, lanes: tuple):
+        while True:
+            item = self._take(lanes)
+            if item is None:
+                return
+            start = time.perf_counter()
+            try:
+                item["value"] = self.process(item["value"])
+            except Exception as e:
+                item["error"] = f"{self.name}: {e}"
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.busy -= 1
+                self.busy_time += elapsed
+                self.services.append(elapsed)
+
+            if self.next_stage is not None and "error" not in item:
+                self.next_stage.submit(item)
+            else:
+                item["finished_at"] = time.perf_counter()
+                self.on_done(item)
+
+class Pipeline:
+    """按顺序连接的多个阶段"""
+
+    def __init__(self, stages: List[Stage]):
+        self.stages = stages
+        for stage, next_stage in zip(stages, stages[1:] + [None]):
+            stage.next_stage = next_stage
+            stage.on_done = self._done
+        self.finished: List[Dict[str, Any]] = []
+        self._lock = threading.Lock()
+        self._all_done = threading.Condition(self._lock)
+        self.submitted = 0
+
+    def _done(self, item: Dict[str, Any]):
+        with self._all_done:
+            self.finished.append(item)
+            self._all_done.notify_all()
+
+    def submit(self, value: Any, priority: str = DEFAULT_PRIORITY):
+        with self._lock:
+            self.submitted += 1
+        self.stages[0].submit({"value": value, "arrived_at": time.perf_counter(), "priority": priority})
+
+    def wait(self, timeout: float) -> bool:
+        """等待所有已提交的条目处理完成"""
+        deadline = time.monotonic() + timeout
+        with self._all_done:
+            while len(self.finished) < self.submitted:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._all_done.wait(remaining)
+        return True
+
+@contextlib.contextmanager
+def pipeline_environment(douyin: DouyinStandin, deepseek: DeepSeekStandin, work_dir: str):
+    """
+    把下载和分析模块指向本地模拟服务，视频文件和数据库写入临时目录，退出时恢复原配置
+    """
+    import analyze_transcript
+    import artifact_store
+    import download_douyin_video
+    import fetch_scheduler
+    import metadata_store
+
+    overrides = [
+        (artifact_store, "ARTIFACT_DIR", os.path.join(work_dir, "artifacts")),
+        (artifact_store, "ARTIFACT_DB", os.path.join(work_dir, "db", "artifacts.db")),
+        (download_douyin_video, "SHORT_LINK_HOST", f"127.0.0.1:{douyin.port}/s/"),
+        (download_douyin_video, "SHARE_VIDEO_URL", f"{douyin.base_url}/share/video/{{video_id}}"),
+        (download_douyin_video, "SHARE_NOTE_URL", f"{douyin.base_url}/share/note/{{video_id}}"),
+        (download_douyin_video, "VIDEO_DIR", os.path.join(work_dir, "video")),
+        (metadata_store, "DB_PATH", os.path.join(work_dir, "db", "metadata.db")),
+        (analyze_transcript, "DEEPSEEK_API_URL", deepseek.api_url),
+        (analyze_transcript, "DEEPSEEK_API_KEY", "standin"),
+        # 每轮测试使用新的抓取调度器，不继承上一轮的并发窗口
+        (fetch_scheduler, "_default_scheduler", None),
+    ]
+    saved = [(module, name, getattr(module, name)) for module, name, _ in overrides]
+    for module, name, value in overrides:
+        setattr(module, name, value)
+    try:
+        yield
+    finally:
+        for module, name, value in saved:
+            setattr(module, name, value)
+
+def build_pipeline(download_workers: int, transcribe_workers: int, analyze_workers: int,
+                   rtf: float, reserved: int = 0) -> Pipeline:
+    """
+    创建 下载 → 转录 → 分析 流水线，各阶段为 interactive 条目预留 reserved 个线程
+    （线程总数只有1个的阶段不预留）
+
+    下载阶段调用 process_multiple_links（短链接跳转、分享页解析、视频下载、写入元数据），
+    分析阶段调用 analyze_with_deepseek；模拟服务返回的视频文件无法解码，
+    转录阶段按视频时长乘以实时率 rtf 模拟Whisper的耗时
+    """
+    import analyze_transcript
+    import download_douyin_video
+    from metadata_store import MetadataStore
+
+    def download(link: str) -> Dict[str, Any]:
+        files = download_douyin_video.process_multiple_links(link)
+        if not files:
+            raise Exception("下载失败")
+        with MetadataStore() as store:
+            record = store.find_by_file(files[0])
+        return {"video": files[0], "duration": (record or {}).get("duration") or 0.0}
+
+    def transcribe(video: Dict[str, Any]) -> str:
+        time.sleep(video["duration"] * rtf)
+        return "模拟转录文本。" * max(1, int(video["duration"] * TRANSCRIPT_CHARS_PER_SECOND / 7))
+
+    def analyze(transcript: str) -> str:
+        return analyze_transcript.analyze_with_deepseek(transcript)
+
+    return Pipeline([
+        Stage("download", download, download_workers, min(reserved, download_workers - 1)),
+        Stage("transcribe", transcribe, transcribe_workers, min(reserved, transcribe_workers - 1)),
+        Stage("analyze", analyze, analyze_workers, min(reserved, analyze_workers - 1)),
+    ])
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    """延迟的条目数和P50/P95/P99"""
+    return {"count": len(latencies), "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95), "p99": percentile(latencies, 0.99)}
+
+def run_load(douyin: DouyinStandin, pipeline: Pipeline, rate: float, duration: float,
+             drain_timeout: float = 120.0, seed: int = 0, interactive_rate: float = 0.0) -> Dict[str, Any]:
+    """
+    按到达率 rate（个/秒）提交批量链接、interactive_rate 提交急用链接 duration 秒，等待处理完成后统计结果
+
+    Returns:
+        包含到达率、吞吐量、延迟分位数（总体和各优先级）和各阶段统计的字典
+    """
+    rng = random.Random(seed)
+    stop_sampling = threading.Event()
+
+    def sample():
+        while not stop_sampling.wait(SAMPLE_INTERVAL):
+            for stage in pipeline.stages:
+                stage.depth_samples.append(stage.depth())
+
+    for stage in pipeline.stages:
+        stage.start()
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+
+    start = time.perf_counter()
+    next_arrival = start
+    count = 0
+    total_rate = rate + interactive_rate
+    while True:
+        # 泊松到达：间隔服从指数分布；两个泊松流合并后仍是泊松流，每个到达按比例随机归类
+        next_arrival += rng.expovariate(total_rate)
+        if next_arrival - start > duration:
+            break
+        time.sleep(max(0.0, next_arrival - time.perf_counter()))
+        count += 1
+        priority = PRIORITY_CLASSES[0] if rng.random() * total_rate < interactive_rate else DEFAULT_PRIORITY
+        pipeline.submit(douyin.short_link(f"{int(rate * 1000)}{count:06d}"), priority)
+    arrivals_end = time.perf_counter()
+
+    # 到达结束时各阶段仍在排队的数量，持续增长说明处理能力跟不上
+    backlog = {stage.name: stage.depth() for stage in pipeline.stages}
+    drained = pipeline.wait(drain_timeout)
+    end = time.perf_counter()
+    stop_sampling.set()
+    sampler.join()
+    for stage in pipeline.stages:
+        stage.stop()
+
+    finished = list(pipeline.finished)
+    completed = [item for item in finished if "error" not in item]
+    latencies = [item["finished_at"] - item["arrived_at"] for item in completed]
+    last_finish = max((item["finished_at"] for item in finished), default=end)
+    wall = max(1e-9, last_finish - start)
+    # 吞吐量不计流水线的填充时间（最短端到端延迟），否则短时间测试会低估吞吐量
+    throughput = len(completed) / max(1e-9, wall - min(latencies, default=0.0))
+
+    stages = {}
+    for stage in pipeline.stages:
+        stages[stage.name] = {
+            "workers": stage.workers,
+            "reserved": stage.reserved,
+            "utilization": stage.busy_time / (stage.workers * wall),
+            "mean_depth": sum(stage.depth_samples) / len(stage.depth_samples) if stage.depth_samples else 0.0,
+            "max_depth": max(stage.depth_samples, default=0),
+            "backlog": backlog[stage.name],
+            "mean_wait": sum(stage.waits) / len(stage.waits) if stage.waits else 0.0,
+            "mean_service": sum(stage.services) / len(stage.services) if stage.services else 0.0,
+        }
+
+    classes = {priority: latency_summary([item["finished_at"] - item["arrived_at"] for item in completed
+                                          if item["priority"] == priority])
+               for priority in PRIORITY_CLASSES}
+
+    return {
+        "rate": rate,
+        "interactive_rate": interactive_rate,
+        "offered": count / max(1e-9, arrivals_end - start),
+        "submitted": count,
+        "completed": len(completed),
+        "errors": [item["error"] for item in finished if "error" in item],
+        "drained": drained,
+        "throughput": throughput,
+        "p50": percentile(latencies, 0.50),
+        "p95": percentile(latencies, 0.95),
+        "p99": percentile(latencies, 0.99),
+        "classes": classes,
+        "stages": stages,
+    }
+
+def is_saturated(result: Dict[str, Any]) -> bool:
+    """吞吐量跟不上到达率、有条目未处理完或某阶段接近满负荷"""
+    if not result["drained"] or result["throughput"] < SATURATION_THROUGHPUT * result["offered"]:
+        return True
+    return any(stage["utilization"] >= SATURATION_UTILIZATION for stage in result["stages"].values())
+
+def bottleneck(result: Dict[str, Any]) -> str:
+    """利用率最高的阶段"""
+    return max(result["stages"], key=lambda name: result["stages"][name]["utilization"])
+
+def print_result(result: Dict[str, Any]):
+    """打印一轮测试的结果"""
+    print(f"\n到达率 {result['rate']:.2f} 个/秒（实际 {result['offered']:.2f}）: "
+          f"提交 {result['submitted']}，完成 {result['completed']}，失败 {len(result['errors'])}，"
+          f"吞吐量 {result['throughput']:.2f} 个/秒")
+    print(f"  端到端延迟 P50 {result['p50']:.2f} 秒  P95 {result['p95']:.2f} 秒  P99 {result['p99']:.2f} 秒")
+    if result.get("interactive_rate"):
+        for priority, summary in result["classes"].items():
+            print(f"    {priority:12s} 完成 {summary['count']:4d}  P50 {summary['p50']:.2f} 秒  "
+                  f"P95 {summary['p95']:.2f} 秒  P99 {summary['p99']:.2f} 秒")
+    for name, stage in result["stages"].items():
+        print(f"  {name:10s} 线程 {stage['workers']:2d}（预留 {stage['reserved']}）  利用率 {stage['utilization'] * 100:5.1f}%  "
+              f"平均队列 {stage['mean_depth']:5.1f}  最大队列 {stage['max_depth']:4d}  到达结束时积压 {stage['backlog']:4d}  "
+              f"平均等待 {stage['mean_wait']:.2f} 秒  平均处理 {stage['mean_service']:.2f} 秒")
+    for error in sorted(set(result["errors"]))[:5]:
+        print(f"  错误: {error}")
+    if not result["drained"]:
+        print("  ✗ 超时仍有条目未处理完成")
+
+def run_sweep(rates: List[float], duration: float, args: argparse.Namespace) -> List[Dict[str, Any]]:
+    """
+    依次以各到达率运行负载测试，报告饱和点
+
+    Returns:
+        每个到达率的测试结果
+    """
+    douyin = DouyinStandin(capacity=args.capacity, latency=args.page_latency, media_size=args.media_size,
+                           bandwidth=args.bandwidth, duration=args.video_duration)
+    deepseek = DeepSeekStandin(latency=args.llm_latency, slow_rate=args.llm_slow_rate,
+                               slow_latency=args.llm_slow_latency)
+
+    print("=" * 50)
+    print("流水线负载测试")
+    print("=" * 50)
+    print(f"视频大小 {args.media_size / 1024 / 1024:.1f} MB，"
+          f"带宽 {'不限' if not args.bandwidth else f'{args.bandwidth / 1024 / 1024:.1f} MB/秒'}，"
+          f"视频时长 {args.video_duration:.0f} 秒，转录实时率 {args.rtf}，DeepSeek延迟 {args.llm_latency} 秒")
+    if args.interactive_rate:
+        print(f"急用链接到达率 {args.interactive_rate} 个/秒，每个阶段预留 {args.reserved} 个线程")
+
+    results = []
+    with douyin, deepseek, tempfile.TemporaryDirectory() as work_dir, \
+            pipeline_environment(douyin, deepseek, work_dir):
+        for rate in rates:
+            pipeline = build_pipeline(args.download_workers, args.transcribe_workers, args.analyze_workers, args.rtf,
+                                      args.reserved)
+            # 各模块的进度输出很多，测试期间不显示
+            output = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+            with output:
+                result = run_load(douyin, pipeline, rate, duration, args.drain_timeout,
+                                  interactive_rate=args.interactive_rate)
+            results.append(result)
+            print_result(result)
+
+    saturated = next((result for result in results if is_saturated(result)), None)
+    print("\n" + "=" * 50)
+    if saturated is None:
+        print(f"测试的到达率范围内未饱和（最高 {rates[-1]:.2f} 个/秒）")
+    else:
+        stable = [result["rate"] for result in results if not is_saturated(result)]
+        print(f"饱和点: 到达率 {saturated['rate']:.2f} 个/秒，瓶颈阶段: {bottleneck(saturated)}")
+        if stable:
+            print(f"最高稳定到达率: {max(stable):.2f} 个/秒")
+    print("=" * 50)
+    return results
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="使用本地模拟服务对下载、转录、分析流水线进行负载测试")
+    parser.add_argument("-r", "--rates", default="0.5,1,2,4", help="逐步测试的到达率，逗号分隔（个/秒，默认: 0.5,1,2,4）")
+    parser.add_argument("-d", "--duration", type=float, default=20.0, help="每个到达率的提交时长（秒，默认: 20）")
+    parser.add_argument("--download-workers", type=int, default=4, help="下载线程数（默认: 4）")
+    parser.add_argument("--transcribe-workers", type=int, default=1, help="转录线程数（默认: 1）")
+    parser.add_argument("--analyze-workers", type=int, default=4, help="分析线程数（默认: 4）")
+    parser.add_argument("--interactive-rate", type=float, default=0.0,
+                        help="同时提交的急用链接到达率（个/秒，默认: 0），单独报告其延迟")
+    parser.add_argument("--reserved", type=int, default=0, help="每个阶段为急用链接预留的线程数（默认: 0）")
+    parser.add_argument("--capacity", type=int, default=8, help="模拟抖音分享页的并发上限（默认: 8）")
+    parser.add_argument("--page-latency", type=float, default=0.05, help="分享页延迟（秒，默认: 0.05）")
+    parser.add_argument("--media-size", type=int, default=2 * 1024 * 1024, help="视频文件大小（字节，默认: 2MB）")
+    parser.add_argument("--bandwidth", type=float, default=8 * 1024 * 1024,
+                        help="每个连接的下载带宽（字节/秒，0表示不限，默认: 8MB/秒）")
+    parser.add_argument("--video-duration", type=float, default=15.0, help="视频时长（秒，默认: 15）")
+    parser.add_argument("--rtf", type=float, default=0.05, help="模拟转录的实时率（处理耗时/视频时长，默认: 0.05）")
+    parser.add_argument("--llm-latency", type=float, default=0.5, help="DeepSeek接口延迟（秒，默认: 0.5）")
+    parser.add_argument("--llm-slow-rate", type=float, default=0.0, help="DeepSeek慢请求比例（默认: 0）")
+    parser.add_argument("--llm-slow-latency", type=float, default=5.0, help="DeepSeek慢请求延迟（秒，默认: 5）")
+    parser.add_argument("--drain-timeout", type=float, default=120.0, help="提交结束后等待处理完成的最长时间（秒，默认: 120）")
+    parser.add_argument("-v", "--verbose", action="store_true", help="显示各模块的处理输出")
+    args = parser.parse_args()
+
+    rates = sorted(float(rate) for rate in args.rates.split(",") if rate.strip())
+    run_sweep(rates, args.duration, args)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,409 @@
+#!/usr/bin/env python3
+"""
+本地模拟服务
+在本机启动模拟抖音（短链接跳转、分享页、视频文件）和DeepSeek API的HTTP服务，用于在不访问真实服务的情况下
+测试抓取调度、限流处理、对冲请求和熔断等逻辑，以及进行整条流水线的负载测试
+"""
+
+import json
+import random
+import re
+import threading
+import time
+import zlib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional
+
+# 模拟的抖音验证页面
+CHALLENGE_PAGE = "<html><head><script>var _wafchallengeid='standin';</script></head><body>验证码</body></html>"
+
+# 模拟视频文件的文件头（MP4 ftyp box），其余内容用零填充
+MP4_HEADER = b"\x00\x00\x00\x18ftypmp42\x00\x00\x00\x00mp42isom"
+
+# 模拟图片文件的文件头（JPEG SOI + APP0）
+JPEG_HEADER = b"\xff\xd8\xff\xe0\x00\x10JFIF\x00"
+
+# 按带宽限速发送视频文件时每次写入的字节数
+MEDIA_CHUNK_SIZE = 64 * 1024
+
+def build_router_data(video_id: str, play_url: Optional[str] = None, duration: float = 15.0,
+                      statistics: Optional[Dict[str, int]] = None,
+                      images: Optional[List[str]] = None) -> Dict[str, Any]:
+    """
+    构造与抖音分享页结构一致的 _ROUTER_DATA 数据
+
+    Args:
+        video_id: 视频ID
+        play_url: 视频文件地址（带水印参数），默认为相对路径 /media/<id>.mp4
+        duration: 视频时长（秒）
+        statistics: 互动数据，默认为固定的点赞100、评论10、播放1000
+        images: 图片地址，不为空时构造图集（note）页面，其中没有视频信息
+    """
+    item = {
+        "desc": f"模拟{'图集' if images else '视频'} {video_id}",
+        "author": {"nickname": "模拟作者"},
+        "statistics": statistics or {"digg_count": 100, "comment_count": 10, "play_count": 1000},
+    }
+    if images:
+        item["images"] = [{"url_list": [url], "width": 1080, "height": 1440} for url in images]
+    else:
+        item["video"] = {
+            "play_addr": {"url_list": [play_url or f"/media/{video_id}.mp4?playwm=1"]},
+            "duration": int(duration * 1000),
+        }
+    page_key = "note_(id)/page" if images else "video_(id)/page"
+    return {"loaderData": {page_key: {"videoInfoRes": {"item_list": [item]}}}}
+
+def build_share_page(video_id: str, play_url: Optional[str] = None, duration: float = 15.0,
+                     statistics: Optional[Dict[str, int]] = None, images: Optional[List[str]] = None) -> str:
+    """构造包含 _ROUTER_DATA 的分享页HTML"""
+    router_data = json.dumps(build_router_data(video_id, play_url, duration, statistics, images), ensure_ascii=False)
+    return f"<html><body><script>window._ROUTER_DATA = {router_data}</script></body></html>"
+
+class StandinServer:
+    """在后台线程中运行的本地HTTP服务，子类实现 handle 处理请求"""
+
+    port = 0
+    _server: Optional[ThreadingHTTPServer] = None
+    _thread: Optional[threading.Thread] = None
+
+    @property
+    def base_url(self) -> str:
+        """服务根地址"""
+        return f"http://127.0.0.1:{self.port}"
+
+    def handle(self, handler: BaseHTTPRequestHandler):
+        """处理单个请求"""
+        raise NotImplementedError
+
+    @staticmethod
+    def _send(handler: BaseHTTPRequestHandler, status: int, body: str,
+              content_type: str = "text/html; charset=utf-8", headers: Optional[Dict[str, str]] = None):
+        data = body.encode("utf-8")
+        handler.send_response(status)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            handler.send_header(name, value)
+        handler.end_headers()
+        handler.wfile.write(data)
+
+    def start(self):
+        """在后台线程中启动服务"""
+        standin = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                standin.handle(self)
+
+            def do_POST(self):
+                standin.handle(self)
+
+            def log_message(self, format, *args):
+                pass
+
+        self._server = ThreadingHTTPServer(("127.0.0.1", self.port), Handler)
+        self._server.daemon_threads = True
+        self.port = self._server.server_address[1]
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        """停止服务"""
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+class DouyinStandin(StandinServer):
+    """
+    模拟抖音服务
+
+    - /s/<id>/: 短链接，302跳转到 /share/video/<id>/（图集跳转到 /share/note/<id>/）
+    - /share/video/<id>: 返回包含 _ROUTER_DATA 的分享页，其中的视频地址为本服务的绝对地址；
+      响应带 ETag，请求的 If-None-Match 与之相同时返回 304，互动数据可以用 set_statistics 修改
+    - /share/note/<id>: 用 add_note 添加的图集分享页
+    - /image/<id>_<序号>.jpeg: 返回 image_size 字节的图片，每张延迟 image_latency 秒
+    - /media/<id>.mp4 或 .mp3: 返回 media_size 字节的视频或音频文件，
+      bandwidth 不为None时按每个连接 bandwidth 字节/秒限速发送
+    - 分享页同时处理的请求数超过 capacity，或每秒请求数超过 rate_limit 时，
+      按 throttle_mode 返回 429 或验证页面，模拟真实的限流行为
+    """
+
+    def __init__(self,
+                 capacity: int = 4,
+                 rate_limit: Optional[float] = None,
+                 latency: float = 0.05,
+                 throttle_mode: str = "429",
+                 media_size: int = 1024 * 1024,
+                 bandwidth: Optional[float] = None,
+                 duration: float = 15.0,
+                 image_size: int = 64 * 1024,
+                 image_latency: float = 0.05,
+                 port: int = 0):
+        self.capacity = capacity
+        self.rate_limit = rate_limit
+        self.latency = latency
+        self.throttle_mode = throttle_mode
+        self.media_size = media_size
+        self.bandwidth = bandwidth
+        self.duration = duration
+        self.image_size = image_size
+        self.image_latency = image_latency
+        self.port = port
+
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self._window_start = time.monotonic()
+        self._window_count = 0
+        self.statistics: Dict[str, Dict[str, int]] = {}
+        self.notes: Dict[str, List[str]] = {}
+        self._images_in_flight = 0
+        self.stats = {"requests": 0, "throttled": 0, "max_in_flight": 0, "redirects": 0, "media": 0, "media_bytes": 0,
+                      "not_modified": 0, "images": 0, "max_images_in_flight": 0}
+
+    def short_link(self, video_id: str) -> str:
+        """视频对应的短链接"""
+        return f"{self.base_url}/s/{video_id}/"
+
+    def add_note(self, video_id: str, image_count: int, duplicates: int = 0) -> List[str]:
+        """
+        添加一个图集作品
+
+        Args:
+            video_id: 作品ID
+            image_count: 图片数
+            duplicates: 额外重复出现的图片数（与第一张图片相同，只是签名参数不同）
+
+        Returns:
+            分享页中的图片地址
+        """
+        images = [f"{self.base_url}/image/{video_id}_{i}.jpeg?sig={i}" for i in range(image_count)]
+        images += [f"{self.base_url}/image/{video_id}_0.jpeg?sig=dup{i}" for i in range(duplicates)]
+        self.notes[video_id] = images
+        return images
+
+    def _send_image(self, handler: BaseHTTPRequestHandler):
+        """发送模拟的图片文件，统计同时下载的图片数"""
+        with self._lock:
+            self.stats["images"] += 1
+            self._images_in_flight += 1
+            self.stats["max_images_in_flight"] = max(self.stats["max_images_in_flight"], self._images_in_flight)
+        try:
+            time.sleep(self.image_latency)
+            handler.send_response(200)
+            handler.send_header("Content-Type", "image/jpeg")
+            handler.send_header("Content-Length", str(self.image_size))
+            handler.end_headers()
+            handler.wfile.write(JPEG_HEADER + bytes(max(0, self.image_size - len(JPEG_HEADER))))
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            with self._lock:
+                self._images_in_flight -= 1
+
+    def set_statistics(self, video_id: str, likes: int, comments: int, plays: int):
+        """修改视频分享页中的互动数据"""
+        with self._lock:
+            self.statistics[video_id] = {"digg_count": likes, "comment_count": comments, "play_count": plays}
+
+    def _should_throttle(self) -> bool:
+        """根据并发数和每秒请求数判断是否限流"""
+        with self._lock:
+            self.stats["requests"] += 1
+            now = time.monotonic()
+            if now - self._window_start >= 1.0:
+                self._window_start = now
+                self._window_count = 0
+            self._window_count += 1
+
+            over_rate = self.rate_limit is not None and self._window_count > self.rate_limit
+            if over_rate or self._in_flight >= self.capacity:
+                self.stats["throttled"] += 1
+                return True
+
+            self._in_flight += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self._in_flight)
+            return False
+
+    def _done(self):
+        with self._lock:
+            self._in_flight -= 1
+
+    def _count(self, key: str, value: int = 1):
+        with self._lock:
+            self.stats[key] += value
+
+    def _send_media(self, handler: BaseHTTPRequestHandler, path: str):
+        """发送模拟的视频或音频文件"""
+        self._count("media")
+        content_type = "audio/mpeg" if path.endswith(".mp3") else "video/mp4"
+        handler.send_response(200)
+        handler.send_header("Content-Type", content_type)
+        handler.send_header("Content-Length", str(self.media_size))
+        handler.end_headers()
+
+        header = MP4_HEADER[:self.media_size]
+        chunk = bytes(MEDIA_CHUNK_SIZE)
+        sent = 0
+        start = time.monotonic()
+        try:
+            handler.wfile.write(header)
+            sent = len(header)
+            while sent < self.media_size:
+                size = min(MEDIA_CHUNK_SIZE, self.media_size - sent)
+                handler.wfile.write(chunk[:size])
+                sent += size
+                if self.bandwidth:
+                    # 按累计发送量限速，避免逐块休眠的误差累积
+                    delay = sent / self.bandwidth - (time.monotonic() - start)
+                    if delay > 0:
+                        time.sleep(delay)
+        except (BrokenPipeError, ConnectionResetError):
+            pass
+        finally:
+            self._count("media_bytes", sent)
+
+    def handle(self, handler: BaseHTTPRequestHandler):
+        """处理单个请求"""
+        path = handler.path.split("?")[0]
+
+        if path.startswith("/s/"):
+            self._count("redirects")
+            video_id = path.strip("/").split("/")[-1]
+            page_type = "note" if video_id in self.notes else "video"
+            handler.send_response(302)
+            handler.send_header("Location", f"{self.base_url}/share/{page_type}/{video_id}/?region=CN")
+            handler.send_header("Content-Length", "0")
+            handler.end_headers()
+            return
+
+        if path.startswith("/media/"):
+            self._send_media(handler, path)
+            return
+
+        if path.startswith("/image/"):
+            self._send_image(handler)
+            return
+
+        if not path.startswith(("/share/video/", "/share/note/")):
+            handler.send_error(404)
+            return
+
+        if self._should_throttle():
+            if self.throttle_mode == "challenge":
+                self._send(handler, 200, CHALLENGE_PAGE)
+            else:
+                self._send(handler, 429, "Too Many Requests")
+            return
+
+        try:
+            time.sleep(self.latency)
+            video_id = path.strip("/").split("/")[-1]
+            play_url = f"{self.base_url}/media/{video_id}.mp4?playwm=1"
+            page = build_share_page(video_id, play_url, self.duration, self.statistics.get(video_id),
+                                    self.notes.get(video_id))
+            etag = f'"{zlib.crc32(page.encode("utf-8")):08x}"'
+            if handler.headers.get("If-None-Match") == etag:
+                self._count("not_modified")
+                handler.send_response(304)
+                handler.send_header("ETag", etag)
+                handler.end_headers()
+                return
+            self._send(handler, 200, page, headers={"ETag": etag})
+        finally:
+            self._done()
+
+class DeepSeekStandin(StandinServer):
+    """
+    模拟DeepSeek对话接口
+
+    - POST /v1/chat/completions: 正常请求延迟 latency 秒；按 slow_rate 的概率延迟 slow_latency 秒（模拟长尾），
+      按 error_rate 的概率返回 error_status（默认503）。属性可以在运行中修改，模拟上游逐渐变慢或故障
+    - 用户消息中包含带 id 的JSON数组（批量分析）时，返回对应的JSON数组
+    """
+
+    def __init__(self,
+                 latency: float = 0.05,
+                 slow_rate: float = 0.0,
+                 slow_latency: float = 5.0,
+                 error_rate: float = 0.0,
+                 error_status: int = 503,
+                 seed: int = 0,
+                 port: int = 0):
+        self.latency = latency
+        self.slow_rate = slow_rate
+        self.slow_latency = slow_latency
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.port = port
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+        self._in_flight = 0
+        self.stats = {"requests": 0, "slow": 0, "errors": 0, "max_in_flight": 0}
+
+    @property
+    def api_url(self) -> str:
+        """对话接口地址"""
+        return f"{self.base_url}/v1/chat/completions"
+
+    @staticmethod
+    def build_reply(payload: Dict[str, Any]) -> str:
+        """根据请求内容构造模拟的分析结果"""
+        content = payload["messages"][-1]["content"]
+        match = re.search(r"\[\s*\{.*\}\s*\]", content, re.S)
+        if match:
+            try:
+                items = json.loads(match.group(0))
+                return json.dumps([{"id": item["id"], "analysis": f"模拟分析结果 {item['id']}"} for item in items],
+                                  ensure_ascii=False)
+            except (json.JSONDecodeError, KeyError, TypeError):
+                pass
+        return "模拟分析结果"
+
+    def handle(self, handler: BaseHTTPRequestHandler):
+        """处理单个请求"""
+        if handler.command != "POST" or not handler.path.endswith("/chat/completions"):
+            handler.send_error(404)
+            return
+
+        length = int(handler.headers.get("Content-Length", 0))
+        payload = json.loads(handler.rfile.read(length) or b"{}")
+
+        with self._lock:
+            self.stats["requests"] += 1
+            self._in_flight += 1
+            self.stats["max_in_flight"] = max(self.stats["max_in_flight"], self._in_flight)
+            fail = self._random.random() < self.error_rate
+            slow = self._random.random() < self.slow_rate
+            if fail:
+                self.stats["errors"] += 1
+            elif slow:
+                self.stats["slow"] += 1
+
+        try:
+            time.sleep(self.slow_latency if slow and not fail else self.latency)
+            if fail:
+                self._send(handler, self.error_status, "Service Unavailable" if self.error_status == 503 else "Error")
+                return
+            body = {
+                "id": "standin",
+                "object": "chat.completion",
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": self.build_reply(payload)},
+                             "finish_reason": "stop"}],
+            }
+            self._send(handler, 200, json.dumps(body, ensure_ascii=False), "application/json")
+        except (BrokenPipeError, ConnectionResetError):
+            # 客户端已超时放弃
+            pass
+        finally:
+            with self._lock:
+                self._in_flight -= 1
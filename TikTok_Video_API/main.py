@@ -4,14 +4,16 @@
 整合下载、转文本、AI分析和文件清理功能
 """
 
+import argparse
 import os
 import sys
-import time
 from pathlib import Path
 
 # 添加当前目录到Python路径
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
+from profiler import add_profile_arguments, run_profiled, stage
+
 def print_header():
     """打印程序标题"""
     print("=" * 60)
@@ -86,17 +88,19 @@ def run_clean_module():
             "video": r"D:\test\TikTok_Video_API\video",
             "txt": r"D:\test\TikTok_Video_API\txt", 
             "json": r"D:\test\TikTok_Video_API\json",
-            "result": r"D:\test\TikTok_Video_API\result"
+            "result": r"D:\test\TikTok_Video_API\result",
+            "artifacts": r"D:\test\TikTok_Video_API\artifacts"
         }
-        clean_old_files.clean_old_files()
+        with stage("clean"):
+            clean_old_files.clean_old_files()
         print("清理完成")
         return True
     except Exception as e:
         print(f"清理模块执行失败: {str(e)}")
         return False
 
-def main():
-    """主函数"""
+def run_pipeline():
+    """依次执行下载、转文本、AI分析和清理"""
     print_header()
     
     # 获取用户输入
@@ -111,29 +115,27 @@ def main():
         print("下载模块执行失败，程序退出。")
         return
     
-    # 等待一段时间确保文件写入完成
-    time.sleep(2)
-    
     # 执行转文本模块
     if not run_transcribe_module():
         print("转文本模块执行失败，程序退出。")
         return
     
-    # 等待一段时间确保文件写入完成
-    time.sleep(2)
-    
     # 执行AI分析模块
     if not run_analysis_module():
         print("API调用模块执行失败，程序退出。")
         return
     
-    # 等待一段时间确保文件写入完成
-    time.sleep(2)
-    
     # 执行清理模块
     run_clean_module()
     
     print("结束保存至路径")
 
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="音视频自动化处理：下载、转文本、AI分析和文件清理")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    run_profiled(args, "main", run_pipeline)
+
 if __name__ == "__main__":
     main()
\ No newline at end of file
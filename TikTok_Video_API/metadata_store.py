@@ -0,0 +1,291 @@
+#!/usr/bin/env python3
+"""
+视频信息存储模块
+使用SQLite保存每次抓取到的视频信息快照（只追加，不覆盖），
+在 video_id、作者和抓取时间上建立索引，并提供简单的查询命令行
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+# 数据库路径（不放在 json 目录下，避免被清理脚本删除）
+DB_PATH = r"D:\test\TikTok_Video_API\db\metadata.db"
+
+# 单独存为列的字段，其余字段保存在 extra 中
+COLUMNS = ("video_id", "title", "author", "likes", "comments", "plays", "url")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS video_snapshots (
+    id INTEGER PRIMARY KEY,
+    video_id TEXT NOT NULL,
+    fetched_at REAL NOT NULL,
+    title TEXT,
+    author TEXT,
+    likes INTEGER,
+    comments INTEGER,
+    plays INTEGER,
+    url TEXT,
+    extra TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_snapshots_video ON video_snapshots(video_id, fetched_at);
+CREATE INDEX IF NOT EXISTS idx_snapshots_author ON video_snapshots(author, fetched_at);
+CREATE INDEX IF NOT EXISTS idx_snapshots_time ON video_snapshots(fetched_at);
+"""
+
+# 每个视频最新的一条快照
+LATEST_SQL = """
+SELECT s.* FROM video_snapshots s
+JOIN (SELECT video_id, MAX(fetched_at) AS fetched_at FROM video_snapshots GROUP BY video_id) latest
+  ON s.video_id = latest.video_id AND s.fetched_at = latest.fetched_at
+"""
+
+class MetadataStore:
+    """
+    只追加的视频信息存储
+
+    写入先进入内存缓冲区，达到 batch_size 条或调用 flush()/close() 时
+    在一个事务中批量提交，避免每条记录都触发一次磁盘同步
+    """
+
+    def __init__(self, db_path: Optional[str] = None, batch_size: int = 200):
+        # 默认路径在创建时读取，测试时可以修改模块的 DB_PATH
+        db_path = db_path or DB_PATH
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self._buffer: List[tuple] = []
+        self._lock = threading.Lock()
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        # WAL模式下提交只需顺序追加日志，NORMAL同步级别不会每次提交都fsync
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def add(self, video_info: Dict[str, Any], fetched_at: Optional[float] = None):
+        """
+        追加一条视频信息快照
+
+        Args:
+            video_info: parse_douyin_share_url 返回的视频信息
+            fetched_at: 抓取时间（Unix时间戳），默认为当前时间
+        """
+        if not video_info.get("video_id"):
+            raise ValueError("视频信息缺少 video_id")
+
+        extra = {k: v for k, v in video_info.items() if k not in COLUMNS and k != "fetched_at"}
+        row = (
+            str(video_info["video_id"]),
+            fetched_at if fetched_at is not None else time.time(),
+            video_info.get("title"),
+            video_info.get("author"),
+            video_info.get("likes"),
+            video_info.get("comments"),
+            video_info.get("plays"),
+            video_info.get("url"),
+            json.dumps(extra, ensure_ascii=False) if extra else None,
+        )
+
+        with self._lock:
+            self._buffer.append(row)
+            if len(self._buffer) >= self.batch_size:
+                self._flush_locked()
+
+    def _flush_locked(self):
+        if not self._buffer:
+            return
+        with self.conn:
+            self.conn.executemany(
+                "INSERT INTO video_snapshots (video_id, fetched_at, title, author, likes, comments, plays, url, extra) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                self._buffer,
+            )
+        self._buffer = []
+
+    def flush(self):
+        """提交缓冲区中的所有记录"""
+        with self._lock:
+            self._flush_locked()
+
+    def close(self):
+        """提交剩余记录并关闭数据库"""
+        self.flush()
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    @staticmethod
+    def _to_dict(row: sqlite3.Row) -> Dict[str, Any]:
+        record = dict(row)
+        extra = record.pop("extra", None)
+        record.pop("id", None)
+        if extra:
+            record.update(json.loads(extra))
+        return record
+
+    def _query(self, sql: str, params: tuple = ()) -> List[Dict[str, Any]]:
+        self.flush()
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def get_latest(self, video_id: str) -> Optional[Dict[str, Any]]:
+        """获取某个视频最新的一条快照"""
+        rows = self._query(
+            "SELECT * FROM video_snapshots WHERE video_id = ? ORDER BY fetched_at DESC LIMIT 1",
+            (video_id,),
+        )
+        return rows[0] if rows else None
+
+    def get_history(self, video_id: str) -> List[Dict[str, Any]]:
+        """获取某个视频的全部历史快照（按时间升序）"""
+        return self._query(
+            "SELECT * FROM video_snapshots WHERE video_id = ? ORDER BY fetched_at",
+            (video_id,),
+        )
+
+    def by_author(self, author: str, limit: int = 100) -> List[Dict[str, Any]]:
+        """获取某个作者的所有视频（每个视频取最新快照，按抓取时间倒序）"""
+        return self._query(
+            LATEST_SQL + " WHERE s.author = ? ORDER BY s.fetched_at DESC LIMIT ?",
+            (author, limit),
+        )
+
+    def top_liked(self, since: Optional[float] = None, limit: int = 20) -> List[Dict[str, Any]]:
+        """获取指定时间之后抓取的点赞数最多的视频"""
+        since = since if since is not None else 0.0
+        return self._query(
+            LATEST_SQL + " WHERE s.fetched_at >= ? ORDER BY s.likes DESC LIMIT ?",
+            (since, limit),
+        )
+
+    def known_durations(self) -> Dict[str, float]:
+        """
+        获取已下载文件的视频时长
+
+        Returns:
+            规范化的本地文件路径到视频时长（秒）的映射
+        """
+        self.flush()
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT json_extract(extra, '$.file'), json_extract(extra, '$.duration') FROM video_snapshots "
+                "WHERE json_extract(extra, '$.file') IS NOT NULL AND json_extract(extra, '$.duration') > 0"
+            ).fetchall()
+        return {os.path.normcase(os.path.normpath(path)): float(duration) for path, duration in rows}
+
+    def known_priorities(self) -> Dict[str, str]:
+        """
+        获取下载时指定了优先级的文件
+
+        Returns:
+            规范化的本地文件路径到优先级（如 interactive）的映射，未指定的文件不包含在内
+        """
+        self.flush()
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT json_extract(extra, '$.file'), json_extract(extra, '$.priority') FROM video_snapshots "
+                "WHERE json_extract(extra, '$.file') IS NOT NULL AND json_extract(extra, '$.priority') IS NOT NULL"
+            ).fetchall()
+        return {os.path.normcase(os.path.normpath(path)): priority for path, priority in rows}
+
+    def find_by_file(self, path: str) -> Optional[Dict[str, Any]]:
+        """
+        根据下载保存的本地文件路径查找视频最新的一条快照
+
+        Args:
+            path: 视频文件路径
+
+        Returns:
+            视频信息，找不到时返回None
+        """
+        name = os.path.basename(path.replace("\\", "/"))
+        rows = self._query(
+            "SELECT * FROM video_snapshots WHERE json_extract(extra, '$.file') LIKE ? ORDER BY fetched_at DESC",
+            ("%" + name,),
+        )
+        for record in rows:
+            if os.path.basename(record["file"].replace("\\", "/")) == name:
+                return record
+        return None
+
+    def import_json_dir(self, json_dir: str) -> int:
+        """
+        导入旧版 json 目录下每个视频一个的JSON文件
+
+        Args:
+            json_dir: json目录路径
+
+        Returns:
+            导入的记录数
+        """
+        count = 0
+        for file in sorted(Path(json_dir).glob("*.json")):
+            try:
+                with open(file, "r", encoding="utf-8") as f:
+                    video_info = json.load(f)
+                self.add(video_info, fetched_at=file.stat().st_mtime)
+                count += 1
+            except Exception as e:
+                print(f"导入文件 {file} 时出错: {e}")
+        self.flush()
+        return count
+
+def print_records(records: List[Dict[str, Any]]):
+    """以表格形式打印查询结果"""
+    if not records:
+        print("没有找到匹配的记录")
+        return
+    for record in records:
+        fetched = datetime.fromtimestamp(record["fetched_at"]).strftime("%Y-%m-%d %H:%M")
+        print(f"{fetched}  {record['video_id']}  点赞:{record['likes']}  评论:{record['comments']}  "
+              f"播放:{record['plays']}  {record['author']}  {record['title']}")
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="查询视频信息存储")
+    parser.add_argument("--db", default=DB_PATH, help=f"数据库路径（默认: {DB_PATH}）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    author_parser = subparsers.add_parser("author", help="查询某个作者的所有视频")
+    author_parser.add_argument("name", help="作者昵称")
+    author_parser.add_argument("-n", "--limit", type=int, default=100, help="最多显示条数（默认: 100）")
+
+    top_parser = subparsers.add_parser("top", help="查询点赞数最多的视频")
+    top_parser.add_argument("--days", type=float, default=7, help="只统计最近几天抓取的视频（默认: 7）")
+    top_parser.add_argument("-n", "--limit", type=int, default=20, help="最多显示条数（默认: 20）")
+
+    history_parser = subparsers.add_parser("history", help="查询某个视频的历史快照")
+    history_parser.add_argument("video_id", help="视频ID")
+
+    import_parser = subparsers.add_parser("import-json", help="导入旧版 json 目录中的视频信息文件")
+    import_parser.add_argument("json_dir", help="json目录路径")
+
+    args = parser.parse_args()
+
+    with MetadataStore(args.db) as store:
+        if args.command == "author":
+            print_records(store.by_author(args.name, args.limit))
+        elif args.command == "top":
+            print_records(store.top_liked(time.time() - args.days * 86400, args.limit))
+        elif args.command == "history":
+            print_records(store.get_history(args.video_id))
+        elif args.command == "import-json":
+            count = store.import_json_dir(args.json_dir)
+            print(f"共导入 {count} 条记录")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+按需性能分析
+运行时加上 --profile 后，对整个运行过程采样调用栈（包括工作线程）、用cProfile统计主线程的函数耗时、
+用tracemalloc记录各阶段的内存峰值。各模块用 stage() 标记阶段（如HTML解析、视频写入、Whisper、OpenCC、等待LLM），
+每个采样都归属到所在线程当前的阶段和条目，结束后输出：
+- <名称>.folded / <名称>_items.folded: 折叠调用栈（按阶段 / 按阶段和条目），可用 flamegraph.pl 或 speedscope 生成火焰图
+- <名称>.prof: cProfile统计，可用 snakeviz 或 pstats 查看
+- <名称>_summary.txt: 各阶段耗时、内存峰值和最热的函数
+未开启时 stage() 只返回一个共享的空上下文管理器，几乎没有额外开销
+"""
+
+import argparse
+import collections
+import contextlib
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+import tracemalloc
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional
+
+# 分析结果输出目录
+PROFILE_DIR = r"D:\test\TikTok_Video_API\profile"
+
+# 默认采样间隔（秒）
+SAMPLE_INTERVAL = 0.005
+
+# 摘要中显示的最热函数条数
+TOP_FUNCTIONS = 20
+
+# 条目名称的最大长度（如过长的链接）
+MAX_ITEM_CHARS = 60
+
+# 当前正在运行的分析器，为None时 stage() 不做任何事
+_active: Optional["Profiler"] = None
+
+_NULL_STAGE = contextlib.nullcontext()
+
+class _StageFrame:
+    """一个正在执行的阶段"""
+
+    __slots__ = ("name", "item", "start", "start_memory", "child_peak", "concurrent")
+
+    def __init__(self, name: str, item: Optional[str]):
+        self.name = name
+        self.item = item
+        self.start = time.perf_counter()
+        self.start_memory = 0
+        self.child_peak = 0
+        # 执行期间有其他线程也处于某个阶段中，内存峰值无法归属到本阶段
+        self.concurrent = False
+
+    @property
+    def label(self) -> str:
+        return f"{self.name}[{self.item}]" if self.item else self.name
+
+def _clean_label(text: str) -> str:
+    """折叠调用栈格式中帧名不能包含分号和换行"""
+    text = str(text).replace(";", ",").replace("\n", " ")
+    return text if len(text) <= MAX_ITEM_CHARS else text[:MAX_ITEM_CHARS - 3] + "..."
+
+class _Stage:
+    """stage() 在分析开启时返回的上下文管理器"""
+
+    def __init__(self, profiler: "Profiler", name: str, item: Optional[Any]):
+        self.profiler = profiler
+        self.frame = _StageFrame(_clean_label(name), _clean_label(item) if item is not None else None)
+
+    def __enter__(self):
+        self.profiler._enter(self.frame)
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.profiler._exit(self.frame)
+
+def stage(name: str, item: Optional[Any] = None):
+    """
+    标记一个处理阶段
+
+    阶段可以嵌套，嵌套的阶段名用 / 连接（如 download/parse_html）
+
+    Args:
+        name: 阶段名称
+        item: 正在处理的条目（如链接、文件名），用于按条目统计
+    """
+    profiler = _active
+    if profiler is None:
+        return _NULL_STAGE
+    return _Stage(profiler, name, item)
+
+def staged(name: str, func: Callable) -> Callable:
+    """
+    返回每次调用都计入 name 阶段的函数，用于频繁调用的小函数（如逐段的繁简转换）
+
+    分析未开启时直接返回原函数
+    """
+    if _active is None:
+        return func
+
+    def wrapper(*args, **kwargs):
+        with stage(name):
+            return func(*args, **kwargs)
+    return wrapper
+
+class Profiler:
+    """
+    一次运行的性能分析器
+
+    用法:
+        with Profiler("main"):
+            ...
+    """
+
+    def __init__(self, name: str, output_dir: str = PROFILE_DIR, interval: float = SAMPLE_INTERVAL,
+                 memory: bool = True, top: int = TOP_FUNCTIONS):
+        self.name = name
+        self.output_dir = output_dir
+        self.interval = interval
+        self.memory = memory
+        self.top = top
+
+        self._lock = threading.Lock()
+        # 线程ID -> 该线程当前的阶段栈，采样线程据此确定样本归属
+        self._stacks: Dict[int, List[_StageFrame]] = {}
+        # (阶段名, 调用栈) -> 样本数，以及 (阶段名[条目], 调用栈) -> 样本数
+        self._samples: Dict[tuple, int] = collections.Counter()
+        self._item_samples: Dict[tuple, int] = collections.Counter()
+        self._records: Dict[str, List[Dict[str, Any]]] = collections.defaultdict(list)
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._profile: Optional[cProfile.Profile] = None
+        self._started_tracemalloc = False
+        self.start_time = 0.0
+        self.elapsed = 0.0
+        self.sample_count = 0
+        self.outputs: Dict[str, str] = {}
+
+    def _enter(self, frame: _StageFrame):
+        tid = threading.get_ident()
+        with self._lock:
+            stack = self._stacks.setdefault(tid, [])
+            # tracemalloc 的峰值是整个进程共享的，多个线程同时处于阶段中时无法区分各线程分配的内存，
+            # 这期间活跃的所有阶段都不记录内存峰值
+            if any(other for other_tid, other in self._stacks.items() if other_tid != tid):
+                frame.concurrent = True
+                for active in self._stacks.values():
+                    for active_frame in active:
+                        active_frame.concurrent = True
+            if self._started_tracemalloc and not frame.concurrent:
+                # 进入阶段时重置峰值，退出时读取；重置前的峰值由外层阶段通过 child_peak 保留
+                current, peak = tracemalloc.get_traced_memory()
+                if stack:
+                    stack[-1].child_peak = max(stack[-1].child_peak, peak)
+                tracemalloc.reset_peak()
+                frame.start_memory = current
+            stack.append(frame)
+
+    def _exit(self, frame: _StageFrame):
+        elapsed = time.perf_counter() - frame.start
+        with self._lock:
+            stack = self._stacks.get(threading.get_ident(), [])
+            key = "/".join(f.name for f in stack)
+            if stack and stack[-1] is frame:
+                stack.pop()
+            parent = stack[-1] if stack else None
+
+        peak = None
+        if self._started_tracemalloc and not frame.concurrent:
+            absolute_peak = max(tracemalloc.get_traced_memory()[1], frame.child_peak)
+            peak = max(0, absolute_peak - frame.start_memory)
+            if parent is not None:
+                parent.child_peak = max(parent.child_peak, absolute_peak)
+
+        with self._lock:
+            self._records[key].append({"item": frame.item, "elapsed": elapsed, "peak": peak})
+
+    def _sample(self):
+        """采样线程：定时读取各线程的调用栈，只记录处于某个阶段中的线程"""
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._lock:
+                stacks = {tid: list(stack) for tid, stack in self._stacks.items() if stack and tid != own}
+            for tid, stage_stack in stacks.items():
+                frame = frames.get(tid)
+                if frame is None:
+                    continue
+                calls = []
+                while frame is not None:
+                    code = frame.f_code
+                    calls.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                calls.reverse()
+                calls = tuple(calls)
+                self._samples[(tuple(f.name for f in stage_stack), calls)] += 1
+                self._item_samples[(tuple(f.label for f in stage_stack), calls)] += 1
+                self.sample_count += 1
+
+    def start(self):
+        """开始分析"""
+        global _active
+        if _active is not None:
+            raise Exception("已有正在运行的性能分析")
+        if self.memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started_tracemalloc = True
+        self._profile = cProfile.Profile()
+        try:
+            self._profile.enable()
+        except ValueError:
+            # 已有其他分析工具（如调试器）在运行
+            self._profile = None
+        self.start_time = time.perf_counter()
+        _active = self
+        self._thread = threading.Thread(target=self._sample, name="profiler-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self) -> Dict[str, str]:
+        """
+        停止分析，写入结果文件并打印摘要
+
+        Returns:
+            输出文件类型到路径的映射
+        """
+        global _active
+        _active = None
+        self.elapsed = time.perf_counter() - self.start_time
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        if self._profile is not None:
+            self._profile.disable()
+        if self._started_tracemalloc:
+            tracemalloc.stop()
+            self._started_tracemalloc = False
+
+        self.outputs = self.write_outputs()
+        print(self.summary())
+        print("性能分析结果已保存至:")
+        for path in self.outputs.values():
+            print(f"  - {path}")
+        return self.outputs
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def hot_functions(self) -> List[tuple]:
+        """
+        按采样统计的最热函数
+
+        Returns:
+            (函数, 自身样本数, 累计样本数) 列表，按自身样本数降序
+        """
+        own = collections.Counter()
+        total = collections.Counter()
+        for (_, calls), count in self._samples.items():
+            if not calls:
+                continue
+            own[calls[-1]] += count
+            for call in set(calls):
+                total[call] += count
+        return [(call, count, total[call]) for call, count in own.most_common(self.top)]
+
+    def summary(self) -> str:
+        """生成文本摘要"""
+        lines = ["=" * 50, f"性能分析: {self.name}（总耗时 {self.elapsed:.2f} 秒，采样 {self.sample_count} 次）", "=" * 50]
+
+        samples_by_stage = collections.Counter()
+        for (names, _), count in self._samples.items():
+            samples_by_stage["/".join(names)] += count
+
+        lines.append("阶段耗时:")
+        for key, records in sorted(self._records.items(), key=lambda kv: -sum(r["elapsed"] for r in kv[1])):
+            total = sum(r["elapsed"] for r in records)
+            peaks = [r["peak"] for r in records if r["peak"] is not None]
+            peak_text = f"  内存峰值 {max(peaks) / 1024 / 1024:8.1f} MB" if peaks else ""
+            lines.append(f"  {key:32s} 次数 {len(records):4d}  总计 {total:8.2f} 秒  平均 {total / len(records):7.3f} 秒  "
+                         f"最长 {max(r['elapsed'] for r in records):7.3f} 秒{peak_text}  采样 {samples_by_stage[key]:6d}")
+
+        slowest = sorted(
+            ((key, r) for key, records in self._records.items() for r in records if r["item"]),
+            key=lambda kr: -kr[1]["elapsed"]
+        )[:10]
+        if slowest:
+            lines.append("最慢的条目:")
+            for key, r in slowest:
+                peak_text = f"  内存峰值 {r['peak'] / 1024 / 1024:.1f} MB" if r["peak"] is not None else ""
+                lines.append(f"  {r['elapsed']:8.3f} 秒  {key}  {r['item']}{peak_text}")
+
+        hot = self.hot_functions()
+        if hot and self.sample_count:
+            lines.append("最热的函数（采样，自身 / 累计）:")
+            for call, own, total in hot:
+                lines.append(f"  {own / self.sample_count * 100:5.1f}% / {total / self.sample_count * 100:5.1f}%  {call}")
+
+        if self._profile is not None:
+            stream = io.StringIO()
+            stats = pstats.Stats(self._profile, stream=stream)
+            stats.sort_stats("tottime").print_stats(self.top)
+            lines.append("cProfile（主线程，按自身耗时）:")
+            lines.extend("  " + line for line in stream.getvalue().strip().splitlines()[-self.top - 1:])
+        return "\n".join(lines)
+
+    def write_outputs(self) -> Dict[str, str]:
+        """写入折叠调用栈、cProfile统计和摘要文件"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        prefix = os.path.join(self.output_dir, f"{datetime.now().strftime('%Y%m%d_%H%M%S')}_{self.name}")
+        outputs = {}
+
+        for key, samples in (("folded", self._samples), ("items_folded", self._item_samples)):
+            path = f"{prefix}.folded" if key == "folded" else f"{prefix}_items.folded"
+            with open(path, "w", encoding="utf-8") as f:
+                for (names, calls), count in sorted(samples.items()):
+                    f.write(f"{';'.join(names + calls)} {count}\n")
+            outputs[key] = path
+
+        if self._profile is not None:
+            outputs["prof"] = f"{prefix}.prof"
+            self._profile.dump_stats(outputs["prof"])
+
+        outputs["summary"] = f"{prefix}_summary.txt"
+        with open(outputs["summary"], "w", encoding="utf-8") as f:
+            f.write(self.summary() + "\n")
+        return outputs
+
+def add_profile_arguments(parser: argparse.ArgumentParser):
+    """给命令行添加 --profile 相关参数"""
+    parser.add_argument("--profile", action="store_true",
+                        help=f"性能分析：采样调用栈、cProfile和内存峰值，结果保存到 {PROFILE_DIR}")
+    parser.add_argument("--profile-interval", type=float, default=SAMPLE_INTERVAL,
+                        help=f"性能分析的采样间隔（秒，默认: {SAMPLE_INTERVAL}）")
+
+def run_profiled(args: argparse.Namespace, name: str, func: Callable, *func_args, **func_kwargs):
+    """
+    按命令行参数决定是否在性能分析下运行函数
+
+    Args:
+        args: 包含 add_profile_arguments 添加的参数的命令行参数
+        name: 分析结果的名称
+        func: 要运行的函数
+
+    Returns:
+        函数的返回值
+    """
+    if not getattr(args, "profile", False):
+        return func(*func_args, **func_kwargs)
+    with Profiler(name, interval=args.profile_interval):
+        return func(*func_args, **func_kwargs)
@@ -0,0 +1,453 @@
+#!/usr/bin/env python3
+"""
+全文检索索引模块
+将每个转录结果（按片段）和AI分析结果写入SQLite FTS5全文索引，并关联视频信息（video_id、标题、作者），
+原始文本文件被清理后仍然可以检索。提供按相关度排序、带摘要片段的命令行查询
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from artifact_store import ArtifactStore, plain_name, read_text
+
+# 索引数据库路径（不放在会被清理的目录下）
+SEARCH_DB = r"D:\test\TikTok_Video_API\db\search.db"
+
+# 导入已有文件时扫描的目录
+TXT_DIR = r"D:\test\TikTok_Video_API\txt"
+RESULT_DIR = r"D:\test\TikTok_Video_API\result"
+
+# 汉字（含扩展A区和兼容区）
+CJK_CHARS = "\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff"
+CJK_PATTERN = re.compile(f"([{CJK_CHARS}])")
+CJK_GAP_PATTERN = re.compile(f"(?<=[{CJK_CHARS}\u3000-\u303f\uff00-\uffef]) (?=[{CJK_CHARS}\u3000-\u303f\uff00-\uffef])")
+
+# 摘要中命中词的标记
+HIGHLIGHT_START = "【"
+HIGHLIGHT_END = "】"
+
+# SQLite 3.34 起 FTS5 自带 trigram 分词器：按任意连续3个字符建索引，检索长度不少于3个字符的内容时
+# 只需读取对应三元组的倒排表，不必像逐字索引那样合并每个单字（常用字出现在几乎所有片段中）的倒排表
+TRIGRAM_AVAILABLE = sqlite3.sqlite_version_info >= (3, 34, 0)
+TRIGRAM_MIN_CHARS = 3
+
+# 不经过FTS5检索时，摘要中命中词前后保留的字符数
+SNIPPET_CHARS = 24
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    id INTEGER PRIMARY KEY,
+    kind TEXT NOT NULL,
+    path TEXT NOT NULL UNIQUE,
+    stem TEXT NOT NULL,
+    video_id TEXT,
+    title TEXT,
+    author TEXT,
+    indexed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_documents_stem ON documents(stem);
+CREATE INDEX IF NOT EXISTS idx_documents_video ON documents(video_id);
+CREATE TABLE IF NOT EXISTS segments (
+    id INTEGER PRIMARY KEY,
+    doc_id INTEGER NOT NULL,
+    start REAL,
+    end REAL
+);
+CREATE INDEX IF NOT EXISTS idx_segments_doc ON segments(doc_id);
+"""
+FTS_SCHEMA = "CREATE VIRTUAL TABLE IF NOT EXISTS segments_fts USING fts5(text, tokenize = '{tokenizer}')"
+
+def tokenize(text: str) -> str:
+    """
+    将文本转换为 unicode61 分词器（SQLite 不支持 trigram 时）索引用的形式：每个汉字单独成词
+
+    unicode61 分词器按空白和标点切分，连续的汉字会被当成一个词，因此在汉字之间插入空格。
+    查询时按短语匹配连续的单字，任意长度的中文词（包括常见的双字词）都能检索到，
+    不依赖分词词典；英文和数字仍按单词索引
+    """
+    return " ".join(CJK_PATTERN.sub(r" \1 ", text).split())
+
+def restore(text: str) -> str:
+    """去掉 tokenize 在汉字之间插入的空格，并合并相邻的高亮标记"""
+    text = text.replace(f"{HIGHLIGHT_END} {HIGHLIGHT_START}", "")
+    return CJK_GAP_PATTERN.sub("", text).replace(HIGHLIGHT_END + HIGHLIGHT_START, "")
+
+def build_match_query(query: str) -> str:
+    """
+    将用户输入的查询转换为FTS5查询表达式
+
+    空白分隔的每个词作为一个短语，多个词之间为"与"的关系
+
+    Args:
+        query: 用户输入的查询
+
+    Returns:
+        FTS5 MATCH 表达式
+    """
+    phrases = []
+    for term in query.split():
+        tokens = tokenize(term)
+        if tokens:
+            phrases.append('"' + tokens.replace('"', '""') + '"')
+    if not phrases:
+        raise ValueError("查询内容为空")
+    return " ".join(phrases)
+
+def build_trigram_query(query: str) -> Tuple[Optional[str], List[str]]:
+    """
+    将用户输入的查询转换为 trigram 索引上的检索条件
+
+    trigram 分词器无法用 MATCH 检索少于3个字符的词（如常见的双字词），这些词改为逐行查找子串
+
+    Args:
+        query: 用户输入的查询
+
+    Returns:
+        (FTS5 MATCH 表达式，没有足够长的词时为None, 需要逐行查找的短词)
+    """
+    terms = query.split()
+    if not terms:
+        raise ValueError("查询内容为空")
+    phrases = ['"' + term.replace('"', '""') + '"' for term in terms if len(term) >= TRIGRAM_MIN_CHARS]
+    short_terms = [term for term in terms if len(term) < TRIGRAM_MIN_CHARS]
+    return (" ".join(phrases) if phrases else None), short_terms
+
+def make_snippet(text: str, terms: List[str]) -> str:
+    """截取第一个命中词附近的文本作为摘要，并标记所有命中词（不经过FTS5检索时使用）"""
+    pattern = re.compile("|".join(re.escape(term) for term in sorted(terms, key=len, reverse=True)), re.I)
+    match = pattern.search(text)
+    start = max(0, match.start() - SNIPPET_CHARS // 2) if match else 0
+    end = start + SNIPPET_CHARS * 2
+    snippet = pattern.sub(lambda m: HIGHLIGHT_START + m.group(0) + HIGHLIGHT_END, text[start:end])
+    snippet = snippet.replace(HIGHLIGHT_END + HIGHLIGHT_START, "")
+    return ("…" if start > 0 else "") + snippet + ("…" if end < len(text) else "")
+
+def transcript_stem(path: str) -> str:
+    """转录文件和对应分析结果文件共用的文件名部分"""
+    stem = Path(plain_name(path)).stem
+    return stem[:-len("_analysis")] if stem.endswith("_analysis") else stem
+
+def read_text_body(path: str) -> str:
+    """读取文本文件（压缩保存的文件自动解压），跳过转录文件开头的元数据（到分隔线为止）"""
+    content = read_text(path)
+    marker = "=" * 50 + "\n"
+    if marker in content[:1000]:
+        content = content.split(marker, 1)[1]
+    return content.strip()
+
+class SearchIndex:
+    """
+    转录和分析结果的全文索引
+
+    片段正文保存在FTS5表中（rowid 与 segments 表的 id 对应），文档和视频信息保存在普通表中；
+    同一路径重新索引时先删除旧内容。SQLite 支持时使用 trigram 分词器，否则逐字索引
+    """
+
+    def __init__(self, db_path: str = SEARCH_DB, trigram: bool = TRIGRAM_AVAILABLE):
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path, check_same_thread=False, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.trigram = trigram
+        self._lock = threading.Lock()
+        self._create_fts_table()
+
+    def _create_fts_table(self):
+        """创建FTS5表；已有的表使用另一种分词器时（如升级SQLite后），按当前分词器重建"""
+        tokenizer = "trigram" if self.trigram else "unicode61"
+        row = self.conn.execute("SELECT sql FROM sqlite_master WHERE name = 'segments_fts'").fetchone()
+        if row is not None and f"'{tokenizer}'" in row["sql"]:
+            return
+
+        with self.conn:
+            rows = []
+            if row is not None:
+                print(f"全文索引分词器改为 {tokenizer}，正在重建索引...")
+                rows = self.conn.execute("SELECT rowid, text FROM segments_fts").fetchall()
+                self.conn.execute("DROP TABLE segments_fts")
+            self.conn.execute(FTS_SCHEMA.format(tokenizer=tokenizer))
+            self.conn.executemany(
+                "INSERT INTO segments_fts (rowid, text) VALUES (?, ?)",
+                ((r["rowid"], restore(r["text"]) if self.trigram else tokenize(r["text"])) for r in rows),
+            )
+
+    def _delete_document(self, path: str):
+        row = self.conn.execute("SELECT id FROM documents WHERE path = ?", (path,)).fetchone()
+        if row is None:
+            return
+        self.conn.execute(
+            "DELETE FROM segments_fts WHERE rowid IN (SELECT id FROM segments WHERE doc_id = ?)", (row["id"],)
+        )
+        self.conn.execute("DELETE FROM segments WHERE doc_id = ?", (row["id"],))
+        self.conn.execute("DELETE FROM documents WHERE id = ?", (row["id"],))
+
+    def add_document(self, kind: str, path: str, segments: List[Dict[str, Any]],
+                     video_info: Optional[Dict[str, Any]] = None) -> int:
+        """
+        索引一个文档
+
+        Args:
+            kind: 文档类型（transcript / analysis）
+            path: 文件路径
+            segments: 片段列表（text，可选 start、end）
+            video_info: 关联的视频信息（video_id、title、author）
+
+        Returns:
+            文档ID
+        """
+        video_info = video_info or {}
+        path = os.path.abspath(path)
+        with self._lock, self.conn:
+            self._delete_document(path)
+            cursor = self.conn.execute(
+                "INSERT INTO documents (kind, path, stem, video_id, title, author, indexed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (kind, path, transcript_stem(path), video_info.get("video_id"), video_info.get("title"),
+                 video_info.get("author"), time.time()),
+            )
+            doc_id = cursor.lastrowid
+            for segment in segments:
+                text = segment.get("text", "").strip()
+                if not text:
+                    continue
+                cursor = self.conn.execute(
+                    "INSERT INTO segments (doc_id, start, end) VALUES (?, ?, ?)",
+                    (doc_id, segment.get("start"), segment.get("end")),
+                )
+                self.conn.execute("INSERT INTO segments_fts (rowid, text) VALUES (?, ?)",
+                                  (cursor.lastrowid, text if self.trigram else tokenize(text)))
+        return doc_id
+
+    def video_info_for_stem(self, stem: str) -> Dict[str, Any]:
+        """查找同一转录文件已索引文档关联的视频信息"""
+        with self._lock:
+            row = self.conn.execute(
+                "SELECT video_id, title, author FROM documents WHERE stem = ? AND video_id IS NOT NULL LIMIT 1",
+                (stem,),
+            ).fetchone()
+        return dict(row) if row else {}
+
+    def search(self, query: str, kind: Optional[str] = None, author: Optional[str] = None,
+               limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        全文检索
+
+        Args:
+            query: 查询内容，空白分隔的多个词须同时出现在同一片段中
+            kind: 只检索某类文档（transcript / analysis）
+            author: 只检索某个作者的视频
+            limit: 最多返回的条数
+
+        Returns:
+            按相关度（BM25）排序的结果，包含摘要、片段时间和视频信息
+        """
+        if self.trigram:
+            match_query, short_terms = build_trigram_query(query)
+        else:
+            match_query, short_terms = build_match_query(query), []
+
+        if match_query is not None:
+            columns = (f"snippet(segments_fts, 0, '{HIGHLIGHT_START}', '{HIGHLIGHT_END}', '…', 24) AS snippet, "
+                       "bm25(segments_fts) AS score")
+            conditions = ["segments_fts MATCH ?"]
+            params: List[Any] = [match_query]
+        else:
+            # 只有短词时无法使用FTS5索引（也就没有BM25分数），逐行查找子串，摘要在下面生成
+            columns = "segments_fts.text AS snippet, 0 AS score"
+            conditions, params = [], []
+        for term in short_terms:
+            conditions.append("instr(lower(segments_fts.text), lower(?)) > 0")
+            params.append(term)
+
+        sql = (
+            f"SELECT d.kind, d.path, d.video_id, d.title, d.author, s.start, s.end, {columns} "
+            "FROM segments_fts JOIN segments s ON s.id = segments_fts.rowid "
+            "JOIN documents d ON d.id = s.doc_id "
+            "WHERE " + " AND ".join(conditions)
+        )
+        if kind:
+            sql += " AND d.kind = ?"
+            params.append(kind)
+        if author:
+            sql += " AND d.author = ?"
+            params.append(author)
+        sql += " ORDER BY score LIMIT ?"
+        params.append(limit)
+
+        with self._lock:
+            rows = self.conn.execute(sql, params).fetchall()
+        results = []
+        for row in rows:
+            result = dict(row)
+            if match_query is None:
+                result["snippet"] = make_snippet(result["snippet"], short_terms)
+            elif self.trigram:
+                result["snippet"] = result["snippet"].replace(HIGHLIGHT_END + HIGHLIGHT_START, "")
+            else:
+                result["snippet"] = restore(result["snippet"])
+            results.append(result)
+        return results
+
+    def stats(self) -> Dict[str, int]:
+        """索引中的文档数和片段数"""
+        with self._lock:
+            documents = dict(self.conn.execute("SELECT kind, COUNT(*) FROM documents GROUP BY kind").fetchall())
+            segments = self.conn.execute("SELECT COUNT(*) FROM segments").fetchone()[0]
+        return {"transcripts": documents.get("transcript", 0), "analyses": documents.get("analysis", 0),
+                "segments": segments}
+
+    def optimize(self):
+        """合并FTS5索引的内部段，大量写入后可提升查询速度"""
+        with self._lock, self.conn:
+            self.conn.execute("INSERT INTO segments_fts (segments_fts) VALUES ('optimize')")
+
+    def close(self):
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def lookup_video_info(video_path: str) -> Dict[str, Any]:
+    """根据下载的视频文件路径查找视频信息，找不到时返回空字典"""
+    try:
+        from metadata_store import MetadataStore
+        with MetadataStore() as store:
+            record = store.find_by_file(video_path)
+    except Exception as e:
+        print(f"查询视频信息时出错: {e}")
+        return {}
+    return {key: record.get(key) for key in ("video_id", "title", "author")} if record else {}
+
+def index_transcript(transcript_path: str, video_path: Optional[str] = None,
+                     segments: Optional[List[Dict[str, Any]]] = None, db_path: str = SEARCH_DB):
+    """
+    索引一个转录结果
+
+    Args:
+        transcript_path: 转录文本路径
+        video_path: 源视频路径（用于关联视频信息）
+        segments: 转录片段，不提供时读取同名的 .segments.jsonl 或整个文本文件
+        db_path: 索引数据库路径
+    """
+    if segments is None:
+        from transcript_stream import read_partial_segments
+        segments = read_partial_segments(os.path.splitext(plain_name(transcript_path))[0] + ".segments.jsonl")
+        if not segments:
+            segments = [{"text": read_text_body(transcript_path)}]
+
+    with SearchIndex(db_path) as index:
+        video_info = lookup_video_info(video_path) if video_path else {}
+        if not video_info:
+            video_info = index.video_info_for_stem(transcript_stem(transcript_path))
+        index.add_document("transcript", transcript_path, segments, video_info)
+
+def index_analysis(analysis_path: str, text: Optional[str] = None, db_path: str = SEARCH_DB):
+    """
+    索引一个分析结果，按段落拆分，并关联对应转录文件的视频信息
+
+    Args:
+        analysis_path: 分析结果路径
+        text: 分析结果文本，不提供时读取文件
+        db_path: 索引数据库路径
+    """
+    if text is None:
+        text = read_text_body(analysis_path)
+    paragraphs = [{"text": p} for p in re.split(r"\n\s*\n", text) if p.strip()]
+    with SearchIndex(db_path) as index:
+        video_info = index.video_info_for_stem(transcript_stem(analysis_path))
+        index.add_document("analysis", analysis_path, paragraphs, video_info)
+
+def import_directories(txt_dir: str = TXT_DIR, result_dir: str = RESULT_DIR, db_path: str = SEARCH_DB) -> int:
+    """
+    导入产物存储和旧版目录中已有的转录和分析结果文件
+
+    Returns:
+        导入的文件数
+    """
+    with ArtifactStore() as store:
+        transcripts = store.list("transcript", newest_first=False)
+        analyses = store.list("analysis", newest_first=False)
+    # result 目录中也有转录文本的副本，只导入 txt 目录中的转录
+    transcripts += sorted(str(p) for p in Path(txt_dir).glob("*.txt")) if os.path.exists(txt_dir) else []
+    analyses += sorted(str(p) for p in Path(result_dir).glob("*_analysis.txt")) if os.path.exists(result_dir) else []
+
+    count = 0
+    for path in transcripts:
+        index_transcript(path, db_path=db_path)
+        count += 1
+    for path in analyses:
+        index_analysis(path, db_path=db_path)
+        count += 1
+    with SearchIndex(db_path) as index:
+        index.optimize()
+    return count
+
+def format_time(seconds: Optional[float]) -> str:
+    """格式化片段时间"""
+    if seconds is None:
+        return ""
+    minutes, secs = divmod(int(seconds), 60)
+    return f"{minutes:02d}:{secs:02d}"
+
+def print_results(results: List[Dict[str, Any]]):
+    """打印检索结果"""
+    if not results:
+        print("没有找到匹配的内容")
+        return
+    for i, result in enumerate(results, 1):
+        kind = "转录" if result["kind"] == "transcript" else "分析"
+        position = f" {format_time(result['start'])}-{format_time(result['end'])}" if result["start"] is not None else ""
+        video = f"{result['title'] or ''}（{result['author'] or '未知作者'}，{result['video_id']}）" \
+            if result["video_id"] else Path(result["path"]).name
+        print(f"{i}. [{kind}{position}] {video}")
+        print(f"   {result['snippet']}")
+        print(f"   {result['path']}")
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="检索转录和AI分析结果")
+    parser.add_argument("--db", default=SEARCH_DB, help=f"索引数据库路径（默认: {SEARCH_DB}）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    search_parser = subparsers.add_parser("search", help="全文检索")
+    search_parser.add_argument("query", nargs="+", help="查询内容，多个词须同时出现")
+    search_parser.add_argument("--kind", choices=["transcript", "analysis"], help="只检索转录或分析结果")
+    search_parser.add_argument("--author", help="只检索某个作者的视频")
+    search_parser.add_argument("-n", "--limit", type=int, default=20, help="最多显示的条数（默认: 20）")
+
+    import_parser = subparsers.add_parser("import", help="导入目录中已有的转录和分析结果")
+    import_parser.add_argument("--txt-dir", default=TXT_DIR, help=f"转录目录（默认: {TXT_DIR}）")
+    import_parser.add_argument("--result-dir", default=RESULT_DIR, help=f"分析结果目录（默认: {RESULT_DIR}）")
+
+    subparsers.add_parser("stats", help="显示索引统计")
+
+    args = parser.parse_args()
+    if args.command == "search":
+        with SearchIndex(args.db) as index:
+            start = time.perf_counter()
+            results = index.search(" ".join(args.query), args.kind, args.author, args.limit)
+            elapsed = time.perf_counter() - start
+        print_results(results)
+        print(f"\n共 {len(results)} 条结果，耗时 {elapsed * 1000:.1f} ms")
+    elif args.command == "import":
+        count = import_directories(args.txt_dir, args.result_dir, args.db)
+        print(f"已导入 {count} 个文件")
+    elif args.command == "stats":
+        with SearchIndex(args.db) as index:
+            stats = index.stats()
+        print(f"转录: {stats['transcripts']} 个，分析结果: {stats['analyses']} 个，片段: {stats['segments']} 条")
+
+if __name__ == "__main__":
+    main()
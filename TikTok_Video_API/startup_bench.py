@@ -0,0 +1,169 @@
+#!/usr/bin/env python3
+"""
+启动时间基准测试
+在独立的子进程中以 -X importtime 导入各个模块，输出导入耗时分析报告，
+并检查每个模块的启动时间是否超出预算、是否在导入时加载了重量级依赖
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+# 需要测试的模块
+MODULES = [
+    "main",
+    "download_douyin_video",
+    "video_to_text",
+    "analyze_transcript",
+    "clean_old_files",
+]
+
+# 只允许在真正执行对应阶段时才导入的重量级依赖
+HEAVY_MODULES = ["whisper", "torch", "opencc", "numpy"]
+
+# 默认启动时间预算（秒）
+DEFAULT_BUDGET = 0.5
+
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    """
+    解析 -X importtime 的输出
+
+    Args:
+        stderr: 子进程的标准错误输出
+
+    Returns:
+        (模块名, 自身耗时微秒, 累计耗时微秒) 列表
+    """
+    entries = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        try:
+            self_us, cumulative_us, name = line.split("|", 2)
+            self_us = int(self_us.split(":")[1])
+            # 名称前的缩进表示导入层级，保留下来用于区分顶层导入
+            entries.append((name[1:].rstrip(), self_us, int(cumulative_us)))
+        except ValueError:
+            continue
+    return entries
+
+def measure_module(module: str) -> Dict:
+    """
+    在子进程中导入模块并测量耗时
+
+    Args:
+        module: 模块名
+
+    Returns:
+        测量结果（总耗时、导入明细、加载的重量级依赖）
+    """
+    code = (
+        f"import {module}, sys; "
+        f"print(','.join(m for m in {HEAVY_MODULES!r} if m in sys.modules))"
+    )
+    start = time.perf_counter()
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", code],
+        cwd=SCRIPT_DIR, capture_output=True, text=True,
+    )
+    elapsed = time.perf_counter() - start
+
+    return {
+        "module": module,
+        "ok": proc.returncode == 0,
+        "elapsed": elapsed,
+        "imports": parse_importtime(proc.stderr),
+        "heavy": [m for m in proc.stdout.strip().split(",") if m],
+        "error": proc.stderr.strip().splitlines()[-1] if proc.returncode != 0 and proc.stderr.strip() else "",
+    }
+
+def print_report(result: Dict, top: int):
+    """打印单个模块的导入耗时报告"""
+    print(f"\n模块 {result['module']}: 总耗时 {result['elapsed'] * 1000:.0f} ms")
+    if not result["ok"]:
+        print(f"  导入失败: {result['error']}")
+        return
+
+    # importtime 按导入完成顺序输出，模块自身一行之前、上一个顶层导入之后的行即为它的导入树
+    imports = result["imports"]
+    root = next((i for i, entry in enumerate(imports) if entry[0] == result["module"]), None)
+    if root is None:
+        return
+    subtree = []
+    for name, self_us, cumulative_us in reversed(imports[:root]):
+        if not name.startswith(" "):
+            break
+        # 只统计模块直接导入的依赖（缩进两个空格）
+        if not name.startswith("   "):
+            subtree.append((name.strip(), self_us, cumulative_us))
+
+    print(f"  模块自身: {imports[root][2] / 1000:.1f} ms")
+    subtree.sort(key=lambda x: x[2], reverse=True)
+    for name, self_us, cumulative_us in subtree[:top]:
+        print(f"  {cumulative_us / 1000:8.1f} ms（自身 {self_us / 1000:6.1f} ms）  {name}")
+
+    if result["heavy"]:
+        print(f"  导入时加载了重量级依赖: {', '.join(result['heavy'])}")
+
+def run_bench(modules: List[str], budget: float, top: int = 10) -> bool:
+    """
+    运行启动时间基准测试
+
+    Args:
+        modules: 要测试的模块
+        budget: 每个模块的启动时间预算（秒）
+        top: 每个模块显示的最耗时导入条数
+
+    Returns:
+        是否全部满足预算
+    """
+    print("=" * 50)
+    print("启动时间基准测试")
+    print("=" * 50)
+    print(f"启动时间预算: {budget * 1000:.0f} ms")
+
+    # 先测量空解释器的启动时间作为基线
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "pass"], capture_output=True)
+    baseline = time.perf_counter() - start
+    print(f"空解释器启动耗时: {baseline * 1000:.0f} ms")
+
+    all_passed = True
+    for module in modules:
+        result = measure_module(module)
+        print_report(result, top)
+
+        if not result["ok"]:
+            # 缺少依赖导致的导入失败不计入预算检查
+            continue
+        if result["heavy"]:
+            print(f"✗ {module} 在导入时加载了重量级依赖")
+            all_passed = False
+        if result["elapsed"] - baseline > budget:
+            print(f"✗ {module} 启动时间超出预算")
+            all_passed = False
+
+    print("\n" + "=" * 50)
+    print("所有模块均满足启动时间预算" if all_passed else "部分模块超出启动时间预算")
+    print("=" * 50)
+    return all_passed
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="测量各模块的导入耗时并检查启动时间预算")
+    parser.add_argument("modules", nargs="*", default=MODULES, help="要测试的模块（默认: 所有入口模块）")
+    parser.add_argument("-b", "--budget", type=float, default=DEFAULT_BUDGET,
+                        help=f"每个模块的启动时间预算，单位秒（默认: {DEFAULT_BUDGET}）")
+    parser.add_argument("-n", "--top", type=int, default=10, help="每个模块显示的最耗时导入条数（默认: 10）")
+
+    args = parser.parse_args()
+    passed = run_bench(args.modules, args.budget, args.top)
+    sys.exit(0 if passed else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+#!/usr/bin/env python3
+"""
+互动数据跟踪模块
+维护需要跟踪的视频列表，按计划只刷新点赞、评论和播放数：
+- 缓存短链接跳转后的分享页地址，之后每次刷新只请求一次分享页
+- 带 If-None-Match / If-Modified-Since 条件请求头，304 时不解析页面
+- 只从页面中提取 statistics 片段，不解析完整的视频信息，也不下载视频
+- 数值没有变化时不写入，时间序列只保存变化点，旧数据可以按小时合并
+- 每个视频按ID哈希固定在刷新周期内的一个时间点，并按总速率限速，跟踪数千个视频时请求也均匀分布
+"""
+
+import argparse
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+import zlib
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+import download_douyin_video
+from fetch_scheduler import FetchScheduler, get_default_scheduler
+
+# 数据库路径（与 metadata.db 放在同一目录）
+DB_PATH = r"D:\test\TikTok_Video_API\db\stats.db"
+
+# 默认刷新周期（秒）
+REFRESH_INTERVAL = 6 * 3600
+
+# 刷新失败后的重试等待（秒），每次失败翻倍，最长不超过刷新周期
+RETRY_DELAY = 300
+
+# 实际刷新速率相对平均速率的余量，积压（如程序停止一段时间后）时以此速率追赶，不会集中请求
+RATE_HEADROOM = 2.0
+
+# 最低刷新速率（每秒请求数），跟踪的视频很少时避免等待过久
+MIN_RATE = 0.05
+
+# 没有到期视频时最长的等待时间（秒），期间新加入的视频最迟在这之后被发现
+MAX_IDLE_WAIT = 60.0
+
+# 分享页中互动数据的提取正则（statistics 是不含嵌套对象的小片段）
+STATISTICS_PATTERN = re.compile(r'"statistics"\s*:\s*(\{[^{}]*\})')
+
+# 保存的互动数据字段（页面字段名 -> 列名）
+STAT_FIELDS = {"digg_count": "likes", "comment_count": "comments", "play_count": "plays"}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS watchlist (
+    video_id TEXT PRIMARY KEY,
+    share_url TEXT NOT NULL,
+    refresh_interval REAL NOT NULL,
+    next_due REAL NOT NULL,
+    etag TEXT,
+    last_modified TEXT,
+    likes INTEGER,
+    comments INTEGER,
+    plays INTEGER,
+    last_checked REAL,
+    failures INTEGER NOT NULL DEFAULT 0,
+    added_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_watchlist_due ON watchlist(next_due);
+CREATE TABLE IF NOT EXISTS stats_series (
+    video_id TEXT NOT NULL,
+    t INTEGER NOT NULL,
+    likes INTEGER,
+    comments INTEGER,
+    plays INTEGER,
+    PRIMARY KEY (video_id, t)
+) WITHOUT ROWID;
+"""
+
+def phase_offset(video_id: str, interval: float) -> float:
+    """
+    视频在刷新周期内固定的时间点
+
+    按视频ID哈希均匀分布在 [0, interval) 内，同一个视频每次重启后位置不变
+
+    Args:
+        video_id: 视频ID
+        interval: 刷新周期（秒）
+
+    Returns:
+        相对周期起点的偏移（秒）
+    """
+    return zlib.crc32(video_id.encode("utf-8")) / 2 ** 32 * interval
+
+def next_slot(video_id: str, interval: float, now: float) -> float:
+    """视频在当前时间之后的下一个刷新时间点"""
+    return now + (phase_offset(video_id, interval) - now) % interval
+
+def extract_statistics(html: str) -> Dict[str, int]:
+    """
+    从分享页中提取互动数据
+
+    优先只匹配 statistics 片段，页面结构不同时才退回解析完整的 _ROUTER_DATA
+
+    Args:
+        html: 分享页HTML
+
+    Returns:
+        likes、comments、plays
+
+    Raises:
+        ValueError: 页面中没有互动数据
+    """
+    match = STATISTICS_PATTERN.search(html)
+    if match:
+        statistics = json.loads(match.group(1))
+    else:
+        find_res = download_douyin_video.ROUTER_DATA_PATTERN.search(html)
+        if not find_res:
+            raise ValueError("从HTML中解析互动数据失败")
+        loader_data = json.loads(find_res.group(1).strip()).get("loaderData", {})
+        pages = [page for key, page in loader_data.items() if key.endswith("(id)/page") and page]
+        if not pages:
+            raise ValueError("从HTML中解析互动数据失败")
+        statistics = pages[0]["videoInfoRes"]["item_list"][0].get("statistics", {})
+    return {column: int(statistics.get(field) or 0) for field, column in STAT_FIELDS.items()}
+
+class StatsTracker:
+    """
+    互动数据跟踪
+
+    watchlist 表保存跟踪的视频、缓存的分享页地址、条件请求头和下次刷新时间，
+    stats_series 表只在数值变化时追加一行（按视频ID聚簇存储，无额外的rowid）
+    """
+
+    def __init__(self, db_path: Optional[str] = None, scheduler: Optional[FetchScheduler] = None,
+                 interval: float = REFRESH_INTERVAL, max_rate: Optional[float] = None):
+        # 默认路径在创建时读取，测试时可以修改模块的 DB_PATH
+        db_path = db_path or DB_PATH
+        self.db_path = db_path
+        self.scheduler = scheduler
+        self.interval = interval
+        self.max_rate = max_rate
+        self.counts = {"changed": 0, "unchanged": 0, "not_modified": 0, "failed": 0}
+
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+
+    def close(self):
+        """关闭数据库"""
+        self.conn.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _scheduler(self) -> FetchScheduler:
+        return self.scheduler or get_default_scheduler()
+
+    def resolve(self, item: str) -> tuple:
+        """
+        把视频ID或分享链接解析为视频ID和分享页地址
+
+        短链接只在加入跟踪列表时请求一次，跳转后的地址缓存在数据库中
+
+        Args:
+            item: 视频ID、分享链接或包含分享链接的文本
+
+        Returns:
+            (视频ID, 分享页地址)
+        """
+        if item.isdigit():
+            return item, download_douyin_video.SHARE_VIDEO_URL.format(video_id=item)
+
+        urls = download_douyin_video.extract_douyin_urls(item)
+        if not urls:
+            raise ValueError(f"未找到有效的分享链接: {item}")
+        share_url = urls[0]
+        if download_douyin_video.SHORT_LINK_HOST in share_url:
+            response = self._scheduler().fetch(share_url, headers=download_douyin_video.HEADERS)
+            share_url = response.url
+        share_url = share_url.split("?")[0]
+        return share_url.strip("/").split("/")[-1], share_url
+
+    def add(self, items: List[str], interval: Optional[float] = None) -> List[str]:
+        """
+        加入跟踪列表（已在列表中的视频只更新刷新周期）
+
+        Args:
+            items: 视频ID或分享链接
+            interval: 刷新周期（秒），默认为跟踪器的刷新周期
+
+        Returns:
+            加入的视频ID
+        """
+        interval = interval or self.interval
+        now = time.time()
+        added = []
+        for item in items:
+            try:
+                video_id, share_url = self.resolve(item.strip())
+            except Exception as e:
+                print(f"解析 {item} 时出错: {e}")
+                continue
+            with self.conn:
+                self.conn.execute(
+                    "INSERT INTO watchlist (video_id, share_url, refresh_interval, next_due, added_at) "
+                    "VALUES (?, ?, ?, ?, ?) ON CONFLICT(video_id) DO UPDATE SET "
+                    "refresh_interval = excluded.refresh_interval, next_due = MIN(next_due, excluded.next_due)",
+                    (video_id, share_url, interval, next_slot(video_id, interval, now), now),
+                )
+            added.append(video_id)
+        return added
+
+    def remove(self, video_ids: List[str], keep_history: bool = True) -> int:
+        """
+        移出跟踪列表
+
+        Args:
+            video_ids: 视频ID
+            keep_history: 是否保留已记录的时间序列
+
+        Returns:
+            移出的视频数
+        """
+        with self.conn:
+            removed = sum(self.conn.execute("DELETE FROM watchlist WHERE video_id = ?", (video_id,)).rowcount
+                          for video_id in video_ids)
+            if not keep_history:
+                self.conn.executemany("DELETE FROM stats_series WHERE video_id = ?", [(v,) for v in video_ids])
+        return removed
+
+    def refresh_rate(self) -> float:
+        """
+        刷新速率上限（每秒请求数）
+
+        为所有视频平均刷新速率的 RATE_HEADROOM 倍，正常情况下每个视频按自己的时间点刷新，
+        积压时也只以这个速率追赶
+        """
+        if self.max_rate:
+            return self.max_rate
+        average = self.conn.execute("SELECT COALESCE(SUM(1.0 / refresh_interval), 0) FROM watchlist").fetchone()[0]
+        return max(MIN_RATE, average * RATE_HEADROOM)
+
+    def refresh(self, row: sqlite3.Row, now: Optional[float] = None) -> str:
+        """
+        刷新一个视频的互动数据
+
+        Args:
+            row: watchlist 中的一行
+            now: 当前时间，默认为 time.time()
+
+        Returns:
+            结果：changed、unchanged、not_modified 或 failed
+        """
+        video_id = row["video_id"]
+        interval = row["refresh_interval"]
+        headers = dict(download_douyin_video.HEADERS)
+        if row["etag"]:
+            headers["If-None-Match"] = row["etag"]
+        if row["last_modified"]:
+            headers["If-Modified-Since"] = row["last_modified"]
+
+        try:
+            response = self._scheduler().fetch(row["share_url"], headers=headers)
+            if response.status_code == 304:
+                values, outcome = None, "not_modified"
+            else:
+                response.raise_for_status()
+                values = extract_statistics(response.text)
+                unchanged = all(values[k] == row[k] for k in STAT_FIELDS.values())
+                outcome = "unchanged" if unchanged else "changed"
+        except Exception as e:
+            print(f"刷新视频 {video_id} 的互动数据时出错: {e}")
+            failures = row["failures"] + 1
+            with self.conn:
+                self.conn.execute(
+                    "UPDATE watchlist SET failures = ?, next_due = ? WHERE video_id = ?",
+                    (failures, (now or time.time()) + min(interval, RETRY_DELAY * 2 ** (failures - 1)), video_id),
+                )
+            self.counts["failed"] += 1
+            return "failed"
+
+        now = now or time.time()
+        # 按固定时间点推进，落后超过一个周期时重新对齐到下一个时间点，而不是连续补刷
+        next_due = row["next_due"] + interval
+        if next_due <= now:
+            next_due = next_slot(video_id, interval, now)
+
+        with self.conn:
+            if outcome == "changed":
+                self.conn.execute(
+                    "INSERT OR REPLACE INTO stats_series (video_id, t, likes, comments, plays) VALUES (?, ?, ?, ?, ?)",
+                    (video_id, int(now), values["likes"], values["comments"], values["plays"]),
+                )
+                self.conn.execute(
+                    "UPDATE watchlist SET likes = ?, comments = ?, plays = ? WHERE video_id = ?",
+                    (values["likes"], values["comments"], values["plays"], video_id),
+                )
+            self.conn.execute(
+                "UPDATE watchlist SET etag = COALESCE(?, etag), last_modified = COALESCE(?, last_modified), "
+                "last_checked = ?, failures = 0, next_due = ? WHERE video_id = ?",
+                (response.headers.get("ETag"), response.headers.get("Last-Modified"), now, next_due, video_id),
+            )
+        self.counts[outcome] += 1
+        return outcome
+
+    def next_due(self) -> Optional[sqlite3.Row]:
+        """下一个需要刷新的视频"""
+        return self.conn.execute("SELECT * FROM watchlist ORDER BY next_due LIMIT 1").fetchone()
+
+    def run(self, once: bool = False, stop: Optional[threading.Event] = None) -> Dict[str, int]:
+        """
+        按计划刷新跟踪列表中的视频
+
+        Args:
+            once: 为True时刷新完当前已到期的视频后返回
+            stop: 设置后停止
+
+        Returns:
+            各种刷新结果的次数
+        """
+        stop = stop or threading.Event()
+        rate = self.refresh_rate()
+        checked = 0
+        while not stop.is_set():
+            row = self.next_due()
+            now = time.time()
+            if row is None or row["next_due"] > now:
+                if once:
+                    break
+                wait = MAX_IDLE_WAIT if row is None else min(row["next_due"] - now, MAX_IDLE_WAIT)
+                stop.wait(wait)
+                rate = self.refresh_rate()
+                continue
+
+            start = time.monotonic()
+            self.refresh(row)
+            checked += 1
+            if checked % 100 == 0:
+                print(f"已刷新 {checked} 次: {self.counts}")
+            # 按速率上限均匀发出请求
+            stop.wait(max(0.0, 1 / rate - (time.monotonic() - start)))
+        return dict(self.counts)
+
+    def history(self, video_id: str, since: Optional[float] = None) -> List[Dict[str, Any]]:
+        """
+        获取视频的互动数据变化（按时间升序）
+
+        只包含数值变化的时间点，两点之间的数值与前一个点相同
+        """
+        rows = self.conn.execute(
+            "SELECT t, likes, comments, plays FROM stats_series WHERE video_id = ? AND t >= ? ORDER BY t",
+            (video_id, int(since or 0)),
+        ).fetchall()
+        return [dict(row) for row in rows]
+
+    def compact(self, older_than: float = 7 * 86400, bucket: int = 3600) -> int:
+        """
+        合并旧数据：早于 older_than 秒的数据每个视频每 bucket 秒只保留最后一个点
+
+        Returns:
+            删除的行数
+        """
+        cutoff = int(time.time() - older_than)
+        with self.conn:
+            deleted = self.conn.execute(
+                "DELETE FROM stats_series WHERE t < :cutoff AND EXISTS ("
+                "SELECT 1 FROM stats_series later WHERE later.video_id = stats_series.video_id "
+                "AND later.t > stats_series.t AND later.t < :cutoff AND later.t / :bucket = stats_series.t / :bucket)",
+                {"cutoff": cutoff, "bucket": bucket},
+            ).rowcount
+        return deleted
+
+    def status(self) -> Dict[str, Any]:
+        """跟踪列表统计"""
+        now = time.time()
+        watched, due, failing = self.conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(next_due <= ?), 0), COALESCE(SUM(failures > 0), 0) FROM watchlist",
+            (now,),
+        ).fetchone()
+        points = self.conn.execute("SELECT COUNT(*) FROM stats_series").fetchone()[0]
+        return {"watched": watched, "due": due, "failing": failing, "points": points,
+                "rate": self.refresh_rate() if watched else 0.0}
+
+def import_metadata_ids() -> List[str]:
+    """视频信息存储中所有视频的ID"""
+    from metadata_store import MetadataStore
+    with MetadataStore() as store:
+        rows = store.conn.execute("SELECT DISTINCT video_id FROM video_snapshots").fetchall()
+    return [row[0] for row in rows if str(row[0]).isdigit()]
+
+def print_history(records: List[Dict[str, Any]]):
+    """打印互动数据变化"""
+    if not records:
+        print("没有记录")
+        return
+    previous = None
+    for record in records:
+        t = datetime.fromtimestamp(record["t"]).strftime("%Y-%m-%d %H:%M")
+        delta = ""
+        if previous:
+            delta = "  (" + " ".join(f"{record[k] - previous[k]:+d}" for k in STAT_FIELDS.values()) + ")"
+        print(f"{t}  点赞:{record['likes']}  评论:{record['comments']}  播放:{record['plays']}{delta}")
+        previous = record
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="跟踪视频的点赞、评论和播放数变化")
+    parser.add_argument("--db", default=DB_PATH, help=f"数据库路径（默认: {DB_PATH}）")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    add_parser = subparsers.add_parser("add", help="加入跟踪列表")
+    add_parser.add_argument("items", nargs="*", help="视频ID或分享链接")
+    add_parser.add_argument("--from-metadata", action="store_true", help="加入视频信息存储中的所有视频")
+    add_parser.add_argument("--hours", type=float, default=REFRESH_INTERVAL / 3600,
+                            help=f"刷新周期（小时，默认: {REFRESH_INTERVAL / 3600:g}）")
+
+    remove_parser = subparsers.add_parser("remove", help="移出跟踪列表")
+    remove_parser.add_argument("video_ids", nargs="+", help="视频ID")
+    remove_parser.add_argument("--purge", action="store_true", help="同时删除已记录的数据")
+
+    run_parser = subparsers.add_parser("run", help="按计划持续刷新")
+    run_parser.add_argument("--once", action="store_true", help="刷新完已到期的视频后退出")
+    run_parser.add_argument("--rate", type=float, help="每秒最多请求数（默认按跟踪数量和刷新周期计算）")
+
+    history_parser = subparsers.add_parser("history", help="查看视频的互动数据变化")
+    history_parser.add_argument("video_id", help="视频ID")
+    history_parser.add_argument("--days", type=float, help="只显示最近几天")
+
+    compact_parser = subparsers.add_parser("compact", help="合并旧数据")
+    compact_parser.add_argument("--days", type=float, default=7, help="合并几天前的数据（默认: 7）")
+
+    subparsers.add_parser("status", help="查看跟踪列表统计")
+
+    args = parser.parse_args()
+
+    with StatsTracker(args.db, max_rate=getattr(args, "rate", None)) as tracker:
+        if args.command == "add":
+            items = args.items + (import_metadata_ids() if args.from_metadata else [])
+            added = tracker.add(items, args.hours * 3600)
+            print(f"已加入 {len(added)} 个视频")
+        elif args.command == "remove":
+            print(f"已移出 {tracker.remove(args.video_ids, keep_history=not args.purge)} 个视频")
+        elif args.command == "run":
+            status = tracker.status()
+            print(f"跟踪 {status['watched']} 个视频，{status['due']} 个已到期，速率上限 {status['rate']:.2f} 次/秒")
+            try:
+                print(f"刷新结果: {tracker.run(once=args.once)}")
+            except KeyboardInterrupt:
+                print(f"\n已停止，刷新结果: {tracker.counts}")
+        elif args.command == "history":
+            since = time.time() - args.days * 86400 if args.days else None
+            print_history(tracker.history(args.video_id, since))
+        elif args.command == "compact":
+            print(f"合并后删除 {tracker.compact(args.days * 86400)} 行")
+        elif args.command == "status":
+            status = tracker.status()
+            print(f"跟踪视频: {status['watched']}  已到期: {status['due']}  刷新失败: {status['failing']}  "
+                  f"数据点: {status['points']}  速率上限: {status['rate']:.2f} 次/秒")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+"""
+文本产物压缩基准测试
+从产物存储（以及旧版 txt、result 目录）中取转录和分析结果，比较不压缩、zlib、zlib+预置字典、
+zstd、zstd+训练字典（需要安装zstandard）的存储大小和读取延迟。
+字典只用一半样本生成，在另一半样本上测试，结果接近新文件的实际压缩效果
+"""
+
+import argparse
+import os
+import statistics
+import tempfile
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import artifact_store
+from artifact_store import ArtifactStore, compress_bytes, decompress_bytes, parse_header, read_text, train_dictionary
+from work_queue import percentile
+
+# 文件系统分配空间的块大小（小文件至少占用一个块）
+BLOCK_SIZE = 4096
+
+# 每个文件的读取次数（取中位数和P95）
+READ_ROUNDS = 5
+
+# 每种产物最多使用的样本数
+MAX_SAMPLES = 1000
+
+def load_samples(kind: str, limit: int = MAX_SAMPLES, extra_dir: Optional[str] = None) -> List[str]:
+    """
+    读取样本文本
+
+    Args:
+        kind: 产物类型（transcript 或 analysis）
+        limit: 最多读取的文件数
+        extra_dir: 额外的样本目录（读取其中的 .txt 文件）
+
+    Returns:
+        文本列表
+    """
+    import analyze_transcript
+    with ArtifactStore() as store:
+        paths = store.list(kind, limit=limit)
+    legacy_dir, pattern = {
+        "transcript": (analyze_transcript.TXT_DIR, "*.txt"),
+        "analysis": (analyze_transcript.RESULT_DIR, "*_analysis.txt"),
+    }[kind]
+    for directory in (legacy_dir, extra_dir):
+        if directory and os.path.isdir(directory):
+            paths += [str(p) for p in sorted(Path(directory).glob(pattern))]
+    return [text for text in (read_text(path) for path in paths[:limit]) if text.strip()]
+
+def disk_usage(size: int) -> int:
+    """按块分配后实际占用的磁盘空间"""
+    return max(1, -(-size // BLOCK_SIZE)) * BLOCK_SIZE
+
+def measure(texts: List[str], codec: Optional[str], dictionary: bytes, work_dir: str) -> Dict[str, Any]:
+    """
+    写入并读取一组文本，统计大小和读取延迟
+
+    Args:
+        texts: 测试文本
+        codec: 压缩方式，None 表示不压缩
+        dictionary: 字典
+        work_dir: 临时目录
+
+    Returns:
+        统计结果
+    """
+    paths = []
+    raw_bytes = stored_bytes = disk_bytes = 0
+    for i, text in enumerate(texts):
+        data = text.encode("utf-8")
+        blob = compress_bytes(data, codec, dictionary) if codec else data
+        path = os.path.join(work_dir, f"{codec or 'plain'}_{len(dictionary)}_{i}")
+        with open(path, "wb") as f:
+            f.write(blob)
+        paths.append(path)
+        raw_bytes += len(data)
+        stored_bytes += len(blob)
+        disk_bytes += disk_usage(len(blob))
+
+    latencies = []
+    for _ in range(READ_ROUNDS):
+        for path in paths:
+            start = time.perf_counter()
+            with open(path, "rb") as f:
+                blob = f.read()
+            header = parse_header(blob)
+            if header:
+                blob = decompress_bytes(header[0], header[2], dictionary)
+            blob.decode("utf-8")
+            latencies.append(time.perf_counter() - start)
+
+    return {
+        "raw_bytes": raw_bytes,
+        "stored_bytes": stored_bytes,
+        "disk_bytes": disk_bytes,
+        "read_p50": statistics.median(latencies),
+        "read_p95": percentile(latencies, 0.95),
+    }
+
+def available_codecs() -> List[str]:
+    """可用的压缩方式"""
+    codecs = ["zlib"]
+    try:
+        import zstandard  # noqa: F401
+        codecs.append("zstd")
+    except ImportError:
+        print("未安装zstandard，跳过zstd（pip install zstandard）")
+    return codecs
+
+def run_bench(kind: str, texts: List[str]) -> List[Dict[str, Any]]:
+    """
+    测试一种产物在各压缩方式下的大小和读取延迟
+
+    Returns:
+        每种配置的统计结果
+    """
+    train_texts, test_texts = texts[::2], texts[1::2]
+    configs = [("不压缩", None, b"")]
+    for codec in available_codecs():
+        configs.append((codec, codec, b""))
+        dictionary = train_dictionary(train_texts, codec) if len(train_texts) >= artifact_store.DICT_MIN_SAMPLES else b""
+        if dictionary:
+            configs.append((f"{codec}+字典({len(dictionary) // 1024}KB)", codec, dictionary))
+
+    results = []
+    with tempfile.TemporaryDirectory() as work_dir:
+        for name, codec, dictionary in configs:
+            result = measure(test_texts, codec, dictionary, work_dir)
+            result["name"] = name
+            results.append(result)
+
+    print("=" * 50)
+    print(f"{kind}: 测试 {len(test_texts)} 个文件（另外 {len(train_texts)} 个用于生成字典）")
+    print("=" * 50)
+    baseline = results[0]
+    for result in results:
+        saved = 1 - result["stored_bytes"] / baseline["stored_bytes"]
+        print(f"{result['name']:16s} 大小 {result['stored_bytes'] / 1024:9.1f} KB（节省 {saved:6.1%}）  "
+              f"占用 {result['disk_bytes'] / 1024:9.1f} KB  "
+              f"读取 P50 {result['read_p50'] * 1e6:7.1f} us  P95 {result['read_p95'] * 1e6:7.1f} us")
+    return results
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="比较转录和分析结果在各压缩方式下的存储大小和读取延迟")
+    parser.add_argument("kinds", nargs="*", default=list(artifact_store.COMPRESSED_KINDS),
+                        choices=list(artifact_store.COMPRESSED_KINDS), help="测试的产物类型（默认: 全部）")
+    parser.add_argument("--dir", help="额外的样本目录（其中的 .txt 文件）")
+    parser.add_argument("-n", "--limit", type=int, default=MAX_SAMPLES, help=f"每种产物最多使用的样本数（默认: {MAX_SAMPLES}）")
+    args = parser.parse_args()
+
+    for kind in args.kinds:
+        texts = load_samples(kind, args.limit, args.dir)
+        if len(texts) < 2:
+            print(f"{kind}: 样本不足，跳过")
+            continue
+        run_bench(kind, texts)
+
+if __name__ == "__main__":
+    main()
@@ -74,11 +74,19 @@ def test_file_paths():
         # 读取文件内容检查路径配置
         with open("download_douyin_video.py", "r", encoding="utf-8") as f:
             content = f.read()
-            if "TikTok_Video_API\\\\video" in content and "TikTok_Video_API\\\\json" in content:
+            if "TikTok_Video_API\\\\video" in content:
                 print("✓ download_douyin_video 路径配置正确")
             else:
                 print("✗ download_douyin_video 路径配置不正确")
                 return False
+        
+        # 检查metadata_store路径
+        import metadata_store
+        if "TikTok_Video_API" in metadata_store.DB_PATH:
+            print("✓ metadata_store 路径配置正确")
+        else:
+            print("✗ metadata_store 路径配置不正确")
+            return False
             
         # 检查video_to_text路径
         if "TikTok_Video_API" in video_to_text.VIDEO_DIR:
@@ -106,6 +114,1420 @@ def test_file_paths():
         print(f"✗ 文件路径测试失败: {e}")
         return False
 
+def test_lazy_imports():
+    """测试导入模块时不会加载whisper等重量级依赖"""
+    print("\n测试延迟导入...")
+    
+    try:
+        from startup_bench import measure_module
+        
+        result = measure_module("video_to_text")
+        if result["heavy"]:
+            print(f"✗ video_to_text 导入时加载了重量级依赖: {', '.join(result['heavy'])}")
+            return False
+        
+        print(f"✓ 延迟导入测试通过（video_to_text 导入耗时 {result['elapsed'] * 1000:.0f} ms）")
+        return True
+    except Exception as e:
+        print(f"✗ 延迟导入测试失败: {e}")
+        return False
+
+def test_fetch_scheduler():
+    """测试抓取调度器在本地模拟限流服务下的表现"""
+    print("\n测试抓取调度器...")
+    
+    try:
+        from concurrent.futures import ThreadPoolExecutor
+        from fetch_scheduler import FetchScheduler
+        from local_standin import DouyinStandin
+        
+        with DouyinStandin(capacity=2, latency=0.05) as standin:
+            scheduler = FetchScheduler(initial_concurrency=6, max_concurrency=8,
+                                       latency_target=0.5, base_delay=0.05, max_delay=0.5, max_retries=8)
+            urls = [f"{standin.base_url}/share/video/{i}" for i in range(12)]
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                responses = list(executor.map(scheduler.fetch, urls))
+        
+        if not all("_ROUTER_DATA" in r.text for r in responses):
+            print("✗ 抓取调度器未能获取全部页面")
+            return False
+        if standin.stats["throttled"] == 0 or scheduler.concurrency_limit >= 6:
+            print("✗ 抓取调度器未对限流做出响应")
+            return False
+        
+        print(f"✓ 抓取调度器测试通过（限流 {standin.stats['throttled']} 次，并发上限降至 {scheduler.concurrency_limit}）")
+        return True
+    except Exception as e:
+        print(f"✗ 抓取调度器测试失败: {e}")
+        return False
+
+def test_export_metadata():
+    """测试视频信息批量导出（JSONL输出、不打印解析进度、续传跳过已导出链接）"""
+    print("\n测试视频信息批量导出...")
+    
+    try:
+        import contextlib
+        import io
+        import json
+        import tempfile
+        from export_metadata import export_metadata
+        from load_test import pipeline_environment
+        from local_standin import DeepSeekStandin, DouyinStandin
+        
+        with DouyinStandin() as douyin, DeepSeekStandin() as deepseek, tempfile.TemporaryDirectory() as work_dir, \
+                pipeline_environment(douyin, deepseek, work_dir):
+            urls = [douyin.short_link(str(7000 + i)) for i in range(4)]
+            output_path = os.path.join(work_dir, "export.jsonl")
+            printed = io.StringIO()
+            with contextlib.redirect_stdout(printed):
+                first = export_metadata(urls[:3], output_path, workers=3)
+            second = export_metadata(urls, output_path, workers=3)
+            with open(output_path, "r", encoding="utf-8") as f:
+                records = [json.loads(line) for line in f]
+        
+        if printed.getvalue():
+            print(f"✗ 导出过程中打印了解析进度: {printed.getvalue()!r}")
+            return False
+        if first["success"] != 3 or second["skipped"] != 3 or second["success"] != 1:
+            print(f"✗ 导出或续传统计不正确: {first}, {second}")
+            return False
+        if sorted(r["video_id"] for r in records) != [str(7000 + i) for i in range(4)]:
+            print("✗ 导出的JSONL记录不正确")
+            return False
+        
+        print("✓ 视频信息批量导出测试通过")
+        return True
+    except Exception as e:
+        print(f"✗ 视频信息批量导出测试失败: {e}")
+        return False
+
+def test_metadata_store():
+    """测试视频信息存储的写入和查询"""
+    print("\n测试视频信息存储...")
+    
+    try:
+        from metadata_store import MetadataStore
+        
+        with MetadataStore(":memory:", batch_size=2) as store:
+            store.add({"video_id": "1", "title": "a", "author": "甲", "likes": 5}, fetched_at=100)
+            store.add({"video_id": "1", "title": "a", "author": "甲", "likes": 8}, fetched_at=200)
+            store.add({"video_id": "2", "title": "b", "author": "乙", "likes": 3}, fetched_at=150)
+            
+            if len(store.get_history("1")) != 2 or store.get_latest("1")["likes"] != 8:
+                print("✗ 视频信息存储历史快照不正确")
+                return False
+            if [r["video_id"] for r in store.top_liked()] != ["1", "2"]:
+                print("✗ 视频信息存储排行查询不正确")
+                return False
+            if len(store.by_author("甲")) != 1:
+                print("✗ 视频信息存储作者查询不正确")
+                return False
+        
+        print("✓ 视频信息存储测试通过")
+        return True
+    except Exception as e:
+        print(f"✗ 视频信息存储测试失败: {e}")
+        return False
+
+def test_link_ingest():
+    """测试流式链接提取和去重"""
+    print("\n测试流式链接提取...")
+    
+    try:
+        import io
+        from link_ingest import iter_chunks, iter_douyin_urls
+        
+        text = "".join(f"第{i}条 https://v.douyin.com/id{i % 50}/ 收藏\n" for i in range(1000))
+        # 使用很小的块大小，检验跨块边界的链接能被完整提取
+        urls = list(iter_douyin_urls(iter_chunks(io.StringIO(text), chunk_size=13)))
+        
+        if urls != [f"https://v.douyin.com/id{i}/" for i in range(50)]:
+            print("✗ 流式链接提取结果不正确")
+            return False
+        
+        # 内嵌在其他URL参数中的分享链接不能被兜底匹配吞掉
+        embedded = list(iter_douyin_urls(["见 https://example.com/jump?to=https://v.douyin.com/abc/ 谢谢"]))
+        if embedded != ["https://v.douyin.com/abc/"]:
+            print(f"✗ 内嵌的分享链接提取不正确: {embedded}")
+            return False
+        # 有分享链接时不产出其他层级的链接，没有时依次退回
+        tiers = [
+            ("https://www.douyin.com/video/1 https://v.douyin.com/x/ https://a.com/", ["https://v.douyin.com/x/"]),
+            ("https://www.douyin.com/video/1 https://a.com/", ["https://www.douyin.com/video/1"]),
+            ("https://a.com/ https://b.com/", ["https://a.com/", "https://b.com/"]),
+        ]
+        for text, expected in tiers:
+            if list(iter_douyin_urls([text])) != expected:
+                print(f"✗ 链接分级不正确: {text}")
+                return False
+        
+        print("✓ 流式链接提取测试通过")
+        return True
+    except Exception as e:
+        print(f"✗ 流式链接提取测试失败: {e}")
+        return False
+
+def test_transcript_stream():
+    """测试流式转录（逐窗口解码、字幕时间戳、SRT/VTT/JSONL输出）和清理时字幕文件与转录文本算作一条"""
+    print("\n测试流式转录...")
+    
+    try:
+        import tempfile
+        import time
+        import numpy as np
+        from clean_old_files import clean_directory
+        from transcript_stream import (SAMPLE_RATE, TranscriptWriter, format_timestamp,
+                                       read_partial_segments, stream_transcribe)
+        
+        class FakeModel:
+            """每10秒识别出一个片段；音频的采样值就是该采样点在整段音频中的秒数"""
+            def __init__(self):
+                self.prompts = []
+            
+            def transcribe(self, chunk, initial_prompt=None, **kwargs):
+                self.prompts.append(initial_prompt)
+                offset = int(round(float(chunk[0])))
+                length = len(chunk) / SAMPLE_RATE
+                return {"segments": [{"start": s, "end": min(s + 10, length), "text": f"第{offset + s}秒"}
+                                     for s in range(0, int(length), 10)]}
+        
+        if format_timestamp(3661.5) != "01:01:01,500" or format_timestamp(59.9996, ".") != "00:01:00.000":
+            print("✗ 字幕时间戳格式不正确")
+            return False
+        
+        model = FakeModel()
+        audio = np.arange(70 * SAMPLE_RATE, dtype=np.float32) / SAMPLE_RATE
+        segments = list(stream_transcribe(model, audio, initial_prompt="提示"))
+        # 非最后一个窗口丢弃末尾片段，下一个窗口从该片段起点重新解码，片段既不重复也不遗漏
+        if [(s["start"], s["end"]) for s in segments] != [(t, t + 10) for t in range(0, 70, 10)]:
+            print(f"✗ 流式转录片段不正确: {segments}")
+            return False
+        if [s["text"] for s in segments] != [f"第{t}秒" for t in range(0, 70, 10)] or \
+                model.prompts != ["提示", "第0秒第10秒", "第20秒第30秒"]:
+            print(f"✗ 流式转录文本或提示词不正确: {model.prompts}")
+            return False
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, "a_transcript.txt")
+            with TranscriptWriter(output_path, "a.mp4", convert=lambda text: text.replace("秒", "s")) as writer:
+                for seg in segments[:2]:
+                    writer.write_segment(seg)
+                partial = read_partial_segments(writer.jsonl_path)
+            with open(output_path, encoding="utf-8") as f:
+                txt = f.read()
+            with open(writer.srt_path, encoding="utf-8") as f:
+                srt = f.read()
+            with open(writer.vtt_path, encoding="utf-8") as f:
+                vtt = f.read()
+            
+            if not txt.startswith("文件: a.mp4\n") or not txt.endswith("第0s第10s") or writer.text != "第0s第10s":
+                print("✗ 转录文本输出不正确")
+                return False
+            if srt != "1\n00:00:00,000 --> 00:00:10,000\n第0s\n\n2\n00:00:10,000 --> 00:00:20,000\n第10s\n\n":
+                print(f"✗ SRT输出不正确: {srt!r}")
+                return False
+            if vtt != "WEBVTT\n\n00:00:00.000 --> 00:00:10.000\n第0s\n\n00:00:10.000 --> 00:00:20.000\n第10s\n\n":
+                print(f"✗ VTT输出不正确: {vtt!r}")
+                return False
+            if partial != [{"id": 0, "start": 0, "end": 10, "text": "第0s"}, {"id": 1, "start": 10, "end": 20, "text": "第10s"}]:
+                print(f"✗ JSONL输出不正确: {partial}")
+                return False
+            
+            # 12条转录各带3个字幕文件，保留10条时只删除最旧的2条（共8个文件）
+            txt_dir = os.path.join(tmp_dir, "txt")
+            os.makedirs(txt_dir)
+            now = time.time()
+            for i in range(12):
+                for ext in (".txt", ".srt", ".vtt", ".segments.jsonl"):
+                    path = os.path.join(txt_dir, f"v{i}_transcript{ext}")
+                    open(path, "w").close()
+                    os.utime(path, (now - 100 + i, now - 100 + i))
+            clean_directory(txt_dir, 10)
+            remaining = sorted(os.listdir(txt_dir))
+        
+        if len(remaining) != 40 or any(name.startswith(("v0_", "v1_")) for name in remaining):
+            print(f"✗ 清理时字幕文件未与转录文本一起计数: 剩余 {len(remaining)} 个文件")
+            return False
+        
+        print("✓ 流式转录测试通过")
+        return True
+    except Exception as e:
+        print(f"✗ 流式转录测试失败: {e}")
+        return False
+
+def test_decoding_profiles():
+    """测试Whisper解码基准的字错误率、按时长分档推荐配置和转录时的配置选择"""
+    print("\n测试解码配置推荐...")
+    
+    try:
+        import json
+        import tempfile
+        import video_to_text
+        from whisper_bench import char_error_rate, recommend_profiles
+        
+        class FakeConverter:
+            def convert(self, text):
+                return text.replace("們", "们")
+        
+        saved_converter = video_to_text._converter
+        video_to_text._converter = FakeConverter()
+        try:
+            rates = [char_error_rate("今天天气很好", "今天天气很好。"), char_error_rate("今天天气很好", "今天天汽很好"),
+                     char_error_rate("我们", "我們"), char_error_rate("", ""), char_error_rate("好", "")]
+        finally:
+            video_to_text._converter = saved_converter
+        if rates != [0.0, 1 / 6, 0.0, 0.0, 1.0]:
+            print(f"✗ 字错误率计算不正确: {rates}")
+            return False
+        
+        def result(model, duration, cer, rtf):
+            return {"model": model, "config": "greedy", "params": {"beam_size": None},
+                    "duration": duration, "cer": cer, "rtf": rtf}
+        
+        runs = [
+            {"model": "base", "results": [result("base", 20, 0.05, 0.1), result("base", 300, 0.20, 0.1)]},
+            {"model": "small", "results": [result("small", 20, 0.04, 0.3), result("small", 300, 0.05, 0.3)]},
+        ]
+        profiles = recommend_profiles(runs)
+        # 短音频两者CER相差不超过容差，选更快的base；长音频base的CER过高，选small；最后一档覆盖任意时长
+        if [(p["model"], p["max_duration"]) for p in profiles] != [("base", 30), ("small", None)]:
+            print(f"✗ 解码配置推荐不正确: {profiles}")
+            return False
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            profile_path = os.path.join(tmp_dir, "profiles.json")
+            with open(profile_path, "w", encoding="utf-8") as f:
+                json.dump({"profiles": list(reversed(profiles))}, f)
+            selected = [video_to_text.select_decoding_profile(d, profile_path)["model"] for d in (10, 30, 31, 5000)]
+            missing = video_to_text.select_decoding_profile(10, os.path.join(tmp_dir, "missing.json"))
+        
+        if selected != ["base", "base", "small", "small"] or missing is not None:
+            print(f"✗ 按时长选择解码配置不正确: {selected}, {missing}")
+            return False
+        
+        print("✓ 解码配置推荐测试通过")
+        return True
+    except Exception as e:
+        print(f"✗ 解码配置推荐测试失败: {e}")
+        return False
+
+def test_transcribe_scheduler():
+    """测试转录调度（最短作业优先、老化、急用任务优先、LPT装箱）和每个工作线程各自加载模型"""
+    print("\n测试转录调度...")
+    
+    try:
+        import threading
+        import types
+        import video_to_text
+        from transcribe_scheduler import TranscriptionJob, TranscriptionQueue, plan_workers, run_queue
+        
+        def drain(queue):
+            order = []
+            while len(queue):
+                order.append(queue.pop().path)
+            return order
+        
+        queue = TranscriptionQueue()
+        for path, duration in [("long", 300), ("short", 10), ("mid", 60)]:
+            queue.push(TranscriptionJob(path, duration, enqueued_at=0.0))
+        queue.push(TranscriptionJob("urgent", 600, priority="interactive", enqueued_at=0.0))
+        if drain(queue) != ["urgent", "short", "mid", "long"]:
+            print("✗ 最短作业优先或急用任务优先调度不正确")
+            return False
+        
+        # 长任务已排队200秒，按 0.5 的老化系数视为时长减少100秒，先于刚入队的短任务
+        for rate, expected in [(0.5, ["old_long", "new_short"]), (0.0, ["new_short", "old_long"])]:
+            queue = TranscriptionQueue(aging_rate=rate)
+            queue.push(TranscriptionJob("old_long", 100, enqueued_at=0.0))
+            queue.push(TranscriptionJob("new_short", 10, enqueued_at=200.0))
+            if drain(queue) != expected:
+                print(f"✗ 老化系数为 {rate} 时调度顺序不正确")
+                return False
+        
+        jobs = [TranscriptionJob(str(d), d) for d in (7, 5, 4, 3, 3, 2)]
+        plan = plan_workers(jobs, 2)
+        loads = [sum(j.expected_duration for j in assigned) for assigned in plan]
+        if loads != [12, 12] or any([j.expected_duration for j in a] != sorted(j.expected_duration for j in a) for a in plan):
+            print(f"✗ LPT装箱不均衡: {loads}")
+            return False
+        
+        # 预留1个线程只处理急用任务，全部任务仍能处理完
+        queue = TranscriptionQueue()
+        for i in range(6):
+            queue.push(TranscriptionJob(f"bulk{i}", i + 1))
+        queue.push(TranscriptionJob("urgent", 50, priority="interactive"))
+        done = run_queue(queue, lambda path: path.upper(), workers=2, reserved=1)
+        if sorted(job.result for job in done) != sorted(["URGENT"] + [f"BULK{i}" for i in range(6)]):
+            print("✗ 转录队列未处理全部任务")
+            return False
+        
+        # 每个线程各自加载一份模型，同一线程内复用
+        loads_count = []
+        fake_whisper = types.ModuleType("whisper")
+        fake_whisper.load_model = lambda name: loads_count.append(name) or object()
+        saved = (sys.modules.get("whisper"), video_to_text.MMAP_MODEL)
+        sys.modules["whisper"], video_to_text.MMAP_MODEL = fake_whisper, False
+        try:
+            pairs = []
+            def load():
+                first = video_to_text.load_whisper_model("base")
+                pairs.append((first, video_to_text.load_whisper_model("base")))
+            threads = [threading.Thread(target=load) for _ in range(2)]
+            for t in threads:
+                t.start()
+            for t in threads:
+                t.join()
+        finally:
+            if saved[0] is None:
+                sys.modules.pop("whisper", None)
+            else:
+                sys.modules["whisper"] = saved[0]
+            video_to_text.MMAP_MODEL = saved[1]
+        if len(loads_count) != 2 or any(a is not b for a, b in pairs) or pairs[0][0] is pairs[1][0]:
+            print("✗ 工作线程之间共享了同一个Whisper模型")
+            return False
+        
+        print("✓ 转录调度测试通过")
+        return True
+    except Exception as e:
+        print(f"✗ 转录调度测试失败: {e}")
+        return False
+
+def test_audio_fingerprint():
+    """测试音频指纹对裁剪和加噪后的重复音频的识别、对齐时间差和复用片段的截取"""
+    print("\n测试音频指纹...")
+    
+    try:
+        import numpy as np
+        from audio_fingerprint import FingerprintIndex, align_segments, fingerprint
+        
+        def synth(seed, seconds=20):
+            # 每0.25秒一个随机频率的音调，叠加少量噪声
+            rng = np.random.default_rng(seed)
+            t = np.arange(seconds * 16000) / 16000
+            audio = np.zeros_like(t)
+            for k in range(seconds * 4):
+                s = slice(k * 4000, (k + 1) * 4000)
+                audio[s] = np.sin(2 * np.pi * rng.uniform(200, 4000) * t[s])
+            return (audio + 0.05 * rng.standard_normal(len(t))).astype(np.float32)
+        
+        original = synth(1)
+        repost = original[16000 * 3:] + 0.1 * np.random.default_rng(0).standard_normal(len(original) - 16000 * 3)
+        
+        segments = [{"start": s, "end": s + 5.0, "text": text} for s, text in zip((0.0, 5.0, 10.0, 15.0), "甲乙丙丁")]
+        
+        with FingerprintIndex(":memory:") as index:
+            index.add(fingerprint(original), "original.mp4", "original.txt", "甲乙丙丁", segments)
+            index.add(fingerprint(synth(2)), "other.mp4", "other.txt", "其他转录")
+            match = index.lookup(fingerprint(repost.astype(np.float32)))
+            unrelated = index.lookup(fingerprint(synth(3)))
+            # 只截取原音频的一小段，或在原音频后拼接大量其他内容，都不应复用整段转录
+            excerpt = index.lookup(fingerprint(original[16000 * 5:16000 * 9]))
+            extended = index.lookup(fingerprint(np.concatenate([original, synth(4, 40)])))
+        
+        if not match or match["text"] != "甲乙丙丁" or unrelated is not None:
+            print("✗ 音频指纹匹配结果不正确")
+            return False
+        if excerpt is not None or extended is not None:
+            print("✗ 只有部分重合的音频被判定为同一段音频")
+            return False
+        if abs(match["offset"] - 3.0) > 0.1:
+            print(f"✗ 音频指纹对齐的时间差不正确: {match['offset']}")
+            return False
+        
+        # 转载音频从原音频第3秒开始：丢弃大部分已被裁掉的第一个片段，其余片段前移3秒
+        aligned = align_segments(match["segments"], 3.0, 17.0)
+        if aligned != [{"start": 2.0, "end": 7.0, "text": "乙"}, {"start": 7.0, "end": 12.0, "text": "丙"},
+                       {"start": 12.0, "end": 17.0, "text": "丁"}]:
+            print(f"✗ 复用的转录片段未对齐到转载音频: {aligned}")
+            return False
+        
+        # 峰值密度上限：20秒音频的哈希数不超过每秒80个
+        if len(fingerprint(original)) > 20 * 80:
+            print(f"✗ 指纹哈希数超过密度上限: {len(fingerprint(original))}")
+            return False
+        
+        # 同一段音频索引两次后，所有哈希都超过停用上限，不再读取候选
+        with FingerprintIndex(":memory:", stop_hash_limit=1) as index:
+            index.add(fingerprint(original), "a.mp4", "a.txt", "甲")
+            if index.lookup(fingerprint(original)) is None:
+                print("✗ 未超过停用上限的哈希没有参与匹配")
+                return False
+            index.add(fingerprint(original), "b.mp4", "b.txt", "甲")
+            if index.lookup(fingerprint(original)) is not None:
+                print("✗ 停用哈希仍然参与了匹配")
+                return False
+        
+        print(f"✓ 音频指纹测试通过（匹配度 {match['score']:.2f}）")
+        return True
+    except Exception as e:
+        print(f"✗ 音频指纹测试失败: {e}")
+        return False
+
+def test_batch_analysis():
+    """测试批量分析的打包和返回结果拆分"""
+    print("\n测试批量分析...")
+    
+    try:
+        from analyze_transcript import pack_batches, parse_batch_response
+        
+        items = [(str(i), "字" * 400) for i in range(5)]
+        batches = pack_batches(items, token_budget=1000, max_items=4)
+        if [len(batch) for batch in batches] != [2, 2, 1]:
+            print("✗ 按token预算打包的结果不正确")
+            return False
+        
+        response = '```json\n[{"id": "1", "analysis": "乙"}, {"id": 0, "analysis": "甲"}]\n```'
+        if parse_batch_response(response, ["0", "1"]) != {"0": "甲", "1": "乙"}:
+            print("✗ 批量返回结果拆分不正确")
+            return False
+        
+        try:
+            parse_batch_response('[{"id": "0", "analysis": "甲"}]', ["0", "1"])
+            print("✗ 缺少编号时应当解析失败")
+            return False
+        except ValueError:
+            pass
+        
+        print("✓ 批量分析测试通过")
+        return True
+    except Exception as e:
+        print(f"✗ 批量分析测试失败: {e}")
+        return False
+
+def test_transcript_normalize():
+    """测试转录文本预压缩"""
+    print("\n测试转录文本预压缩...")
+    
+    try:
+        from transcript_normalize import collapse_repetitions, normalize_transcript
+        
+        text = "嗯，大家好，今天介绍一下这款产品。" + "谢谢大家的观看，" * 40 + "价格是1000元"
+        normalized, stats = normalize_transcript(text)
+        
+        if normalized != "大家好，今天介绍一下这款产品。谢谢大家的观看，价格是1000元":
+            print(f"✗ 预压缩结果不正确: {normalized}")
+            return False
+        if stats["tokens_after"] >= stats["tokens_before"]:
+            print("✗ 预压缩后token数没有减少")
+            return False
+        
+        # 正常说法中的少量重复、英文和数字、网址都不能被折叠
+        for text in ["一步一步一步来", "对对对", "AAA级景区", "www.abcabcabc.com",
+                     "访问 https://example.com/ababababab/ 查看", "电话是13333333333"]:
+            if normalize_transcript(text)[0] != text:
+                print(f"✗ 正常文本被误折叠: {text} → {normalize_transcript(text)[0]}")
+                return False
+        
+        # 句子连续出现不到 MIN_REPEATS 次时保留，达到时只保留一次
+        for text in ["我爱你。我爱你。", "对。对。"]:
+            if collapse_repetitions(text) != text:
+                print(f"✗ 少量重复的句子被误折叠: {text} → {collapse_repetitions(text)}")
+                return False
+        # 标点不同的重复句子不能被片段规则匹配，由句子规则折叠
+        text = "好的。好的…。" * 2 + "好的。再见"
+        if collapse_repetitions(text) != "好的。再见":
+            print(f"✗ 重复句子没有被折叠: {collapse_repetitions(text)}")
+            return False
+        
+        # 没有重复的文本切分再拼接后不能丢失任何字符（包括开头和连续的标点）
+        text = "？？你说什么！\n\n我没听清。。。那再说一遍？好\n"
+        if len(collapse_repetitions(text)) != len(text):
+            print(f"✗ 句子切分丢失了字符: {collapse_repetitions(text)}")
+            return False
+        
+        print(f"✓ 转录文本预压缩测试通过（约 {stats['tokens_before']} → {stats['tokens_after']} tokens）")
+        return True
+    except Exception as e:
+        print(f"✗ 转录文本预压缩测试失败: {e}")
+        return False
+
+def test_deepseek_client():
+    """测试DeepSeek客户端的对冲请求和熔断器"""
+    print("\n测试DeepSeek客户端...")
+    
+    try:
+        import time
+        from deepseek_client import CircuitBreaker, CircuitOpenError, DeepSeekClient
+        from local_standin import DeepSeekStandin
+        
+        payload = {"messages": [{"role": "user", "content": "测试"}]}
+        with DeepSeekStandin(latency=0.01, slow_rate=0.05, slow_latency=3.0) as standin:
+            # 慢请求应被对冲请求替代，最长延迟远低于注入的3秒
+            client = DeepSeekClient(standin.api_url, "test", max_hedge_ratio=1.0)
+            latencies = []
+            for _ in range(60):
+                start = time.monotonic()
+                client.complete(payload)
+                latencies.append(time.monotonic() - start)
+            if standin.stats["slow"] == 0 or max(latencies) > 1.5:
+                print(f"✗ 对冲请求未能降低尾延迟（最长 {max(latencies):.2f} 秒）")
+                return False
+            hedged = client.stats["hedged"]
+            
+            # 上游故障时熔断器打开，后续请求直接失败
+            standin.error_rate = 1.0
+            client = DeepSeekClient(standin.api_url, "test", breaker=CircuitBreaker(min_requests=2))
+            for _ in range(2):
+                try:
+                    client.complete(payload, max_retries=1)
+                except Exception:
+                    pass
+            start = time.monotonic()
+            try:
+                client.complete(payload)
+                print("✗ 熔断器未打开")
+                return False
+            except CircuitOpenError:
+                pass
+            if time.monotonic() - start > 0.1:
+                print("✗ 熔断器打开后没有快速失败")
+                return False
+            
+            # 半开状态下的试探请求收到400（请求本身有误）时应释放试探名额，上游恢复后请求可以正常发出
+            client = DeepSeekClient(standin.api_url, "test", breaker=CircuitBreaker(min_requests=2, cooldown=0.2))
+            for _ in range(2):
+                try:
+                    client.complete(payload, max_retries=1)
+                except Exception:
+                    pass
+            time.sleep(0.3)
+            standin.error_status = 400
+            try:
+                client.complete(payload)
+                print("✗ 400响应未抛出异常")
+                return False
+            except CircuitOpenError:
+                print("✗ 400响应被当作熔断")
+                return False
+            except Exception:
+                pass
+            standin.error_rate = 0.0
+            if client.complete(payload) != "模拟分析结果" or client.breaker.state != "closed":
+                print("✗ 试探请求收到400后熔断器一直处于半开状态")
+                return False
+        
+        # 只有持有试探名额的请求能释放名额，过期的试探编号不影响之后的试探
+        breaker = CircuitBreaker(min_requests=1, cooldown=0.05)
+        breaker.record(False)
+        time.sleep(0.1)
+        allowed, probe = breaker.allow()
+        if not allowed or probe is None or breaker.allow()[0]:
+            print("✗ 半开状态下没有只放行一个试探请求")
+            return False
+        breaker.record(False)
+        time.sleep(0.1)
+        _, next_probe = breaker.allow()
+        breaker.release(probe)
+        if breaker.allow()[0]:
+            print("✗ 过期的试探请求释放了新试探的名额")
+            return False
+        breaker.release(next_probe)
+        allowed, probe = breaker.allow()
+        if not allowed or probe is None:
+            print("✗ 试探请求释放名额后没有重新放行试探")
+            return False
+        
+        # 单次尝试的超时时间按 max_tokens 放宽
+        short_timeout, _ = client.timeouts(payload)
+        long_timeout, long_deadline = client.timeouts({**payload, "max_tokens": 8192})
+        if long_timeout <= short_timeout + 60 or long_deadline <= client.deadline + 60:
+            print("✗ 生成长回复时的超时时间没有放宽")
+            return False
+        
+        print(f"✓ DeepSeek客户端测试通过（对冲 {hedged} 次，最长延迟 {max(latencies):.2f} 秒）")
+        return True
+    except Exception as e:
+        print(f"✗ DeepSeek客户端测试失败: {e}")
+        return False
+
+def test_search_index():
+    """测试全文检索索引"""
+    print("\n测试全文检索...")
+    
+    try:
+        import tempfile
+        from search_index import TRIGRAM_AVAILABLE, SearchIndex
+        
+        # trigram 分词器和逐字索引（SQLite 3.34 以前）的检索结果应当一致
+        for trigram in ((True, False) if TRIGRAM_AVAILABLE else (False,)):
+            with SearchIndex(":memory:", trigram=trigram) as index:
+                video_info = {"video_id": "7001", "title": "耳机测评", "author": "数码博主"}
+                index.add_document("transcript", "a_transcript.txt", [
+                    {"start": 0.0, "end": 3.0, "text": "今天测评一款降噪耳机"},
+                    {"start": 3.0, "end": 6.0, "text": "价格是299元"},
+                ], video_info)
+                index.add_document("analysis", "a_transcript_analysis.txt", [{"text": "主要内容：耳机降噪效果评测"}], video_info)
+                # 重新索引同一文件时替换旧内容
+                index.add_document("transcript", "a_transcript.txt", [{"text": "今天测评一款降噪耳机"}], video_info)
+                
+                results = index.search("降噪 耳机")
+                transcripts = index.search("耳机", kind="transcript")
+                missing = index.search("手机")
+                phrase = index.search("降噪耳机")
+                mixed = index.search("降噪效果 耳机")
+            
+            if len(results) != 2 or results[0]["video_id"] != "7001" or transcripts[0]["snippet"] != "今天测评一款降噪【耳机】":
+                print(f"✗ 全文检索结果不正确（trigram={trigram}）")
+                return False
+            if len(transcripts) != 1 or missing:
+                print(f"✗ 全文检索过滤或重新索引不正确（trigram={trigram}）")
+                return False
+            if [r["snippet"] for r in phrase] != ["今天测评一款【降噪耳机】"] or len(mixed) != 1:
+                print(f"✗ 多字词检索结果不正确（trigram={trigram}）: {phrase} {mixed}")
+                return False
+        
+        # 已有的逐字索引在支持 trigram 时自动重建，原有内容仍可检索
+        if TRIGRAM_AVAILABLE:
+            with tempfile.TemporaryDirectory() as tmp:
+                db_path = os.path.join(tmp, "search.db")
+                with SearchIndex(db_path, trigram=False) as index:
+                    index.add_document("transcript", "b_transcript.txt", [{"text": "这款口红的试色效果"}])
+                with SearchIndex(db_path) as index:
+                    rebuilt = index.search("口红的试色")
+            if [r["snippet"] for r in rebuilt] != ["这款【口红的试色】效果"]:
+                print(f"✗ 全文索引改用 trigram 后内容丢失: {rebuilt}")
+                return False
+        
+        print("✓ 全文检索测试通过")
+        return True
+    except Exception as e:
+        print(f"✗ 全文检索测试失败: {e}")
+        return False
+
+def test_whisper_mmap_defaults():
+    """测试内存映射加载默认关闭，默认通过 whisper.load_model 加载模型"""
+    print("\n测试模型加载默认配置...")
+    
+    try:
+        import threading
+        import types
+        import video_to_text
+        import whisper_mmap
+        
+        if video_to_text.MMAP_MODEL or whisper_mmap.AUTO_CONVERT:
+            print("✗ 内存映射加载或自动转换默认开启")
+            return False
+        
+        loaded = []
+        fake_whisper = types.ModuleType("whisper")
+        fake_whisper.load_model = lambda name: loaded.append(name) or object()
+        saved = sys.modules.get("whisper")
+        sys.modules["whisper"] = fake_whisper
+        try:
+            # 在新线程中加载，不使用当前线程已缓存的模型
+            thread = threading.Thread(target=video_to_text.load_whisper_model, args=("tiny",))
+            thread.start()
+            thread.join()
+        finally:
+            if saved is None:
+                sys.modules.pop("whisper", None)
+            else:
+                sys.modules["whisper"] = saved
+        
+        if loaded != ["tiny"]:
+            print("✗ 默认配置下没有使用 whisper.load_model 加载模型")
+            return False
+        
+        print("✓ 模型加载默认配置测试通过")
+        return True
+    except Exception as e:
+        print(f"✗ 模型加载默认配置测试失败: {e}")
+        return False
+
+def test_whisper_mmap_equivalence():
+    """测试内存映射加载的模型与 whisper.load_model 加载的权重和输出完全一致（未安装torch或whisper时跳过）"""
+    print("\n测试内存映射加载...")
+    
+    try:
+        try:
+            import torch
+            import whisper
+            from whisper.model import ModelDimensions, Whisper
+        except ImportError:
+            print("✓ 未安装 torch 或 whisper，跳过内存映射加载测试")
+            return True
+        import tempfile
+        from whisper_mmap import convert_checkpoint, load_model_mmap, mmap_supported
+        
+        if not mmap_supported():
+            print("✓ 当前torch版本不支持内存映射加载，跳过内存映射加载测试")
+            return True
+        
+        dims = ModelDimensions(n_mels=80, n_audio_ctx=8, n_audio_state=16, n_audio_head=2, n_audio_layer=1,
+                               n_vocab=64, n_text_ctx=8, n_text_state=16, n_text_head=2, n_text_layer=2)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            # 用随机初始化的小模型代替官方检查点
+            checkpoint_path = os.path.join(tmp_dir, "tiny_test.pt")
+            torch.save({"dims": dims.__dict__, "model_state_dict": Whisper(dims).state_dict()}, checkpoint_path)
+            convert_checkpoint(checkpoint_path, tmp_dir)
+            
+            normal = whisper.load_model(checkpoint_path, device="cpu")
+            mapped = load_model_mmap("tiny_test", device="cpu", model_dir=tmp_dir)
+            
+            normal_state, mapped_state = normal.state_dict(), mapped.state_dict()
+            if normal_state.keys() != mapped_state.keys() or \
+                    not all(torch.equal(normal_state[key], mapped_state[key]) for key in normal_state):
+                print("✗ 内存映射加载的权重与 whisper.load_model 不一致")
+                return False
+            if not torch.equal(normal.alignment_heads.to_dense(), mapped.alignment_heads.to_dense()):
+                print("✗ 内存映射加载的对齐注意力头与 whisper.load_model 不一致")
+                return False
+            
+            mel = torch.randn(1, dims.n_mels, dims.n_audio_ctx * 2)
+            tokens = torch.tensor([[1, 2, 3]])
+            with torch.no_grad():
+                expected = normal(mel, tokens)
+                actual = mapped(mel, tokens)
+            # 释放映射的张量后才能删除临时目录中的文件（Windows）
+            del normal, mapped, normal_state, mapped_state
+        
+        if not torch.equal(expected, actual):
+            print("✗ 内存映射加载的模型解码输出与 whisper.load_model 不一致")
+            return False
+        
+        print("✓ 内存映射加载测试通过")
+        return True
+    except Exception as e:
+        print(f"✗ 内存映射加载测试失败: {e}")
+        return False
+
+def test_work_queue():
+    """测试分布式任务队列的租约和重新投递"""
+    print("\n测试分布式任务队列...")
+    
+    try:
+        import tempfile
+        import time
+        from work_queue import SQLiteQueue, run_worker
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with SQLiteQueue(os.path.join(tmp_dir, "queue.db"), max_attempts=2) as queue:
+                job_id = queue.put("transcribe", {"video": "a.mp4"})
+                job = queue.claim("transcribe", "worker-1", lease_seconds=0.2)
+                idle = queue.claim("transcribe", "worker-2")
+                # worker-1 失联，租约过期后任务重新投递给 worker-2
+                time.sleep(0.3)
+                redelivered = queue.claim("transcribe", "worker-2", lease_seconds=5)
+                stale_heartbeat = queue.heartbeat(job)
+                queue.complete(redelivered, "a_transcript.txt")
+                
+                queue.put("analyze", {"transcript": "b.txt"})
+                run_worker(queue, "analyze", lambda payload: 1 / 0, "worker-3", exit_when_idle=True)
+                run_worker(queue, "analyze", lambda payload: 1 / 0, "worker-3", exit_when_idle=True)
+                stats = queue.stats()
+        
+        if job.id != job_id or idle is not None or redelivered is None or redelivered.id != job_id:
+            print("✗ 租约过期后任务没有被重新投递")
+            return False
+        if stale_heartbeat or redelivered.attempts != 2:
+            print("✗ 租约丢失后仍能续约或投递次数不正确")
+            return False
+        if stats != {"transcribe": {"done": 1}, "analyze": {"dead": 1}}:
+            print(f"✗ 队列状态不正确: {stats}")
+            return False
+        
+        print("✓ 分布式任务队列测试通过")
+        return True
+    except Exception as e:
+        print(f"✗ 分布式任务队列测试失败: {e}")
+        return False
+
+def test_redis_queue():
+    """测试Redis队列的领取、续约、完成、租约过期重新投递和统计（使用fakeredis，未安装时跳过）"""
+    print("\n测试Redis任务队列...")
+    
+    try:
+        from work_queue import RedisQueue, WorkQueue
+        
+        try:
+            WorkQueue()
+            print("✗ 任务队列接口可以直接实例化")
+            return False
+        except TypeError:
+            pass
+        
+        try:
+            import fakeredis
+        except ImportError:
+            print("✓ 未安装 fakeredis，跳过Redis任务队列测试")
+            return True
+        import time
+        
+        # 脚本访问未通过 KEYS 声明的键时报错（Redis Cluster 要求脚本访问的键都通过 KEYS 传入）
+        guard = """
+        local declared = {}
+        for _, key in ipairs(KEYS) do declared[key] = true end
+        local function checked_call(command, key, ...)
+            if not declared[key] then error('undeclared key: ' .. tostring(key)) end
+            return redis.call(command, key, ...)
+        end
+        """
+        scripts = {name: guard + value.replace("redis.call(", "checked_call(")
+                   for name, value in vars(RedisQueue).items() if name.endswith("_SCRIPT")}
+        GuardedQueue = type("GuardedQueue", (RedisQueue,), scripts)
+        
+        with GuardedQueue(client=fakeredis.FakeRedis(decode_responses=True), max_attempts=2) as queue:
+            bulk_id = queue.put("transcribe", {"video": "a.mp4"})
+            urgent_id = queue.put("transcribe", {"video": "b.mp4"}, priority="interactive")
+            first = queue.claim("transcribe", "worker-1", lease_seconds=0.2)
+            second = queue.claim("transcribe", "worker-2", lease_seconds=5)
+            idle = queue.claim("transcribe", "worker-3")
+            alive = queue.heartbeat(second)
+            leased = queue.stats()["transcribe"]["leased"]
+            queue.complete(second, "b_transcript.txt")
+            # worker-1 失联，租约过期后任务重新投递，worker-1 不能再续约
+            time.sleep(0.3)
+            redelivered = queue.claim("transcribe", "worker-3", lease_seconds=5)
+            stale_heartbeat = queue.heartbeat(first)
+            queue.complete(redelivered)
+            done = queue.stats()["transcribe"]
+            latencies = queue.latencies("transcribe")
+            
+            # 租约两次过期的任务进入死信；已完成和失败的任务记录设置了过期时间
+            dead_id = queue.put("analyze", {"transcript": "c.txt"})
+            for _ in range(2):
+                queue.claim("analyze", "worker-1", lease_seconds=0.05)
+                time.sleep(0.1)
+            dead_claim = queue.claim("analyze", "worker-2")
+            ttls = [queue.client.ttl(queue._key("job", job_id)) for job_id in (urgent_id, bulk_id, dead_id)]
+        
+        if first.id != urgent_id or second.id != bulk_id or idle is not None:
+            print("✗ Redis队列没有按优先级领取任务")
+            return False
+        if not alive or leased != 2:
+            print(f"✗ Redis队列领取后任务不在租约集合中（处理中 {leased}），无法续约")
+            return False
+        if redelivered is None or redelivered.id != urgent_id or redelivered.attempts != 2 or stale_heartbeat:
+            print("✗ Redis队列租约过期后任务没有被重新投递")
+            return False
+        if done["done"] != 2 or done["pending"] != 0 or done["leased"] != 0 or done["dead"] != 0 or \
+                len(latencies["interactive"]) != 1 or len(latencies["bulk"]) != 1:
+            print(f"✗ Redis队列完成后状态不正确: {done}")
+            return False
+        if dead_claim is not None or not all(ttl > 0 for ttl in ttls):
+            print(f"✗ Redis队列的死信任务被重新领取，或结束的任务没有设置过期时间: {ttls}")
+            return False
+        
+        with RedisQueue(client=fakeredis.FakeRedis(decode_responses=True)) as queue:
+            queue.put("download", {"url": "a"})
+            queue.put("analyze", {"transcript": "b.txt"}, priority="interactive")
+            before = queue.stats()
+            # 模拟任务已被取走：Redis删除空列表后，阶段仍然出现在统计中
+            queue.client.delete(queue._pending_key("download", "bulk"))
+            drained = queue.stats()
+        
+        if before["download"]["pending:bulk"] != 1 or before["analyze"]["pending:interactive"] != 1:
+            print(f"✗ Redis队列待处理数不正确: {before}")
+            return False
+        if sorted(drained) != ["analyze", "download"] or drained["download"]["pending"] != 0:
+            print(f"✗ 队列清空后阶段从统计中消失: {drained}")
+            return False
+        
+        print("✓ Redis任务队列测试通过")
+        return True
+    except Exception as e:
+        print(f"✗ Redis任务队列测试失败: {e}")
+        return False
+
+def test_transcribe_redelivery():
+    """测试转录任务在转录完成、提交完成之前中断后重新投递：沿用已有的转录结果，不再重新转录"""
+    print("\n测试转录任务重新投递...")
+    
+    try:
+        import tempfile
+        import time
+        import artifact_store
+        import video_to_text
+        from artifact_store import ArtifactStore
+        from distributed import make_handlers
+        from work_queue import SQLiteQueue, run_worker
+        
+        saved = (artifact_store.ARTIFACT_DIR, artifact_store.ARTIFACT_DB, video_to_text.convert_video_to_text)
+        converted = []
+        
+        def fake_convert(video_path):
+            # 与 convert_video_to_text 一样：写入转录结果后删除源视频
+            converted.append(video_path)
+            with ArtifactStore() as store:
+                key = store.key_for_path(video_path)
+                path = store.write_text(key, "transcript", "转录内容")
+                store.remove(key, "video")
+            return path
+        
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                artifact_store.ARTIFACT_DIR = os.path.join(tmp_dir, "artifacts")
+                artifact_store.ARTIFACT_DB = os.path.join(tmp_dir, "db", "artifacts.db")
+                video_to_text.convert_video_to_text = fake_convert
+                source = os.path.join(tmp_dir, "7001.mp4")
+                with open(source, "wb") as f:
+                    f.write(b"video")
+                with ArtifactStore() as store:
+                    video = store.add_file(source, key="7001")
+                
+                with SQLiteQueue(os.path.join(tmp_dir, "queue.db")) as queue:
+                    handlers = make_handlers(queue)
+                    queue.put("transcribe", {"video": video})
+                    # worker-1 完成转录后、放入分析任务和提交完成之前被终止
+                    queue.claim("transcribe", "worker-1", lease_seconds=0.2)
+                    transcript = fake_convert(video)
+                    time.sleep(0.3)
+                    run_worker(queue, "transcribe", handlers["transcribe"], "worker-2", exit_when_idle=True)
+                    stats = queue.stats()
+                    analyze = queue.claim("analyze", "worker-3")
+        finally:
+            artifact_store.ARTIFACT_DIR, artifact_store.ARTIFACT_DB, video_to_text.convert_video_to_text = saved
+        
+        if len(converted) != 1 or stats.get("transcribe") != {"done": 1}:
+            print(f"✗ 重新投递的转录任务没有沿用已有的转录结果: {stats}")
+            return False
+        if analyze is None or analyze.payload["transcript"] != transcript:
+            print("✗ 重新投递的转录任务没有放入分析任务")
+            return False
+        
+        print("✓ 转录任务重新投递测试通过")
+        return True
+    except Exception as e:
+        print(f"✗ 转录任务重新投递测试失败: {e}")
+        return False
+
+def test_load_test():
+    """测试负载测试使用的模拟服务（短链接跳转、分享页解析、视频下载、DeepSeek分析）"""
+    print("\n测试负载测试模拟服务...")
+    
+    try:
+        import tempfile
+        import analyze_transcript
+        import download_douyin_video
+        from load_test import pipeline_environment
+        from local_standin import DeepSeekStandin, DouyinStandin
+        
+        with DouyinStandin(media_size=200 * 1024, duration=12.0) as douyin, DeepSeekStandin(latency=0.01) as deepseek, \
+                tempfile.TemporaryDirectory() as work_dir, pipeline_environment(douyin, deepseek, work_dir):
+            video_info = download_douyin_video.parse_douyin_share_url(douyin.short_link("7123"))
+            save_path = download_douyin_video.download_video(video_info)
+            size = os.path.getsize(save_path)
+            analysis = analyze_transcript.analyze_with_deepseek("模拟转录文本")
+        
+        if video_info["video_id"] != "7123" or video_info["duration"] != 12.0 or not video_info["url"].startswith(douyin.base_url):
+            print(f"✗ 短链接跳转或分享页解析不正确: {video_info}")
+            return False
+        if size != 200 * 1024 or douyin.stats["redirects"] != 1 or analysis != "模拟分析结果":
+            print("✗ 视频下载或DeepSeek模拟接口不正确")
+            return False
+        
+        print("✓ 负载测试模拟服务测试通过")
+        return True
+    except Exception as e:
+        print(f"✗ 负载测试模拟服务测试失败: {e}")
+        return False
+
+def test_profiler():
+    """测试性能分析（阶段统计、折叠调用栈输出、内存峰值只在单线程时记录、未开启时不做任何事）"""
+    print("\n测试性能分析...")
+    
+    try:
+        import tempfile
+        import threading
+        import time
+        import profiler
+        
+        if profiler.stage("download") is not profiler.stage("analyze"):
+            print("✗ 未开启分析时 stage() 应返回共享的空上下文")
+            return False
+        
+        barrier = threading.Barrier(2)
+        
+        def work(item, wait=True):
+            if wait:
+                barrier.wait()
+            with profiler.stage("download", item):
+                with profiler.stage("parse_html"):
+                    data = [str(i) for i in range(200000)]
+                time.sleep(0.05)
+            return data
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with profiler.Profiler("test", output_dir=tmp_dir, interval=0.002) as prof:
+                threads = [threading.Thread(target=work, args=(f"link{i}",)) for i in range(2)]
+                for thread in threads:
+                    thread.start()
+                for thread in threads:
+                    thread.join()
+            with open(prof.outputs["items_folded"], "r", encoding="utf-8") as f:
+                folded = f.read()
+            with profiler.Profiler("single", output_dir=tmp_dir, interval=0.002) as single:
+                work("link2", wait=False)
+        
+        records = prof._records
+        if len(records["download"]) != 2 or len(records["download/parse_html"]) != 2:
+            print(f"✗ 阶段统计不正确: {dict(records)}")
+            return False
+        # 两个线程同时处于阶段中，进程共享的内存峰值无法归属，不记录
+        if any(r["peak"] is not None for rows in records.values() for r in rows):
+            print("✗ 多线程并发时仍记录了内存峰值")
+            return False
+        single_records = single._records
+        if single_records["download/parse_html"][0]["peak"] < 1024 * 1024 or \
+                single_records["download"][0]["peak"] < single_records["download/parse_html"][0]["peak"]:
+            print("✗ 内存峰值统计不正确")
+            return False
+        if "download[link0]" not in folded or not all(line.rsplit(" ", 1)[1].isdigit() for line in folded.splitlines()):
+            print("✗ 折叠调用栈格式不正确")
+            return False
+        
+        print("✓ 性能分析测试通过")
+        return True
+    except Exception as e:
+        print(f"✗ 性能分析测试失败: {e}")
+        return False
+
+def test_artifact_store():
+    """测试产物存储（按键分组、原子写入、索引查找、清理后重建索引、按键清理图集）"""
+    print("\n测试产物存储...")
+    
+    try:
+        import tempfile
+        from artifact_store import ArtifactStore, image_name
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with ArtifactStore(os.path.join(tmp_dir, "artifacts"), os.path.join(tmp_dir, "artifacts.db")) as store:
+                # 同一分钟下载的两个同标题视频按视频ID分组，不会互相覆盖
+                for video_id in ("7001", "7002"):
+                    with store.open_write(video_id, "video", ".mp4") as f:
+                        f.write(video_id.encode())
+                try:
+                    with store.open_write("7003", "video", ".mp4") as f:
+                        f.write(b"partial")
+                        raise IOError("下载中断")
+                except IOError:
+                    pass
+                transcript = store.write_text("7001", "transcript", "转录")
+                latest_video = store.latest("video")
+                pending = store.pending("transcript", "analysis")
+                store.write_text("7001", "analysis", "分析")
+                pending_after = store.pending("transcript", "analysis")
+                key = store.key_for_path(transcript)
+                store.remove("7002", "video")
+                partial_files = [name for _, _, files in os.walk(store.root) for name in files if "7003" in name]
+                videos = [os.path.basename(p) for p in store.list("video")]
+                indexed = store.rebuild_index()
+                stats = store.stats()
+            
+            # 图集每张图片一行：按每个键最新的图片排序，只删除最旧的图集
+            with ArtifactStore(os.path.join(tmp_dir, "images"), os.path.join(tmp_dir, "images.db")) as store:
+                for gallery, times in {"old": (100, 101), "new": (300,), "mixed": (50, 200)}.items():
+                    for index, created_at in enumerate(times, 1):
+                        with store.open_write(gallery, "image", name=image_name(gallery, index), created_at=created_at) as f:
+                            f.write(b"jpg")
+                pruned = store.prune("image", 2)
+                remaining_images = sorted({store.key_for_path(p) for p in store.list("image")})
+        
+        if pruned != ["old"] or remaining_images != ["mixed", "new"]:
+            print(f"✗ 图集清理不正确: 删除 {pruned}，保留 {remaining_images}")
+            return False
+        if latest_video is None or os.path.basename(latest_video) != "7002.mp4" or videos != ["7001.mp4"]:
+            print(f"✗ 视频查找不正确: {latest_video} {videos}")
+            return False
+        if partial_files or store.key_for_path(os.path.join(tmp_dir, "7001.mp4")) is not None:
+            print("✗ 中断的写入留下了临时文件，或存储外的路径被识别为产物")
+            return False
+        if pending != [transcript] or pending_after or key != "7001":
+            print("✗ 待分析转录查找不正确")
+            return False
+        if indexed != 3 or {kind: info["count"] for kind, info in stats.items()} != {"video": 1, "transcript": 1, "analysis": 1}:
+            print(f"✗ 重建索引不正确: {stats}")
+            return False
+        
+        print("✓ 产物存储测试通过")
+        return True
+    except Exception as e:
+        print(f"✗ 产物存储测试失败: {e}")
+        return False
+
+def test_compressed_storage():
+    """测试文本产物压缩保存（字典压缩、透明读取、压缩已有文件）"""
+    print("\n测试文本产物压缩保存...")
+    
+    try:
+        import tempfile
+        import artifact_store
+        from analyze_transcript import read_transcript_file
+        from artifact_store import ArtifactStore
+        
+        saved = (artifact_store.COMPRESSION, artifact_store.DICT_MIN_SAMPLES)
+        template = "**主要内容总结**\n视频{i}介绍了家常菜的做法。\n\n**情感倾向分析**\n整体情感积极，评论区反响热烈。"
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                with ArtifactStore(os.path.join(tmp_dir, "artifacts"), os.path.join(tmp_dir, "artifacts.db")) as store:
+                    plain = store.write_text("7000", "transcript", "文件: a.mp4\n" + "=" * 50 + "\n转录内容")
+                    artifact_store.COMPRESSION = "zlib"
+                    artifact_store.DICT_MIN_SAMPLES = 5
+                    # 样本不足时不使用字典，样本足够后生成字典
+                    paths = [store.write_text(str(7001 + i), "analysis", template.format(i=i)) for i in range(8)]
+                    compressed = store.compress("7000", "transcript")
+                    texts = [artifact_store.read_text(path) for path in paths]
+                    transcript = read_transcript_file(compressed)
+                    # 按压缩前记录的路径读取
+                    transcript_old_path = artifact_store.read_text(plain)
+                    with open(paths[-1], "rb") as f:
+                        header = artifact_store.parse_header(f.read())
+                    dictionaries = os.listdir(store.dictionary_dir)
+                    pending = store.pending("transcript", "analysis")
+        finally:
+            artifact_store.COMPRESSION, artifact_store.DICT_MIN_SAMPLES = saved
+        
+        if texts != [template.format(i=i) for i in range(8)] or not all(p.endswith(".z") for p in paths):
+            print("✗ 压缩保存的分析结果读取不正确")
+            return False
+        if transcript != "转录内容" or not transcript_old_path.endswith("转录内容") or os.path.basename(compressed) != "7000_transcript.txt.z":
+            print("✗ 压缩已有转录文件后读取不正确")
+            return False
+        if header is None or header[1] == 0 or len(dictionaries) != 1 or pending != [compressed]:
+            print("✗ 没有使用字典压缩或索引不正确")
+            return False
+        
+        print("✓ 文本产物压缩保存测试通过")
+        return True
+    except Exception as e:
+        print(f"✗ 文本产物压缩保存测试失败: {e}")
+        return False
+
+def test_watch_folder():
+    """测试监视文件夹（写入完成后处理、每个文件只处理一次、video 目录中的文件移入存储）"""
+    print("\n测试监视文件夹...")
+    
+    try:
+        import tempfile
+        import threading
+        import time
+        import artifact_store
+        import metadata_store
+        from artifact_store import ArtifactStore
+        from watch_folder import WatchStage, Watcher
+        
+        saved = (artifact_store.ARTIFACT_DIR, artifact_store.ARTIFACT_DB, metadata_store.DB_PATH)
+        calls = {"transcribe": [], "analyze": []}
+        
+        def transcribe(paths):
+            with ArtifactStore() as store:
+                for path in paths:
+                    calls["transcribe"].append(os.path.basename(path))
+                    key = store.key_for_path(path)
+                    store.write_text(key, "transcript", f"转录 {key}")
+                    store.remove(key, "video")
+        
+        def analyze(paths):
+            with ArtifactStore() as store:
+                for path in paths:
+                    calls["analyze"].append(os.path.basename(path))
+                    store.write_text(store.key_for_path(path), "analysis", "分析")
+        
+        try:
+            with tempfile.TemporaryDirectory() as tmp_dir:
+                artifact_store.ARTIFACT_DIR = os.path.join(tmp_dir, "artifacts")
+                artifact_store.ARTIFACT_DB = os.path.join(tmp_dir, "db", "artifacts.db")
+                metadata_store.DB_PATH = os.path.join(tmp_dir, "db", "metadata.db")
+                inbox = os.path.join(tmp_dir, "video")
+                stages = [
+                    WatchStage("transcribe", lambda store: store.list("video", newest_first=False), transcribe),
+                    WatchStage("analyze", lambda store: store.pending("transcript", "analysis"), analyze, batch_size=4),
+                ]
+                watcher = Watcher(stages, inbox, {".mp4"}, poll_interval=0.5)
+                stop = threading.Event()
+                thread = threading.Thread(target=watcher.run, kwargs={"stop": stop})
+                thread.start()
+                with ArtifactStore() as store:
+                    for video_id in ("7101", "7102"):
+                        with store.open_write(video_id, "video", ".mp4") as f:
+                            f.write(b"video")
+                # 手动放入的文件先写临时文件再重命名
+                with open(os.path.join(inbox, ".copy.tmp"), "wb") as f:
+                    f.write(b"manual")
+                os.replace(os.path.join(inbox, ".copy.tmp"), os.path.join(inbox, "manual.mp4"))
+                deadline = time.time() + 10
+                while time.time() < deadline and len(calls["analyze"]) < 3:
+                    time.sleep(0.1)
+                # 再触发几次查询，已处理的文件不应被重复处理
+                time.sleep(1.2)
+                stop.set()
+                thread.join()
+                mode = watcher.notifier.mode
+                inbox_left = os.listdir(inbox)
+        finally:
+            artifact_store.ARTIFACT_DIR, artifact_store.ARTIFACT_DB, metadata_store.DB_PATH = saved
+        
+        if sorted(calls["transcribe"])[:2] != ["7101.mp4", "7102.mp4"] or len(calls["transcribe"]) != 3:
+            print(f"✗ 转录阶段处理的文件不正确: {calls['transcribe']}")
+            return False
+        if len(calls["analyze"]) != 3 or len(set(calls["analyze"])) != 3 or inbox_left:
+            print(f"✗ 分析阶段处理的文件不正确或 video 目录中的文件没有移入存储: {calls['analyze']} {inbox_left}")
+            return False
+        
+        print(f"✓ 监视文件夹测试通过（{mode}）")
+        return True
+    except Exception as e:
+        print(f"✗ 监视文件夹测试失败: {e}")
+        return False
+
+def test_stats_tracker():
+    """测试互动数据跟踪（缓存分享页地址、条件请求、只记录变化、刷新时间均匀分布）"""
+    print("\n测试互动数据跟踪...")
+    
+    try:
+        import tempfile
+        import download_douyin_video
+        from fetch_scheduler import FetchScheduler
+        from local_standin import DouyinStandin
+        from stats_tracker import StatsTracker, next_slot
+        
+        saved = (download_douyin_video.SHORT_LINK_HOST, download_douyin_video.SHARE_VIDEO_URL)
+        try:
+            with DouyinStandin(latency=0.01) as standin, tempfile.TemporaryDirectory() as tmp_dir:
+                download_douyin_video.SHORT_LINK_HOST = f"127.0.0.1:{standin.port}/s/"
+                download_douyin_video.SHARE_VIDEO_URL = f"{standin.base_url}/share/video/{{video_id}}"
+                scheduler = FetchScheduler(initial_concurrency=2, max_concurrency=2, max_retries=1)
+                with StatsTracker(os.path.join(tmp_dir, "stats.db"), scheduler=scheduler, max_rate=1000) as tracker:
+                    tracker.add([standin.short_link("7201"), "7202"])
+                    results = []
+                    for likes in (150, 150):
+                        standin.set_statistics("7201", likes, 12, 2000)
+                        tracker.conn.execute("UPDATE watchlist SET next_due = 0")
+                        tracker.run(once=True)
+                        results.append(dict(tracker.counts))
+                        # 同一秒内的数据点会合并，把已记录的点移到一分钟前
+                        tracker.conn.execute("UPDATE stats_series SET t = t - 60")
+                    standin.set_statistics("7201", 180, 12, 2500)
+                    tracker.conn.execute("UPDATE watchlist SET next_due = 0")
+                    tracker.run(once=True)
+                    history = tracker.history("7201")
+                    other = tracker.history("7202")
+                redirects, not_modified = standin.stats["redirects"], standin.stats["not_modified"]
+        finally:
+            download_douyin_video.SHORT_LINK_HOST, download_douyin_video.SHARE_VIDEO_URL = saved
+        
+        if results[0]["changed"] != 2 or results[1]["not_modified"] != 2 or redirects != 1 or not_modified != 3:
+            print(f"✗ 刷新结果不正确: {results} 跳转 {redirects} 次，304 {not_modified} 次")
+            return False
+        if [(p["likes"], p["plays"]) for p in history] != [(150, 2000), (180, 2500)] or len(other) != 1:
+            print(f"✗ 时间序列不正确: {history} {other}")
+            return False
+        
+        # 1000个视频的刷新时间点在周期内均匀分布
+        slots = [next_slot(str(7000000 + i), 3600, 0) // 360 for i in range(1000)]
+        busiest = max(slots.count(i) for i in range(10))
+        if busiest > 150:
+            print(f"✗ 刷新时间分布不均匀: 最多 {busiest} 个视频在同一时段")
+            return False
+        
+        print("✓ 互动数据跟踪测试通过")
+        return True
+    except Exception as e:
+        print(f"✗ 互动数据跟踪测试失败: {e}")
+        return False
+
+def test_priority_lanes():
+    """测试优先级：急用任务先于批量任务领取、预留线程、在条目边界抢占、分优先级统计延迟"""
+    print("\n测试优先级...")
+    
+    try:
+        import tempfile
+        import time
+        from load_test import Pipeline, Stage
+        from transcribe_scheduler import TranscriptionJob, TranscriptionQueue
+        from work_queue import SQLiteQueue
+        
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            with SQLiteQueue(os.path.join(tmp_dir, "queue.db")) as queue:
+                for i in range(3):
+                    queue.put("download", {"url": f"bulk-{i}"})
+                queue.put("download", {"url": "urgent", "submitted_at": time.time() - 5}, "interactive")
+                first = queue.claim("download", "worker-1")
+                reserved_idle = queue.claim("download", "worker-2", classes=["interactive"])
+                queue.complete(first)
+                stats = queue.stats()["download"]
+                latencies = queue.latencies("download")
+        
+        if first.payload["url"] != "urgent" or first.priority != "interactive" or reserved_idle is not None:
+            print("✗ 急用任务没有先于批量任务领取，或预留的工作进程领取了批量任务")
+            return False
+        if stats.get("pending:bulk") != 3 or len(latencies["interactive"]) != 1 or latencies["interactive"][0] < 5:
+            print(f"✗ 队列状态或延迟统计不正确: {stats} {latencies}")
+            return False
+        
+        transcription = TranscriptionQueue()
+        transcription.push(TranscriptionJob("bulk.mp4", 10))
+        transcription.push(TranscriptionJob("urgent.mp4", 600, "interactive"))
+        if transcription.pop().path != "urgent.mp4":
+            print("✗ 转录队列没有优先处理急用任务")
+            return False
+        
+        # 两个线程（预留1个），先提交20个批量条目，再提交1个急用条目
+        stage = Stage("work", lambda value: time.sleep(0.05) or value, workers=2, reserved=1)
+        pipeline = Pipeline([stage])
+        stage.start()
+        for i in range(20):
+            pipeline.submit(f"bulk-{i}")
+        time.sleep(0.12)
+        pipeline.submit("urgent", "interactive")
+        pipeline.wait(10)
+        stage.stop()
+        order = [item["value"] for item in pipeline.finished]
+        urgent = next(item for item in pipeline.finished if item["value"] == "urgent")
+        if urgent["finished_at"] - urgent["arrived_at"] > 0.2 or order.index("urgent") > 5:
+            print(f"✗ 急用条目排在批量条目之后: 第 {order.index('urgent') + 1} 个完成")
+            return False
+        
+        print("✓ 优先级测试通过")
+        return True
+    except Exception as e:
+        print(f"✗ 优先级测试失败: {e}")
+        return False
+
+def test_gallery_download():
+    """测试图集下载（识别图集页面、图片去重、并行下载、保存到作品的产物分组）"""
+    print("\n测试图集下载...")
+    
+    try:
+        import contextlib
+        import io
+        import tempfile
+        import download_douyin_video
+        from artifact_store import ArtifactStore
+        from load_test import pipeline_environment
+        from local_standin import DeepSeekStandin, DouyinStandin
+        
+        with DouyinStandin(media_size=32 * 1024, image_size=16 * 1024, image_latency=0.1) as douyin, \
+                DeepSeekStandin(latency=0.01) as deepseek, tempfile.TemporaryDirectory() as work_dir, \
+                pipeline_environment(douyin, deepseek, work_dir):
+            douyin.add_note("7301", 8, duplicates=2)
+            output = io.StringIO()
+            with contextlib.redirect_stdout(output):
+                files = download_douyin_video.download_links([douyin.short_link("7301"), douyin.short_link("7302")])
+            with ArtifactStore() as store:
+                images = sorted(os.path.basename(path) for path in store.list("image"))
+                group = os.path.dirname(store.artifact_path("7301", "image", name="x"))
+                rebuilt = store.rebuild_index()
+                images_after_rebuild = len(store.list("image"))
+        
+        expected = [f"7301_{i:02d}.jpg" for i in range(1, 9)]
+        if images != expected or len(files) != 9 or not all(path.startswith(group) for path in files[:8]):
+            print(f"✗ 图集图片没有保存到作品的产物分组: {images}")
+            return False
+        if douyin.stats["images"] != 8 or not 1 < douyin.stats["max_images_in_flight"] <= download_douyin_video.IMAGE_CONCURRENCY:
+            print(f"✗ 重复图片没有去掉或没有并行下载: {douyin.stats}")
+            return False
+        if rebuilt != 9 or images_after_rebuild != 8 or "图片: 8 个" not in output.getvalue() or "视频: 1 个" not in output.getvalue():
+            print("✗ 重建索引没有识别图片，或没有输出下载吞吐量")
+            return False
+        
+        print("✓ 图集下载测试通过")
+        return True
+    except Exception as e:
+        print(f"✗ 图集下载测试失败: {e}")
+        return False
+
 def main():
     """主函数"""
     print("=" * 50)
@@ -118,6 +1540,32 @@ def main():
     all_tests_passed &= test_module_imports()
     all_tests_passed &= test_directory_structure()
     all_tests_passed &= test_file_paths()
+    all_tests_passed &= test_lazy_imports()
+    all_tests_passed &= test_fetch_scheduler()
+    all_tests_passed &= test_export_metadata()
+    all_tests_passed &= test_metadata_store()
+    all_tests_passed &= test_link_ingest()
+    all_tests_passed &= test_transcript_stream()
+    all_tests_passed &= test_decoding_profiles()
+    all_tests_passed &= test_transcribe_scheduler()
+    all_tests_passed &= test_audio_fingerprint()
+    all_tests_passed &= test_batch_analysis()
+    all_tests_passed &= test_transcript_normalize()
+    all_tests_passed &= test_deepseek_client()
+    all_tests_passed &= test_search_index()
+    all_tests_passed &= test_whisper_mmap_defaults()
+    all_tests_passed &= test_whisper_mmap_equivalence()
+    all_tests_passed &= test_work_queue()
+    all_tests_passed &= test_redis_queue()
+    all_tests_passed &= test_transcribe_redelivery()
+    all_tests_passed &= test_load_test()
+    all_tests_passed &= test_profiler()
+    all_tests_passed &= test_artifact_store()
+    all_tests_passed &= test_compressed_storage()
+    all_tests_passed &= test_watch_folder()
+    all_tests_passed &= test_stats_tracker()
+    all_tests_passed &= test_priority_lanes()
+    all_tests_passed &= test_gallery_download()
     
     print("\n" + "=" * 50)
     if all_tests_passed:
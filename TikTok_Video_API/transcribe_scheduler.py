@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+转录任务调度模块
+按预计音频时长进行最短作业优先（SJF）调度，并通过老化机制避免长视频一直得不到处理；
+急用链接（interactive）的任务总是先于批量任务（bulk）调度，同一优先级内再按上述规则排序；
+也可以按时长将任务预先分配到多个工作线程（最长处理时间优先装箱），统计每个任务的排队等待时间
+"""
+
+import heapq
+import itertools
+import json
+import os
+import subprocess
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from work_queue import DEFAULT_PRIORITY, PRIORITY_CLASSES, percentile
+
+# 老化系数：每排队1秒，调度时视为时长减少 AGING_RATE 秒
+AGING_RATE = 0.5
+
+# 无法获取时长时，按文件大小估算所用的码率（字节/秒，约1Mbps）
+FALLBACK_BYTES_PER_SECOND = 125_000
+
+@dataclass
+class TranscriptionJob:
+    """一个待转录的文件"""
+    path: str
+    expected_duration: float
+    priority: str = DEFAULT_PRIORITY
+    enqueued_at: float = field(default_factory=time.monotonic)
+    started_at: Optional[float] = None
+    finished_at: Optional[float] = None
+    result: Any = None
+    error: Optional[str] = None
+
+    @property
+    def wait_time(self) -> float:
+        """排队等待时间（秒）"""
+        if self.started_at is None:
+            return time.monotonic() - self.enqueued_at
+        return self.started_at - self.enqueued_at
+
+def normalize_path(path: str) -> str:
+    """统一路径写法（分隔符、大小写），用于匹配下载时记录的文件路径"""
+    return os.path.normcase(os.path.normpath(path))
+
+def probe_duration(path: str) -> Optional[float]:
+    """使用ffprobe读取音视频时长（Whisper本身依赖ffmpeg，一般都可用）"""
+    try:
+        output = subprocess.run(
+            ["ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "json", path],
+            capture_output=True, text=True, timeout=10,
+        ).stdout
+        return float(json.loads(output)["format"]["duration"])
+    except Exception:
+        return None
+
+def expected_duration(path: str, known_durations: Optional[Dict[str, float]] = None) -> float:
+    """
+    获取文件的预计音频时长
+
+    优先使用下载时记录的抖音视频时长，其次用ffprobe读取，最后按文件大小估算
+
+    Args:
+        path: 音视频文件路径
+        known_durations: 规范化文件路径到已知时长（秒）的映射
+
+    Returns:
+        预计时长（秒）
+    """
+    key = normalize_path(path)
+    if known_durations and key in known_durations:
+        return known_durations[key]
+    duration = probe_duration(path)
+    if duration is not None:
+        return duration
+    return os.path.getsize(path) / FALLBACK_BYTES_PER_SECOND
+
+class TranscriptionQueue:
+    """
+    带老化机制的最短作业优先队列
+
+    任务的调度优先级为 时长 - AGING_RATE × 已等待时间。由于所有任务的等待时间以相同速度增长，
+    该值的相对大小只取决于 时长 + AGING_RATE × 入队时间，因此可以直接用堆维护。
+    每个优先级（interactive、bulk）各用一个堆，取任务时先取高优先级的堆
+    """
+
+    def __init__(self, aging_rate: float = AGING_RATE):
+        self.aging_rate = aging_rate
+        self._heaps: Dict[str, List] = {priority: [] for priority in PRIORITY_CLASSES}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def push(self, job: TranscriptionJob):
+        """加入一个任务"""
+        key = job.expected_duration + self.aging_rate * job.enqueued_at
+        with self._lock:
+            heapq.heappush(self._heaps[job.priority], (key, next(self._counter), job))
+
+    def pop(self, classes: Optional[Sequence[str]] = None) -> Optional[TranscriptionJob]:
+        """
+        取出当前优先级最高的任务，队列为空时返回None
+
+        Args:
+            classes: 只取这些优先级的任务，默认全部
+        """
+        with self._lock:
+            heap = next((self._heaps[p] for p in PRIORITY_CLASSES
+                         if self._heaps[p] and (classes is None or p in classes)), None)
+            if heap is None:
+                return None
+            job = heapq.heappop(heap)[2]
+        job.started_at = time.monotonic()
+        return job
+
+    def __len__(self) -> int:
+        with self._lock:
+            return sum(len(heap) for heap in self._heaps.values())
+
+def plan_workers(jobs: List[TranscriptionJob], workers: int) -> List[List[TranscriptionJob]]:
+    """
+    按最长处理时间优先（LPT）将任务装箱到多个工作线程，使各线程的总时长尽量均衡
+
+    Args:
+        jobs: 任务列表
+        workers: 工作线程数
+
+    Returns:
+        每个工作线程分到的任务（线程内按时长从短到长执行）
+    """
+    bins: List[List[TranscriptionJob]] = [[] for _ in range(workers)]
+    loads = [(0.0, i) for i in range(workers)]
+    heapq.heapify(loads)
+    for job in sorted(jobs, key=lambda j: j.expected_duration, reverse=True):
+        load, i = heapq.heappop(loads)
+        bins[i].append(job)
+        heapq.heappush(loads, (load + job.expected_duration, i))
+    for assigned in bins:
+        assigned.sort(key=lambda j: j.expected_duration)
+    return bins
+
+def run_queue(queue: TranscriptionQueue, process: Callable[[str], Any], workers: int = 1,
+              reserved: int = 0) -> List[TranscriptionJob]:
+    """
+    用多个工作线程从队列中按优先级取任务执行，直到队列为空
+
+    每个线程处理完一个文件后重新从最高优先级取任务，运行期间加入的急用任务不会排在已有的批量任务之后
+
+    Args:
+        queue: 转录任务队列
+        process: 处理单个文件的函数
+        workers: 工作线程数
+        reserved: 只处理 interactive 任务的线程数（必须小于 workers）
+
+    Returns:
+        已执行的任务（包含等待时间和执行结果）
+    """
+    if reserved >= workers:
+        raise ValueError("预留的线程数必须小于线程总数")
+    done: List[TranscriptionJob] = []
+    done_lock = threading.Lock()
+
+    def worker(classes: Optional[Sequence[str]]):
+        while True:
+            job = queue.pop(classes)
+            if job is None:
+                return
+            print(f"开始转录: {os.path.basename(job.path)}（预计时长 {job.expected_duration:.0f} 秒，"
+                  f"排队 {job.wait_time:.1f} 秒）")
+            try:
+                job.result = process(job.path)
+            except Exception as e:
+                job.error = str(e)
+                print(f"转录 {job.path} 时出错: {e}")
+            job.finished_at = time.monotonic()
+            with done_lock:
+                done.append(job)
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        for i in range(workers):
+            executor.submit(worker, PRIORITY_CLASSES[:1] if i < reserved else None)
+
+    return done
+
+def run_plan(plan: List[List[TranscriptionJob]], process: Callable[[str], Any]) -> List[TranscriptionJob]:
+    """
+    按 plan_workers 的装箱结果执行，每个工作线程依次处理分给自己的任务
+
+    Args:
+        plan: 每个工作线程分到的任务
+        process: 处理单个文件的函数
+
+    Returns:
+        已执行的任务
+    """
+    done: List[TranscriptionJob] = []
+    done_lock = threading.Lock()
+
+    def worker(assigned: List[TranscriptionJob]):
+        for job in assigned:
+            job.started_at = time.monotonic()
+            print(f"开始转录: {os.path.basename(job.path)}（预计时长 {job.expected_duration:.0f} 秒，"
+                  f"排队 {job.wait_time:.1f} 秒）")
+            try:
+                job.result = process(job.path)
+            except Exception as e:
+                job.error = str(e)
+                print(f"转录 {job.path} 时出错: {e}")
+            job.finished_at = time.monotonic()
+            with done_lock:
+                done.append(job)
+
+    with ThreadPoolExecutor(max_workers=max(1, len(plan))) as executor:
+        for assigned in plan:
+            executor.submit(worker, assigned)
+
+    return done
+
+def wait_time_report(jobs: List[TranscriptionJob]) -> Dict[str, float]:
+    """
+    统计排队等待时间
+
+    Args:
+        jobs: 已执行的任务
+
+    Returns:
+        平均、P95和最大等待时间（秒）
+    """
+    waits = [job.wait_time for job in jobs]
+    if not waits:
+        return {"count": 0, "mean": 0.0, "p95": 0.0, "max": 0.0}
+    return {
+        "count": len(waits),
+        "mean": sum(waits) / len(waits),
+        "p95": percentile(waits, 0.95),
+        "max": max(waits),
+    }
+
+def print_wait_time_report(jobs: List[TranscriptionJob]):
+    """打印排队等待时间统计（有急用任务时分优先级统计）"""
+    report = wait_time_report(jobs)
+    print("\n" + "=" * 50)
+    print("转录队列等待时间")
+    print("=" * 50)
+    print(f"任务数: {report['count']}")
+    print(f"平均等待: {report['mean']:.1f} 秒")
+    print(f"P95等待: {report['p95']:.1f} 秒")
+    print(f"最长等待: {report['max']:.1f} 秒")
+    if any(job.priority != DEFAULT_PRIORITY for job in jobs):
+        for priority in PRIORITY_CLASSES:
+            lane = wait_time_report([job for job in jobs if job.priority == priority])
+            print(f"  {priority:12s} 任务数 {lane['count']:4d}  平均 {lane['mean']:.1f} 秒  "
+                  f"P95 {lane['p95']:.1f} 秒  最长 {lane['max']:.1f} 秒")
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+"""
+转录文本预压缩模块
+在发送给DeepSeek之前规范化转录文本：折叠Whisper的重复循环（同一句话连续出现几十次）、
+去掉语气填充词和多余空白，并统计压缩前后的token数，减少请求的延迟和费用
+"""
+
+import argparse
+import re
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+# 连续重复达到该次数才视为重复循环（"对对对"、"一步一步一步"等正常说法最多重复3次）
+MIN_REPEATS = 5
+
+# 检测的重复单元最大长度（字符）
+MAX_UNIT_CHARS = 50
+
+# 单字重复（如"哈哈哈哈"）保留的次数
+SINGLE_CHAR_KEEP = 2
+
+# 语气填充词：只在句首、标点或空白之后单独出现时去掉，避免误删正常词语
+FILLER_WORDS = ["嗯嗯", "嗯", "呃", "额", "啊啊", "呐", "唔", "emmm", "emm", "um", "uh"]
+
+PUNCTUATION = "，。！？、；：,.!?;:"
+
+# 重复单元按最短优先匹配，单元本身不能以空白开头，相邻两次重复之间允许有标点和空白
+REPEAT_PATTERN = re.compile(
+    r"(\S.{0,%d}?)(?:[%s\s]*\1){%d,}" % (MAX_UNIT_CHARS - 1, re.escape(PUNCTUATION), MIN_REPEATS - 1),
+    re.S,
+)
+FILLER_PATTERN = re.compile(
+    r"(^|[%s\s])(?:%s)(?=[%s\s]|$)[%s]?" % (
+        re.escape(PUNCTUATION), "|".join(re.escape(w) for w in FILLER_WORDS),
+        re.escape(PUNCTUATION), re.escape(PUNCTUATION),
+    ),
+    re.I | re.M,
+)
+# 句末标点和换行作为分隔符（带捕获组），切分后拼接回去与原文完全一致
+SENTENCE_PATTERN = re.compile(r"([。！？!?\n]+)")
+# 网址原样保留，不参与重复折叠
+URL_PATTERN = re.compile(r"((?:https?://|www\.)[^\s，。！？、；：]+)", re.I)
+# 含字母或数字的重复单元（英文缩写、等级、金额、电话号码等）不是识别错误
+LATIN_DIGIT_PATTERN = re.compile(r"[A-Za-z0-9０-９Ａ-Ｚａ-ｚ]")
+
+def estimate_tokens(text: str) -> int:
+    """
+    粗略估算文本的token数
+
+    中文约每个汉字1个token，英文和数字约每4个字符1个token
+    """
+    cjk = len(re.findall(r"[\u3000-\u9fff\uff00-\uffef]", text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def collapse_repetitions(text: str) -> str:
+    """
+    折叠连续重复的片段
+
+    任意长度不超过 MAX_UNIT_CHARS 的片段连续出现 MIN_REPEATS 次及以上时只保留一次
+    （单字重复保留 SINGLE_CHAR_KEEP 次），内容相同的句子连续出现 MIN_REPEATS 次及以上时也只保留一次。
+    含字母或数字的片段和网址不折叠
+    """
+    def replace(match):
+        unit = match.group(1)
+        if LATIN_DIGIT_PATTERN.search(unit):
+            return match.group(0)
+        return unit * SINGLE_CHAR_KEEP if len(unit) == 1 else unit
+
+    def collapse(piece):
+        # 折叠后可能出现新的相邻重复（如嵌套循环），重复直到不再变化
+        previous = None
+        while previous != piece:
+            previous = piece
+            piece = REPEAT_PATTERN.sub(replace, piece)
+        return piece
+
+    # 按网址切分（正则带捕获组），结果中奇数位置是网址
+    pieces = URL_PATTERN.split(text)
+    text = "".join(piece if i % 2 else collapse(piece) for i, piece in enumerate(pieces))
+
+    # 标点略有不同的重复句子无法被上面的规则匹配，按去掉标点后的内容比较；
+    # 切分结果中偶数位置是句子内容，奇数位置是其后的分隔符，开头的标点归入内容为空的第一句
+    parts = SENTENCE_PATTERN.split(text)
+    sentences = ["".join(parts[i:i + 2]) for i in range(0, len(parts), 2)]
+
+    result: List[str] = []
+    run: List[str] = []
+    run_key = None
+    for sentence in sentences:
+        key = re.sub(r"[\W_]+", "", sentence)
+        if key and key == run_key:
+            run.append(sentence)
+            continue
+        result.extend(run[:1] if len(run) >= MIN_REPEATS else run)
+        run = [sentence]
+        run_key = key
+    result.extend(run[:1] if len(run) >= MIN_REPEATS else run)
+    return "".join(result)
+
+def strip_fillers(text: str) -> str:
+    """去掉单独出现的语气填充词"""
+    previous = None
+    while previous != text:
+        previous = text
+        text = FILLER_PATTERN.sub(r"\1", text)
+    return text
+
+def normalize_whitespace(text: str) -> str:
+    """合并多余的空白和空行"""
+    text = re.sub(r"[ \t　]+", " ", text)
+    text = re.sub(r" *\n[ \n]*", "\n", text)
+    return text.strip()
+
+def normalize_transcript(text: str) -> Tuple[str, Dict[str, int]]:
+    """
+    规范化转录文本
+
+    Args:
+        text: 原始转录文本
+
+    Returns:
+        (规范化后的文本, 统计信息)，统计信息包含压缩前后的字符数和估算token数
+    """
+    normalized = normalize_whitespace(strip_fillers(collapse_repetitions(text)))
+    stats = {
+        "chars_before": len(text),
+        "chars_after": len(normalized),
+        "tokens_before": estimate_tokens(text),
+        "tokens_after": estimate_tokens(normalized),
+    }
+    return normalized, stats
+
+def format_stats(stats: Dict[str, int]) -> str:
+    """格式化单条文本的压缩统计"""
+    before, after = stats["tokens_before"], stats["tokens_after"]
+    saved = (1 - after / before) * 100 if before else 0.0
+    return f"约 {before} → {after} tokens（减少 {saved:.1f}%）"
+
+def main():
+    """主函数：统计转录文件的压缩效果，不修改文件"""
+    from analyze_transcript import TXT_DIR, read_transcript_file
+
+    parser = argparse.ArgumentParser(description="统计转录文本预压缩前后的token数")
+    parser.add_argument("files", nargs="*", help=f"转录文件（默认: {TXT_DIR} 下的所有文件）")
+    parser.add_argument("--show", action="store_true", help="输出规范化后的文本")
+    args = parser.parse_args()
+
+    files = args.files or sorted(str(f) for f in Path(TXT_DIR).glob("*.txt"))
+    total_before = total_after = 0
+    for file_path in files:
+        normalized, stats = normalize_transcript(read_transcript_file(file_path))
+        total_before += stats["tokens_before"]
+        total_after += stats["tokens_after"]
+        print(f"{Path(file_path).name}: {format_stats(stats)}")
+        if args.show:
+            print(normalized + "\n")
+
+    if files:
+        print("=" * 50)
+        print(f"共 {len(files)} 个文件: {format_stats({'tokens_before': total_before, 'tokens_after': total_after})}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+流式转录模块
+按Whisper的30秒窗口逐段解码音频，每解码出一个片段就立即转换为简体并追加写入
+文本、SRT、VTT和JSONL文件，下游的分析等阶段无需等待整段音频转录完成
+"""
+
+import datetime
+import json
+import os
+from pathlib import Path
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+# Whisper的采样率和单次解码窗口长度
+SAMPLE_RATE = 16000
+WINDOW_SECONDS = 30
+
+# 以前文为提示词时最多保留的字符数
+PROMPT_TAIL_CHARS = 200
+
+def stream_transcribe(model, audio, window_seconds: float = WINDOW_SECONDS,
+                      **whisper_params) -> Iterator[Dict[str, Any]]:
+    """
+    逐窗口转录音频，每得到一个片段就产出
+
+    每个窗口末尾的片段可能被截断，因此除最后一个窗口外都丢弃末尾片段，
+    下一个窗口从该片段的起点开始重新解码（与Whisper内部的seek方式一致）
+
+    Args:
+        model: Whisper模型
+        audio: 音视频文件路径，或已解码的16kHz音频数组
+        window_seconds: 单次解码的窗口长度（秒）
+        **whisper_params: 传递给 model.transcribe 的参数
+
+    Yields:
+        片段字典（start、end为相对整段音频的秒数，text为原始识别文本）
+    """
+    if isinstance(audio, str):
+        from whisper.audio import load_audio
+        audio = load_audio(audio)
+    duration = len(audio) / SAMPLE_RATE
+    initial_prompt = whisper_params.pop("initial_prompt", None)
+    condition_on_previous_text = whisper_params.get("condition_on_previous_text", True)
+
+    prompt = initial_prompt
+    seek = 0.0
+    index = 0
+    while seek < duration:
+        end = min(duration, seek + window_seconds)
+        chunk = audio[int(seek * SAMPLE_RATE):int(end * SAMPLE_RATE)]
+        result = model.transcribe(chunk, initial_prompt=prompt, **whisper_params)
+        segments = [seg for seg in result["segments"] if seg["text"].strip()]
+
+        is_last_window = end >= duration
+        if not is_last_window and len(segments) > 1:
+            segments = segments[:-1]
+            next_seek = seek + segments[-1]["end"]
+        else:
+            next_seek = end
+        # 防止识别结果异常时原地打转
+        if next_seek <= seek:
+            next_seek = end
+
+        for seg in segments:
+            yield {
+                "id": index,
+                "start": round(seek + seg["start"], 3),
+                "end": round(seek + seg["end"], 3),
+                "text": seg["text"],
+            }
+            index += 1
+
+        if condition_on_previous_text and segments:
+            prompt = "".join(seg["text"] for seg in segments)[-PROMPT_TAIL_CHARS:]
+        else:
+            prompt = initial_prompt
+        seek = next_seek
+
+def format_timestamp(seconds: float, separator: str = ",") -> str:
+    """
+    格式化字幕时间戳
+
+    Args:
+        seconds: 秒数
+        separator: 毫秒分隔符，SRT为","，VTT为"."
+
+    Returns:
+        形如 00:01:02,345 的时间戳
+    """
+    milliseconds = int(round(seconds * 1000))
+    hours, milliseconds = divmod(milliseconds, 3_600_000)
+    minutes, milliseconds = divmod(milliseconds, 60_000)
+    secs, milliseconds = divmod(milliseconds, 1000)
+    return f"{hours:02d}:{minutes:02d}:{secs:02d}{separator}{milliseconds:03d}"
+
+class TranscriptWriter:
+    """
+    转录结果写入器
+
+    同时维护文本、SRT、VTT和JSONL四个输出文件，每写入一个片段就刷新到磁盘，
+    其他进程可以随时读取到目前为止的部分转录结果
+    """
+
+    def __init__(self, output_path: str, source_path: str,
+                 convert: Optional[Callable[[str], str]] = None):
+        """
+        Args:
+            output_path: 文本输出路径，字幕文件与其同名、扩展名不同
+            source_path: 源音视频文件路径（写入文本文件头）
+            convert: 片段文本转换函数（如繁体转简体）
+        """
+        self.output_path = output_path
+        self.convert = convert or (lambda text: text)
+        self.texts: List[str] = []
+        self.segments: List[Dict[str, Any]] = []
+
+        base = os.path.splitext(output_path)[0]
+        self.srt_path = base + ".srt"
+        self.vtt_path = base + ".vtt"
+        self.jsonl_path = base + ".segments.jsonl"
+
+        os.makedirs(os.path.dirname(output_path) or ".", exist_ok=True)
+        self._txt = open(output_path, "w", encoding="utf-8")
+        self._srt = open(self.srt_path, "w", encoding="utf-8")
+        self._vtt = open(self.vtt_path, "w", encoding="utf-8")
+        self._jsonl = open(self.jsonl_path, "w", encoding="utf-8")
+
+        self._txt.write(f"文件: {source_path}\n")
+        self._txt.write(f"处理时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
+        self._txt.write("=" * 50 + "\n")
+        self._vtt.write("WEBVTT\n\n")
+        self._flush()
+
+    def _flush(self):
+        for f in (self._txt, self._srt, self._vtt, self._jsonl):
+            f.flush()
+
+    def write_segment(self, segment: Dict[str, Any]) -> str:
+        """
+        转换并追加写入一个片段
+
+        Args:
+            segment: 片段字典（start、end、text）
+
+        Returns:
+            转换后的片段文本
+        """
+        text = self.convert(segment["text"]).strip()
+        number = len(self.texts) + 1
+        self.texts.append(text)
+
+        self._txt.write(text)
+        self._srt.write(f"{number}\n{format_timestamp(segment['start'])} --> "
+                        f"{format_timestamp(segment['end'])}\n{text}\n\n")
+        self._vtt.write(f"{format_timestamp(segment['start'], '.')} --> "
+                        f"{format_timestamp(segment['end'], '.')}\n{text}\n\n")
+        record = {"id": number - 1, "start": segment["start"], "end": segment["end"], "text": text}
+        self.segments.append(record)
+        self._jsonl.write(json.dumps(record, ensure_ascii=False) + "\n")
+        self._flush()
+        return text
+
+    @property
+    def text(self) -> str:
+        """目前为止的完整转录文本"""
+        return "".join(self.texts)
+
+    def close(self):
+        """关闭所有输出文件"""
+        for f in (self._txt, self._srt, self._vtt, self._jsonl):
+            f.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+def read_partial_segments(jsonl_path: str) -> List[Dict[str, Any]]:
+    """
+    读取目前已写入的片段（转录尚未完成时也可调用）
+
+    Args:
+        jsonl_path: 片段JSONL文件路径
+
+    Returns:
+        片段列表，忽略正在写入的不完整的最后一行
+    """
+    segments = []
+    if not Path(jsonl_path).exists():
+        return segments
+    with open(jsonl_path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                segments.append(json.loads(line))
+            except json.JSONDecodeError:
+                break
+    return segments
@@ -5,41 +5,99 @@
 """
 
 import os
-import whisper
+import json
 import datetime
+import threading
 from pathlib import Path
-import opencc
+from typing import Any, Dict, Optional
+
+from artifact_store import ArtifactStore, content_key, ingest_videos
+from profiler import add_profile_arguments, run_profiled, stage, staged
+from transcript_stream import TranscriptWriter, stream_transcribe
 
 # 设置视频文件目录和输出目录
+# 下载的视频和转录结果保存在产物存储（artifact_store.py）中；VIDEO_DIR 用于手动放入的文件，
+# 处理前会移入产物存储；OUTPUT_DIR 只在显式指定输出目录时使用
 VIDEO_DIR = r"D:\test\TikTok_Video_API\video"
 OUTPUT_DIR = r"D:\test\TikTok_Video_API\txt"
 
-# 繁体中文转简体中文转换器
-cc = opencc.OpenCC('t2s')
+# 支持的音视频文件扩展名
+SUPPORTED_EXTENSIONS = {'.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.wav', '.mp3', '.m4a'}
 
-def get_latest_video_file():
-    """获取最新的视频文件"""
-    if not os.path.exists(VIDEO_DIR):
-        raise FileNotFoundError(f"视频目录 {VIDEO_DIR} 不存在")
-    
-    # 支持的音视频文件扩展名
-    supported_extensions = {'.mp4', '.avi', '.mov', '.mkv', '.flv', '.wmv', '.wav', '.mp3', '.m4a'}
+# 是否默认使用流式转录
+STREAM_TRANSCRIBE = False
+
+# 是否在转录前按音频指纹查找重复音频并复用已有转录结果
+FINGERPRINT_DEDUP = False
+
+# 转录完成后写入全文检索索引
+SEARCH_INDEX = True
+
+# 默认Whisper模型和按音频时长推荐的解码配置文件（由 whisper_bench.py 生成）
+DEFAULT_MODEL = "turbo"
+PROFILE_PATH = r"D:\test\TikTok_Video_API\whisper_profiles.json"
+
+# 是否内存映射加载模型（多个转录进程共享同一份权重，见 whisper_mmap.py）；
+# 该加载方式依赖whisper的内部接口，在目标环境中验证转录结果一致之前默认关闭
+MMAP_MODEL = False
+
+# whisper（依赖torch）和opencc导入开销很大，只在真正转录时才加载，
+# 使只做下载或清理的调用不必承担这部分启动时间和内存
+_converter = None
+# 已加载的模型按线程缓存：Whisper解码时会在模型上挂载kv-cache钩子，同一个模型实例不能被多个线程同时使用
+_models = threading.local()
+_model_lock = threading.Lock()
+
+def get_converter():
+    """获取繁体中文转简体中文转换器（首次调用时创建）"""
+    global _converter
+    if _converter is None:
+        import opencc
+        _converter = opencc.OpenCC('t2s')
+    return _converter
+
+def load_whisper_model(name: str = "turbo"):
+    """
+    加载Whisper模型，同一线程内同名模型只加载一次
     
-    # 获取目录下所有音视频文件，并按修改时间排序（最新优先）
-    video_files = []
-    for file in os.listdir(VIDEO_DIR):
-        if Path(file).suffix.lower() in supported_extensions:
-            full_path = os.path.join(VIDEO_DIR, file)
-            video_files.append(full_path)
+    并行转录的每个工作线程各自持有一份模型（开启 MMAP_MODEL 时各份模型共享同一份权重内存）
     
-    # 按修改时间排序，最新的文件排在前面
-    video_files.sort(key=lambda x: os.path.getmtime(x), reverse=True)
+    Args:
+        name: 模型名称
+        
+    Returns:
+        Whisper模型
+    """
+    models = getattr(_models, "cache", None)
+    if models is None:
+        models = _models.cache = {}
+    if name not in models:
+        # 多个线程同时首次加载时逐个进行，避免同时下载或转换同一个权重文件
+        with _model_lock:
+            if MMAP_MODEL:
+                from whisper_mmap import load_model_mmap
+                models[name] = load_model_mmap(name)
+            else:
+                import whisper
+                models[name] = whisper.load_model(name)
+    return models[name]
+
+def list_video_files():
+    """获取产物存储中所有待转录的音视频文件（最新的排在前面），视频目录中手动放入的文件先移入存储"""
+    with ArtifactStore() as store:
+        ingest_videos(VIDEO_DIR, SUPPORTED_EXTENSIONS, store)
+        return store.list("video")
+
+def get_latest_video_file():
+    """获取最新的视频文件"""
+    with ArtifactStore() as store:
+        ingest_videos(VIDEO_DIR, SUPPORTED_EXTENSIONS, store)
+        latest = store.latest("video")
     
-    if not video_files:
-        raise FileNotFoundError(f"在目录 {VIDEO_DIR} 中未找到支持的音视频文件")
+    if latest is None:
+        raise FileNotFoundError(f"产物存储和目录 {VIDEO_DIR} 中都没有待转录的音视频文件")
     
-    # 返回最新的文件
-    return video_files[0]
+    return latest
 
 def read_prompt_file():
     """读取提示词文件内容"""
@@ -54,26 +112,16 @@ def read_prompt_file():
         print(f"警告: 读取提示词文件时出错: {e}，将使用默认提示词")
         return ""
 
-def convert_video_to_text(video_path: str, output_dir: str) -> str:
+def build_whisper_params(initial_prompt: str = "") -> Dict[str, Any]:
     """
-    将音视频文件转换为文本
+    构造Whisper转录参数
     
     Args:
-        video_path: 音视频文件路径
-        output_dir: 输出目录路径
+        initial_prompt: 提示词，为空时不添加
         
     Returns:
-        生成的文本文件路径
+        传递给 model.transcribe 的参数字典
     """
-    print(f"正在处理文件: {video_path}")
-    
-    # 加载Whisper模型（使用turbo模型，速度优先）
-    print("正在加载Whisper模型...")
-    model = whisper.load_model("turbo")  # 使用turbo模型以提高处理速度
-    
-    # 读取提示词文件内容
-    initial_prompt = read_prompt_file()
-    
     # Whisper参数配置（流式处理优化）
     whisper_params = {
         "fp16": False,           # 禁用FP16以避免警告
@@ -98,54 +146,163 @@ def convert_video_to_text(video_path: str, output_dir: str) -> str:
     # whisper_params["without_timestamps"] = False  # 是否包含时间戳
     # whisper_params["max_initial_timestamp"] = 1.0 # 最大初始时间戳
     
-    # 使用Whisper转录音频（流式处理）
-    print("正在进行音频转文字（流式处理）...")
-    result = model.transcribe(video_path, **whisper_params)
+    return whisper_params
+
+def select_decoding_profile(duration: float, profile_path: str = PROFILE_PATH) -> Optional[Dict[str, Any]]:
+    """
+    根据音频时长从推荐配置文件中选择解码配置
     
-    # 繁体中文转简体中文
-    simplified_text = cc.convert(result["text"])
+    Args:
+        duration: 音频时长（秒）
+        profile_path: whisper_bench.py 生成的推荐配置文件路径
+        
+    Returns:
+        包含 model 和 params 的配置，没有可用配置时返回None
+    """
+    try:
+        with open(profile_path, "r", encoding="utf-8") as f:
+            profiles = json.load(f)["profiles"]
+    except Exception as e:
+        print(f"警告: 读取解码配置文件 {profile_path} 时出错: {e}，将使用默认配置")
+        return None
     
-    # 提取文件名（不含扩展名）
-    filename = Path(video_path).stem
+    # 配置按 max_duration 升序排列，选择第一个能覆盖该时长的配置
+    for profile in sorted(profiles, key=lambda p: p["max_duration"] or float("inf")):
+        if profile["max_duration"] is None or duration <= profile["max_duration"]:
+            return profile
+    return None
+
+def convert_video_to_text(video_path: str, output_dir: Optional[str] = None, stream: bool = STREAM_TRANSCRIBE) -> str:
+    """
+    将音视频文件转换为文本，同时在输出目录生成同名的SRT、VTT字幕和片段JSONL文件
     
-    # 生成输出文件路径，使用精确到分钟的时间戳
-    timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M")
-    output_filename = f"{timestamp}_{filename}_transcript.txt"
-    output_path = os.path.join(output_dir, output_filename)
+    Args:
+        video_path: 音视频文件路径
+        output_dir: 输出目录路径，为None时保存到产物存储中视频所在的分组（存储外的文件按内容哈希建立分组）
+        stream: 是否使用流式转录（逐段写入，可读取部分结果）
+        
+    Returns:
+        生成的文本文件路径
+    """
+    print(f"正在处理文件: {video_path}")
     
-    # 确保输出目录存在
-    os.makedirs(output_dir, exist_ok=True)
+    # 读取提示词文件内容
+    initial_prompt = read_prompt_file()
     
-    # 将转录结果写入文件
-    with open(output_path, "w", encoding="utf-8") as f:
-        f.write(f"文件: {video_path}\n")
-        f.write(f"处理时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write("=" * 50 + "\n")
-        f.write(simplified_text)
+    # Whisper参数配置
+    whisper_params = build_whisper_params(initial_prompt)
     
-    # 同时保存到 D:\test\TikTok_Video_API\result 目录
-    result_output_dir = r"D:\test\TikTok_Video_API\result"
-    result_output_path = os.path.join(result_output_dir, output_filename)
-    os.makedirs(result_output_dir, exist_ok=True)
+    # 选择解码配置或计算音频指纹时需要先解码音频，只解码一次
+    audio = video_path
+    if os.path.exists(PROFILE_PATH) or FINGERPRINT_DEDUP:
+        from whisper.audio import load_audio
+        with stage("decode_audio"):
+            audio = load_audio(video_path)
     
-    # 将转录结果写入 result 目录
-    with open(result_output_path, "w", encoding="utf-8") as f:
-        f.write(f"文件: {video_path}\n")
-        f.write(f"处理时间: {datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}\n")
-        f.write("=" * 50 + "\n")
-        f.write(simplified_text)
+    # 如果有 whisper_bench.py 生成的推荐配置，按音频时长自动选择模型和解码参数
+    profile = None
+    if os.path.exists(PROFILE_PATH):
+        duration = len(audio) / 16000
+        profile = select_decoding_profile(duration)
+        if profile:
+            print(f"音频时长 {duration:.0f} 秒，使用推荐解码配置: {profile['model']} {profile['params']}")
+            whisper_params.update(profile["params"])
     
-    # 删除源视频文件
-    try:
-        os.remove(video_path)
-        print(f"已删除源视频文件: {video_path}")
-    except Exception as e:
-        print(f"删除源视频文件 {video_path} 时出错: {str(e)}")
+    with ArtifactStore() as store:
+        key = None
+        if output_dir is None:
+            # 转录结果与视频放在同一分组，文件名由视频ID决定，不会与其他视频的转录冲突
+            key = store.key_for_path(video_path) or content_key(video_path)
+            output_path = store.artifact_path(key, "transcript")
+            os.makedirs(os.path.dirname(output_path), exist_ok=True)
+        else:
+            # 提取文件名（不含扩展名）
+            filename = Path(video_path).stem
+        
+            # 生成输出文件路径，使用精确到分钟的时间戳
+            timestamp = datetime.datetime.now().strftime("%Y%m%d_%H%M")
+            output_filename = f"{timestamp}_{filename}_transcript.txt"
+            output_path = os.path.join(output_dir, output_filename)
+    
+        # 查询音频指纹索引，转载/重复上传的音频直接复用已有的转录结果
+        hashes = None
+        match = None
+        if FINGERPRINT_DEDUP:
+            from audio_fingerprint import FingerprintIndex, fingerprint
+            with stage("fingerprint"):
+                hashes = fingerprint(audio)
+                with FingerprintIndex() as index:
+                    match = index.lookup(hashes)
+    
+        reused = None
+        if match:
+            duration = len(audio) / 16000
+            if match["segments"]:
+                # 按对齐的时间差平移片段，只保留两段音频共有部分的片段
+                from audio_fingerprint import align_segments
+                reused = align_segments(match["segments"], match["offset"], duration)
+            else:
+                reused = [{"start": 0.0, "end": duration, "text": match["text"]}]
+    
+        if reused:
+            print(f"音频与已转录的 {match['source']} 的第 {match['offset']:.1f} 秒起匹配（匹配度 {match['score']:.2f}），"
+                  f"复用转录结果，跳过Whisper")
+            segments = reused
+            convert = None  # 复用的文本已经是简体
+        else:
+            # 加载Whisper模型（默认使用turbo模型，速度优先）
+            print("正在加载Whisper模型...")
+            with stage("load_model"):
+                model = load_whisper_model(profile["model"] if profile else DEFAULT_MODEL)
+        
+            # 使用Whisper转录音频
+            if stream:
+                # 流式模式：逐窗口解码，每个片段解码后立即写入，分析等下游阶段可以读取部分结果
+                print("正在进行音频转文字（流式处理）...")
+                segments = stream_transcribe(model, audio, **whisper_params)
+            else:
+                print("正在进行音频转文字...")
+                with stage("whisper"):
+                    segments = model.transcribe(audio, **whisper_params)["segments"]
+            convert = staged("opencc", get_converter().convert)
+    
+        # 逐个片段繁体转简体，并同时写入文本、SRT、VTT和JSONL文件
+        with stage("write_transcript"), TranscriptWriter(output_path, video_path, convert=convert) as writer:
+            for segment in segments:
+                writer.write_segment(segment)
+            simplified_text = writer.text
+        if key:
+            store.register(key, "transcript", output_path)
+            # 开启压缩时转录文本写完后改为压缩保存（字幕文件不压缩）
+            output_path = store.compress(key, "transcript")
+    
+        # 新转录的音频加入指纹索引
+        if hashes and not reused:
+            with FingerprintIndex() as index:
+                index.add(hashes, video_path, output_path, simplified_text, writer.segments)
+    
+        # 写入全文检索索引，并关联下载时记录的视频信息
+        if SEARCH_INDEX:
+            try:
+                from search_index import index_transcript
+                index_transcript(output_path, video_path, writer.segments)
+            except Exception as e:
+                print(f"写入检索索引时出错: {e}")
+    
+        # 删除源视频文件（存储中的视频同时从索引中移除；分布式处理时视频可能由其他机器下载，不在本机的索引中）
+        try:
+            if store.key_for_path(video_path):
+                store.remove(store.key_for_path(video_path), "video")
+            if os.path.exists(video_path):
+                os.remove(video_path)
+            print(f"已删除源视频文件: {video_path}")
+        except Exception as e:
+            print(f"删除源视频文件 {video_path} 时出错: {str(e)}")
     
     print(f"转文字完成，结果已保存至: {output_path}")
     return output_path
 
-def process_latest_video():
+def process_latest_video(stream: bool = STREAM_TRANSCRIBE):
     """处理目录下最新的一个音视频文件后自动结束程序"""
     print("=" * 50)
     print("音视频转文字工具")
@@ -157,16 +314,96 @@ def process_latest_video():
         print(f"找到最新视频文件: {os.path.basename(latest_video_file)}")
         
         # 处理最新视频文件
-        result_path = convert_video_to_text(latest_video_file, OUTPUT_DIR)
+        with stage("transcribe", os.path.basename(latest_video_file)):
+            result_path = convert_video_to_text(latest_video_file, stream=stream)
         print("\n文件处理完成，程序即将退出。")
         return result_path
     except Exception as e:
         print(f"处理文件时出错: {str(e)}")
         return None
 
-def main():
+def process_all_videos(workers: int = 1, binpack: bool = False, stream: bool = STREAM_TRANSCRIBE,
+                       reserved: int = 0):
+    """
+    处理目录下所有的音视频文件，按优先级和预计时长调度
+    
+    Args:
+        workers: 并行转录的工作线程数
+        binpack: 为True时按时长预先装箱分配到各工作线程，否则使用带老化的最短作业优先队列
+        stream: 是否使用流式转录
+        reserved: 只转录急用链接（下载时指定了 interactive）的工作线程数
+        
+    Returns:
+        生成的文本文件路径列表
+    """
+    from metadata_store import MetadataStore
+    from transcribe_scheduler import (TranscriptionJob, TranscriptionQueue, expected_duration, normalize_path,
+                                      plan_workers, print_wait_time_report, run_plan, run_queue)
+    from work_queue import DEFAULT_PRIORITY
+    
+    print("=" * 50)
+    print("音视频批量转文字工具")
+    print("=" * 50)
+    
+    try:
+        video_files = list_video_files()
+    except Exception as e:
+        print(f"处理文件时出错: {str(e)}")
+        return []
+    
+    if not video_files:
+        print(f"产物存储和目录 {VIDEO_DIR} 中都没有待转录的音视频文件")
+        return []
+    
+    # 下载时记录的抖音视频时长和优先级
+    try:
+        with MetadataStore() as store:
+            known_durations = store.known_durations()
+            known_priorities = store.known_priorities()
+    except Exception as e:
+        print(f"读取视频时长记录时出错: {e}，将从文件中读取时长")
+        known_durations, known_priorities = {}, {}
+    
+    jobs = [TranscriptionJob(path, expected_duration(path, known_durations),
+                             known_priorities.get(normalize_path(path), DEFAULT_PRIORITY))
+            for path in video_files]
+    print(f"共 {len(jobs)} 个待转录文件，预计总时长 {sum(j.expected_duration for j in jobs):.0f} 秒")
+    
+    def process(path):
+        with stage("transcribe", os.path.basename(path)):
+            return convert_video_to_text(path, stream=stream)
+    
+    if binpack:
+        done = run_plan(plan_workers(jobs, workers), process)
+    else:
+        queue = TranscriptionQueue()
+        for job in jobs:
+            queue.push(job)
+        done = run_queue(queue, process, workers, min(reserved, workers - 1))
+    
+    print_wait_time_report(done)
+    return [job.result for job in done if job.result]
+
+def main(stream: bool = STREAM_TRANSCRIBE):
     """主函数"""
-    return process_latest_video()
+    return process_latest_video(stream)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="将最新的音视频文件转换为文本")
+    parser.add_argument("--stream", action="store_true", help="流式转录，每解码一个片段就写入输出文件")
+    parser.add_argument("--all", action="store_true", help="处理目录下所有文件，按预计时长短作业优先调度")
+    parser.add_argument("-w", "--workers", type=int, default=1, help="--all 模式下并行转录的工作线程数，每个线程各加载一份模型（默认: 1）")
+    parser.add_argument("--binpack", action="store_true", help="--all 模式下按时长预先装箱分配到各工作线程")
+    parser.add_argument("--reserve", type=int, default=0, help="--all 模式下只转录急用链接的工作线程数（默认: 0）")
+    parser.add_argument("--watch", action="store_true", help="常驻运行，新视频下载完成后立即转录（见 watch_folder.py）")
+    add_profile_arguments(parser)
+    args = parser.parse_args()
+    if args.watch:
+        from watch_folder import watch
+        run_profiled(args, "transcribe", watch, ["transcribe"], stream=args.stream or STREAM_TRANSCRIBE)
+    elif args.all:
+        run_profiled(args, "transcribe", process_all_videos, args.workers, args.binpack,
+                     stream=args.stream or STREAM_TRANSCRIBE, reserved=args.reserve)
+    else:
+        run_profiled(args, "transcribe", main, stream=args.stream or STREAM_TRANSCRIBE)
\ No newline at end of file
@@ -0,0 +1,415 @@
+#!/usr/bin/env python3
+"""
+监视文件夹
+转录和分析阶段常驻运行：新视频下载完成、新转录写完后立即处理，不需要反复扫描目录查找最新的文件。
+
+产物写入完成的标志是登记到产物索引（artifact_store），每次登记都会写入索引数据库，
+因此监视的是索引数据库所在的目录（不需要监视产物存储下的每个分片目录），收到通知后按索引查询待处理的文件。
+手动放入 video 目录的文件在写入完成（关闭或重命名到该目录，没有这类事件时为大小稳定）后移入产物存储。
+
+文件事件通知优先使用 watchdog（pip install watchdog，Linux为inotify，Windows为ReadDirectoryChangesW），
+未安装时Linux上直接使用inotify，其他系统定时查询；有文件事件时也每隔 POLL_INTERVAL 秒查询一次，防止漏掉事件。
+每个文件只加入队列一次，由常驻的工作线程处理，Whisper模型和DeepSeek连接只创建一次
+"""
+
+import argparse
+import ctypes
+import os
+import queue
+import select
+import struct
+import sys
+import threading
+import time
+from dataclasses import dataclass
+from typing import Any, Callable, Dict, List, Optional, Set, Tuple
+
+from artifact_store import ArtifactStore, ingest_videos
+from profiler import stage
+
+# 没有文件事件时的查询间隔，有文件事件时作为兜底查询的间隔（秒）
+POLL_INTERVAL = 2.0
+
+# 收到事件后等待的时间，合并短时间内的多个事件（秒）
+DEBOUNCE = 0.2
+
+# 没有关闭或重命名事件时，video 目录中的文件大小保持不变多久才认为写入完成（秒）
+STABLE_SECONDS = 2.0
+
+# inotify 事件类型
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+INOTIFY_EVENT = struct.Struct("iIII")
+
+@dataclass
+class WatchStage:
+    """
+    一个常驻处理阶段
+
+    Attributes:
+        name: 阶段名
+        candidates: 按索引查询待处理文件的函数（从旧到新）
+        process: 处理一批文件的函数
+        batch_size: 每次最多处理的文件数
+        warmup: 工作线程启动时调用（如预先加载Whisper模型）
+    """
+    name: str
+    candidates: Callable[[ArtifactStore], List[str]]
+    process: Callable[[List[str]], Any]
+    batch_size: int = 1
+    warmup: Optional[Callable[[], Any]] = None
+
+class _InotifyWatcher:
+    """Linux inotify 文件事件（不依赖第三方库）"""
+
+    def __init__(self, directories: List[str], callback: Callable[[str, bool], None]):
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._fd = self._libc.inotify_init()
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init 失败")
+        self._dirs = {}
+        for directory in directories:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(directory),
+                                              IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE)
+            if wd < 0:
+                raise OSError(ctypes.get_errno(), f"无法监视目录 {directory}")
+            self._dirs[wd] = directory
+        self._callback = callback
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="inotify", daemon=True)
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            if not select.select([self._fd], [], [], 0.5)[0]:
+                continue
+            data = os.read(self._fd, 64 * 1024)
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = INOTIFY_EVENT.unpack_from(data, offset)
+                name = data[offset + INOTIFY_EVENT.size:offset + INOTIFY_EVENT.size + length].rstrip(b"\0")
+                offset += INOTIFY_EVENT.size + length
+                if wd in self._dirs and name:
+                    self._callback(os.path.join(self._dirs[wd], os.fsdecode(name)),
+                                   bool(mask & (IN_CLOSE_WRITE | IN_MOVED_TO)))
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+        os.close(self._fd)
+
+class ChangeNotifier:
+    """
+    目录变化通知
+
+    优先使用 watchdog 的文件事件，其次Linux的inotify，都不可用时只定时查询
+    """
+
+    def __init__(self, directories: List[str], use_events: bool = True,
+                 accept: Optional[Callable[[str], bool]] = None):
+        self._accept = accept
+        self._changed = threading.Event()
+        self._lock = threading.Lock()
+        self._completed: Set[str] = set()
+        self._backend = None
+        self.mode = "定时查询"
+        for directory in directories:
+            os.makedirs(directory, exist_ok=True)
+        if not use_events:
+            return
+
+        try:
+            from watchdog.events import FileSystemEventHandler
+            from watchdog.observers import Observer
+        except ImportError:
+            Observer = None
+        if Observer is not None:
+            notifier = self
+
+            class Handler(FileSystemEventHandler):
+                def on_any_event(self, event):
+                    if event.is_directory:
+                        return
+                    path = getattr(event, "dest_path", "") or event.src_path
+                    notifier.on_event(path, event.event_type in ("closed", "moved"))
+
+            self._backend = Observer()
+            for directory in directories:
+                self._backend.schedule(Handler(), directory, recursive=False)
+            self._backend.start()
+            self.mode = "文件事件（watchdog）"
+        elif sys.platform.startswith("linux"):
+            try:
+                self._backend = _InotifyWatcher(directories, self.on_event)
+                self.mode = "文件事件（inotify）"
+            except OSError as e:
+                print(f"无法使用inotify: {e}，改为定时查询")
+        else:
+            print("未安装watchdog，使用定时查询（pip install watchdog 可改为文件事件通知）")
+
+    def on_event(self, path: str, completed: bool):
+        """
+        处理文件事件
+
+        Args:
+            path: 文件路径
+            completed: 是否为写入完成的事件（关闭或重命名到该目录）
+        """
+        if os.path.basename(path).startswith(".") or (self._accept and not self._accept(path)):
+            return
+        if completed:
+            with self._lock:
+                self._completed.add(os.path.abspath(path))
+        self._changed.set()
+
+    def notify(self):
+        """主动触发一次查询（如某个阶段处理完成后）"""
+        self._changed.set()
+
+    def wait(self, timeout: float) -> bool:
+        """等待目录变化，返回是否收到通知"""
+        changed = self._changed.wait(timeout)
+        if changed:
+            time.sleep(DEBOUNCE)
+            self._changed.clear()
+        return changed
+
+    def take_completed(self) -> Set[str]:
+        """取出收到写入完成事件的文件"""
+        with self._lock:
+            completed, self._completed = self._completed, set()
+        return completed
+
+    def close(self):
+        if self._backend is not None:
+            self._backend.stop()
+            if hasattr(self._backend, "join"):
+                self._backend.join()
+            self._backend = None
+
+class Watcher:
+    """
+    监视产物索引和 video 目录，把新文件交给各阶段的常驻工作线程
+
+    每个文件只加入队列一次：处理完成的文件不再出现在待处理列表中，从记录中移除；
+    处理失败的文件保留在记录中，本次运行不再重试（重新启动后会重新处理）
+    """
+
+    def __init__(self, stages: List[WatchStage], inbox: Optional[str] = None,
+                 extensions: Optional[set] = None, use_events: bool = True,
+                 poll_interval: float = POLL_INTERVAL):
+        self.stages = stages
+        self.inbox = inbox
+        self.extensions = extensions or set()
+        self.poll_interval = poll_interval
+        self.store = ArtifactStore()
+        index_dir = os.path.dirname(os.path.abspath(self.store.db_path))
+        index_name = os.path.basename(self.store.db_path)
+        # 索引数据库目录中还有其他数据库，只关注产物索引（含 -wal 日志）的变化
+        self.notifier = ChangeNotifier(
+            [index_dir] + ([inbox] if inbox else []), use_events,
+            lambda path: os.path.dirname(path) != index_dir or os.path.basename(path).startswith(index_name),
+        )
+        self._queues = {s.name: queue.Queue() for s in stages}
+        self._seen: Dict[str, Set[str]] = {s.name: set() for s in stages}
+        self._active: Dict[str, Set[str]] = {s.name: set() for s in stages}
+        self._inbox_sizes: Dict[str, Tuple[int, float, float]] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self.processed: Dict[str, int] = {s.name: 0 for s in stages}
+        self.failed: Dict[str, int] = {s.name: 0 for s in stages}
+
+    def ingest_inbox(self, completed: Set[str]) -> List[str]:
+        """
+        把 video 目录中写入完成的文件移入产物存储
+
+        Args:
+            completed: 收到写入完成事件的文件
+
+        Returns:
+            移入后的文件路径列表
+        """
+        if not self.inbox or not os.path.isdir(self.inbox):
+            return []
+        now = time.time()
+        ready = []
+        for name in os.listdir(self.inbox):
+            path = os.path.abspath(os.path.join(self.inbox, name))
+            if name.startswith(".") or os.path.splitext(name)[1].lower() not in self.extensions:
+                continue
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            previous = self._inbox_sizes.get(path)
+            if path in completed:
+                ready.append(path)
+            elif previous and previous[:2] == (stat.st_size, stat.st_mtime):
+                # 没有写入完成事件（Windows复制文件、定时查询）时，大小和修改时间保持不变足够久才处理
+                if now - previous[2] >= STABLE_SECONDS:
+                    ready.append(path)
+                continue
+            self._inbox_sizes[path] = (stat.st_size, stat.st_mtime, now)
+        for path in ready:
+            self._inbox_sizes.pop(path, None)
+        return ingest_videos(self.inbox, self.extensions, self.store, ready) if ready else []
+
+    def sweep(self) -> int:
+        """
+        按索引查询各阶段的待处理文件，新文件加入队列
+
+        Returns:
+            新加入队列的文件数
+        """
+        self.ingest_inbox(self.notifier.take_completed())
+        added = 0
+        for watch_stage in self.stages:
+            candidates = watch_stage.candidates(self.store)
+            with self._lock:
+                seen = self._seen[watch_stage.name]
+                seen.intersection_update(set(candidates) | self._active[watch_stage.name])
+                for path in candidates:
+                    if path not in seen:
+                        seen.add(path)
+                        self._active[watch_stage.name].add(path)
+                        self._queues[watch_stage.name].put(path)
+                        added += 1
+        return added
+
+    def _work(self, watch_stage: WatchStage):
+        """工作线程：从队列中取出文件，凑够一批或队列为空时处理"""
+        if watch_stage.warmup:
+            try:
+                watch_stage.warmup()
+            except Exception as e:
+                print(f"[{watch_stage.name}] 预加载失败: {e}，将在处理第一个文件时加载")
+        work = self._queues[watch_stage.name]
+        while not self._stop.is_set():
+            try:
+                batch = [work.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            while len(batch) < watch_stage.batch_size:
+                try:
+                    batch.append(work.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                with stage(watch_stage.name, os.path.basename(batch[0])):
+                    watch_stage.process(batch)
+                self.processed[watch_stage.name] += len(batch)
+            except Exception as e:
+                self.failed[watch_stage.name] += len(batch)
+                print(f"[{watch_stage.name}] 处理 {', '.join(os.path.basename(p) for p in batch)} 时出错: {e}")
+            finally:
+                with self._lock:
+                    self._active[watch_stage.name].difference_update(batch)
+                # 处理结果可能是下一个阶段的输入
+                self.notifier.notify()
+
+    def idle(self) -> bool:
+        """所有阶段都没有排队或正在处理的文件"""
+        with self._lock:
+            return not any(self._active.values())
+
+    def run(self, exit_when_idle: bool = False, stop: Optional[threading.Event] = None):
+        """
+        运行直到被中断（或 exit_when_idle 为True时所有文件都处理完）
+
+        Args:
+            exit_when_idle: 没有待处理的文件时退出
+            stop: 外部停止信号
+        """
+        stop = stop or threading.Event()
+        workers = [threading.Thread(target=self._work, args=(s,), name=f"watch-{s.name}", daemon=True)
+                   for s in self.stages]
+        for worker in workers:
+            worker.start()
+        print(f"正在监视（{self.notifier.mode}）: {', '.join(s.name for s in self.stages)}")
+        try:
+            self.sweep()
+            while not stop.is_set():
+                self.notifier.wait(self.poll_interval)
+                added = self.sweep()
+                if exit_when_idle and not added and self.idle() and not self._inbox_sizes:
+                    break
+        except KeyboardInterrupt:
+            print("\n已停止监视")
+        finally:
+            self._stop.set()
+            for worker in workers:
+                worker.join()
+            self.notifier.close()
+            self.store.close()
+
+def transcribe_stage(stream: bool = False, preload: bool = True) -> WatchStage:
+    """转录阶段：处理产物存储中的视频（转录完成后视频被删除，不会再出现在待处理列表中）"""
+    import video_to_text
+
+    def process(paths: List[str]):
+        for path in paths:
+            video_to_text.convert_video_to_text(path, stream=stream)
+
+    return WatchStage(
+        "transcribe",
+        lambda store: store.list("video", newest_first=False),
+        process,
+        warmup=(lambda: video_to_text.load_whisper_model(video_to_text.DEFAULT_MODEL)) if preload else None,
+    )
+
+def analyze_stage(max_items: Optional[int] = None) -> WatchStage:
+    """分析阶段：处理还没有分析结果的转录，同时到达的多个转录合并到同一个请求中"""
+    import analyze_transcript
+    max_items = max_items or analyze_transcript.BATCH_MAX_ITEMS
+    return WatchStage(
+        "analyze",
+        lambda store: store.pending("transcript", "analysis"),
+        lambda paths: analyze_transcript.analyze_transcripts_batched(paths, max_items=max_items),
+        batch_size=max_items,
+    )
+
+def watch(stage_names: List[str], use_events: bool = True, poll_interval: float = POLL_INTERVAL,
+          stream: bool = False, preload: bool = True, exit_when_idle: bool = False) -> Dict[str, int]:
+    """
+    监视并处理新文件
+
+    Args:
+        stage_names: 运行的阶段（transcribe、analyze）
+        use_events: 是否使用文件事件通知
+        poll_interval: 查询间隔（秒）
+        stream: 转录阶段是否使用流式转录
+        preload: 转录阶段是否在启动时加载Whisper模型
+        exit_when_idle: 处理完已有文件后退出
+
+    Returns:
+        各阶段处理的文件数
+    """
+    import video_to_text
+    stages = []
+    if "transcribe" in stage_names:
+        stages.append(transcribe_stage(stream, preload))
+    if "analyze" in stage_names:
+        stages.append(analyze_stage())
+    watcher = Watcher(stages, video_to_text.VIDEO_DIR if "transcribe" in stage_names else None,
+                      video_to_text.SUPPORTED_EXTENSIONS, use_events, poll_interval)
+    watcher.run(exit_when_idle)
+    print(f"处理完成: {watcher.processed}，失败: {watcher.failed}")
+    return watcher.processed
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="监视新下载的视频和新转录，常驻处理")
+    parser.add_argument("stages", nargs="*", default=["transcribe", "analyze"], choices=["transcribe", "analyze"],
+                        help="运行的阶段（默认: transcribe analyze）")
+    parser.add_argument("--poll", action="store_true", help="不使用文件事件通知，只定时查询")
+    parser.add_argument("--interval", type=float, default=POLL_INTERVAL, help=f"查询间隔，单位秒（默认: {POLL_INTERVAL}）")
+    parser.add_argument("--stream", action="store_true", help="流式转录")
+    parser.add_argument("--no-preload", action="store_true", help="不在启动时加载Whisper模型")
+    parser.add_argument("--exit-when-idle", action="store_true", help="处理完已有文件后退出")
+    args = parser.parse_args()
+    watch(args.stages, not args.poll, args.interval, args.stream, not args.no_preload, args.exit_when_idle)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+"""
+Whisper解码配置基准测试
+用本地参考语料（音频 + 同名参考文本）测试不同模型大小、集束搜索/温度和
+condition_on_previous_text 组合的实时率（RTF）、峰值内存和字错误率（CER），
+并按音频时长生成推荐配置，供 video_to_text.convert_video_to_text 自动选择
+"""
+
+import argparse
+import itertools
+import json
+import os
+import re
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import video_to_text
+
+# 参考语料目录：每个音频文件旁放一个同名的 .txt 参考文本
+CORPUS_DIR = r"D:\test\TikTok_Video_API\bench\corpus"
+
+# 测试的参数组合
+MODELS = ["base", "small", "turbo"]
+BEAM_SIZES = [None, 5]  # None 表示贪心解码
+TEMPERATURES = {
+    "greedy": 0.0,
+    "fallback": [0.0, 0.2, 0.4, 0.6, 0.8, 1.0],  # 解码失败时逐步升温重试
+}
+CONDITION_ON_PREVIOUS_TEXT = [True, False]
+
+# 推荐配置的时长分档（秒），None 表示不限
+DURATION_BUCKETS = [30, 120, 600, None]
+
+# 在最低CER基础上允许的误差，范围内选择最快的配置
+CER_TOLERANCE = 0.02
+
+AUDIO_EXTENSIONS = {'.mp4', '.wav', '.mp3', '.m4a', '.flac', '.ogg'}
+
+def load_corpus(corpus_dir: str) -> List[Tuple[str, str]]:
+    """
+    加载参考语料
+
+    Args:
+        corpus_dir: 语料目录
+
+    Returns:
+        (音频路径, 参考文本) 列表
+    """
+    corpus = []
+    for file in sorted(Path(corpus_dir).iterdir()):
+        if file.suffix.lower() not in AUDIO_EXTENSIONS:
+            continue
+        reference_file = file.with_suffix(".txt")
+        if not reference_file.exists():
+            print(f"警告: 音频 {file.name} 缺少参考文本，跳过")
+            continue
+        corpus.append((str(file), reference_file.read_text(encoding="utf-8")))
+    return corpus
+
+def normalize_text(text: str) -> str:
+    """统一转为简体并去掉标点和空白，只比较文字内容"""
+    text = video_to_text.get_converter().convert(text)
+    return re.sub(r"[\W_]+", "", text)
+
+def char_error_rate(reference: str, hypothesis: str) -> float:
+    """
+    计算字错误率（字符级编辑距离 / 参考文本长度）
+
+    Args:
+        reference: 参考文本
+        hypothesis: 识别结果
+
+    Returns:
+        字错误率
+    """
+    reference = normalize_text(reference)
+    hypothesis = normalize_text(hypothesis)
+    if not reference:
+        return 0.0 if not hypothesis else 1.0
+
+    previous = list(range(len(hypothesis) + 1))
+    for i, ref_char in enumerate(reference, 1):
+        current = [i]
+        for j, hyp_char in enumerate(hypothesis, 1):
+            current.append(min(previous[j] + 1, current[j - 1] + 1,
+                               previous[j - 1] + (ref_char != hyp_char)))
+        previous = current
+    return previous[-1] / len(reference)
+
+def peak_rss_mb() -> Optional[float]:
+    """当前进程的峰值常驻内存（MB），无法获取时返回None"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Linux 单位为KB，macOS 为字节
+        return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return getattr(info, "peak_wset", info.rss) / (1024 * 1024)
+    except ImportError:
+        return None
+
+def build_configs(beam_sizes=BEAM_SIZES, temperatures=TEMPERATURES,
+                  conditions=CONDITION_ON_PREVIOUS_TEXT) -> List[Dict[str, Any]]:
+    """生成除模型以外的解码参数组合"""
+    configs = []
+    for beam_size, temperature_name, condition in itertools.product(beam_sizes, temperatures, conditions):
+        params = {
+            "temperature": temperatures[temperature_name],
+            "condition_on_previous_text": condition,
+        }
+        if beam_size is not None:
+            params["beam_size"] = beam_size
+        configs.append({"name": f"beam={beam_size or 'greedy'},temp={temperature_name},cond={condition}",
+                        "params": params})
+    return configs
+
+def run_model(model_name: str, corpus: List[Tuple[str, str]], configs: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    在当前进程中加载一个模型，依次测试所有参数组合
+
+    Args:
+        model_name: Whisper模型名称
+        corpus: 参考语料
+        configs: 参数组合
+
+    Returns:
+        模型加载耗时、峰值内存和每条语料的测试结果
+    """
+    from whisper.audio import load_audio
+
+    start = time.perf_counter()
+    model = video_to_text.load_whisper_model(model_name)
+    load_time = time.perf_counter() - start
+
+    results = []
+    for audio_path, reference in corpus:
+        audio = load_audio(audio_path)
+        duration = len(audio) / 16000
+        for config in configs:
+            whisper_params = video_to_text.build_whisper_params()
+            whisper_params.update(config["params"])
+
+            start = time.perf_counter()
+            hypothesis = model.transcribe(audio, **whisper_params)["text"]
+            elapsed = time.perf_counter() - start
+
+            result = {
+                "model": model_name,
+                "config": config["name"],
+                "params": config["params"],
+                "clip": os.path.basename(audio_path),
+                "duration": duration,
+                "rtf": elapsed / duration if duration else 0.0,
+                "cer": char_error_rate(reference, hypothesis),
+            }
+            print(f"{model_name:8s} {config['name']:45s} {result['clip']:30s} "
+                  f"RTF {result['rtf']:.3f}  CER {result['cer']:.3f}", file=sys.stderr)
+            results.append(result)
+
+    return {"model": model_name, "load_time": load_time, "peak_rss_mb": peak_rss_mb(), "results": results}
+
+def run_model_in_subprocess(model_name: str, corpus_dir: str) -> Dict[str, Any]:
+    """在独立子进程中测试一个模型，使峰值内存互不影响"""
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        output_path = os.path.join(tmp_dir, "result.json")
+        subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--worker", model_name,
+             "--corpus", corpus_dir, "--worker-output", output_path],
+            check=True,
+        )
+        with open(output_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+def recommend_profiles(model_runs: List[Dict[str, Any]], buckets=DURATION_BUCKETS,
+                       tolerance: float = CER_TOLERANCE) -> List[Dict[str, Any]]:
+    """
+    按时长分档选择推荐配置：在CER不超过最低CER + tolerance 的配置中选择平均RTF最低的
+
+    Args:
+        model_runs: 各模型的测试结果
+        buckets: 时长分档上限（秒）
+        tolerance: 允许的CER误差
+
+    Returns:
+        推荐配置列表
+    """
+    results = [r for run in model_runs for r in run["results"]]
+    profiles = []
+    lower = 0.0
+    for upper in buckets:
+        in_bucket = [r for r in results if r["duration"] > lower and (upper is None or r["duration"] <= upper)]
+        lower = upper if upper is not None else lower
+        if not in_bucket:
+            continue
+
+        # 按 (模型, 参数组合) 聚合
+        groups: Dict[Tuple[str, str], List[Dict[str, Any]]] = {}
+        for r in in_bucket:
+            groups.setdefault((r["model"], r["config"]), []).append(r)
+        summary = []
+        for (model_name, config_name), rows in groups.items():
+            summary.append({
+                "model": model_name,
+                "config": config_name,
+                "params": rows[0]["params"],
+                "rtf": sum(r["rtf"] for r in rows) / len(rows),
+                "cer": sum(r["cer"] for r in rows) / len(rows),
+                "clips": len(rows),
+            })
+
+        best_cer = min(s["cer"] for s in summary)
+        candidates = [s for s in summary if s["cer"] <= best_cer + tolerance]
+        best = min(candidates, key=lambda s: s["rtf"])
+        best["max_duration"] = upper
+        profiles.append(best)
+
+    # 最后一档必须覆盖任意时长
+    if profiles and profiles[-1]["max_duration"] is not None:
+        profiles[-1]["max_duration"] = None
+    return profiles
+
+def print_summary(model_runs: List[Dict[str, Any]], profiles: List[Dict[str, Any]]):
+    """打印测试结果汇总"""
+    print("\n" + "=" * 50)
+    print("模型资源占用")
+    print("=" * 50)
+    for run in model_runs:
+        rss = f"{run['peak_rss_mb']:.0f} MB" if run["peak_rss_mb"] is not None else "未知"
+        print(f"{run['model']:8s} 加载耗时 {run['load_time']:.1f} 秒  峰值内存 {rss}")
+
+    print("\n" + "=" * 50)
+    print("推荐解码配置")
+    print("=" * 50)
+    for profile in profiles:
+        limit = f"≤{profile['max_duration']} 秒" if profile["max_duration"] is not None else "更长"
+        print(f"{limit:10s} {profile['model']:8s} {profile['config']:45s} "
+              f"RTF {profile['rtf']:.3f}  CER {profile['cer']:.3f}（{profile['clips']} 条样本）")
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="测试Whisper解码配置的速度和准确率，生成按时长推荐的配置")
+    parser.add_argument("--corpus", default=CORPUS_DIR, help=f"参考语料目录（默认: {CORPUS_DIR}）")
+    parser.add_argument("--models", nargs="+", default=MODELS, help=f"测试的模型（默认: {' '.join(MODELS)}）")
+    parser.add_argument("-o", "--output", default=video_to_text.PROFILE_PATH,
+                        help=f"推荐配置输出路径（默认: {video_to_text.PROFILE_PATH}）")
+    parser.add_argument("--tolerance", type=float, default=CER_TOLERANCE,
+                        help=f"在最低CER基础上允许的误差（默认: {CER_TOLERANCE}）")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    parser.add_argument("--worker-output", help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    corpus = load_corpus(args.corpus)
+    if not corpus:
+        print(f"在目录 {args.corpus} 中未找到参考语料")
+        return None
+
+    # 子进程模式：只测试一个模型并写出结果
+    if args.worker:
+        run = run_model(args.worker, corpus, build_configs())
+        with open(args.worker_output, "w", encoding="utf-8") as f:
+            json.dump(run, f, ensure_ascii=False)
+        return run
+
+    print(f"共 {len(corpus)} 条参考语料，{len(args.models)} 个模型，{len(build_configs())} 种参数组合")
+    model_runs = [run_model_in_subprocess(model_name, args.corpus) for model_name in args.models]
+    profiles = recommend_profiles(model_runs, tolerance=args.tolerance)
+    print_summary(model_runs, profiles)
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump({
+            "generated_at": datetime.now().isoformat(timespec="seconds"),
+            "corpus": args.corpus,
+            "profiles": profiles,
+            "runs": model_runs,
+        }, f, ensure_ascii=False, indent=2)
+    print(f"\n推荐配置已保存至: {args.output}")
+    return profiles
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+"""
+Whisper模型内存映射加载
+whisper.load_model 每次都把整个检查点读入并反序列化到新分配的内存中，每个工作进程各自一份。
+本模块先把检查点转换为CPU推理用的float32格式保存到本地（只需一次），之后用 torch.load(mmap=True)
+内存映射加载，并用 load_state_dict(assign=True) 直接使用映射的张量，不再复制权重：
+同一主机上的多个转录进程通过系统页缓存共享同一份权重，冷启动也省去了读取和随机初始化的时间
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import subprocess
+import sys
+import time
+from typing import Dict, Optional
+
+# 转换后的模型文件目录
+MMAP_MODEL_DIR = r"D:\test\TikTok_Video_API\models"
+
+# 找不到转换后的模型文件时是否自动转换（默认不转换，需先运行 convert 命令，否则使用 whisper.load_model）
+AUTO_CONVERT = False
+
+def converted_path(name: str, model_dir: str = MMAP_MODEL_DIR) -> str:
+    """转换后的模型文件路径"""
+    return os.path.join(model_dir, f"{name}.fp32.pt")
+
+def mmap_supported() -> bool:
+    """当前torch版本是否支持内存映射加载（torch 2.1及以上）"""
+    import inspect
+    import torch
+    return "mmap" in inspect.signature(torch.load).parameters and \
+        "assign" in inspect.signature(torch.nn.Module.load_state_dict).parameters
+
+def convert_checkpoint(name: str, model_dir: str = MMAP_MODEL_DIR) -> str:
+    """
+    将官方检查点转换为可内存映射的float32格式
+
+    CPU推理时whisper使用float32，如果直接映射官方的float16检查点，
+    每次前向计算都要临时转换权重，因此预先转换好
+
+    Args:
+        name: 模型名称（如 turbo）或检查点文件路径
+        model_dir: 输出目录
+
+    Returns:
+        转换后的文件路径
+    """
+    import torch
+    import whisper
+
+    if name in whisper._MODELS:
+        download_root = os.path.join(os.getenv("XDG_CACHE_HOME", os.path.join(os.path.expanduser("~"), ".cache")),
+                                     "whisper")
+        checkpoint_file = whisper._download(whisper._MODELS[name], download_root, False)
+        alignment_heads = whisper._ALIGNMENT_HEADS[name]
+    elif os.path.isfile(name):
+        checkpoint_file = name
+        alignment_heads = None
+    else:
+        raise ValueError(f"未知的Whisper模型: {name}")
+
+    print(f"正在转换模型 {name}: {checkpoint_file}")
+    checkpoint = torch.load(checkpoint_file, map_location="cpu")
+    state_dict = {
+        key: (value.float() if value.is_floating_point() else value).contiguous()
+        for key, value in checkpoint["model_state_dict"].items()
+    }
+
+    output_path = converted_path(os.path.splitext(os.path.basename(name))[0], model_dir)
+    os.makedirs(model_dir, exist_ok=True)
+    # 先写临时文件再重命名，其他进程不会读到写了一半的文件
+    tmp_path = f"{output_path}.{os.getpid()}.tmp"
+    torch.save({"dims": checkpoint["dims"], "model_state_dict": state_dict, "alignment_heads": alignment_heads},
+               tmp_path)
+    os.replace(tmp_path, output_path)
+    print(f"模型已转换并保存至: {output_path}")
+    return output_path
+
+def load_model_mmap(name: str, device: Optional[str] = None, model_dir: str = MMAP_MODEL_DIR):
+    """
+    内存映射加载Whisper模型
+
+    torch版本不支持内存映射或加载失败时，回退到 whisper.load_model
+
+    Args:
+        name: 模型名称
+        device: 运行设备，默认有CUDA时使用CUDA
+        model_dir: 转换后的模型文件目录
+
+    Returns:
+        Whisper模型
+    """
+    import torch
+    import whisper
+    from whisper.model import ModelDimensions, Whisper
+
+    if device is None:
+        device = "cuda" if torch.cuda.is_available() else "cpu"
+
+    path = converted_path(name, model_dir)
+    if not mmap_supported():
+        print("当前torch版本不支持内存映射加载，使用 whisper.load_model")
+        return whisper.load_model(name, device=device)
+    if not os.path.exists(path):
+        if not AUTO_CONVERT:
+            return whisper.load_model(name, device=device)
+        convert_checkpoint(name, model_dir)
+
+    try:
+        checkpoint = torch.load(path, map_location="cpu", mmap=True, weights_only=True)
+        dims = ModelDimensions(**checkpoint["dims"])
+
+        # 在meta设备上构建模型，不分配内存也不做随机初始化，参数随后直接替换为映射的张量
+        try:
+            with torch.device("meta"):
+                model = Whisper(dims)
+        except Exception:
+            # 部分torch版本不支持在meta设备上创建稀疏张量，改为正常构建（随机初始化的参数随后被替换释放）
+            model = Whisper(dims)
+        model.load_state_dict(checkpoint["model_state_dict"], assign=True)
+
+        # 不保存在检查点中的缓冲区需要重新创建
+        model.decoder.register_buffer(
+            "mask", torch.empty(dims.n_text_ctx, dims.n_text_ctx).fill_(-float("inf")).triu_(1), persistent=False
+        )
+        if checkpoint.get("alignment_heads") is not None:
+            model.set_alignment_heads(checkpoint["alignment_heads"])
+        else:
+            # 与 Whisper 默认值一致：使用后一半解码层的所有注意力头
+            heads = torch.zeros(dims.n_text_layer, dims.n_text_head, dtype=torch.bool)
+            heads[dims.n_text_layer // 2:] = True
+            model.register_buffer("alignment_heads", heads.to_sparse(), persistent=False)
+
+        remaining = [key for key, value in list(model.named_parameters()) + list(model.named_buffers())
+                     if value.is_meta]
+        if remaining:
+            raise ValueError(f"以下权重未能加载: {', '.join(remaining)}")
+    except Exception as e:
+        print(f"内存映射加载模型失败: {e}，使用 whisper.load_model")
+        return whisper.load_model(name, device=device)
+
+    return model.to(device)
+
+def memory_usage_mb() -> Dict[str, Optional[float]]:
+    """
+    当前进程的内存占用（MB）
+
+    RSS包含与其他进程共享的映射页；PSS把共享页按进程数均摊，更能反映多进程时的实际占用（仅Linux）
+    """
+    usage = {"rss": None, "pss": None}
+    try:
+        with open("/proc/self/smaps_rollup", "r") as f:
+            for line in f:
+                key, value = line.split(":", 1)
+                if key in ("Rss", "Pss"):
+                    usage[key.lower()] = int(value.split()[0]) / 1024
+        return usage
+    except (OSError, ValueError):
+        pass
+    try:
+        import psutil
+        usage["rss"] = psutil.Process().memory_info().rss / (1024 * 1024)
+    except ImportError:
+        pass
+    return usage
+
+def run_worker(name: str, method: str):
+    """
+    基准测试子进程：加载模型后输出耗时，收到父进程通知（所有进程都加载完成）后再输出内存占用，
+    之后保持模型直到标准输入关闭
+    """
+    # 加载过程中的提示信息输出到标准错误，标准输出只用于向父进程返回结果
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(sys.stderr):
+        if method == "mmap":
+            model = load_model_mmap(name, device="cpu")
+        else:
+            import whisper
+            model = whisper.load_model(name, device="cpu")
+    print(json.dumps({"load_time": time.perf_counter() - start}), flush=True)
+
+    sys.stdin.readline()
+    print(json.dumps(memory_usage_mb()), flush=True)
+    sys.stdin.read()
+    del model
+
+def run_bench(name: str, workers: int):
+    """
+    分别用两种方式在多个并发子进程中加载模型，比较冷启动耗时和内存占用
+
+    Args:
+        name: 模型名称
+        workers: 同时加载模型的进程数
+    """
+    if not os.path.exists(converted_path(name)):
+        convert_checkpoint(name)
+
+    print("=" * 50)
+    print(f"Whisper模型加载基准测试（{name}，{workers} 个进程）")
+    print("=" * 50)
+    for method in ("whisper", "mmap"):
+        procs = [
+            subprocess.Popen([sys.executable, os.path.abspath(__file__), "--worker", method, name],
+                             stdin=subprocess.PIPE, stdout=subprocess.PIPE, text=True)
+            for _ in range(workers)
+        ]
+        # 等所有进程都加载完成，模型同时驻留时再测量内存
+        load_times = [json.loads(proc.stdout.readline())["load_time"] for proc in procs]
+        usages = []
+        for proc in procs:
+            proc.stdin.write("\n")
+            proc.stdin.flush()
+            usages.append(json.loads(proc.stdout.readline()))
+        for proc in procs:
+            proc.communicate()
+
+        def average(key):
+            values = [usage[key] for usage in usages if usage[key] is not None]
+            return f"{sum(values) / len(values):.0f} MB" if values else "未知"
+
+        print(f"{method:8s} 平均加载耗时 {sum(load_times) / len(load_times):.2f} 秒  "
+              f"平均RSS {average('rss')}  平均PSS {average('pss')}")
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="转换Whisper模型为可内存映射的格式，或比较两种加载方式")
+    subparsers = parser.add_subparsers(dest="command")
+
+    convert_parser = subparsers.add_parser("convert", help="转换模型")
+    convert_parser.add_argument("models", nargs="+", help="模型名称（如 turbo small）")
+
+    bench_parser = subparsers.add_parser("bench", help="比较 whisper.load_model 与内存映射加载")
+    bench_parser.add_argument("model", nargs="?", default="turbo", help="模型名称（默认: turbo）")
+    bench_parser.add_argument("-w", "--workers", type=int, default=2, help="同时加载模型的进程数（默认: 2）")
+
+    parser.add_argument("--worker", nargs=2, metavar=("METHOD", "MODEL"), help=argparse.SUPPRESS)
+
+    args = parser.parse_args()
+    if args.worker:
+        run_worker(args.worker[1], args.worker[0])
+    elif args.command == "convert":
+        for name in args.models:
+            convert_checkpoint(name)
+    elif args.command == "bench":
+        run_bench(args.model, args.workers)
+    else:
+        parser.print_help()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,587 @@
+#!/usr/bin/env python3
+"""
+分布式任务队列
+下载、转录和分析的工作进程可以分布在多台机器上，从同一个队列领取任务。
+领取任务时获得一个有时限的租约，处理期间定时发送心跳续约；工作进程崩溃或失联后租约过期，
+任务会被重新投递给其他工作进程。
+任务分为 interactive（单个急用链接）和 bulk（批量链接）两个优先级，领取时先领取高优先级的任务，
+工作进程处理完一个任务后重新按优先级领取，可以只处理指定优先级以预留并发给急用链接。
+队列后端：
+- SQLiteQueue: 单个SQLite文件，用于本机测试或单机多进程
+- RedisQueue: Redis消息代理，用于多台机器的生产环境（需要安装 redis 包）
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from dataclasses import dataclass, field
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+# 本地测试用的队列数据库
+QUEUE_DB = r"D:\test\TikTok_Video_API\db\queue.db"
+
+# 默认租约时长（秒），心跳间隔为租约时长的三分之一
+LEASE_SECONDS = 60.0
+
+# 任务最多投递次数，超过后放入死信（dead）状态
+MAX_ATTEMPTS = 3
+
+# 队列为空时的轮询间隔（秒）
+POLL_INTERVAL = 1.0
+
+# 任务优先级（从高到低）和默认优先级
+PRIORITY_CLASSES = ("interactive", "bulk")
+DEFAULT_PRIORITY = "bulk"
+
+# 每个阶段每个优先级保留的最近完成任务延迟数（用于统计分位数）
+LATENCY_SAMPLES = 1000
+
+# 已完成或失败的任务在Redis中保留的时间（秒），之后自动删除，避免任务记录无限增长
+JOB_TTL = 7 * 24 * 3600
+
+@dataclass
+class Job:
+    """一个任务"""
+    id: str
+    stage: str
+    payload: Dict[str, Any]
+    attempts: int = 0
+    worker: Optional[str] = None
+    lease_until: float = 0.0
+    enqueued_at: float = field(default_factory=time.time)
+    priority: str = DEFAULT_PRIORITY
+
+    @property
+    def latency(self) -> float:
+        """从提交（payload 中的 submitted_at，没有时为入队时间）到现在的时间"""
+        return time.time() - float(self.payload.get("submitted_at") or self.enqueued_at)
+
+class LeaseLostError(Exception):
+    """租约已过期并被其他工作进程领取，当前进程不能再提交该任务的结果"""
+
+class PermanentJobError(Exception):
+    """任务本身有误（如源文件不存在），重试也不会成功"""
+
+def priority_rank(priority: str) -> int:
+    """优先级的序号，越小越优先"""
+    if priority not in PRIORITY_CLASSES:
+        raise ValueError(f"未知的优先级: {priority}（可选: {', '.join(PRIORITY_CLASSES)}）")
+    return PRIORITY_CLASSES.index(priority)
+
+def percentile(values: List[float], q: float) -> float:
+    """计算分位数（最近秩法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q * (len(ordered) - 1))))]
+
+def default_worker_id() -> str:
+    """工作进程标识：主机名 + 进程号 + 随机后缀"""
+    return f"{socket.gethostname()}-{os.getpid()}-{uuid.uuid4().hex[:6]}"
+
+class WorkQueue(ABC):
+    """
+    任务队列接口
+
+    所有方法都必须是原子的：同一个任务在租约有效期内只会被一个工作进程持有
+    """
+
+    @abstractmethod
+    def put(self, stage: str, payload: Dict[str, Any], priority: str = DEFAULT_PRIORITY) -> str:
+        """加入一个任务，返回任务ID"""
+
+    @abstractmethod
+    def claim(self, stage: str, worker: str, lease_seconds: float = LEASE_SECONDS,
+              classes: Optional[Sequence[str]] = None) -> Optional[Job]:
+        """
+        领取一个待处理或租约已过期的任务，没有任务时返回None
+
+        classes 为只领取的优先级（默认全部），按优先级从高到低、同一优先级内按入队顺序领取
+        """
+
+    @abstractmethod
+    def heartbeat(self, job: Job, lease_seconds: float = LEASE_SECONDS) -> bool:
+        """续约，租约已被其他工作进程取得时返回False"""
+
+    @abstractmethod
+    def complete(self, job: Job, result: Any = None):
+        """标记任务完成"""
+
+    @abstractmethod
+    def fail(self, job: Job, error: str, retry: bool = True):
+        """标记任务失败，retry为True且未超过最大投递次数时重新排队"""
+
+    @abstractmethod
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        """各阶段各状态的任务数，另有 pending:<优先级> 为各优先级的待处理数"""
+
+    @abstractmethod
+    def latencies(self, stage: str) -> Dict[str, List[float]]:
+        """各优先级最近完成的任务从提交到该阶段完成的时间（秒）"""
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+class SQLiteQueue(WorkQueue):
+    """
+    基于SQLite的队列
+
+    领取任务在 BEGIN IMMEDIATE 事务中完成，依靠数据库文件锁保证多个进程不会领取到同一个任务。
+    SQLite的文件锁在网络文件系统上不可靠，多台机器共享时请使用 RedisQueue
+    """
+
+    SCHEMA = """
+    CREATE TABLE IF NOT EXISTS jobs (
+        id TEXT PRIMARY KEY,
+        stage TEXT NOT NULL,
+        payload TEXT NOT NULL,
+        status TEXT NOT NULL,
+        attempts INTEGER NOT NULL DEFAULT 0,
+        max_attempts INTEGER NOT NULL,
+        worker TEXT,
+        lease_until REAL NOT NULL DEFAULT 0,
+        enqueued_at REAL NOT NULL,
+        updated_at REAL NOT NULL,
+        result TEXT,
+        error TEXT,
+        priority INTEGER NOT NULL DEFAULT 1
+    );
+    CREATE INDEX IF NOT EXISTS idx_jobs_claim ON jobs(stage, status, lease_until, enqueued_at);
+    """
+
+    def __init__(self, db_path: str = QUEUE_DB, max_attempts: int = MAX_ATTEMPTS):
+        if db_path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(db_path)), exist_ok=True)
+        self.max_attempts = max_attempts
+        # 手动管理事务（isolation_level=None），以便使用 BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(db_path, timeout=30, isolation_level=None, check_same_thread=False)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(self.SCHEMA)
+        # 旧版数据库没有优先级列，已有的任务都视为默认优先级
+        columns = [row[1] for row in self.conn.execute("PRAGMA table_info(jobs)")]
+        if "priority" not in columns:
+            self.conn.execute(f"ALTER TABLE jobs ADD COLUMN priority INTEGER NOT NULL DEFAULT {priority_rank(DEFAULT_PRIORITY)}")
+        self.conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_priority ON jobs(stage, status, priority, enqueued_at)")
+        self._lock = threading.Lock()
+
+    def _transaction(self, fn: Callable[[], Any]) -> Any:
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                result = fn()
+            except Exception:
+                self.conn.execute("ROLLBACK")
+                raise
+            self.conn.execute("COMMIT")
+            return result
+
+    def put(self, stage: str, payload: Dict[str, Any], priority: str = DEFAULT_PRIORITY) -> str:
+        job_id = uuid.uuid4().hex
+        now = time.time()
+        rank = priority_rank(priority)
+        self._transaction(lambda: self.conn.execute(
+            "INSERT INTO jobs (id, stage, payload, status, max_attempts, enqueued_at, updated_at, priority) "
+            "VALUES (?, ?, ?, 'pending', ?, ?, ?, ?)",
+            (job_id, stage, json.dumps(payload, ensure_ascii=False), self.max_attempts, now, now, rank),
+        ))
+        return job_id
+
+    def claim(self, stage: str, worker: str, lease_seconds: float = LEASE_SECONDS,
+              classes: Optional[Sequence[str]] = None) -> Optional[Job]:
+        ranks = [priority_rank(priority) for priority in (classes or PRIORITY_CLASSES)]
+
+        def claim_one():
+            now = time.time()
+            # 租约过期但投递次数已用尽的任务转为死信
+            self.conn.execute(
+                "UPDATE jobs SET status = 'dead', error = '租约过期次数过多', updated_at = ? "
+                "WHERE stage = ? AND status = 'leased' AND lease_until < ? AND attempts >= max_attempts",
+                (now, stage, now),
+            )
+            row = self.conn.execute(
+                "SELECT id, payload, attempts, enqueued_at, priority FROM jobs "
+                f"WHERE stage = ? AND priority IN ({', '.join('?' * len(ranks))}) "
+                "AND (status = 'pending' OR (status = 'leased' AND lease_until < ?)) "
+                "ORDER BY priority, enqueued_at LIMIT 1",
+                (stage, *ranks, now),
+            ).fetchone()
+            if row is None:
+                return None
+            job = Job(id=row[0], stage=stage, payload=json.loads(row[1]), attempts=row[2] + 1,
+                      worker=worker, lease_until=now + lease_seconds, enqueued_at=row[3],
+                      priority=PRIORITY_CLASSES[row[4]])
+            self.conn.execute(
+                "UPDATE jobs SET status = 'leased', attempts = ?, worker = ?, lease_until = ?, updated_at = ? "
+                "WHERE id = ?",
+                (job.attempts, worker, job.lease_until, now, job.id),
+            )
+            return job
+
+        return self._transaction(claim_one)
+
+    def heartbeat(self, job: Job, lease_seconds: float = LEASE_SECONDS) -> bool:
+        lease_until = time.time() + lease_seconds
+        cursor = self._transaction(lambda: self.conn.execute(
+            "UPDATE jobs SET lease_until = ?, updated_at = ? WHERE id = ? AND status = 'leased' AND worker = ?",
+            (lease_until, time.time(), job.id, job.worker),
+        ))
+        if cursor.rowcount:
+            job.lease_until = lease_until
+        return cursor.rowcount > 0
+
+    def complete(self, job: Job, result: Any = None):
+        cursor = self._transaction(lambda: self.conn.execute(
+            "UPDATE jobs SET status = 'done', result = ?, updated_at = ? "
+            "WHERE id = ? AND status = 'leased' AND worker = ?",
+            (json.dumps(result, ensure_ascii=False), time.time(), job.id, job.worker),
+        ))
+        if not cursor.rowcount:
+            raise LeaseLostError(f"任务 {job.id} 的租约已失效")
+
+    def fail(self, job: Job, error: str, retry: bool = True):
+        status = "pending" if retry and job.attempts < self.max_attempts else "dead"
+        self._transaction(lambda: self.conn.execute(
+            "UPDATE jobs SET status = ?, error = ?, worker = NULL, lease_until = 0, updated_at = ? "
+            "WHERE id = ? AND status = 'leased' AND worker = ?",
+            (status, error, time.time(), job.id, job.worker),
+        ))
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        now = time.time()
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT stage, CASE WHEN status = 'leased' AND lease_until < ? THEN 'expired' ELSE status END, "
+                "priority, COUNT(*) FROM jobs GROUP BY 1, 2, 3",
+                (now,),
+            ).fetchall()
+        stats: Dict[str, Dict[str, int]] = {}
+        for stage, status, rank, count in rows:
+            counts = stats.setdefault(stage, {})
+            counts[status] = counts.get(status, 0) + count
+            if status == "pending":
+                counts[f"pending:{PRIORITY_CLASSES[rank]}"] = count
+        return stats
+
+    def latencies(self, stage: str) -> Dict[str, List[float]]:
+        latencies = {}
+        with self._lock:
+            for rank, priority in enumerate(PRIORITY_CLASSES):
+                rows = self.conn.execute(
+                    "SELECT updated_at - COALESCE(json_extract(payload, '$.submitted_at'), enqueued_at) FROM jobs "
+                    "WHERE stage = ? AND status = 'done' AND priority = ? ORDER BY updated_at DESC LIMIT ?",
+                    (stage, rank, LATENCY_SAMPLES),
+                ).fetchall()
+                latencies[priority] = [row[0] for row in rows]
+        return latencies
+
+    def close(self):
+        self.conn.close()
+
+class RedisQueue(WorkQueue):
+    """
+    基于Redis的队列，适用于多台机器
+
+    每个阶段每个优先级使用一个待处理列表，所有优先级共用一个以租约到期时间为分数的有序集合，
+    出现过的阶段名记录在一个集合中（Redis会删除空列表，不能靠扫描待处理列表得到阶段）；
+    领取、续约和完成都通过Lua脚本原子执行，领取时先把租约过期的任务放回所属优先级的待处理列表，
+    再按优先级从高到低依次尝试各待处理列表。
+    脚本访问的每个键都通过 KEYS 传入（任务的键在领取到任务ID之后才知道，因此领取分为取出任务ID和登记租约两步）；
+    在Redis Cluster上使用时把 prefix 设为哈希标签的形式（如 {tiktok}），所有键落在同一个槽中。
+    已完成或失败的任务记录 JOB_TTL 秒后自动删除
+    """
+
+    # KEYS: 租约集合、任务、死信列表、所属优先级的待处理列表
+    # ARGV: 任务ID、当前时间、最多投递次数、保留时间
+    REQUEUE_SCRIPT = """
+    local lease_until = redis.call('ZSCORE', KEYS[1], ARGV[1])
+    if not lease_until or tonumber(lease_until) > tonumber(ARGV[2]) then
+        return 0
+    end
+    redis.call('ZREM', KEYS[1], ARGV[1])
+    redis.call('HDEL', KEYS[2], 'worker')
+    if tonumber(redis.call('HGET', KEYS[2], 'attempts') or '0') >= tonumber(ARGV[3]) then
+        redis.call('HSET', KEYS[2], 'status', 'dead', 'error', 'lease expired too many times')
+        redis.call('EXPIRE', KEYS[2], ARGV[4])
+        redis.call('LPUSH', KEYS[3], ARGV[1])
+    else
+        redis.call('HSET', KEYS[2], 'status', 'pending')
+        redis.call('RPUSH', KEYS[4], ARGV[1])
+    end
+    return 1
+    """
+
+    # KEYS: 租约集合、各优先级的待处理列表（从高到低）
+    # ARGV: 租约到期时间
+    CLAIM_SCRIPT = """
+    for i = 2, #KEYS do
+        local id = redis.call('RPOP', KEYS[i])
+        if id then
+            redis.call('ZADD', KEYS[1], ARGV[1], id)
+            return id
+        end
+    end
+    return nil
+    """
+
+    # KEYS: 租约集合、任务
+    # ARGV: 任务ID、工作进程标识
+    LEASE_SCRIPT = """
+    if not redis.call('ZSCORE', KEYS[1], ARGV[1]) then
+        return 0
+    end
+    redis.call('HSET', KEYS[2], 'status', 'leased', 'worker', ARGV[2])
+    return redis.call('HINCRBY', KEYS[2], 'attempts', 1)
+    """
+
+    HEARTBEAT_SCRIPT = """
+    if redis.call('HGET', KEYS[2], 'worker') ~= ARGV[1] or not redis.call('ZSCORE', KEYS[1], ARGV[3]) then
+        return 0
+    end
+    redis.call('ZADD', KEYS[1], 'XX', ARGV[2], ARGV[3])
+    return 1
+    """
+
+    FINISH_SCRIPT = """
+    if redis.call('HGET', KEYS[2], 'worker') ~= ARGV[1] or redis.call('ZREM', KEYS[1], ARGV[2]) == 0 then
+        return 0
+    end
+    redis.call('HSET', KEYS[2], 'status', ARGV[3], 'result', ARGV[4], 'error', ARGV[5])
+    if ARGV[3] == 'pending' then
+        redis.call('LPUSH', KEYS[3], ARGV[2])
+        return 1
+    end
+    if ARGV[3] == 'dead' then
+        redis.call('LPUSH', KEYS[4], ARGV[2])
+    else
+        redis.call('INCR', KEYS[5])
+        redis.call('LPUSH', KEYS[6], ARGV[6])
+        redis.call('LTRIM', KEYS[6], 0, tonumber(ARGV[7]) - 1)
+    end
+    redis.call('EXPIRE', KEYS[2], ARGV[8])
+    return 1
+    """
+
+    def __init__(self, url: str = "redis://localhost:6379/0", prefix: str = "tiktok", max_attempts: int = MAX_ATTEMPTS,
+                 client=None):
+        """
+        Args:
+            url: Redis地址
+            prefix: 键名前缀
+            max_attempts: 任务最多投递次数
+            client: 已创建的Redis客户端（需设置 decode_responses=True），提供时忽略 url
+        """
+        if client is None:
+            try:
+                import redis
+            except ImportError:
+                raise ImportError("RedisQueue 需要安装 redis 包: pip install redis")
+            client = redis.Redis.from_url(url, decode_responses=True)
+        self.client = client
+        self.prefix = prefix
+        self.max_attempts = max_attempts
+        self._requeue = self.client.register_script(self.REQUEUE_SCRIPT)
+        self._claim = self.client.register_script(self.CLAIM_SCRIPT)
+        self._lease = self.client.register_script(self.LEASE_SCRIPT)
+        self._heartbeat = self.client.register_script(self.HEARTBEAT_SCRIPT)
+        self._finish = self.client.register_script(self.FINISH_SCRIPT)
+
+    def _key(self, *parts: str) -> str:
+        return ":".join((self.prefix,) + parts)
+
+    def _pending_key(self, stage: str, priority: str) -> str:
+        # 默认优先级沿用旧版的列表名，升级前已入队的任务仍然可以领取
+        if priority == DEFAULT_PRIORITY:
+            return self._key(stage, "pending")
+        return self._key(stage, "pending", priority)
+
+    def put(self, stage: str, payload: Dict[str, Any], priority: str = DEFAULT_PRIORITY) -> str:
+        priority_rank(priority)
+        job_id = uuid.uuid4().hex
+        pipe = self.client.pipeline()
+        pipe.hset(self._key("job", job_id), mapping={
+            "stage": stage, "payload": json.dumps(payload, ensure_ascii=False), "status": "pending",
+            "attempts": 0, "enqueued_at": time.time(), "priority": priority,
+        })
+        pipe.lpush(self._pending_key(stage, priority), job_id)
+        pipe.sadd(self._key("stages"), stage)
+        pipe.execute()
+        return job_id
+
+    def claim(self, stage: str, worker: str, lease_seconds: float = LEASE_SECONDS,
+              classes: Optional[Sequence[str]] = None) -> Optional[Job]:
+        classes = sorted(classes or PRIORITY_CLASSES, key=priority_rank)
+        leased_key = self._key(stage, "leased")
+        now = time.time()
+        # 租约过期的任务放回所属优先级的待处理列表（任务的优先级不会改变，可以先读出再传入脚本）
+        for expired_id in self.client.zrangebyscore(leased_key, "-inf", now):
+            job_key = self._key("job", expired_id)
+            priority = self.client.hget(job_key, "priority") or DEFAULT_PRIORITY
+            self._requeue(keys=[leased_key, job_key, self._key(stage, "dead"), self._pending_key(stage, priority)],
+                          args=[expired_id, now, self.max_attempts, JOB_TTL])
+
+        while True:
+            job_id = self._claim(keys=[leased_key] + [self._pending_key(stage, priority) for priority in classes],
+                                 args=[now + lease_seconds])
+            if job_id is None:
+                return None
+            # 两步之间租约被判定过期、任务已被放回队列时（工作进程在两步之间停顿超过租约时长），重新领取
+            if self._lease(keys=[leased_key, self._key("job", job_id)], args=[job_id, worker]):
+                break
+        data = self.client.hgetall(self._key("job", job_id))
+        return Job(id=job_id, stage=stage, payload=json.loads(data["payload"]), attempts=int(data["attempts"]),
+                   worker=worker, lease_until=now + lease_seconds, enqueued_at=float(data["enqueued_at"]),
+                   priority=data.get("priority", DEFAULT_PRIORITY))
+
+    def heartbeat(self, job: Job, lease_seconds: float = LEASE_SECONDS) -> bool:
+        lease_until = time.time() + lease_seconds
+        ok = self._heartbeat(keys=[self._key(job.stage, "leased"), self._key("job", job.id)],
+                             args=[job.worker, lease_until, job.id])
+        if ok:
+            job.lease_until = lease_until
+        return bool(ok)
+
+    def _finish_job(self, job: Job, status: str, result: Any = None, error: str = "") -> bool:
+        return bool(self._finish(
+            keys=[self._key(job.stage, "leased"), self._key("job", job.id), self._pending_key(job.stage, job.priority),
+                  self._key(job.stage, "dead"), self._key(job.stage, "done_count"),
+                  self._key(job.stage, "latency", job.priority)],
+            args=[job.worker, job.id, status, json.dumps(result, ensure_ascii=False), error,
+                  job.latency, LATENCY_SAMPLES, JOB_TTL],
+        ))
+
+    def complete(self, job: Job, result: Any = None):
+        if not self._finish_job(job, "done", result):
+            raise LeaseLostError(f"任务 {job.id} 的租约已失效")
+
+    def fail(self, job: Job, error: str, retry: bool = True):
+        status = "pending" if retry and job.attempts < self.max_attempts else "dead"
+        self._finish_job(job, status, error=error)
+
+    def stats(self) -> Dict[str, Dict[str, int]]:
+        stats: Dict[str, Dict[str, int]] = {}
+        now = time.time()
+        stages = set(self.client.smembers(self._key("stages")))
+        # 记录阶段名之前入队、仍在排队的任务
+        stages.update(key[len(self.prefix) + 1:-len(":pending")] for key in self.client.scan_iter(self._key("*", "pending")))
+        for stage in sorted(stages):
+            leased_key = self._key(stage, "leased")
+            stats[stage] = {
+                "leased": self.client.zcount(leased_key, now, "+inf"),
+                "expired": self.client.zcount(leased_key, "-inf", now),
+                "dead": self.client.llen(self._key(stage, "dead")),
+                "done": int(self.client.get(self._key(stage, "done_count")) or 0),
+            }
+            for priority in PRIORITY_CLASSES:
+                stats[stage][f"pending:{priority}"] = self.client.llen(self._pending_key(stage, priority))
+            stats[stage]["pending"] = sum(stats[stage][f"pending:{priority}"] for priority in PRIORITY_CLASSES)
+        return stats
+
+    def latencies(self, stage: str) -> Dict[str, List[float]]:
+        return {priority: [float(value) for value in self.client.lrange(self._key(stage, "latency", priority), 0, -1)]
+                for priority in PRIORITY_CLASSES}
+
+    def close(self):
+        self.client.close()
+
+def open_queue(url: Optional[str] = None) -> WorkQueue:
+    """
+    根据地址打开队列
+
+    Args:
+        url: redis:// 开头时使用Redis，否则视为SQLite数据库路径（默认 QUEUE_DB）
+    """
+    if url and url.startswith(("redis://", "rediss://")):
+        return RedisQueue(url)
+    return SQLiteQueue(url or QUEUE_DB)
+
+class Heartbeat:
+    """在后台线程中定时续约，租约丢失时设置 lost 标志"""
+
+    def __init__(self, queue: WorkQueue, job: Job, lease_seconds: float = LEASE_SECONDS):
+        self.queue = queue
+        self.job = job
+        self.lease_seconds = lease_seconds
+        self.lost = False
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.lease_seconds / 3):
+            try:
+                if not self.queue.heartbeat(self.job, self.lease_seconds):
+                    self.lost = True
+                    return
+            except Exception as e:
+                # 暂时无法连接队列时继续尝试，租约在到期前仍然有效
+                print(f"发送心跳失败: {e}")
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+
+def run_worker(queue: WorkQueue, stage: str, handler: Callable[[Dict[str, Any]], Any],
+               worker: Optional[str] = None, lease_seconds: float = LEASE_SECONDS,
+               poll_interval: float = POLL_INTERVAL, max_jobs: Optional[int] = None,
+               exit_when_idle: bool = False, stop: Optional[threading.Event] = None,
+               classes: Optional[Sequence[str]] = None) -> List[Job]:
+    """
+    工作进程主循环：领取任务、处理期间发送心跳、提交结果
+
+    Args:
+        queue: 任务队列
+        stage: 处理的阶段
+        handler: 处理函数，接收任务内容，返回结果；抛出 PermanentJobError 表示任务本身有误、不再重试
+        worker: 工作进程标识
+        lease_seconds: 租约时长
+        poll_interval: 队列为空时的轮询间隔
+        max_jobs: 处理的任务数上限，None 表示不限
+        exit_when_idle: 队列为空时退出，否则一直等待新任务
+        stop: 设置后在当前任务完成后退出
+        classes: 只领取的优先级，默认全部（每个任务完成后都重新按优先级领取）
+
+    Returns:
+        已处理的任务
+    """
+    worker = worker or default_worker_id()
+    processed: List[Job] = []
+    while (max_jobs is None or len(processed) < max_jobs) and not (stop and stop.is_set()):
+        job = queue.claim(stage, worker, lease_seconds, classes)
+        if job is None:
+            if exit_when_idle:
+                break
+            time.sleep(poll_interval)
+            continue
+
+        print(f"[{worker}] 领取任务 {stage}/{job.id}（{job.priority}，第 {job.attempts} 次投递）")
+        try:
+            with Heartbeat(queue, job, lease_seconds) as heartbeat:
+                result = handler(job.payload)
+            if heartbeat.lost:
+                print(f"[{worker}] 任务 {job.id} 的租约已丢失，结果被丢弃")
+            else:
+                queue.complete(job, result)
+        except LeaseLostError as e:
+            print(f"[{worker}] {e}")
+        except PermanentJobError as e:
+            print(f"[{worker}] 任务 {job.id} 无法处理: {e}")
+            queue.fail(job, str(e), retry=False)
+        except Exception as e:
+            print(f"[{worker}] 任务 {job.id} 处理失败: {e}")
+            queue.fail(job, str(e))
+        processed.append(job)
+    return processed